@@ -0,0 +1,6 @@
+"""
+Benchmarks for the HStyle server. each benchmark is a module that can be run
+from the application folder, e.g.:
+`python -m server.benchmarks.train_step_benchmark`
+and prints its results as json.
+"""
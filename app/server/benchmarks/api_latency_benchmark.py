@@ -0,0 +1,188 @@
+"""
+Benchmark of api response times under concurrent large uploads. the app is
+served by a local uvicorn server, clients upload distinct phone camera size
+jpegs while probe clients request a light end point, reported as p50 and p99
+response time of both with image preprocessing on the event loop (as before)
+and on the preprocess executor. renders are not started, only the api path
+is measured.
+"""
+
+
+import os
+import time
+import socket
+import argparse
+import threading
+import requests
+import uvicorn
+import numpy as np
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+from server.benchmarks import common
+from server.benchmarks.upload_decode_benchmark import create_upload
+from server.controllers import style_transfer as controller
+from server.controllers import uploads as api_uploads
+from server.controllers.main import app
+
+
+# seconds to wait for a response, a hung server fails the benchmark
+request_timeout_seconds: float = 60.0
+
+
+class InlineExecutor(Executor):
+    """
+    Class of an executor running calls in the calling thread, so
+    preprocessing blocks the event loop as it did before the executor
+    """
+    def submit(self, fn: Callable, *args, **kwargs) -> Future: # pylint: disable=W0221
+        """
+        Method to run a call
+
+        Args:
+            fn (Callable): the function to call
+            *args: function positional arguments
+            **kwargs: function keyword arguments
+
+        Returns:
+            Future: the done future of the call
+        """
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as err: # pylint: disable=W0703
+            future.set_exception(err)
+        return future
+
+
+class BenchmarkServer(uvicorn.Server):
+    """
+    Class of a uvicorn server that runs in a background thread
+    """
+    def install_signal_handlers(self) -> None:
+        """
+        Signals are handled by the main thread
+        """
+
+
+def free_port() -> int:
+    """
+    Method to get a free local port
+
+    Returns:
+        int: the port
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    """
+    Method to summarize response times
+
+    Args:
+        latencies (List[float]): response times in seconds
+
+    Returns:
+        Dict[str, float]: count, p50 and p99 in seconds
+    """
+    return {'requests': len(latencies),
+            'p50_seconds': float(np.percentile(latencies, 50)),
+            'p99_seconds': float(np.percentile(latencies, 99))}
+
+
+def run_load(url: str, upload: bytes, uploads: int, upload_clients: int, # pylint: disable=R0913
+             probe_clients: int) -> Dict[str, Any]:
+    """
+    Method to upload images concurrently while probing a light end point
+
+    Args:
+        url (str): the server url
+        upload (bytes): the jpeg upload
+        uploads (int): number of uploads
+        upload_clients (int): number of concurrent upload clients
+        probe_clients (int): number of concurrent probe clients
+
+    Returns:
+        Dict[str, Any]: response times of uploads and probes
+    """
+    upload_latencies: List[float] = []
+    probe_latencies: List[float] = []
+    done: threading.Event = threading.Event()
+
+    def send_upload(i: int) -> None:
+        # trailing bytes after the jpeg end marker make every upload
+        # distinct, so no upload is answered from a cache
+        start: float = time.perf_counter()
+        requests.post(f'{url}/api/styleTransfer/renderImage/', data={
+            'email': 'test@test.com', 'content_loss': '150',
+            'style_loss': '0.01', 'total_variation_loss': '30',
+            'apply_dilation': 'true'}, files={'content_image': (
+                'content.jpg', upload + os.urandom(16) + bytes([i % 256]),
+                'image/jpeg')},
+            timeout=request_timeout_seconds).raise_for_status()
+        upload_latencies.append(time.perf_counter() - start)
+
+    def probe() -> None:
+        with requests.Session() as session:
+            while not done.is_set():
+                start: float = time.perf_counter()
+                session.get(f'{url}/api/styleTransfer/jobs/unknown',
+                            timeout=request_timeout_seconds)
+                probe_latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(probe_clients) as probes:
+        for _ in range(probe_clients):
+            probes.submit(probe)
+        with ThreadPoolExecutor(upload_clients) as clients:
+            list(clients.map(send_upload, range(uploads)))
+        done.set()
+    return {'uploads': percentiles(upload_latencies),
+            'probes': percentiles(probe_latencies)}
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--uploads', type=int, default=40)
+    parser.add_argument('--upload-clients', type=int, default=4)
+    parser.add_argument('--probe-clients', type=int, default=2)
+    args: argparse.Namespace = parser.parse_args()
+
+    # measure the api only, renders are never started
+    controller.start_workers = lambda: None
+    controller.render_pool.submit = lambda *args, **kwargs: Future()
+
+    port: int = free_port()
+    server: BenchmarkServer = BenchmarkServer(uvicorn.Config(
+        app, host='127.0.0.1', port=port, log_level='warning'))
+    thread: threading.Thread = threading.Thread(target=server.run,
+                                                daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.1)
+
+    upload: bytes = create_upload(args.megapixels)
+    executor: ThreadPoolExecutor = api_uploads.preprocess_executor
+    results: List[Dict[str, Any]] = []
+    for mode, mode_executor in (('event_loop', InlineExecutor()),
+                                ('executor', executor)):
+        api_uploads.preprocess_executor = mode_executor
+        results.append({'preprocess': mode, **run_load(
+            f'http://127.0.0.1:{port}', upload, args.uploads,
+            args.upload_clients, args.probe_clients)})
+
+    server.should_exit = True
+    thread.join()
+    common.print_report({'benchmark': 'api_latency',
+                         'megapixels': args.megapixels,
+                         'preprocess_workers': api_uploads.preprocess_workers,
+                         'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark of batched rendering on CPU, reported as renders per minute for
+each batch size.
+"""
+
+
+import argparse
+from typing import Any, Dict, List
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import batch_render
+from server.machine_learning.style_transfer import RenderOptions
+
+
+def benchmark_batch(batch_size: int, steps: int) -> Dict[str, Any]:
+    """
+    Method to measure renders per minute of a batch size
+
+    Args:
+        batch_size (int): number of renders in batch
+        steps (int): number of optimization steps per render
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    content_img, style_img = common.load_default_images()
+    requests: List[batch_render.RenderRequest] = [
+        batch_render.RenderRequest(content_img, style_img, 0.01, 10000.0,
+                                   30.0)
+        for _ in range(batch_size)]
+    # targets are cached after the warm up, like the default style traffic
+    options: RenderOptions = RenderOptions()
+
+    def render() -> None:
+        batch_render.render_batch(requests, content_layer, style_layers, 0,
+                                  1, steps, options)
+
+    # first render includes tracing and target extraction
+    _, warm_up_seconds = common.timed(render)
+    _, seconds = common.timed(render)
+    return {'batch_size': batch_size,
+            'steps': steps,
+            'warm_up_seconds': warm_up_seconds,
+            'seconds': seconds,
+            'renders_per_minute': 60 * batch_size / seconds}
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--batch-sizes', type=int, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--steps', type=int, default=20)
+    args: argparse.Namespace = parser.parse_args()
+
+    results: List[Dict[str, Any]] = [
+        benchmark_batch(batch_size, args.steps)
+        for batch_size in args.batch_sizes]
+    common.print_report({'benchmark': 'batch_render',
+                         'peak_rss_mb': common.peak_rss_mb(),
+                         'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Common helpers for HStyle benchmarks.
+"""
+
+
+import os
+import sys
+import json
+import time
+import resource
+import numpy as np
+import tensorflow as tf
+from typing import Any, Callable, Dict, List, Tuple
+from PIL import Image
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer, engines
+
+
+# get dir path
+dir_path: str = os.path.dirname(os.path.realpath(__file__))
+
+# path of server data folder
+data_path: str = os.path.join(dir_path, '..', 'data')
+
+# path of repository examples folder
+examples_path: str = os.path.join(dir_path, '..', '..', '..', 'examples')
+
+
+def read_rgb_image(path: str) -> np.ndarray:
+    """
+    Method to read an image file as an RGB numpy array
+
+    Args:
+        path (str): the image path
+
+    Returns:
+        np.ndarray: RGB image as numpy array
+    """
+    return np.asarray(Image.open(path).convert('RGB'))
+
+
+def load_default_images() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Method to load the default content and style images of the server
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: content image and style image
+    """
+    return (read_rgb_image(os.path.join(data_path, 'modern.png')),
+            read_rgb_image(os.path.join(data_path, 'historical.png')))
+
+
+def default_style_id() -> str:
+    """
+    Method to get the style id of the default style image of the server
+
+    Returns:
+        str: the style id, the digest of the style image file
+    """
+    return engines.file_digest(os.path.join(data_path, 'historical.png'))
+
+
+def timed(func: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    """
+    Method to call a function and measure its wall time
+
+    Args:
+        func (Callable): the function to call
+        *args: function positional arguments
+        **kwargs: function keyword arguments
+
+    Returns:
+        Tuple[Any, float]: function result and wall time in seconds
+    """
+    start: float = time.perf_counter()
+    result: Any = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def peak_rss_mb() -> float:
+    """
+    Method to get the peak resident memory of the current process
+
+    Returns:
+        float: peak resident memory in megabytes
+    """
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, mac os reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """
+    Method to print a benchmark report as json
+
+    Args:
+        report (Dict[str, Any]): the benchmark report
+    """
+    print(json.dumps(report, indent=2, default=float))
+
+
+def example_pairs() -> List[Tuple[str, np.ndarray, np.ndarray]]:
+    """
+    Method to load the content and style image pairs of the repository
+    examples
+
+    Returns:
+        List[Tuple[str, np.ndarray, np.ndarray]]: example name, content
+        image and style image of each example
+    """
+    pairs: List[Tuple[str, np.ndarray, np.ndarray]] = []
+    for name in sorted(os.listdir(examples_path),
+                       key=lambda name: (len(name), name)):
+        folder: str = os.path.join(examples_path, name)
+        files: List[str] = os.listdir(folder) \
+            if os.path.isdir(folder) else []
+        content: List[str] = [f for f in files if f.startswith('content.')]
+        style: List[str] = [f for f in files if f.startswith('style.')]
+        if content and style:
+            pairs.append((name,
+                          read_rgb_image(os.path.join(folder, content[0])),
+                          read_rgb_image(os.path.join(folder, style[0]))))
+    return pairs
+
+
+def example_style_id(name: str) -> str:
+    """
+    Method to get the style id of the style image of a repository example
+
+    Args:
+        name (str): the example name
+
+    Returns:
+        str: the style id, the digest of the style image file
+    """
+    folder: str = os.path.join(examples_path, name)
+    style: List[str] = [f for f in os.listdir(folder)
+                        if f.startswith('style.')]
+    return engines.file_digest(os.path.join(folder, style[0]))
+
+
+def output_loss(output: Image.Image, content_img: np.ndarray, # pylint: disable=R0913
+                style_img: np.ndarray, max_dim: int, style_weight: float,
+                content_weight: float,
+                total_variation_weight: float) -> float:
+    """
+    Method to calculate the style transfer loss of a rendered image, so
+    renders of different engines and modes can be compared
+
+    Args:
+        output (Image.Image): the rendered image
+        content_img (np.ndarray): the content image
+        style_img (np.ndarray): the style image
+        max_dim (int): maximum dimension the loss is measured at
+        style_weight (float): the style weight
+        content_weight (float): the content weight
+        total_variation_weight (float): the total variation weight
+
+    Returns:
+        float: style, content and total variation loss
+    """
+    extractor: style_transfer.StyleContentModel = \
+        style_transfer.extractor_registry.get(style_layers, content_layer)
+    image: tf.Tensor = style_transfer.load_img(np.asarray(output), max_dim)
+    loss: tf.Tensor = style_transfer.style_content_loss(
+        extractor(image),
+        style_transfer.get_targets(extractor, 'style', style_img, max_dim),
+        style_transfer.get_targets(extractor, 'content', content_img,
+                                   max_dim),
+        len(style_layers), len(content_layer), style_weight, content_weight)
+    loss += total_variation_weight * style_transfer.total_variation_loss(
+        image)
+    return float(loss)
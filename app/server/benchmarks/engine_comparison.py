@@ -0,0 +1,103 @@
+"""
+Quality and latency comparison of the render engines on the repository
+examples. every engine renders each example content image with its style
+image, reported as wall time and the style transfer loss of the result
+(lower is closer to the optimization objective). single pass engines are
+skipped when not trained.
+"""
+
+
+import os
+import argparse
+import numpy as np
+from typing import Any, Dict, List, Optional
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer, render, fast_style, adain
+
+
+# loss weights of the compared renders
+style_weight: float = 0.01
+content_weight: float = 10000.0
+total_variation_weight: float = 30.0
+
+
+def available_engines(style_id: str) -> List[str]:
+    """
+    Method to get the engines that can render a style
+
+    Args:
+        style_id (str): the style id, digest of the style image file
+
+    Returns:
+        List[str]: the engine names
+    """
+    engines: List[str] = [style_transfer.OPTIMIZATION_ENGINE]
+    if fast_style.fast_style_registry.has(style_id):
+        engines.append(fast_style.FAST_ENGINE)
+    if adain.decoder_trained():
+        engines.append(adain.ADAIN_ENGINE)
+    return engines
+
+
+def compare_example(name: str, content_img: np.ndarray,
+                    style_img: np.ndarray, steps: int,
+                    output_dir: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Method to render an example with every available engine
+
+    Args:
+        name (str): the example name
+        content_img (np.ndarray): the content image
+        style_img (np.ndarray): the style image
+        steps (int): number of optimization steps
+        output_dir (str, optional): folder to save rendered images in
+
+    Returns:
+        List[Dict[str, Any]]: the results of each engine
+    """
+    results: List[Dict[str, Any]] = []
+    style_id: str = common.example_style_id(name)
+    for engine in available_engines(style_id):
+        options: style_transfer.RenderOptions = \
+            style_transfer.RenderOptions(engine=engine, style_id=style_id)
+        (output, report), seconds = common.timed(
+            render.render_image_with_report, content_img, style_img,
+            content_layer, style_layers, style_weight, content_weight,
+            total_variation_weight, 0, 1, steps, options)
+        if output_dir is not None:
+            output.save(os.path.join(output_dir, f'{name}_{engine}.png'))
+        results.append({
+            'example': name, 'engine': engine, 'seconds': seconds,
+            'steps': report.steps,
+            'loss': common.output_loss(output, content_img, style_img, 512,
+                                       style_weight, content_weight,
+                                       total_variation_weight)})
+    return results
+
+
+def main() -> None:
+    """
+    Run the comparison
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--steps', type=int, default=1000,
+                        help='optimization steps of each render')
+    parser.add_argument('--output-dir',
+                        help='folder to save the rendered images in')
+    args: argparse.Namespace = parser.parse_args()
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    style_transfer.extractor_registry.warm(style_layers, content_layer)
+    results: List[Dict[str, Any]] = [
+        result for name, content_img, style_img in common.example_pairs()
+        for result in compare_example(name, content_img, style_img,
+                                      args.steps, args.output_dir)]
+    common.print_report({'benchmark': 'engine_comparison',
+                         'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Render benchmark suite over the repository examples. every render mode
+renders each example content image with its style image, reported as wall
+time, steps per second, peak resident memory, final loss and the distance of
+the rendered image from the example result (psnr, ssim and vgg feature
+distance). each mode runs in its own process so peak memory is not shared
+between modes. the report is written as json and can be compared with the
+report of a previous version to catch throughput regressions.
+"""
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import multiprocessing
+import numpy as np
+import tensorflow as tf
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from PIL import Image
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer, render, engines
+from server.machine_learning.fast_style import fast_style_registry
+
+
+# loss weights of the benchmark renders
+style_weight: float = 0.01
+content_weight: float = 10000.0
+total_variation_weight: float = 30.0
+
+# maximum dimension of the renders, the distance to the example results is
+# measured at the render size
+render_max_dim: int = 512
+
+# render modes of the suite
+MODES: List[str] = ['optimization', 'pyramid', 'bfloat16', 'fast', 'adain']
+
+# relative steps per second drop reported as a regression
+default_tolerance: float = 0.1
+
+
+def mode_options(mode: str, style_id: str
+                 ) -> Optional[style_transfer.RenderOptions]:
+    """
+    Method to get the render options of a mode
+
+    Args:
+        mode (str): the render mode
+        style_id (str): the style id, digest of the style image file
+
+    Raises:
+        ValueError: if mode is unknown
+
+    Returns:
+        Optional[style_transfer.RenderOptions]: the options, None if this
+        machine or style can not render in the mode
+    """
+    if mode == 'optimization':
+        return style_transfer.RenderOptions()
+    if mode == 'pyramid':
+        return style_transfer.RenderOptions(
+            pyramid=render.pyramid_levels())
+    if mode == 'bfloat16':
+        return style_transfer.RenderOptions(precision='bfloat16') \
+            if 'bfloat16' in style_transfer.supported_precisions() else None
+    if mode == 'fast':
+        return style_transfer.RenderOptions(engine=engines.FAST_ENGINE,
+                                            style_id=style_id) \
+            if fast_style_registry.has(style_id) else None
+    if mode == 'adain':
+        return style_transfer.RenderOptions(engine=engines.ADAIN_ENGINE) \
+            if engines.decoder_trained() else None
+    raise ValueError(f'Unknown render mode {mode}')
+
+
+def result_distance(output: Image.Image, result: np.ndarray,
+                    extractor: style_transfer.StyleContentModel
+                    ) -> Dict[str, float]:
+    """
+    Method to measure the distance of a rendered image from the example
+    result, at the rendered image size
+
+    Args:
+        output (Image.Image): the rendered image
+        result (np.ndarray): the example result
+        extractor (style_transfer.StyleContentModel): the extractor, its
+        content layer features are compared
+
+    Returns:
+        Dict[str, float]: psnr and ssim (higher is closer) and mean squared
+        vgg content feature distance (lower is closer)
+    """
+    rendered: tf.Tensor = tf.convert_to_tensor(
+        np.asarray(output.convert('RGB')), tf.float32)[tf.newaxis] / 255
+    reference: tf.Tensor = tf.image.resize(
+        tf.convert_to_tensor(result, tf.float32)[tf.newaxis] / 255,
+        rendered.shape[1:3])
+    distances: List[float] = [
+        float(tf.reduce_mean(tf.square(rendered_layer - reference_layer)))
+        for rendered_layer, reference_layer in zip(
+            extractor(rendered)['content'].values(),
+            extractor(reference)['content'].values())]
+    return {'psnr': float(tf.image.psnr(rendered, reference, 1.0)[0]),
+            'ssim': float(tf.image.ssim(rendered, reference, 1.0)[0]),
+            'feature_distance': float(np.mean(distances))}
+
+
+def benchmark_mode(mode: str, epochs: int, steps_per_epoch: int,
+                   examples: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    Method to render every example in a mode
+
+    Args:
+        mode (str): the render mode
+        epochs (int): number of epochs with total variation
+        steps_per_epoch (int): number of steps in each epoch
+        examples (List[str], optional): names of the examples to render, all
+        if not given
+
+    Returns:
+        Dict[str, Any]: the results of each example and peak memory
+    """
+    extractor: style_transfer.StyleContentModel = \
+        style_transfer.extractor_registry.get(style_layers, content_layer)
+    results: List[Dict[str, Any]] = []
+    for name, content_img, style_img in common.example_pairs():
+        if examples is not None and name not in examples:
+            continue
+        options: Optional[style_transfer.RenderOptions] = mode_options(
+            mode, common.example_style_id(name))
+        if options is None:
+            continue
+        (output, report), seconds = common.timed(
+            render.render_image_with_report, content_img, style_img,
+            content_layer, style_layers, style_weight, content_weight,
+            total_variation_weight, 0, epochs, steps_per_epoch, options)
+        optimization_seconds: float = sum(phase.seconds
+                                          for phase in report.phases)
+        results.append({
+            'example': name, 'engine': report.engine, 'seconds': seconds,
+            'setup_seconds': report.setup_seconds, 'steps': report.steps,
+            'steps_per_second': report.steps / optimization_seconds
+            if report.steps and optimization_seconds else None,
+            'final_loss': common.output_loss(
+                output, content_img, style_img, render_max_dim,
+                style_weight, content_weight, total_variation_weight),
+            **result_distance(output, common.read_rgb_image(os.path.join(
+                common.examples_path, name, 'result.png')), extractor)})
+    return {'mode': mode, 'peak_rss_mb': common.peak_rss_mb(),
+            'examples': results}
+
+
+def summarize(mode_result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Method to summarize the results of a mode over the examples
+
+    Args:
+        mode_result (Dict[str, Any]): the results of the mode
+
+    Returns:
+        Dict[str, Any]: total time, mean steps per second, loss and
+        distances
+    """
+    examples: List[Dict[str, Any]] = mode_result['examples']
+    if not examples:
+        return {'examples': 0}
+    steps_per_second: List[float] = [example['steps_per_second']
+                                     for example in examples
+                                     if example['steps_per_second']]
+    return {'examples': len(examples),
+            'seconds': sum(example['seconds'] for example in examples),
+            'steps_per_second': float(np.mean(steps_per_second))
+            if steps_per_second else None,
+            **{key: float(np.mean([example[key] for example in examples]))
+               for key in ('final_loss', 'psnr', 'ssim', 'feature_distance')}}
+
+
+def find_regressions(report: Dict[str, Any], baseline: Dict[str, Any],
+                     tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Method to compare the throughput of a report with a baseline report
+
+    Args:
+        report (Dict[str, Any]): the benchmark report
+        baseline (Dict[str, Any]): the report of a previous version
+        tolerance (float): relative steps per second drop allowed
+
+    Returns:
+        List[Dict[str, Any]]: the modes whose steps per second dropped more
+        than tolerance
+    """
+    regressions: List[Dict[str, Any]] = []
+    for mode, summary in report['summary'].items():
+        previous: Optional[float] = baseline.get('summary', {}).get(
+            mode, {}).get('steps_per_second')
+        current: Optional[float] = summary.get('steps_per_second')
+        if previous and current and current < previous * (1 - tolerance):
+            regressions.append({'mode': mode, 'baseline': previous,
+                                'current': current,
+                                'change': current / previous - 1})
+    return regressions
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--modes', nargs='+', choices=MODES,
+                        default=['optimization', 'pyramid'])
+    parser.add_argument('--examples', nargs='+',
+                        help='names of the examples to render, all if not '
+                        'given')
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--steps-per-epoch', type=int, default=100)
+    parser.add_argument('--output', help='file to write the report to')
+    parser.add_argument('--baseline',
+                        help='report of a previous version to compare with, '
+                        'exits with status 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=default_tolerance)
+    args: argparse.Namespace = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for mode in args.modes:
+        # a fresh process per mode, peak memory only grows
+        with ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context('spawn')) as executor:
+            results.append(executor.submit(
+                benchmark_mode, mode, args.epochs, args.steps_per_epoch,
+                args.examples).result())
+
+    report: Dict[str, Any] = {
+        'benchmark': 'examples',
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'machine': {'platform': platform.platform(),
+                    'processor': platform.processor(),
+                    'cpus': os.cpu_count(),
+                    'python': platform.python_version(),
+                    'tensorflow': tf.__version__},
+        'epochs': args.epochs, 'steps_per_epoch': args.steps_per_epoch,
+        'summary': {result['mode']: summarize(result) for result in results},
+        'results': results}
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            report['regressions'] = find_regressions(
+                report, json.load(baseline_file), args.tolerance)
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2, default=float)
+    common.print_report(report)
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
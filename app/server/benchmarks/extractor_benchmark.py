@@ -0,0 +1,142 @@
+"""
+Benchmark of the exported extractor against building it with keras,
+reported as load time, first call time, forward pass latency, optimization
+step latency (keras and SavedModel, TFLite has no gradients) and peak
+resident memory. each variant loads in its own process, like a new worker.
+"""
+
+
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import tensorflow as tf
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer, frozen_extractor
+
+
+# variants of the benchmark
+VARIANTS: List[str] = ['keras', 'saved_model', 'tflite', 'tflite_quantized']
+
+
+def load_variant(variant: str, artifact: str) -> Callable:
+    """
+    Method to load the extractor of a variant
+
+    Args:
+        variant (str): the variant
+        artifact (str): the exported SavedModel folder
+
+    Returns:
+        Callable: the extractor
+    """
+    if variant == 'keras':
+        return style_transfer.StyleContentModel(style_layers, content_layer)
+    if variant == 'saved_model':
+        return frozen_extractor.FrozenStyleContentModel(artifact)
+    suffix: str = '.quantized.tflite' if variant == 'tflite_quantized' \
+        else '.tflite'
+    return frozen_extractor.TFLiteStyleContentModel(artifact + suffix,
+                                                    artifact)
+
+
+def benchmark_variant(variant: str, artifact: str, size: int,
+                      repeats: int) -> Dict[str, Any]:
+    """
+    Method to measure an extractor variant
+
+    Args:
+        variant (str): the variant
+        artifact (str): the exported SavedModel folder
+        size (int): dimension of the square input image
+        repeats (int): number of timed forward passes and steps
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    if variant == 'keras':
+        # download the weights before timing, like a worker with a cache
+        tf.keras.utils.get_file(
+            'vgg19_weights_tf_dim_ordering_tf_kernels_notop.h5',
+            style_transfer.vgg19_weights_url, cache_subdir='models',
+            file_hash=style_transfer.vgg19_weights_hash)
+    image: tf.Tensor = tf.random.uniform((1, size, size, 3))
+    extractor, load_seconds = common.timed(load_variant, variant, artifact)
+    _, first_call_seconds = common.timed(extractor, image)
+    forward_seconds: List[float] = [common.timed(extractor, image)[1]
+                                    for _ in range(repeats)]
+    result: Dict[str, Any] = {
+        'variant': variant, 'load_seconds': load_seconds,
+        'first_call_seconds': first_call_seconds,
+        'forward_ms': 1000 * float(np.median(forward_seconds)),
+        'step_ms': None}
+
+    if not variant.startswith('tflite'):
+        outputs: Dict[str, Dict[str, tf.Tensor]] = extractor(image)
+        variable: tf.Variable = tf.Variable(image)
+        opt: tf.optimizers.Adam = tf.optimizers.Adam(learning_rate=0.02)
+
+        def step() -> float:
+            return float(style_transfer.train_step_with_variation_loss(
+                variable, extractor, opt, outputs['style'],
+                outputs['content'], len(style_layers), len(content_layer),
+                0.01, 10000.0, 30.0))
+
+        # first step traces the step graph
+        step()
+        result['step_ms'] = 1000 * float(np.median(
+            [common.timed(step)[1] for _ in range(repeats)]))
+    result['peak_rss_mb'] = common.peak_rss_mb()
+    return result
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--artifact',
+                        help='exported SavedModel folder (with .tflite and '
+                        '.quantized.tflite models next to it), exported to a '
+                        'temporary folder if not given')
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS,
+                        default=VARIANTS)
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--repeats', type=int, default=10)
+    args: argparse.Namespace = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        artifact: str = args.artifact
+        if artifact is None:
+            artifact = os.path.join(export_dir, 'extractor')
+            start: float = time.perf_counter()
+            frozen_extractor.export_saved_model(
+                style_transfer.StyleContentModel(style_layers, content_layer),
+                artifact)
+            print(f'exported in {time.perf_counter() - start:.1f}s')
+            frozen_extractor.export_tflite(artifact, artifact + '.tflite')
+            frozen_extractor.export_tflite(
+                artifact, artifact + '.quantized.tflite', quantize=True)
+
+        results: List[Dict[str, Any]] = []
+        for variant in args.variants:
+            # a fresh process per variant, like a new worker
+            with ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context('spawn')
+            ) as executor:
+                results.append(executor.submit(
+                    benchmark_variant, variant, artifact, args.size,
+                    args.repeats).result())
+    common.print_report({'benchmark': 'extractor', 'size': args.size,
+                         'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark of fast style rendering latency against optimization rendering,
+reported as seconds per render for each image size. the trained model of the
+default style is used if it exists, otherwise an untrained network of the
+same architecture (same latency).
+"""
+
+
+import argparse
+import numpy as np
+from typing import Any, Dict, List
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer, render, fast_style
+
+
+def benchmark_fast(content_img: np.ndarray, style_id: str, size: int,
+                   renders: int) -> Dict[str, Any]:
+    """
+    Method to measure fast style render latency
+
+    Args:
+        content_img (np.ndarray): the content image
+        style_id (str): the style id, digest of the style image file
+        size (int): maximum dimension of the rendered image
+        renders (int): number of timed renders
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    model: fast_style.TransformerNet = \
+        fast_style.fast_style_registry.get(style_id)
+    trained: bool = model is not None
+    if model is None:
+        model = fast_style.build_transformer()
+
+    # first render includes building the graph of the image size
+    _, first_seconds = common.timed(fast_style.render_fast, content_img,
+                                    model, size)
+    latencies: List[float] = [
+        common.timed(fast_style.render_fast, content_img, model, size)[1]
+        for _ in range(renders)]
+    return {'engine': fast_style.FAST_ENGINE, 'size': size,
+            'trained_model': trained, 'first_render_seconds': first_seconds,
+            'p50_seconds': float(np.percentile(latencies, 50)),
+            'p99_seconds': float(np.percentile(latencies, 99))}
+
+
+def benchmark_optimization(content_img: np.ndarray, style_img: np.ndarray,
+                           size: int, steps: int) -> Dict[str, Any]:
+    """
+    Method to measure optimization render latency
+
+    Args:
+        content_img (np.ndarray): the content image
+        style_img (np.ndarray): the style image
+        size (int): maximum dimension of the rendered image
+        steps (int): number of optimization steps
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    options: style_transfer.RenderOptions = style_transfer.RenderOptions(
+        pyramid=[style_transfer.PyramidLevel(size, 1.0)])
+    _, seconds = common.timed(render.render_image, content_img,
+                              style_img, content_layer, style_layers, 0.01,
+                              10000.0, 30.0, 0, 1, steps, options)
+    return {'engine': 'optimization', 'size': size, 'steps': steps,
+            'seconds': seconds}
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 512])
+    parser.add_argument('--renders', type=int, default=20)
+    parser.add_argument('--steps', type=int, default=1000)
+    args: argparse.Namespace = parser.parse_args()
+
+    content_img, style_img = common.load_default_images()
+    style_transfer.extractor_registry.warm(style_layers, content_layer)
+    results: List[Dict[str, Any]] = []
+    for size in args.sizes:
+        results.append(benchmark_fast(content_img, common.default_style_id(),
+                                      size, args.renders))
+        results.append(benchmark_optimization(content_img, style_img, size,
+                                              args.steps))
+    common.print_report({'benchmark': 'fast_style', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
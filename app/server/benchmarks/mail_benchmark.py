@@ -0,0 +1,145 @@
+"""
+Benchmark of email delivery throughput against a local aiosmtpd server, a
+new connection per email (as before) against the mail outbox sending batches
+over pooled connections, reported as messages per second. the local server
+has no tls or login, so a connect delay can be added to every connection to
+account for the handshakes of a remote server.
+"""
+
+
+import time
+import socket
+import argparse
+import functools
+import smtplib
+from typing import Any, Callable, Dict, List
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import Envelope
+from server.benchmarks import common
+from server.services import mail_service
+
+
+class CountingHandler: # pylint: disable=R0903
+    """
+    Class of an smtp server handler counting received emails
+    """
+    def __init__(self):
+        self.received: int = 0
+
+    async def handle_DATA(self, _server: Any, _session: Any, # pylint: disable=C0103
+                          _envelope: Envelope) -> str:
+        """
+        Method to receive an email
+
+        Args:
+            _server (Any): the smtp server
+            _session (Any): the smtp session
+            _envelope (Envelope): the email
+
+        Returns:
+            str: the smtp reply
+        """
+        self.received += 1
+        return '250 OK'
+
+
+def delayed_connect(port: int, connect_delay: float) -> smtplib.SMTP:
+    """
+    Method to open a connection to the local server
+
+    Args:
+        port (int): the local server port
+        connect_delay (float): seconds added to account for tls and login
+
+    Returns:
+        smtplib.SMTP: the connection
+    """
+    time.sleep(connect_delay)
+    return mail_service.connect('127.0.0.1', port, '', '', False)
+
+
+def per_message(factory: Callable[[], smtplib.SMTP],
+                messages: List[str]) -> None:
+    """
+    Method to send every email over a new connection
+
+    Args:
+        factory (Callable[[], smtplib.SMTP]): opens a connection
+        messages (List[str]): the emails
+    """
+    for message in messages:
+        server: smtplib.SMTP = factory()
+        server.sendmail(mail_service.sender, 'test@test.com', message)
+        server.quit()
+
+
+def outbox(factory: Callable[[], smtplib.SMTP], messages: List[str], # pylint: disable=R0913
+           workers: int, batch_size: int) -> None:
+    """
+    Method to send the emails through a mail outbox
+
+    Args:
+        factory (Callable[[], smtplib.SMTP]): opens a connection
+        messages (List[str]): the emails
+        workers (int): number of delivery threads
+        batch_size (int): maximum number of emails sent over a connection
+        at once
+    """
+    mail_outbox: mail_service.MailOutbox = mail_service.MailOutbox(
+        mail_service.SmtpConnectionPool(size=workers, factory=factory),
+        workers=workers, batch_size=batch_size)
+    for message in messages:
+        mail_outbox.enqueue('test@test.com', message)
+    mail_outbox.flush()
+    mail_outbox.close()
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--image-kb', type=int, default=300)
+    parser.add_argument('--connect-delay-ms', type=float, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=20)
+    args: argparse.Namespace = parser.parse_args()
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port: int = sock.getsockname()[1]
+    handler: CountingHandler = CountingHandler()
+    controller: Controller = Controller(handler, hostname='127.0.0.1',
+                                        port=port)
+    controller.start()
+
+    message: str = mail_service.build_image_message(
+        bytes(args.image_kb * 1024), 'test', 'test@test.com').as_string()
+    messages: List[str] = [message] * args.messages
+    factory: Callable[[], smtplib.SMTP] = functools.partial(
+        delayed_connect, port, args.connect_delay_ms / 1000)
+    results: List[Dict[str, Any]] = []
+    for mode, send in (
+            ('per_message', functools.partial(per_message, factory)),
+            ('outbox', functools.partial(outbox, factory,
+                                         workers=args.workers,
+                                         batch_size=args.batch_size))):
+        received: int = handler.received
+        _, seconds = common.timed(send, messages)
+        results.append({'mode': mode, 'seconds': seconds,
+                        'received': handler.received - received,
+                        'messages_per_second': args.messages / seconds})
+
+    controller.stop()
+    common.print_report({'benchmark': 'mail', 'messages': args.messages,
+                         'image_kb': args.image_kb,
+                         'connect_delay_ms': args.connect_delay_ms,
+                         'workers': args.workers,
+                         'batch_size': args.batch_size,
+                         'results': results})
+
+
+if __name__ == '__main__':
+    main()
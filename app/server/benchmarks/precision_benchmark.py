@@ -0,0 +1,163 @@
+"""
+Benchmark of the reduced precision extractor modes against float32. each
+precision is reported as training steps per second and, for accuracy, the
+relative float32 loss delta and PSNR of its render against the float32
+render of the same image. precisions the machine does not support natively
+are skipped.
+"""
+
+
+import argparse
+import numpy as np
+import tensorflow as tf
+from typing import Any, Dict, List
+from PIL import Image
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer
+from server.machine_learning.render import render_image_with_report
+
+
+# loss weights of the compared renders
+style_weight: float = 0.01
+content_weight: float = 10000.0
+total_variation_weight: float = 30.0
+
+
+def benchmark_throughput(precision: str, size: int,
+                         steps: int) -> Dict[str, Any]:
+    """
+    Method to measure training steps per second of a precision
+
+    Args:
+        precision (str): the extractor precision
+        size (int): maximum dimension of the rendered image
+        steps (int): number of timed steps
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    content_img, style_img = common.load_default_images()
+    content_image: tf.Tensor = style_transfer.load_img(content_img, size)
+    style_image: tf.Tensor = style_transfer.load_img(style_img, size)
+
+    extractor: style_transfer.StyleContentModel = \
+        style_transfer.StyleContentModel(style_layers, content_layer,
+                                         precision)
+    style_targets: tf.Tensor = extractor(style_image)['style']
+    content_targets: tf.Tensor = extractor(content_image)['content']
+    opt: tf.optimizers.Adam = tf.optimizers.Adam(learning_rate=0.02,
+                                                 beta_1=0.99, epsilon=1e-1)
+    image: tf.Variable = tf.Variable(content_image)
+
+    def step() -> tf.Tensor:
+        return style_transfer.train_step_without_variation_loss(
+            image, extractor, opt, style_targets, content_targets,
+            len(style_layers), len(content_layer), style_weight,
+            content_weight, False)
+
+    # first step includes tracing the graph
+    _, first_step_seconds = common.timed(lambda: float(step()))
+
+    def run() -> None:
+        losses: List[tf.Tensor] = [step() for _ in range(steps)]
+        # wait for last step to finish
+        float(losses[-1])
+
+    _, seconds = common.timed(run)
+    return {'first_step_seconds': first_step_seconds,
+            'steps_per_second': steps / seconds}
+
+
+def render(precision: str, steps: int) -> Image.Image:
+    """
+    Method to render the default images in a precision
+
+    Args:
+        precision (str): the extractor precision
+        steps (int): number of optimization steps
+
+    Returns:
+        Image.Image: the rendered image
+    """
+    content_img, style_img = common.load_default_images()
+    output, _ = render_image_with_report(
+        content_img, style_img, content_layer, style_layers, style_weight,
+        content_weight, total_variation_weight, 0, 1, steps,
+        style_transfer.RenderOptions(precision=precision,
+                                     use_target_cache=False))
+    return output
+
+
+def psnr(image: Image.Image, reference: Image.Image) -> float:
+    """
+    Method to calculate the peak signal to noise ratio of an image against
+    a reference image of the same size
+
+    Args:
+        image (Image.Image): the image
+        reference (Image.Image): the reference image
+
+    Returns:
+        float: PSNR in decibels, inf for identical images
+    """
+    return float(tf.image.psnr(np.asarray(image, np.float32),
+                               np.asarray(reference, np.float32), 255.0))
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--precisions', nargs='+',
+                        default=['bfloat16', 'float16'],
+                        choices=list(style_transfer.PRECISION_POLICIES))
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--steps', type=int, default=50,
+                        help='timed training steps of each precision')
+    parser.add_argument('--render-steps', type=int, default=300,
+                        help='optimization steps of each compared render')
+    parser.add_argument('--max-loss-delta', type=float, default=0.02,
+                        help='accepted relative loss delta against float32')
+    parser.add_argument('--min-psnr', type=float, default=30.0,
+                        help='accepted PSNR against the float32 render')
+    args: argparse.Namespace = parser.parse_args()
+
+    content_img, style_img = common.load_default_images()
+    reference: Image.Image = render('float32', args.render_steps)
+    reference_loss: float = common.output_loss(
+        reference, content_img, style_img, 512, style_weight,
+        content_weight, total_variation_weight)
+    results: List[Dict[str, Any]] = [
+        {'precision': 'float32', 'loss': reference_loss,
+         **benchmark_throughput('float32', args.size, args.steps)}]
+
+    for precision in args.precisions:
+        if precision == 'float32':
+            continue
+        if precision not in style_transfer.supported_precisions():
+            results.append({'precision': precision, 'skipped': True})
+            continue
+        output: Image.Image = render(precision, args.render_steps)
+        # losses of both renders are measured by the float32 extractor
+        loss: float = common.output_loss(
+            output, content_img, style_img, 512, style_weight,
+            content_weight, total_variation_weight)
+        loss_delta: float = abs(loss - reference_loss) / reference_loss
+        image_psnr: float = psnr(output, reference)
+        results.append({
+            'precision': precision, 'loss': loss, 'loss_delta': loss_delta,
+            'psnr': image_psnr,
+            'passed': loss_delta <= args.max_loss_delta and
+                      image_psnr >= args.min_psnr,
+            **benchmark_throughput(precision, args.size, args.steps)})
+
+    common.print_report({'benchmark': 'precision',
+                         'supported': style_transfer.supported_precisions(),
+                         'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark of coarse to fine (pyramid) rendering against full resolution
+rendering, reported as wall time and loss of the output image at full
+resolution.
+"""
+
+
+import argparse
+from typing import Any, Dict, List, Optional
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer, render
+
+
+# loss weights of the benchmark renders
+style_weight: float = 0.01
+content_weight: float = 10000.0
+total_variation_weight: float = 30.0
+
+
+def benchmark_render(dims: Optional[List[int]], epochs: int,
+                     steps_per_epoch: int) -> Dict[str, Any]:
+    """
+    Method to measure a render
+
+    Args:
+        dims (List[int], optional): pyramid level dimensions, None to render
+        at full resolution only
+        epochs (int): number of epochs with total variation
+        steps_per_epoch (int): number of steps in each epoch
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    content_img, style_img = common.load_default_images()
+    options: style_transfer.RenderOptions = style_transfer.RenderOptions(
+        pyramid=render.pyramid_levels(tuple(dims)) if dims else None)
+
+    (output, report), seconds = common.timed(
+        render.render_image_with_report, content_img, style_img,
+        content_layer, style_layers, style_weight, content_weight,
+        total_variation_weight, 0, epochs, steps_per_epoch, options)
+    max_dim: int = dims[-1] if dims else 512
+    return {'mode': 'pyramid' if dims else 'full',
+            'levels': dims or [max_dim],
+            'phases': [{'name': phase.name, 'max_dim': phase.max_dim,
+                        'steps': phase.steps, 'seconds': phase.seconds}
+                       for phase in report.phases],
+            'output_size': list(output.size),
+            'seconds': seconds,
+            'final_loss': common.output_loss(
+                output, content_img, style_img, max_dim, style_weight,
+                content_weight, total_variation_weight)}
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--levels', type=int, nargs='+',
+                        default=[128, 256, 512])
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--steps-per-epoch', type=int, default=100)
+    args: argparse.Namespace = parser.parse_args()
+
+    # warm extractor and traces so the first render is not penalized
+    style_transfer.extractor_registry.warm(style_layers, content_layer)
+    results: List[Dict[str, Any]] = [
+        benchmark_render(dims, args.epochs, args.steps_per_epoch)
+        for dims in (None, args.levels)]
+    common.print_report({'benchmark': 'pyramid', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
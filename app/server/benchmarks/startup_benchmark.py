@@ -0,0 +1,103 @@
+"""
+Benchmark of api worker startup, importing the app with the render engines
+loaded eagerly (as before) against the lazy loading of the render workers,
+reported as import time, time until the first served request, peak resident
+memory at that point and time until the render engine is ready. each
+startup runs in a fresh interpreter, with thread render workers so the
+engine warms in the measured process.
+"""
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+from typing import Any, Dict, List
+
+
+def measure_startup(eager: bool, ready_timeout: float) -> Dict[str, Any]:
+    """
+    Method to start the api in the current interpreter and measure it
+
+    Args:
+        eager (bool): import the render engines before the app, as the api
+        did before loading them lazily
+        ready_timeout (float): maximum seconds to wait until the render
+        engine is warm, 0 to not wait
+
+    Returns:
+        Dict[str, Any]: the startup measurements
+    """
+    start: float = time.perf_counter()
+    if eager:
+        # the import chain of the app before lazy loading
+        from server.machine_learning import (tiled_render, # pylint: disable=C0415,W0611
+                                             fast_style, adain)
+    from server.controllers import main as api # pylint: disable=C0415
+    from fastapi.testclient import TestClient # pylint: disable=C0415
+    imported: float = time.perf_counter()
+    TestClient(api.app).get('/docs').raise_for_status()
+    served: float = time.perf_counter()
+    result: Dict[str, Any] = {
+        'import_seconds': imported - start,
+        'first_response_seconds': served - start,
+        'peak_rss_mb': resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'tensorflow_loaded': 'tensorflow' in sys.modules}
+    if ready_timeout:
+        api.style_transfer.start_workers()
+        deadline: float = time.perf_counter() + ready_timeout
+        while not api.style_transfer.render_pool.ready and \
+                time.perf_counter() < deadline:
+            time.sleep(0.01)
+        # None when the engine did not warm, e.g. weights download failed
+        result['ready_seconds'] = time.perf_counter() - start \
+            if api.style_transfer.render_pool.ready else None
+        api.style_transfer.render_pool.shutdown(wait=False)
+    return result
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--ready-timeout', type=float, default=600,
+                        help='seconds to wait for the render engine, 0 to '
+                        'not wait')
+    parser.add_argument('--measure', choices=['eager', 'lazy'],
+                        help=argparse.SUPPRESS)
+    args: argparse.Namespace = parser.parse_args()
+
+    if args.measure is not None:
+        print(json.dumps(measure_startup(args.measure == 'eager',
+                                         args.ready_timeout)))
+        return
+
+    env: Dict[str, str] = {**os.environ, 'HSTYLE_RENDER_BACKEND': 'thread',
+                           'HSTYLE_RENDER_WORKERS': '1'}
+    results: List[Dict[str, Any]] = []
+    for mode in ('eager', 'lazy'):
+        for _ in range(args.repeats):
+            command: List[str] = [sys.executable, '-m',
+                                  'server.benchmarks.startup_benchmark',
+                                  '--measure', mode, '--ready-timeout',
+                                  str(args.ready_timeout)]
+            output: str = subprocess.run(command, env=env, check=True,
+                                         capture_output=True,
+                                         text=True).stdout
+            results.append({'mode': mode,
+                            **json.loads(output.strip().splitlines()[-1])})
+    # the report helpers load tensorflow, imported once the interpreters
+    # were measured so they do not inherit its memory
+    from server.benchmarks import common # pylint: disable=C0415
+    common.print_report({'benchmark': 'startup', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
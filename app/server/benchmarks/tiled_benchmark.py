@@ -0,0 +1,79 @@
+"""
+Benchmark of tiled high resolution rendering, reported as wall time and peak
+resident memory for each output size. each output size renders in its own
+process so peak memory is not shared between sizes.
+"""
+
+
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import tiled_render
+
+
+def benchmark_size(output_size: int, steps_per_epoch: int,
+                   parallel_tiles: int) -> Dict[str, Any]:
+    """
+    Method to measure a tiled render of an output size
+
+    Args:
+        output_size (int): maximum dimension of the rendered image
+        steps_per_epoch (int): number of steps in each epoch
+        parallel_tiles (int): number of tiles optimized at the same time
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    content_img, style_img = common.load_default_images()
+    tile_options: tiled_render.TileOptions = tiled_render.TileOptions(
+        output_max_dim=output_size, parallel_tiles=parallel_tiles)
+    rss_before: float = common.peak_rss_mb()
+    (output, report), seconds = common.timed(
+        tiled_render.render_tiled, content_img, style_img, content_layer,
+        style_layers, 0.01, 10000.0, 30.0, 0, 1, steps_per_epoch, None,
+        tile_options)
+    width, height = output.size
+    tiled: bool = output_size > tiled_render.model_max_dim
+    return {'output_size': [width, height],
+            'parallel_tiles': parallel_tiles,
+            'tiles': len(tiled_render.tile_boxes(
+                height, width, tile_options.tile_size,
+                tile_options.overlap)) if tiled else 0,
+            'steps': report.steps,
+            'seconds': seconds,
+            'peak_rss_mb_before_render': rss_before,
+            'peak_rss_mb': common.peak_rss_mb()}
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[512, 1024, 2048, 4096])
+    parser.add_argument('--steps-per-epoch', type=int, default=100)
+    parser.add_argument('--parallel-tiles', type=int, nargs='+',
+                        default=[1])
+    args: argparse.Namespace = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for size in args.sizes:
+        for parallel_tiles in args.parallel_tiles:
+            # a fresh process per size, peak memory only grows
+            with ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context('spawn')
+            ) as executor:
+                results.append(executor.submit(
+                    benchmark_size, size, args.steps_per_epoch,
+                    parallel_tiles).result())
+    common.print_report({'benchmark': 'tiled', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
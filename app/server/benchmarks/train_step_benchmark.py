@@ -0,0 +1,87 @@
+"""
+Benchmark of style transfer training steps, traced graph vs eager
+execution, reported as steps per second for each image size.
+"""
+
+
+import argparse
+import tensorflow as tf
+from typing import Any, Dict, List
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer
+
+
+def benchmark_steps(size: int, run_eagerly: bool, steps: int,
+                    with_variation: bool) -> Dict[str, Any]:
+    """
+    Method to measure training steps per second
+
+    Args:
+        size (int): maximum dimension of the rendered image
+        run_eagerly (bool): run the steps eagerly instead of traced
+        steps (int): number of timed steps
+        with_variation (bool): apply steps with total variation
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    content_img, style_img = common.load_default_images()
+    content_image: tf.Tensor = style_transfer.load_img(content_img, size)
+    style_image: tf.Tensor = style_transfer.load_img(style_img, size)
+
+    extractor: style_transfer.StyleContentModel = \
+        style_transfer.StyleContentModel(style_layers, content_layer)
+    style_targets: tf.Tensor = extractor(style_image)['style']
+    content_targets: tf.Tensor = extractor(content_image)['content']
+    opt: tf.optimizers.Adam = tf.optimizers.Adam(learning_rate=0.02,
+                                                 beta_1=0.99, epsilon=1e-1)
+    image: tf.Variable = tf.Variable(content_image)
+
+    def step() -> tf.Tensor:
+        if with_variation:
+            return style_transfer.train_step_with_variation_loss(
+                image, extractor, opt, style_targets, content_targets,
+                len(style_layers), len(content_layer), 0.01, 10000.0, 30.0,
+                run_eagerly)
+        return style_transfer.train_step_without_variation_loss(
+            image, extractor, opt, style_targets, content_targets,
+            len(style_layers), len(content_layer), 0.01, 10000.0,
+            run_eagerly)
+
+    # first step includes tracing the graph
+    _, first_step_seconds = common.timed(lambda: float(step()))
+
+    def run() -> None:
+        losses: List[tf.Tensor] = [step() for _ in range(steps)]
+        # wait for last step to finish
+        float(losses[-1])
+
+    _, seconds = common.timed(run)
+    return {'size': size,
+            'mode': 'eager' if run_eagerly else 'compiled',
+            'with_variation': with_variation,
+            'first_step_seconds': first_step_seconds,
+            'steps': steps,
+            'steps_per_second': steps / seconds}
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 512])
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--with-variation', action='store_true')
+    args: argparse.Namespace = parser.parse_args()
+
+    results: List[Dict[str, Any]] = [
+        benchmark_steps(size, run_eagerly, args.steps, args.with_variation)
+        for size in args.sizes for run_eagerly in (False, True)]
+    common.print_report({'benchmark': 'train_step', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark of preparing an uploaded image for rendering, the full size decode
+path (read to bytes, opencv decode, color conversion copy, float copy,
+resize) against the reduced jpeg decode path of the api, reported as wall
+time and peak resident memory for each upload size. each decode runs in its
+own process so peak memory is not shared between decodes.
+"""
+
+
+import io
+import argparse
+import multiprocessing
+import cv2
+import numpy as np
+import tensorflow as tf
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List
+from PIL import Image
+from server.benchmarks import common
+from server.controllers import uploads
+from server.machine_learning import style_transfer
+
+
+def create_upload(megapixels: float) -> bytes:
+    """
+    Method to create a phone camera like jpeg upload from the default
+    content image
+
+    Args:
+        megapixels (float): the upload size in megapixels
+
+    Returns:
+        bytes: the jpeg file
+    """
+    content_img, _ = common.load_default_images()
+    height, width, _ = content_img.shape
+    scale: float = (megapixels * 1e6 / (width * height)) ** 0.5
+    upload: io.BytesIO = io.BytesIO()
+    Image.fromarray(content_img).resize(
+        (int(width * scale), int(height * scale)), Image.BICUBIC).save(
+            upload, format='JPEG', quality=90)
+    return upload.getvalue()
+
+
+def full_size_decode(data: bytes, max_dim: int) -> tf.Tensor:
+    """
+    Method to prepare an upload by decoding it at full size
+
+    Args:
+        data (bytes): the jpeg file
+        max_dim (int): maximum dimension the image is rendered at
+
+    Returns:
+        tf.Tensor: the loaded image
+    """
+    img: np.ndarray = cv2.imdecode(np.frombuffer(bytes(data), np.uint8),
+                                   cv2.IMREAD_COLOR)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    loaded: tf.Tensor = tf.convert_to_tensor(img, dtype=tf.float32) / 255
+    shape: tf.Tensor = tf.cast(tf.shape(loaded)[:-1], tf.float32)
+    return tf.image.resize(loaded, tf.cast(
+        shape * max_dim / max(shape), tf.int32))[tf.newaxis, :]
+
+
+def reduced_decode(data: bytes, max_dim: int) -> tf.Tensor:
+    """
+    Method to prepare an upload by the api decode path
+
+    Args:
+        data (bytes): the jpeg file
+        max_dim (int): maximum dimension the image is rendered at
+
+    Returns:
+        tf.Tensor: the loaded image
+    """
+    return style_transfer.load_img(
+        uploads.decode_image(io.BytesIO(data), max_dim), max_dim)
+
+
+def benchmark_decode(data: bytes, warm_up_data: bytes, max_dim: int,
+                     reduced: bool) -> Dict[str, Any]:
+    """
+    Method to measure preparing an upload
+
+    Args:
+        data (bytes): the jpeg upload
+        warm_up_data (bytes): a small jpeg upload
+        max_dim (int): maximum dimension the image is rendered at
+        reduced (bool): use the reduced decode path
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    decode: Callable[[bytes, int], tf.Tensor] = reduced_decode \
+        if reduced else full_size_decode
+    # first call loads the tensorflow kernels
+    decode(warm_up_data, max_dim)
+    rss_before: float = common.peak_rss_mb()
+    loaded, seconds = common.timed(decode, data, max_dim)
+    return {'path': 'reduced' if reduced else 'full_size',
+            'upload_mb': len(data) / 2 ** 20,
+            'max_dim': max_dim, 'shape': list(loaded.shape),
+            'seconds': seconds,
+            'peak_rss_mb_growth': common.peak_rss_mb() - rss_before}
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--megapixels', type=float, nargs='+',
+                        default=[3, 12, 48])
+    parser.add_argument('--max-dim', type=int, default=512)
+    args: argparse.Namespace = parser.parse_args()
+
+    # uploads are created here, so creating them does not count in the peak
+    # memory of the decode processes
+    warm_up_data: bytes = create_upload(0.1)
+    results: List[Dict[str, Any]] = []
+    for megapixels in args.megapixels:
+        data: bytes = create_upload(megapixels)
+        for reduced in (False, True):
+            # a fresh process per decode, peak memory only grows
+            with ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context('spawn')
+            ) as executor:
+                results.append({'megapixels': megapixels,
+                                **executor.submit(
+                                    benchmark_decode, data, warm_up_data,
+                                    args.max_dim, reduced).result()})
+    common.print_report({'benchmark': 'upload_decode', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of building the style content extractor with the whole VGG19
+convolutional stack against VGG19 truncated at the deepest requested layer,
+reported as load time, weights and resident memory per worker. each variant
+loads in its own process so memory is not shared between variants.
+"""
+
+
+import argparse
+import multiprocessing
+import tensorflow as tf
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+from server.benchmarks import common
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer
+
+
+def benchmark_load(truncate: bool) -> Dict[str, Any]:
+    """
+    Method to measure building an extractor of the server layers
+
+    Args:
+        truncate (bool): create vgg only up to the deepest requested layer
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    # download the weights before timing, both variants read the same file
+    tf.keras.utils.get_file(
+        'vgg19_weights_tf_dim_ordering_tf_kernels_notop.h5',
+        style_transfer.vgg19_weights_url, cache_subdir='models',
+        file_hash=style_transfer.vgg19_weights_hash)
+    rss_before: float = common.peak_rss_mb()
+    vgg, seconds = common.timed(style_transfer.vgg_layers,
+                                style_layers + content_layer,
+                                truncate=truncate)
+    # first call includes building the graph
+    _, first_call_seconds = common.timed(
+        lambda: [output.numpy() for output in vgg(tf.zeros((1, 512, 512, 3)))])
+    return {'variant': 'truncated' if truncate else 'full',
+            'layers': len(vgg.layers),
+            'weights_mb': sum(weight.numpy().nbytes
+                              for weight in vgg.weights) / (1024 * 1024),
+            'load_seconds': seconds,
+            'first_call_seconds': first_call_seconds,
+            'peak_rss_mb_before_load': rss_before,
+            'peak_rss_mb': common.peak_rss_mb()}
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='fresh process loads of each variant')
+    args: argparse.Namespace = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    for truncate in (False, True):
+        for _ in range(args.repeats):
+            # a fresh process per load, like a new worker
+            with ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context('spawn')
+            ) as executor:
+                results.append(executor.submit(benchmark_load,
+                                               truncate).result())
+    common.print_report({'benchmark': 'vgg_load',
+                         'deepest_layer': max(
+                             style_layers + content_layer,
+                             key=style_transfer.vgg19_layer_names().index),
+                         'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark of concurrent renders on the host, sweeping the number of render
+worker processes and the tensorflow threads of each worker, reported as
+renders per hour of every configuration and the best one. unpinned workers
+use the tensorflow defaults (every worker sizes its thread pools to every
+cpu of the host), pinned workers split the cpus between them.
+"""
+
+
+import time
+import argparse
+import functools
+from typing import Any, Dict, List, Optional
+import numpy as np
+from server.controllers.style_transfer import (content_layer, style_layers,
+                                               warm_up)
+from server.services import render_worker, worker_config
+
+
+# loss weights of the benchmark renders
+style_weight: float = 0.01
+content_weight: float = 10000.0
+total_variation_weight: float = 30.0
+
+
+def render_job(content_img: np.ndarray, style_img: np.ndarray,
+               steps: int) -> int:
+    """
+    Worker method to render the benchmark images
+
+    Args:
+        content_img (np.ndarray): the content image
+        style_img (np.ndarray): the style image
+        steps (int): number of optimization steps
+
+    Returns:
+        int: number of steps run
+    """
+    # loaded once the worker process is pinned and its threads are set
+    from server.machine_learning import style_transfer, render # pylint: disable=C0415
+
+    # every render extracts its targets, like renders of new images
+    _, report = render.render_image_with_report(
+        content_img, style_img, content_layer, style_layers, style_weight,
+        content_weight, total_variation_weight, 0, 1, steps,
+        style_transfer.RenderOptions(use_target_cache=False,
+                                     use_session_store=False))
+    return report.steps
+
+
+def benchmark_config(workers: int, configs: List[worker_config.WorkerConfig],
+                     content_img: np.ndarray, style_img: np.ndarray,
+                     renders: int, steps: int,
+                     ready_timeout: float) -> Dict[str, Any]:
+    """
+    Method to measure renders per hour of a worker configuration
+
+    Args:
+        workers (int): number of render worker processes
+        configs (List[worker_config.WorkerConfig]): configuration of each
+        worker, empty to keep the tensorflow defaults
+        content_img (np.ndarray): the content image
+        style_img (np.ndarray): the style image
+        renders (int): number of timed renders
+        steps (int): number of optimization steps per render
+        ready_timeout (float): maximum seconds to wait for the workers to
+        warm
+
+    Returns:
+        Dict[str, Any]: the benchmark results
+    """
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        workers, renders + workers, render_worker.PROCESS_BACKEND,
+        initializer=warm_up,
+        worker_setup=functools.partial(worker_config.apply_worker_config,
+                                       configs) if configs else None)
+    try:
+        pool.start()
+        deadline: float = time.perf_counter() + ready_timeout
+        while not pool.ready and time.perf_counter() < deadline:
+            time.sleep(0.1)
+        # a render per worker traces the step graph of the image shape
+        for future in [pool.submit(render_job, content_img, style_img, 1)
+                       for _ in range(workers)]:
+            future.result()
+
+        start: float = time.perf_counter()
+        total_steps: int = sum(
+            future.result() for future in
+            [pool.submit(render_job, content_img, style_img, steps)
+             for _ in range(renders)])
+        seconds: float = time.perf_counter() - start
+    finally:
+        pool.shutdown()
+    return {'workers': workers, 'pinned': bool(configs and configs[0].cpus),
+            'cpus': [config.cpus for config in configs] if configs else None,
+            'intra_op_threads': configs[0].intra_op_threads
+            if configs else None,
+            'inter_op_threads': configs[0].inter_op_threads
+            if configs else None,
+            'renders': renders, 'seconds': seconds,
+            'renders_per_hour': 3600 * renders / seconds,
+            'steps_per_second': total_steps / seconds}
+
+
+def main() -> None:
+    """
+    Run the benchmark
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, nargs='+', default=[0],
+                        help='intra op threads of each pinned worker, 0 for '
+                        'its share of the cpus')
+    parser.add_argument('--cpus', default='',
+                        help='cpus to split between workers (e.g. 0-7), '
+                        'every cpu if not given')
+    parser.add_argument('--renders', type=int,
+                        help='timed renders per configuration, twice the '
+                        'largest number of workers if not given')
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--ready-timeout', type=float, default=600)
+    args: argparse.Namespace = parser.parse_args()
+
+    # the report helpers load tensorflow, only the api process loads them
+    from server.benchmarks import common # pylint: disable=C0415
+    content_img, style_img = common.load_default_images()
+    cpus: List[int] = worker_config.parse_cpu_list(args.cpus) or \
+        worker_config.available_cpus()
+    renders: int = args.renders or 2 * max(args.workers)
+
+    results: List[Dict[str, Any]] = []
+    for workers in args.workers:
+        # tensorflow defaults, concurrent renders share every cpu
+        results.append(benchmark_config(workers, [], content_img, style_img,
+                                        renders, args.steps,
+                                        args.ready_timeout))
+        for threads in args.threads:
+            results.append(benchmark_config(
+                workers, worker_config.plan_workers(workers, cpus, threads),
+                content_img, style_img, renders, args.steps,
+                args.ready_timeout))
+
+    best: Optional[Dict[str, Any]] = max(
+        results, key=lambda result: result['renders_per_hour'], default=None)
+    common.print_report({'benchmark': 'workers', 'cpus': cpus,
+                         'steps': args.steps, 'results': results,
+                         'best': best})
+
+
+if __name__ == '__main__':
+    main()
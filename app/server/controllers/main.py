@@ -5,10 +5,12 @@ app, configuring it and adding all other api that exist.
 
 
 from typing import List
-from fastapi import FastAPI
+from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import RedirectResponse
-from server.controllers import style_transfer
+from starlette.responses import (JSONResponse, RedirectResponse,
+                                 PlainTextResponse)
+from server.controllers import style_transfer, uploads
+from server.services import metrics
 
 
 # create a fastapi app
@@ -29,6 +31,27 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# reject oversized uploads before their body is read
+app.add_middleware(uploads.UploadLimitMiddleware)
+
+
+# start render workers (each warms its model) before serving
+@app.on_event("startup")
+def start_render_workers() -> None:
+    """
+    Start the render workers so requests do not pay their cold start
+    """
+    style_transfer.start_workers()
+
+
+# let queued and in flight renders finish before exiting
+@app.on_event("shutdown")
+def stop_render_workers() -> None:
+    """
+    Stop the render workers once queued renders are done
+    """
+    style_transfer.stop_workers()
+
 
 # redirect to docs when getting root of app
 @app.get("/", include_in_schema=False)
@@ -42,6 +65,37 @@ async def root() -> RedirectResponse:
     response: RedirectResponse = RedirectResponse(url='/docs')
     return response
 
+
+# expose application metrics
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    """
+    Get the application metrics in the prometheus text format
+
+    Returns:
+       PlainTextResponse: the metrics
+    """
+    return PlainTextResponse(metrics.REGISTRY.render())
+
+
+# report when the render engine is warm, the api serves before it is
+@app.get("/ready", include_in_schema=False)
+async def get_ready() -> JSONResponse:
+    """
+    Get the readiness of the render engine, ready once every render worker
+    loaded tensorflow and built its model
+
+    Returns:
+       JSONResponse: readiness and render workers, with status 503 until
+       ready
+    """
+    ready: bool = style_transfer.render_pool.ready
+    return JSONResponse(
+        {'ready': ready, 'workers': style_transfer.render_pool.workers,
+         'backend': style_transfer.render_pool.backend},
+        status_code=status.HTTP_200_OK if ready
+        else status.HTTP_503_SERVICE_UNAVAILABLE)
+
 # add our style transfer api
 app.include_router(style_transfer.router, prefix="/api/styleTransfer",
                    tags=["styleTransfer"])
@@ -1,19 +1,28 @@
 """
 Style transfer api controller for HStyle api. responsable for the style
-transfer end point and applying the style transfer.
+transfer end point and applying the style transfer. tensorflow and the
+render engines are imported by the render workers only, so the api starts
+and serves without loading them.
 """
 
 
+import io
 import os
-import cv2
+import base64
+import asyncio
+import functools
+import dataclasses
 import numpy as np
-from server.machine_learning import style_transfer
-from server.services import mail_service
-from typing import List
+from concurrent.futures import Future
+from server.controllers import uploads
+from server.machine_learning import engines
+from server.services import (mail_service, render_worker, job_store, metrics,
+                             result_cache, worker_config)
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from pydantic import EmailStr
 from fastapi import (APIRouter, UploadFile, File, Body, HTTPException,
-                     status, BackgroundTasks)
-from starlette.responses import Response
+                     Query, status)
+from starlette.responses import Response, StreamingResponse
 from PIL import Image
 
 
@@ -28,8 +37,9 @@ style_layers: List[str] = ['block1_conv1', 'block2_conv1',
                            'block3_conv1', 'block4_conv1',
                            'block5_conv1']
 
-# amount of epochs to apply withot total variation
-epochs_without_variation: int = 10
+# amount of epochs to apply withot total variation, the with total variation
+# phase continues from its result (0 renders with total variation only)
+epochs_without_variation: int = 0
 
 # amount of epochs to apply with total variation
 epochs_with_variation: int = 10
@@ -49,78 +59,527 @@ style_min_weight: float = 0.01
 total_variation_max_weight: float = 30.0
 total_variation_min_weight: float = 30.0
 
-# deafult content image
-content_img_deafult: np.ndarray = np.asarray(
-    Image.open(dir_path + '/../data/modern.png'))
-# deafult style image
-style_img_deafult: np.ndarray = np.asarray(
-    Image.open(dir_path + '/../data/historical.png'))
+# deafult content image, read on first use
+content_img_deafult_path: str = dir_path + '/../data/modern.png'
+# deafult style image, read on first use
+style_img_deafult_path: str = dir_path + '/../data/historical.png'
+
+# number of renders running at the same time
+render_workers: int = int(os.environ.get('HSTYLE_RENDER_WORKERS', '1'))
+
+# maximum number of renders waiting for a worker
+render_queue_size: int = int(os.environ.get('HSTYLE_RENDER_QUEUE_SIZE', '8'))
+
+# render execution backend ('process' or 'thread')
+render_backend: str = os.environ.get('HSTYLE_RENDER_BACKEND',
+                                     render_worker.PROCESS_BACKEND)
+
+# cpus split between render worker processes (e.g. '0-7'), every cpu of the
+# api process if empty
+render_cpus: List[int] = worker_config.parse_cpu_list(
+    os.environ.get('HSTYLE_RENDER_CPUS', ''))
+
+# pin each render worker process to its share of render_cpus
+render_pin_cpus: bool = os.environ.get('HSTYLE_RENDER_PIN_CPUS', '1') == '1'
+
+# tensorflow intra and inter op threads of each render worker process, 0
+# for its share of render_cpus (intra) and up to 2 (inter)
+render_intra_op_threads: int = int(os.environ.get(
+    'HSTYLE_RENDER_INTRA_OP_THREADS', '0'))
+render_inter_op_threads: int = int(os.environ.get(
+    'HSTYLE_RENDER_INTER_OP_THREADS', '0'))
+
+# maximum number of queued renders of the same size and quality a render
+# worker optimizes together in one batch, 1 to render one at a time
+render_batch_size: int = int(os.environ.get('HSTYLE_RENDER_BATCH_SIZE',
+                                            '1'))
+
+# maximum total size of stored render results
+result_store_bytes: int = int(os.environ.get('HSTYLE_RESULT_STORE_MB',
+                                             '256')) * 1024 * 1024
+
+# seconds a render job and its result are kept after its last update
+result_ttl_seconds: float = float(os.environ.get('HSTYLE_RESULT_TTL_SECONDS',
+                                                 '3600'))
+
+# media types of result download formats
+result_media_types: Dict[str, str] = {'png': 'image/png',
+                                      'jpeg': 'image/jpeg'}
+
+# number of steps between render previews
+preview_every: int = 100
+
+# maximum dimension of render previews
+preview_max_dim: int = 256
+
+# seconds between preview stream checks for a new preview
+preview_poll_seconds: float = 0.5
+
+# render quality tiers, maximum steps and minimal relative loss improvement
+# over convergence_window steps for the render to continue
+quality_tiers: Dict[str, Dict[str, Any]] = {
+    'draft': {'max_steps': 300, 'convergence_tolerance': 1e-2},
+    'standard': {'max_steps': 1000, 'convergence_tolerance': 1e-3},
+    'high': {'max_steps': None, 'convergence_tolerance': 1e-4}}
+
+# number of steps loss improvement is measured over
+convergence_window: int = 100
+
+# maximum optimization seconds of a render, 0 for no limit
+render_max_seconds: float = float(os.environ.get('HSTYLE_RENDER_MAX_SECONDS',
+                                                 '0'))
+
+# maximum dimensions of coarse to fine render levels (e.g. '128,256,512'),
+# empty to render at full resolution only
+render_pyramid: List[int] = [
+    int(dim) for dim in os.environ.get('HSTYLE_RENDER_PYRAMID', '').split(',')
+    if dim.strip()]
+
+# steps run by each render
+render_steps: metrics.Histogram = metrics.Histogram(
+    'hstyle_render_steps', 'Optimization steps run by each render',
+    buckets=(100, 200, 300, 500, 750, 1000, 1500, 2000))
+
+# renders by stop reason (completed when all steps ran)
+render_stop_reasons: metrics.Counter = metrics.Counter(
+    'hstyle_render_stop_reasons_total', 'Finished renders by stop reason')
+
+# renders by engine
+renders_by_engine: metrics.Counter = metrics.Counter(
+    'hstyle_renders_total', 'Finished renders by engine')
+
+# time from render start until optimization starts (loading, targets)
+render_setup_seconds: metrics.Histogram = metrics.Histogram(
+    'hstyle_render_setup_seconds',
+    'Per render setup time before the optimization loop')
+
+# time of each optimization phase of a render
+render_phase_seconds: metrics.Histogram = metrics.Histogram(
+    'hstyle_render_phase_seconds',
+    'Per render time of each optimization phase')
+
+# render time of each render (setup and every phase), by engine
+render_seconds: metrics.Histogram = metrics.Histogram(
+    'hstyle_render_seconds', 'Render time of each render')
+
+# mean time of each profiled span of a render (steps, gradients, optimizer
+# update), renders are profiled when HSTYLE_PROFILE_RENDERS=1
+render_span_seconds: metrics.Histogram = metrics.Histogram(
+    'hstyle_render_span_seconds',
+    'Per render mean time of each profiled span',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+             2.5, 10.0, 60.0, 300.0))
+
+# maximum dimension of rendered images, above the model resolution (512)
+# images are refined in tiles
+output_min_size: int = 512
+output_max_size: int = 4096
+
+# number of tiles of a high resolution render optimized at the same time
+render_parallel_tiles: int = int(os.environ.get('HSTYLE_RENDER_PARALLEL_TILES',
+                                                '1'))
+
+# engine choice that renders trained styles with the fast engine and
+# optimizes other styles
+AUTO_ENGINE: str = 'auto'
+
+# seconds queued emails are delivered for when stopping
+mail_flush_seconds: float = 30.0
+
+# render results of identical requests, in memory and in
+# HSTYLE_RESULT_CACHE_DIR when set
+results: result_cache.ResultCache = result_cache.ResultCache(
+    int(os.environ.get('HSTYLE_RESULT_CACHE_MB', '64')) * 1024 * 1024,
+    os.environ.get('HSTYLE_RESULT_CACHE_DIR'),
+    int(os.environ.get('HSTYLE_RESULT_CACHE_DISK_MB', '512')) * 1024 * 1024)
+
+# emails of jobs waiting on the render of an identical job
+waiting_emails: Dict[str, str] = {}
 
 # create our router to style transfer api
 router: APIRouter = APIRouter()
 
 
-async def read_image_from_api(api_img: UploadFile) -> np.ndarray:
+def warm_up() -> None:
     """
-    Method to read an UploadFile from api as image
+    Method to load tensorflow and build the style transfer extractor before
+    the first request
+    """
+    from server.machine_learning import style_transfer # pylint: disable=C0415
+
+    style_transfer.extractor_registry.warm(
+        style_layers, content_layer, style_transfer.resolve_precision())
+
+
+# render jobs status, progress and results
+jobs: job_store.JobStore = job_store.JobStore(result_store_bytes,
+                                              result_ttl_seconds)
+
+
+def on_render_progress(job_id: str, progress: Dict[str, Any]) -> None:
+    """
+    Method to store the progress or preview reported by a render worker
 
     Args:
-        api_img (UploadFile): an image file
+        job_id (str): the render job id
+        progress (Dict[str, Any]): the progress, or a preview with its step
+    """
+    # identical requests waiting on the render follow its progress
+    for waiting_id in results.jobs(job_id):
+        if 'preview' in progress:
+            jobs.set_preview(waiting_id, progress['preview'],
+                             progress['step'])
+        else:
+            jobs.update_progress(waiting_id, progress)
 
-    Raises:
-        HTTPException: if image is not readable
+
+# cpu set and tensorflow threads of each render worker process
+render_worker_configs: List[worker_config.WorkerConfig] = \
+    worker_config.plan_workers(render_workers, render_cpus or None,
+                               render_intra_op_threads,
+                               render_inter_op_threads, render_pin_cpus)
+
+# pool of workers rendering the images, each worker is pinned to its cpus
+# and warms its model
+render_pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+    render_workers, render_queue_size, render_backend, initializer=warm_up,
+    progress_handler=on_render_progress,
+    worker_setup=functools.partial(worker_config.apply_worker_config,
+                                   render_worker_configs),
+    max_batch_size=render_batch_size)
+
+
+def start_workers() -> None:
+    """
+    Method to start the render workers
+    """
+    render_pool.start()
+
+
+def stop_workers() -> None:
+    """
+    Method to stop the render workers once queued renders are done, and
+    deliver their emails
+    """
+    render_pool.shutdown(wait=True)
+    mail_service.outbox.close(mail_flush_seconds)
+
+
+def encode_image(img: Image, image_format: str) -> bytes:
+    """
+    Method to encode an image
+
+    Args:
+        img (Image): the image
+        image_format (str): 'png' or 'jpeg'
 
     Returns:
-        np.ndarray: RGB image as numpy array
+        bytes: the encoded image
     """
-    try:
-        # read image as bytes/chars
-        img: bytes = await api_img.read()
-        # create numpy array from bytes
-        img: np.ndarray = np.frombuffer(img, np.uint8)
-        # create image from bytes
-        img: np.ndarray = cv2.imdecode(img, cv2.IMREAD_COLOR)
-        # transform BGR to RGB
-        img: np.ndarray = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        return img
-    except Exception as err:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="Unable to process image file"
-        ) from err
+    img_data: io.BytesIO = io.BytesIO()
+    img.convert('RGB').save(img_data, format=image_format.upper())
+    return img_data.getvalue()
 
 
-def render_image_background(email: EmailStr, content_loss: float, style_loss: float,
-                 total_variation_loss: float, content_img: np.ndarray,
-                 style_img: np.ndarray) -> None:
+def encode_preview(img: Image) -> bytes:
     """
-    background method to apply style transfer and send by email
+    Method to encode a downscaled jpeg preview of an image
 
     Args:
-        email (EmailStr): receiver email
+        img (Image): the image
+
+    Returns:
+        bytes: the encoded preview
+    """
+    preview: Image = img.copy()
+    preview.thumbnail((preview_max_dim, preview_max_dim))
+    return encode_image(preview, 'jpeg')
+
+
+def render_image_job(job_id: str, content_loss: float, style_loss: float, # pylint: disable=R0913
+                     total_variation_loss: float, content_img: np.ndarray,
+                     style_img: np.ndarray, quality: str = 'standard',
+                     engine: str = AUTO_ENGINE,
+                     output_size: int = output_min_size,
+                     warm_start: bool = False,
+                     style_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Render worker method to apply style transfer, reporting its progress
+
+    Args:
+        job_id (str): the render job id
         content_loss (float): the content loss weight for style transfer model
         style_loss (float): the style loss weight for style transfer model
         total_variation_loss (float): the total variation loss weight for
+        style transfer model
         content_img (np.ndarray): content image
         style_img (np.ndarray): style image
+        quality (str): quality tier (draft, standard or high)
+        engine (str): render engine, auto renders styles with a trained
+        fast style model in a single forward pass and optimizes other styles
+        output_size (int): maximum dimension of the rendered image
+        warm_start (bool): start from the previous render of the same images
+        on this worker, if any
+        style_id (str, optional): hash of the style image file, the id of
+        its trained fast style model
+
+    Returns:
+        Dict[str, Any]: the rendered image as png and the render report
+    """
+    # render engines are loaded by the render workers, not the api
+    from server.machine_learning import (style_transfer, # pylint: disable=C0415
+                                         render, fast_style, tiled_render,
+                                         profiling)
+
+    # a fast style model renders the loss weights it was trained with only
+    if engine == AUTO_ENGINE:
+        engine = engines.FAST_ENGINE \
+            if fast_style.fast_style_registry.trained_with(
+                style_id, style_loss, content_loss, total_variation_loss) \
+            else engines.OPTIMIZATION_ENGINE
+
+    # timing spans, loss log and profiler trace by the deployment settings
+    profiler: Optional[profiling.RenderProfiler] = \
+        profiling.job_profiler(job_id)
+    options: style_transfer.RenderOptions = render_options(
+        quality, job_id,
+        pyramid=render.pyramid_levels(tuple(render_pyramid))
+        if render_pyramid else None,
+        warm_start=warm_start, engine=engine, style_id=style_id,
+        profiler=profiler)
+
+    # apply style transfer model, refined in tiles above model resolution
+    with profiling.trace(profiler):
+        result, report = tiled_render.render_tiled(
+            content_img, style_img, content_layer, style_layers, style_loss,
+            content_loss, total_variation_loss, epochs_without_variation,
+            epochs_with_variation, steps_per_epoch, options,
+            tiled_render.TileOptions(output_max_dim=output_size,
+                                     parallel_tiles=render_parallel_tiles))
+    return {'image': encode_image(result, 'png'),
+            'report': dataclasses.asdict(report)}
+
+
+def render_options(quality: str, job_id: Optional[str] = None,
+                   **settings) -> Any:
+    """
+    Render worker method to create the options of a render, reporting the
+    progress and previews of its job and stopping when the user is happy
+    with the preview
+
+    Args:
+        quality (str): quality tier (draft, standard or high)
+        job_id (str, optional): the render job id, None for the render
+        settings without job callbacks
+        **settings: other render options
+
+    Returns:
+        style_transfer.RenderOptions: the render options
+    """
+    from server.machine_learning import style_transfer # pylint: disable=C0415
+
+    if job_id is not None:
+        settings.update(
+            progress_callback=lambda progress: render_worker.report_progress(
+                job_id, dataclasses.asdict(progress)),
+            preview_callback=lambda step, img: render_worker.report_progress(
+                job_id, {'preview': encode_preview(img), 'step': step}),
+            should_stop=lambda: render_worker.stop_requested(job_id))
+    return style_transfer.RenderOptions(
+        preview_every=preview_every, convergence_window=convergence_window,
+        max_seconds=render_max_seconds or None, **quality_tiers[quality],
+        **settings)
+
+
+def render_batch_key(content_img: np.ndarray, quality: str, engine: str,
+                     output_size: int, warm_start: bool
+                     ) -> Optional[Tuple[int, int, str]]:
+    """
+    Method to get the key of the render jobs a render worker may optimize
+    together in one batch, renders at the model resolution with the same
+    shape and quality
+
+    Args:
+        content_img (np.ndarray): content image
+        quality (str): quality tier (draft, standard or high)
+        engine (str): render engine
+        output_size (int): maximum dimension of the rendered image
+        warm_start (bool): start from the previous render of the same images
+
+    Returns:
+        Optional[Tuple[int, int, str]]: rendered height, width and quality,
+        None if the render runs alone
+    """
+    if render_batch_size <= 1 or \
+            engine not in (AUTO_ENGINE, engines.OPTIMIZATION_ENGINE) or \
+            output_size != output_min_size or warm_start or render_pyramid:
+        return None
+    return (*engines.render_shape(*content_img.shape[:2]), quality)
+
+
+def render_image_batch_job(calls: List[Tuple]) -> List[Dict[str, Any]]:
+    """
+    Render worker method to apply style transfer to render jobs of the same
+    batch key in one batch, styles with a fast style model trained with the
+    loss weights are rendered alone
+
+    Args:
+        calls (List[Tuple]): the render_image_job arguments of each job
+
+    Returns:
+        List[Dict[str, Any]]: the rendered image as png and the render
+        report of each job
+    """
+    # render engines are loaded by the render workers, not the api
+    from server.machine_learning import (fast_style, # pylint: disable=C0415
+                                         batch_render)
+
+    rendered: Dict[int, Dict[str, Any]] = {}
+    batched: List[int] = []
+    for i, (_, content_loss, style_loss, total_variation_loss, _, _, _,
+            engine, _, _, style_id) in enumerate(calls):
+        if engine == AUTO_ENGINE and \
+                fast_style.fast_style_registry.trained_with(
+                    style_id, style_loss, content_loss,
+                    total_variation_loss):
+            rendered[i] = render_image_job(*calls[i])
+        else:
+            batched.append(i)
+    if len(batched) == 1:
+        rendered[batched[0]] = render_image_job(*calls[batched[0]])
+    elif batched:
+        requests: List[batch_render.RenderRequest] = [
+            batch_render.RenderRequest(
+                content_img, style_img, style_loss, content_loss,
+                total_variation_loss, render_options(quality, job_id))
+            for job_id, content_loss, style_loss, total_variation_loss,
+            content_img, style_img, quality, *_ in
+            (calls[i] for i in batched)]
+        # jobs of a batch have the same quality
+        images, reports = batch_render.render_batch_with_reports(
+            requests, content_layer, style_layers, epochs_without_variation,
+            epochs_with_variation, steps_per_epoch,
+            render_options(calls[batched[0]][6]))
+        for i, image, report in zip(batched, images, reports):
+            rendered[i] = {'image': encode_image(image, 'png'),
+                           'report': dataclasses.asdict(report)}
+    return [rendered[i] for i in range(len(calls))]
+
+
+def render_settings() -> Dict[str, Any]:
+    """
+    Method to get the deployment settings that change rendered images
+
+    Returns:
+        Dict[str, Any]: the render settings
+    """
+    return {'epochs': [epochs_without_variation, epochs_with_variation],
+            'steps_per_epoch': steps_per_epoch,
+            'max_seconds': render_max_seconds, 'pyramid': render_pyramid,
+            'precision': engines.default_precision}
+
+
+def record_render_report(report: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Method to record the metrics of a finished render
+
+    Args:
+        report (Dict[str, Any]): the render report
+
+    Returns:
+        Dict[str, Any]: engine, steps run, render time and stop reason of
+        the render and each phase, and its profiled spans if any
+    """
+    steps: int = sum(phase['steps'] for phase in report['phases'])
+    stop_reason: str = report['stop_reason'] or 'completed'
+    seconds: float = report['setup_seconds'] + sum(
+        phase['seconds'] for phase in report['phases'])
+    renders_by_engine.inc(engine=report['engine'])
+    render_steps.observe(steps)
+    render_stop_reasons.inc(reason=stop_reason)
+    render_setup_seconds.observe(report['setup_seconds'])
+    render_seconds.observe(seconds, engine=report['engine'])
+    for phase in report['phases']:
+        render_phase_seconds.observe(phase['seconds'], phase=phase['name'])
+    spans: Dict[str, Dict[str, float]] = report.get('spans') or {}
+    for name, span in spans.items():
+        render_span_seconds.observe(span['seconds'] / span['count'],
+                                    span=name)
+    summary: Dict[str, Any] = {
+        'engine': report['engine'], 'steps': steps, 'seconds': seconds,
+        'stop_reason': stop_reason,
+        'phases': [{'name': phase['name'], 'steps': phase['steps'],
+                    'stop_reason': phase['stop_reason']}
+                   for phase in report['phases']]}
+    if spans:
+        summary['spans'] = spans
+    return summary
+
+
+def send_result_by_email(email: EmailStr, result: bytes) -> None:
+    """
+    Method to send a rendered image by email, queued in the mail outbox
+
+    Args:
+        email (EmailStr): receiver email
+        result (bytes): the rendered image as png
     """
-    # apply style transfer model
-    result: Image = style_transfer.render_image(content_img, style_img,
-                                                content_layer, style_layers,
-                                                style_loss, content_loss,
-                                                total_variation_loss,
-                                                epochs_without_variation,
-                                                epochs_with_variation,
-                                                steps_per_epoch)
-    # send image by email
     msg = ('Thanks for using HStyle!\nwe added the Rendered Image'
            ', We hope u are satisfied from our service')
-    mail_service.send_image_by_email(result, msg, email)
+    mail_service.outbox.send_image(result, msg, email)
+
+
+def on_render_done(job_id: str, email: EmailStr, future: Future) -> None:
+    """
+    Method to store the result of a finished render, and of identical
+    requests waiting on it, and send it by email
+
+    Args:
+        job_id (str): the render job id
+        email (EmailStr): receiver email
+        future (Future): the render future
+    """
+    render_pool.clear_stop(job_id)
+    error: BaseException = future.exception()
+    if error is not None:
+        for waiting_id in results.release(job_id):
+            waiting_emails.pop(waiting_id, None)
+            jobs.set_failed(waiting_id, str(error) or type(error).__name__)
+        return
+    result: bytes = future.result()['image']
+    report: Dict[str, Any] = record_render_report(future.result()['report'])
+    # a render stopped by the user is not the result of its parameters
+    waiting: List[str] = results.release(job_id) \
+        if report['stop_reason'] == engines.STOPPED \
+        else results.complete(job_id, result, report)
+    for waiting_id in waiting:
+        # result is available for download before the email is sent
+        jobs.set_result(waiting_id, result, report)
+        send_result_by_email(waiting_emails.pop(waiting_id, email), result)
+
+
+def get_existing_job(job_id: str) -> job_store.JobRecord:
+    """
+    Method to get a render job
+
+    Args:
+        job_id (str): the render job id
+
+    Raises:
+        HTTPException: if job is unknown or expired
+
+    Returns:
+        job_store.JobRecord: the job
+    """
+    job: job_store.JobRecord = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="Render job not found")
+    return job
 
 
 @router.post("/renderImage/")
-async def render_image(background_tasks: BackgroundTasks,
-                 email: EmailStr = Body(...),
+async def render_image(email: EmailStr = Body(...), # pylint: disable=R0913,R0914
                  content_loss: float = Body(..., ge=content_min_weight,
                                              le=content_max_weight),
                  style_loss: float = Body(..., ge=style_min_weight,
@@ -129,8 +588,16 @@ async def render_image(background_tasks: BackgroundTasks,
                      ..., ge=total_variation_min_weight,
                      le=total_variation_max_weight),
                  apply_dilation: bool = Body(...),
+                 quality: str = Body('standard',
+                                     regex='^(draft|standard|high)$'),
+                 engine: str = Body(AUTO_ENGINE,
+                                    regex='^(auto|optimization|adain)$'),
+                 output_size: int = Body(output_min_size,
+                                         ge=output_min_size,
+                                         le=output_max_size),
+                 warm_start: bool = Body(False),
                  content_image: UploadFile = File(None),
-                 style_image: UploadFile = File(None)) -> Response:
+                 style_image: UploadFile = File(None)) -> Dict[str, str]:
     """
     End point for using the style transfer model in order to render a content
     image with the style of style image.
@@ -142,35 +609,254 @@ async def render_image(background_tasks: BackgroundTasks,
         total_variation_loss (float): the total variation loss weight for
         style transfer model
         apply_dilation (bool): boolean to apply dilation on content image
+        quality (str): quality tier, draft and standard stop at a step
+        budget or when the loss stops improving, high runs all steps unless
+        converged
+        engine (str): auto renders styles with a trained fast style model in
+        a single pass and optimizes other styles, optimization always
+        optimizes, adain renders any style in a single pass
+        output_size (int): maximum dimension of the rendered image, above
+        512 the render is refined in tiles
+        warm_start (bool): start from the previous render of the same
+        images instead of the content image, for re-renders with other loss
+        weights
         content_image (UploadFile, optional): content image
         style_image (UploadFile, optional): style image
 
+    Raises:
+        HTTPException: if engine is not available or render queue is full
+
     Returns:
-        Response: status OK.
+        Dict[str, str]: the render job id
     """
+    if engine == engines.ADAIN_ENGINE and not engines.decoder_trained():
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="AdaIN engine is not available")
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
 
     # test content image was provided and its type
     if content_image is not None:
-        content_img: np.ndarray = await read_image_from_api(content_image)
+        content_hash, content_img = await uploads.read_image_from_api(
+            content_image, output_size)
     # apply deafault content image
     else:
-        content_img: np.ndarray = content_img_deafult.copy()
+        content_hash, content_img = await loop.run_in_executor(
+            uploads.preprocess_executor, uploads.read_default_image,
+            content_img_deafult_path)
 
     # test style image was provided and its type
     if style_image is not None:
-        style_img: np.ndarray = await read_image_from_api(style_image)
+        style_hash, style_img = await uploads.read_image_from_api(
+            style_image, engines.model_max_dim)
     # apply deafault style image
     else:
-        style_img: np.ndarray = style_img_deafult.copy()
+        style_hash, style_img = await loop.run_in_executor(
+            uploads.preprocess_executor, uploads.read_default_image,
+            style_img_deafult_path)
+
+    # answer identical requests from the result cache, or from the render
+    # of an identical request in progress. warm started renders depend on
+    # the previous renders of their worker and always render
+    job_id: str = jobs.create()
+    outcome, cached = results.lookup(result_cache.request_key(
+        content_hash, style_hash, apply_dilation, content_loss, style_loss,
+        total_variation_loss, quality, engine, output_size,
+        render_settings()), job_id) \
+        if not warm_start else (result_cache.MISS, None)
+    if outcome == result_cache.HIT:
+        jobs.set_result(job_id, cached.result, cached.report)
+        send_result_by_email(email, cached.result)
+        return {"job_id": job_id}
+    if outcome == result_cache.JOINED:
+        waiting_emails[job_id] = email
+        return {"job_id": job_id}
 
     # apply dilation on content image
     if apply_dilation:
-        kernel: np.ndarray = np.ones((5, 5), np.uint8)
-        content_img: np.ndarray = cv2.erode(content_img, kernel, iterations=1)
+        content_img: np.ndarray = await loop.run_in_executor(
+            uploads.preprocess_executor, uploads.dilate_image, content_img)
+
+    # run model on a render worker, with queued renders of the same size
+    # when batching, store result and email it when done
+    batch_key: Optional[Tuple[int, int, str]] = render_batch_key(
+        content_img, quality, engine, output_size, warm_start)
+    try:
+        if batch_key is None:
+            future: Future = render_pool.submit(
+                render_image_job, job_id, content_loss, style_loss,
+                total_variation_loss, content_img, style_img, quality,
+                engine, output_size, warm_start, style_hash)
+        else:
+            future: Future = render_pool.submit_batchable(
+                batch_key, render_image_batch_job, render_image_job, job_id,
+                content_loss, style_loss, total_variation_loss, content_img,
+                style_img, quality, engine, output_size, warm_start,
+                style_hash)
+    except (render_worker.QueueFullError,
+            render_worker.PoolClosedError) as err:
+        results.release(job_id)
+        jobs.set_failed(job_id, "Rejected, render queue is full")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many renders in progress, try again later"
+        ) from err
+    future.add_done_callback(functools.partial(on_render_done, job_id,
+                                               email))
+
+    return {"job_id": job_id}
+
 
-    # run model + email send in background
-    background_tasks.add_task(render_image_background, email, content_loss,
-                              style_loss, total_variation_loss,
-                              content_img, style_img)
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str) -> Dict[str, Any]:
+    """
+    End point to get the status of a render job
+    \f
+    Args:
+        job_id (str): the render job id
+
+    Returns:
+        Dict[str, Any]: job id, status (queued, running, done or failed),
+        progress, failure reason and the render report of a done job
+    """
+    job: job_store.JobRecord = get_existing_job(job_id)
+    return {"job_id": job.job_id, "status": job.status,
+            "progress": job.progress, "error": job.error,
+            "report": job.report}
 
-    return Response(status_code=status.HTTP_200_OK)
+
+@router.get("/jobs/{job_id}/progress")
+async def get_job_progress(job_id: str) -> Dict[str, Any]:
+    """
+    End point to get the progress of a render job
+    \f
+    Args:
+        job_id (str): the render job id
+
+    Returns:
+        Dict[str, Any]: phase, epoch, step, total steps and current loss,
+        empty if render did not start
+    """
+    return get_existing_job(job_id).progress
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str,
+                         image_format: str = Query(
+                             'png', regex='^(png|jpeg)$')) -> Response:
+    """
+    End point to download the rendered image of a render job
+    \f
+    Args:
+        job_id (str): the render job id
+        image_format (str): png or jpeg
+
+    Raises:
+        HTTPException: if job is unknown, not done or its result expired
+
+    Returns:
+        Response: the rendered image
+    """
+    job: job_store.JobRecord = get_existing_job(job_id)
+    if job.status != job_store.DONE:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f"Render job is {job.status}")
+    result: bytes = job.result
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_410_GONE,
+                            detail="Render result expired")
+    if image_format != 'png':
+        result = encode_image(Image.open(io.BytesIO(result)), image_format)
+    return Response(content=result,
+                    media_type=result_media_types[image_format])
+
+
+@router.post("/jobs/{job_id}/stop")
+async def stop_job(job_id: str) -> Dict[str, str]:
+    """
+    End point to stop a render job early, the job finishes with its current
+    image as result. a job waiting on the render of identical requests
+    stops waiting, the render is stopped once no job waits on it
+    \f
+    Args:
+        job_id (str): the render job id
+
+    Returns:
+        Dict[str, str]: job id and status
+    """
+    job: job_store.JobRecord = get_existing_job(job_id)
+    if job.status in (job_store.QUEUED, job_store.RUNNING):
+        render_id: Optional[str] = results.detach(job_id)
+        if render_id is not None:
+            render_pool.request_stop(render_id)
+        if render_id != job_id:
+            # other jobs wait on the render, or it is not this job's render
+            waiting_emails.pop(job_id, None)
+            jobs.set_failed(job_id, "Stopped before the render finished")
+    return {"job_id": job.job_id, "status": job.status}
+
+
+@router.get("/jobs/{job_id}/preview")
+async def get_job_preview(job_id: str) -> Response:
+    """
+    End point to get the latest downscaled jpeg preview of a render job
+    \f
+    Args:
+        job_id (str): the render job id
+
+    Raises:
+        HTTPException: if job is unknown or has no preview yet
+
+    Returns:
+        Response: the preview image
+    """
+    job: job_store.JobRecord = get_existing_job(job_id)
+    if job.preview is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="No preview available")
+    return Response(content=job.preview, media_type='image/jpeg',
+                    headers={'X-Render-Step': str(job.preview_step)})
+
+
+async def preview_events(job_id: str) -> AsyncIterator[str]:
+    """
+    Method to generate server sent events of a render job previews, until
+    the job is done
+
+    Args:
+        job_id (str): the render job id
+
+    Returns:
+        AsyncIterator[str]: preview events (base64 jpeg) and a final event
+        with the job status
+    """
+    sent_step: int = 0
+    while True:
+        job: job_store.JobRecord = jobs.get(job_id)
+        if job is None:
+            return
+        if job.preview is not None and job.preview_step > sent_step:
+            sent_step = job.preview_step
+            data: str = base64.b64encode(job.preview).decode()
+            yield f'event: preview\nid: {sent_step}\ndata: {data}\n\n'
+        if job.status in (job_store.DONE, job_store.FAILED):
+            yield f'event: {job.status}\ndata: {job.job_id}\n\n'
+            return
+        await asyncio.sleep(preview_poll_seconds)
+
+
+@router.get("/jobs/{job_id}/previews")
+async def stream_job_previews(job_id: str) -> StreamingResponse:
+    """
+    End point to stream the previews of a render job as server sent events
+    \f
+    Args:
+        job_id (str): the render job id
+
+    Returns:
+        StreamingResponse: event stream of base64 jpeg previews
+    """
+    get_existing_job(job_id)
+    return StreamingResponse(preview_events(job_id),
+                             media_type='text/event-stream')
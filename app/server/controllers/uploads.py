@@ -0,0 +1,264 @@
+"""
+Upload handling of the style transfer api. uploaded images are bounded in
+size before their request body is read, hashed and decoded off the event
+loop, and kept decoded for the session.
+"""
+
+
+import os
+import asyncio
+import hashlib
+import functools
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, Tuple
+from fastapi import UploadFile, HTTPException, status
+from starlette.responses import JSONResponse
+from PIL import Image, ImageOps
+from server.machine_learning import engines
+from server.services import session_store
+
+
+# maximum size of an uploaded image
+max_upload_bytes: int = int(os.environ.get('HSTYLE_MAX_UPLOAD_MB',
+                                           '20')) * 1024 * 1024
+
+# bytes of the form fields and multipart boundaries of a render request
+form_fields_bytes: int = 64 * 1024
+
+# bytes of an upload hashed at a time
+upload_chunk_bytes: int = 1024 * 1024
+
+# number of uploads hashed, decoded and dilated at the same time, off the
+# event loop
+preprocess_workers: int = int(os.environ.get('HSTYLE_PREPROCESS_WORKERS',
+                                             '2'))
+
+# decoded uploads of the session, so re-submitting an image with other loss
+# weights skips decoding
+upload_store: session_store.SessionStore = session_store.SessionStore(
+    int(os.environ.get('HSTYLE_SESSION_ENTRIES', '16')),
+    float(os.environ.get('HSTYLE_SESSION_TTL_SECONDS', '900')))
+
+# prepares uploaded images, so a large upload does not block other requests
+preprocess_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+    max_workers=preprocess_workers)
+
+
+def max_request_bytes() -> int:
+    """
+    Method to get the maximum size of a request body, the content and style
+    images and the form fields
+
+    Returns:
+        int: maximum size of a request body
+    """
+    return 2 * max_upload_bytes + form_fields_bytes
+
+
+class RequestTooLargeError(Exception):
+    """
+    Class of the error raised when a request body is over its bound
+    """
+
+
+class UploadLimitMiddleware: # pylint: disable=R0903
+    """
+    Class of an ASGI middleware bounding the size of request bodies before
+    they are read, by their Content-Length header and by the bytes received
+    for chunked bodies, so an oversized upload is never spooled to disk
+    """
+    def __init__(self, app: Callable[..., Awaitable[None]]):
+        """
+        Initialization Method
+
+        Args:
+            app (Callable[..., Awaitable[None]]): the ASGI app
+        """
+        self.app: Callable[..., Awaitable[None]] = app
+
+    async def __call__(self, scope: Dict[str, Any],
+                       receive: Callable[[], Awaitable[Dict[str, Any]]],
+                       send: Callable[[Dict[str, Any]], Awaitable[None]]
+                       ) -> None:
+        """
+        Method to handle a request, answering 413 when its body is over
+        max_request_bytes
+
+        Args:
+            scope (Dict[str, Any]): the connection scope
+            receive (Callable[[], Awaitable[Dict[str, Any]]]): receives the
+            request messages
+            send (Callable[[Dict[str, Any]], Awaitable[None]]): sends the
+            response messages
+        """
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        max_bytes: int = max_request_bytes()
+        too_large: JSONResponse = JSONResponse(
+            {'detail': 'Request body is too large'},
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        length: bytes = dict(scope['headers']).get(b'content-length', b'0')
+        try:
+            declared_bytes: int = int(length)
+        except ValueError:
+            bad_length: JSONResponse = JSONResponse(
+                {'detail': 'Invalid Content-Length header'},
+                status_code=status.HTTP_400_BAD_REQUEST)
+            await bad_length(scope, receive, send)
+            return
+        if declared_bytes > max_bytes:
+            await too_large(scope, receive, send)
+            return
+
+        received: int = 0
+        exceeded: bool = False
+
+        async def receive_bounded() -> Dict[str, Any]:
+            nonlocal received, exceeded
+            message: Dict[str, Any] = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > max_bytes:
+                    exceeded = True
+                    raise RequestTooLargeError()
+            return message
+
+        async def send_unless_exceeded(message: Dict[str, Any]) -> None:
+            # the app answers the aborted body as a bad request
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, receive_bounded, send_unless_exceeded)
+        except RequestTooLargeError:
+            pass
+        if exceeded:
+            await too_large(scope, receive, send)
+
+
+@functools.lru_cache(maxsize=None)
+def read_default_image(path: str) -> Tuple[str, np.ndarray]:
+    """
+    Method to read a default image, once per process
+
+    Args:
+        path (str): the image path
+
+    Returns:
+        Tuple[str, np.ndarray]: hash of the image file, as uploads are
+        hashed, and read only image as numpy array
+    """
+    img: np.ndarray = np.asarray(Image.open(path))
+    img.setflags(write=False)
+    return engines.file_digest(path), img
+
+
+def decode_image(file: BinaryIO, max_dim: int) -> np.ndarray:
+    """
+    Method to decode an image file, jpeg files are decoded directly at the
+    smallest DCT scale (1/2, 1/4 or 1/8) keeping max_dim pixels so large
+    uploads are never decoded at full size
+
+    Args:
+        file (BinaryIO): the image file
+        max_dim (int): maximum dimension the image is rendered at
+
+    Returns:
+        np.ndarray: read only RGB image as numpy array
+    """
+    with Image.open(file) as img:
+        width, height = img.size
+        scale: float = max_dim / max(width, height)
+        if scale < 1:
+            # decodes to RGB in the jpeg decoder, no color conversion copy
+            img.draft('RGB', (int(np.ceil(width * scale)),
+                              int(np.ceil(height * scale))))
+        # apply camera orientation, as opencv decoding did
+        rgb: Image = ImageOps.exif_transpose(img)
+        if rgb.mode != 'RGB':
+            rgb = rgb.convert('RGB')
+        decoded: np.ndarray = np.asarray(rgb)
+    # decoded images are shared by the renders of the session
+    decoded.setflags(write=False)
+    return decoded
+
+
+def hash_upload(file: BinaryIO) -> str:
+    """
+    Method to hash an uploaded file in chunks, bounding its size
+
+    Args:
+        file (BinaryIO): the uploaded file
+
+    Raises:
+        HTTPException: if file is bigger than max_upload_bytes
+
+    Returns:
+        str: hex digest of the file
+    """
+    digest = hashlib.sha256()
+    size: int = 0
+    file.seek(0)
+    while True:
+        chunk: bytes = file.read(upload_chunk_bytes)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_upload_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Image file is too large")
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def dilate_image(img: np.ndarray) -> np.ndarray:
+    """
+    Method to apply dilation on an image
+
+    Args:
+        img (np.ndarray): the image
+
+    Returns:
+        np.ndarray: the dilated image
+    """
+    kernel: np.ndarray = np.ones((5, 5), np.uint8)
+    return cv2.erode(img, kernel, iterations=1)
+
+
+async def read_image_from_api(api_img: UploadFile,
+                              max_dim: int = engines.model_max_dim
+                              ) -> Tuple[str, np.ndarray]:
+    """
+    Method to read an UploadFile from api as image, decoded once per session
+    from the uploaded file without copying it to memory, on the preprocess
+    executor
+
+    Args:
+        api_img (UploadFile): an image file
+        max_dim (int): maximum dimension the image is rendered at
+
+    Raises:
+        HTTPException: if image is too large or not readable
+
+    Returns:
+        Tuple[str, np.ndarray]: hash of the file and read only RGB image as
+        numpy array
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+    digest: str = await loop.run_in_executor(preprocess_executor,
+                                             hash_upload, api_img.file)
+    try:
+        return digest, await loop.run_in_executor(
+            preprocess_executor, upload_store.get_or_compute, 'upload',
+            (digest, max_dim),
+            functools.partial(decode_image, api_img.file, max_dim))
+    except Exception as err:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Unable to process image file"
+        ) from err
@@ -0,0 +1,313 @@
+"""
+Arbitrary style transfer with adaptive instance normalization (AdaIN). the
+VGG19 features of the content image are normalized to the feature
+statistics of the style image and decoded back to an image, so any style
+renders in a single forward pass.
+"""
+
+
+import os
+import time
+import threading
+import numpy as np
+import tensorflow as tf
+from typing import Callable, List, Optional, Tuple
+from PIL import Image
+from server.machine_learning import style_transfer
+from server.machine_learning.engines import (ADAIN_ENGINE,
+                                             decoder_weights_path,
+                                             decoder_trained)
+from server.machine_learning.layers import ConvLayer, load_training_image
+
+
+# encoder layers, the last is normalized and decoded, all are matched by
+# the style loss when training the decoder
+adain_layers: List[str] = ['block1_conv1', 'block2_conv1', 'block3_conv1',
+                           'block4_conv1']
+
+
+def adaptive_instance_normalization(content_features: tf.Tensor,
+                                    style_features: tf.Tensor,
+                                    epsilon: float = 1e-5) -> tf.Tensor:
+    """
+    Function to align the mean and standard deviation of each channel of
+    the content features with the style features
+
+    Args:
+      content_features (tf.Tensor): the content features
+      style_features (tf.Tensor): the style features
+
+    Returns:
+      tf.Tensor: the normalized content features
+    """
+    content_mean, content_variance = tf.nn.moments(
+        content_features, axes=[1, 2], keepdims=True)
+    style_mean, style_variance = tf.nn.moments(
+        style_features, axes=[1, 2], keepdims=True)
+    return (tf.sqrt(style_variance + epsilon) *
+            (content_features - content_mean) /
+            tf.sqrt(content_variance + epsilon) + style_mean)
+
+
+class Decoder(tf.keras.models.Model):
+    """
+    Class of the AdaIN decoder, mirrors the VGG19 encoder up to
+    block4_conv1 with upsampling instead of pooling
+    """
+    def __init__(self):
+        """
+        Initialization Method
+        """
+        super(Decoder, self).__init__()
+        # a list of convolution layers per resolution, upsampled between
+        self.blocks: List[List[ConvLayer]] = [
+            [ConvLayer(256, 3, normalize=False)],
+            [ConvLayer(256, 3, normalize=False) for _ in range(3)] +
+            [ConvLayer(128, 3, normalize=False)],
+            [ConvLayer(128, 3, normalize=False),
+             ConvLayer(64, 3, normalize=False)],
+            [ConvLayer(64, 3, normalize=False),
+             ConvLayer(3, 3, relu=False, normalize=False)]]
+
+    def call(self, inputs: tf.Tensor) -> tf.Tensor: # pylint: disable=W0221
+        """
+        Method to decode features to an image
+
+        Args:
+          inputs (tf.Tensor): block4_conv1 features
+
+        Returns:
+          tf.Tensor: the decoded image, 8 times the feature size
+        """
+        outputs: tf.Tensor = inputs
+        for i, block in enumerate(self.blocks):
+            if i > 0:
+                outputs = tf.image.resize(outputs, tf.shape(outputs)[1:3] * 2,
+                                          'nearest')
+            for layer in block:
+                outputs = layer(outputs)
+        return outputs
+
+
+class AdaINModel(tf.keras.models.Model):
+    """
+    Class of the AdaIN style transfer model, a VGG19 encoder created by
+    vgg_layers and a trained decoder
+    """
+    def __init__(self):
+        """
+        Initialization Method
+        """
+        super(AdaINModel, self).__init__()
+        self.encoder: tf.keras.Model = style_transfer.vgg_layers(adain_layers)
+        self.decoder: Decoder = Decoder()
+
+    def encode(self, image: tf.Tensor) -> List[tf.Tensor]:
+        """
+        Method to get the encoder features of an image
+
+        Args:
+          image (tf.Tensor): the image, float input in [0,1]
+
+        Returns:
+          List[tf.Tensor]: the features of each encoder layer
+        """
+        return self.encoder(
+            tf.keras.applications.vgg19.preprocess_input(image * 255.0))
+
+    def call(self, inputs: Tuple[tf.Tensor, tf.Tensor], # pylint: disable=W0221
+             alpha: float = 1.0) -> tf.Tensor:
+        """
+        Method to render content images with the style of style images
+
+        Args:
+          inputs (Tuple[tf.Tensor, tf.Tensor]): content images and style
+          images, float input in [0,1]
+          alpha (float): style strength, 0 decodes the content features
+
+        Returns:
+          tf.Tensor: the rendered images, same size as content images
+        """
+        content, style = inputs
+        content_features: tf.Tensor = self.encode(content)[-1]
+        features: tf.Tensor = adaptive_instance_normalization(
+            content_features, self.encode(style)[-1])
+        features = alpha * features + (1 - alpha) * content_features
+        # odd content sizes lose rows or columns when encoded
+        return tf.image.resize(self.decoder(features), tf.shape(content)[1:3])
+
+
+def build_adain_model() -> AdaINModel:
+    """
+    Method to create an AdaIN model with created decoder weights
+
+    Returns:
+      AdaINModel: the model
+    """
+    model: AdaINModel = AdaINModel()
+    image: tf.Tensor = tf.zeros((1, 64, 64, 3), tf.float32)
+    model((image, image))
+    return model
+
+
+def feature_statistics(features: tf.Tensor) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Function to calculate the mean and standard deviation of each channel
+
+    Args:
+      features (tf.Tensor): the features
+
+    Returns:
+      Tuple[tf.Tensor, tf.Tensor]: the mean and standard deviation
+    """
+    mean, variance = tf.nn.moments(features, axes=[1, 2])
+    return mean, tf.sqrt(variance + 1e-5)
+
+
+def train_decoder(content_images: List[np.ndarray], # pylint: disable=R0913,R0914
+                  style_images: List[np.ndarray], epochs: int = 2,
+                  batch_size: int = 4, image_size: int = 256,
+                  learning_rate: float = 1e-4, style_weight: float = 10.0,
+                  progress_callback: Optional[
+                      Callable[[int, float], None]] = None) -> AdaINModel:
+    """
+    Method to train the AdaIN decoder to decode normalized features to
+    images with the content of the content images and the feature
+    statistics of the style images
+
+    Args:
+      content_images (List[np.ndarray]): the training content images
+      style_images (List[np.ndarray]): the training style images
+      epochs (int): number of passes over the content images
+      batch_size (int): number of content images in each step
+      image_size (int): size training images are resized to
+      learning_rate (float): the optimizer learning rate
+      style_weight (float): the style loss weight
+      progress_callback (Callable[[int, float], None], optional): called
+      with step and loss after every step
+
+    Returns:
+      AdaINModel: the model with trained decoder
+    """
+    contents: tf.Tensor = tf.stack([load_training_image(img, image_size)
+                                    for img in content_images])
+    styles: tf.Tensor = tf.stack([load_training_image(img, image_size)
+                                  for img in style_images])
+
+    model: AdaINModel = build_adain_model()
+    opt: tf.optimizers.Adam = tf.optimizers.Adam(learning_rate=learning_rate)
+
+    @tf.function
+    def train_step(content: tf.Tensor, style: tf.Tensor) -> tf.Tensor:
+        style_features: List[tf.Tensor] = model.encode(style)
+        target: tf.Tensor = adaptive_instance_normalization(
+            model.encode(content)[-1], style_features[-1])
+        with tf.GradientTape() as tape:
+            rendered: tf.Tensor = model.decoder(target, training=True)
+            rendered_features: List[tf.Tensor] = model.encode(rendered)
+            # content loss against the normalized features
+            loss: tf.Tensor = tf.reduce_mean(
+                (rendered_features[-1] - target) ** 2)
+            # style loss of feature statistics of every encoder layer
+            for rendered_layer, style_layer in zip(rendered_features,
+                                                   style_features):
+                rendered_mean, rendered_std = feature_statistics(
+                    rendered_layer)
+                style_mean, style_std = feature_statistics(style_layer)
+                loss += style_weight * (
+                    tf.reduce_mean((rendered_mean - style_mean) ** 2) +
+                    tf.reduce_mean((rendered_std - style_std) ** 2))
+        grad: List[tf.Tensor] = tape.gradient(
+            loss, model.decoder.trainable_variables)
+        opt.apply_gradients(zip(grad, model.decoder.trainable_variables))
+        return loss
+
+    step: int = 0
+    for _ in range(epochs):
+        dataset: tf.data.Dataset = tf.data.Dataset.zip((
+            tf.data.Dataset.from_tensor_slices(contents).shuffle(
+                len(content_images)),
+            tf.data.Dataset.from_tensor_slices(styles).shuffle(
+                len(style_images)).repeat())).batch(batch_size)
+        for content, style in dataset:
+            loss: tf.Tensor = train_step(content, style)
+            step += 1
+            if progress_callback is not None:
+                progress_callback(step, float(loss))
+    return model
+
+
+# AdaIN model of the current process, loaded on first use
+_adain_model: Optional[AdaINModel] = None
+_adain_lock: threading.Lock = threading.Lock()
+
+
+def get_adain_model() -> AdaINModel:
+    """
+    Method to get the AdaIN model with the trained decoder, loading it on
+    first use
+
+    Raises:
+      FileNotFoundError: if decoder is not trained
+
+    Returns:
+      AdaINModel: the model
+    """
+    global _adain_model # pylint: disable=W0603
+    with _adain_lock:
+        if _adain_model is None:
+            if not decoder_trained():
+                raise FileNotFoundError(
+                    f'No trained AdaIN decoder at {decoder_weights_path}')
+            model: AdaINModel = build_adain_model()
+            model.decoder.load_weights(decoder_weights_path).expect_partial()
+            _adain_model = model
+        return _adain_model
+
+
+def save_decoder(model: AdaINModel, path: str = None) -> None:
+    """
+    Method to save the trained decoder weights
+
+    Args:
+      model (AdaINModel): the trained model
+      path (str, optional): the weights path, the engine weights path if
+      not given
+    """
+    path: str = path or decoder_weights_path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model.decoder.save_weights(path)
+
+
+def render_adain_with_report(content_image: np.ndarray,
+                             style_image: np.ndarray, max_dim: int = 512,
+                             alpha: float = 1.0
+                             ) -> Tuple[Image, style_transfer.RenderReport]:
+    """
+    Method to render a content image with the style of a style image in a
+    single forward pass, and report the render time
+
+    Args:
+      content_image (np.ndarray): the content image
+      style_image (np.ndarray): the style image
+      max_dim (int): maximum dimension of the rendered image
+      alpha (float): style strength in [0,1]
+
+    Returns:
+      Tuple[Image, style_transfer.RenderReport]: the rendered image and
+      render report
+    """
+    start: float = time.perf_counter()
+    model: AdaINModel = get_adain_model()
+    content: tf.Tensor = style_transfer.load_img(content_image, max_dim)
+    style: tf.Tensor = style_transfer.load_img(style_image, max_dim)
+    report: style_transfer.RenderReport = style_transfer.RenderReport(
+        setup_seconds=time.perf_counter() - start, engine=ADAIN_ENGINE)
+
+    start = time.perf_counter()
+    result: Image = style_transfer.tensor_to_image(
+        style_transfer.clip_0_1(model((content, style), alpha)))
+    report.phases.append(style_transfer.PhaseTrace(
+        'forward_pass', seconds=time.perf_counter() - start,
+        max_dim=max_dim))
+    return result, report
@@ -0,0 +1,476 @@
+"""
+Batched style transfer. renders of the same target resolution are optimized
+together in one batched image variable, so each VGG pass serves all of them.
+"""
+
+
+import time
+import weakref
+import numpy as np
+import tensorflow as tf
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from PIL import Image
+from server.machine_learning import engines, render, style_transfer
+from server.machine_learning.engines import CONVERGED, STEP_BUDGET
+from server.machine_learning.render import RenderPhase, ConvergenceDetector
+from server.machine_learning.style_transfer import (StyleContentModel,
+                                                    RenderOptions,
+                                                    RenderProgress,
+                                                    RenderReport, PhaseTrace)
+from server.machine_learning.target_cache import image_hash
+
+
+@dataclass
+class RenderRequest:
+    """
+    Class of a single render in a batch
+
+    Attributes:
+      content_image (np.ndarray): the content image
+      style_image (np.ndarray): the style image
+      style_weight (float): the style weight
+      content_weight (float): the content weight
+      total_variation_weight (float): the total variation weight
+      options (RenderOptions, optional): progress, preview and stop
+      callbacks of the render, other settings are shared by the batch
+    """
+    content_image: np.ndarray
+    style_image: np.ndarray
+    style_weight: float
+    content_weight: float
+    total_variation_weight: float
+    options: Optional[RenderOptions] = None
+
+
+def batch_style_content_loss(outputs: Dict[str, Dict[str, tf.Tensor]],
+                             style_targets: Dict[str, tf.Tensor],
+                             content_targets: Dict[str, tf.Tensor],
+                             num_style_layers: int, num_content_layers: int,
+                             style_weights: tf.Tensor,
+                             content_weights: tf.Tensor) -> tf.Tensor:
+    """
+    Function to calculate the style and content loss of each sample in batch
+
+    Args:
+      outputs (Dict[str, Dict[str, tf.Tensor]]): the rendered images
+      intermidate outputs
+      style_targets (Dict[str, tf.Tensor]): the style intermidate outputs
+      of each sample
+      content_targets (Dict[str, tf.Tensor]): the content intermidate outputs
+      of each sample
+      num_style_layers (int): number of style layers
+      num_content_layers (int): number of content layers
+      style_weights (tf.Tensor): the style weight of each sample [batch]
+      content_weights (tf.Tensor): the content weight of each sample [batch]
+
+    Returns:
+      tf.Tensor: style and content loss of each sample [batch]
+    """
+    # average over every axis but the batch axis
+    style_loss: tf.Tensor = tf.add_n(
+        [tf.reduce_mean((outputs['style'][name]-style_targets[name])**2,
+                        axis=[1, 2])
+         for name in outputs['style'].keys()])
+    content_loss: tf.Tensor = tf.add_n(
+        [tf.reduce_mean((outputs['content'][name]-content_targets[name])**2,
+                        axis=[1, 2, 3])
+         for name in outputs['content'].keys()])
+
+    return (style_loss * style_weights / num_style_layers +
+            content_loss * content_weights / num_content_layers)
+
+
+def batch_gradients(image: tf.Tensor, extractor: StyleContentModel,
+                    style_targets: Dict[str, tf.Tensor],
+                    content_targets: Dict[str, tf.Tensor],
+                    style_weights: tf.Tensor, content_weights: tf.Tensor,
+                    total_variation_weights: tf.Tensor,
+                    with_variation: bool) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Method to calculate the loss of each sample and the gradient of a batched
+    training step. samples only depend on their own loss, so the gradient of
+    the sum is the gradient of each render.
+
+    Args:
+      image (tf.Tensor): the rendered images [batch, height, width, 3]
+      extractor (StyleContentModel): the intermidate layer extractor
+      style_targets (Dict[str, tf.Tensor]): the style intermidate outputs
+      content_targets (Dict[str, tf.Tensor]): the content intermidate outputs
+      style_weights (tf.Tensor): the style weight of each sample
+      content_weights (tf.Tensor): the content weight of each sample
+      total_variation_weights (tf.Tensor): the total variation weight of
+      each sample
+      with_variation (bool): add total variation loss
+
+    Returns:
+      Tuple[tf.Tensor, tf.Tensor]: the loss of each sample and the gradient
+    """
+    with tf.GradientTape() as tape:
+        tape.watch(image)
+        outputs: Dict[str, Dict[str, tf.Tensor]] = extractor(image)
+        loss: tf.Tensor = batch_style_content_loss(
+            outputs, style_targets, content_targets,
+            extractor.num_style_layers, len(extractor.content_layers),
+            style_weights, content_weights)
+        if with_variation:
+            loss += total_variation_weights*tf.image.total_variation(image)
+        total_loss: tf.Tensor = tf.reduce_sum(loss)
+    return loss, tape.gradient(total_loss, image)
+
+
+class BatchAdam: # pylint: disable=R0903
+    """
+    Class of the Adam optimizer of a batched image with moments and step
+    counts per sample, a sample that stopped keeps the optimizer state of a
+    render of it alone while the other samples continue. updates match
+    tf.optimizers.Adam.
+    """
+    def __init__(self, image: tf.Variable, learning_rate: float = 0.02,
+                 beta_1: float = 0.99, beta_2: float = 0.999,
+                 epsilon: float = 1e-1):
+        """
+        Initialization Method
+
+        Args:
+          image (tf.Variable): the rendered images [batch, height, width, 3]
+          learning_rate (float): the learning rate
+          beta_1 (float): decay of the first moment
+          beta_2 (float): decay of the second moment
+          epsilon (float): small value added to the second moment root
+        """
+        self.learning_rate: float = learning_rate
+        self.beta_1: float = beta_1
+        self.beta_2: float = beta_2
+        self.epsilon: float = epsilon
+        self.momentums: tf.Variable = tf.Variable(tf.zeros_like(image))
+        self.velocities: tf.Variable = tf.Variable(tf.zeros_like(image))
+        self.steps: tf.Variable = tf.Variable(tf.zeros([image.shape[0], 1,
+                                                        1, 1]))
+
+    def apply(self, image: tf.Variable, grad: tf.Tensor,
+              running: List[bool]) -> None:
+        """
+        Method to apply a gradient descent step to the running samples and
+        clip them to [0,1]
+
+        Args:
+          image (tf.Variable): the rendered images
+          grad (tf.Tensor): the loss gradient by the images
+          running (List[bool]): samples to update, others keep their image
+          and optimizer state
+        """
+        mask: tf.Tensor = tf.reshape(tf.constant(running), [-1, 1, 1, 1])
+        self.steps.assign_add(tf.cast(mask, tf.float32))
+        self.momentums.assign(tf.where(
+            mask, self.momentums + (grad - self.momentums) * (1 - self.beta_1),
+            self.momentums))
+        self.velocities.assign(tf.where(
+            mask, self.velocities +
+            (tf.square(grad) - self.velocities) * (1 - self.beta_2),
+            self.velocities))
+        # bias correction by the steps of each sample
+        steps: tf.Tensor = tf.maximum(self.steps, 1.0)
+        alpha: tf.Tensor = self.learning_rate * \
+            tf.sqrt(1 - self.beta_2 ** steps) / (1 - self.beta_1 ** steps)
+        image.assign(tf.where(mask, style_transfer.clip_0_1(
+            image - alpha * self.momentums /
+            (tf.sqrt(self.velocities) + self.epsilon)), image))
+
+
+# traced batch gradient functions of every live extractor
+_batch_steps: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_batch_step(extractor: StyleContentModel,
+                   run_eagerly: bool = False) -> Callable:
+    """
+    Method to get the traced batch gradient function of an extractor
+
+    Args:
+      extractor (StyleContentModel): the intermidate layer extractor
+      run_eagerly (bool): run the steps eagerly instead of traced
+
+    Returns:
+      Callable: batch_gradients bound to the extractor
+    """
+    if run_eagerly:
+        return lambda image, *args: batch_gradients(image, extractor, *args)
+
+    if extractor not in _batch_steps:
+        # weak reference so the traced function does not keep it alive
+        extractor_ref: weakref.ref = weakref.ref(extractor)
+        _batch_steps[extractor] = tf.function(
+            lambda image, *args: batch_gradients(image, extractor_ref(),
+                                                 *args))
+    return _batch_steps[extractor]
+
+
+def group_requests(requests: List[RenderRequest], max_batch_size: int,
+                   max_dim: int = 512) -> List[List[int]]:
+    """
+    Method to group requests that render at the same resolution
+
+    Args:
+      requests (List[RenderRequest]): the requests
+      max_batch_size (int): maximum number of requests in group
+      max_dim (int): maximum dimension the images are loaded with
+
+    Returns:
+      List[List[int]]: indices of requests in each group
+    """
+    groups: Dict[Tuple[int, int], List[List[int]]] = {}
+    for i, request in enumerate(requests):
+        shape: Tuple[int, int] = engines.render_shape(
+            *request.content_image.shape[:2], max_dim)
+        shape_groups: List[List[int]] = groups.setdefault(shape, [[]])
+        if len(shape_groups[-1]) == max_batch_size:
+            shape_groups.append([])
+        shape_groups[-1].append(i)
+    return [group for shape_groups in groups.values()
+            for group in shape_groups]
+
+
+def render_batch_with_reports(requests: List[RenderRequest], # pylint: disable=R0912,R0913,R0914,R0915
+                              content_layers: List[str],
+                              style_layers: List[str],
+                              epochs_without_variation: int,
+                              epochs_with_variation: int,
+                              steps_per_epoch: int,
+                              options: RenderOptions = None
+                              ) -> Tuple[List[Image.Image],
+                                         List[RenderReport]]:
+    """
+    Method to render requests of the same resolution in one batch, and
+    report the steps and stop reason of each. a sample that converged in a
+    phase, ran out of budget or was stopped keeps its image and optimizer
+    state while the other samples continue, the phase seconds of a sample
+    are the time until it stopped.
+
+    Args:
+      requests (List[RenderRequest]): the requests
+      content_layers (List[str]): the conten intermediate layers
+      style_layers (List[str]): the style intermediate layers
+      epochs_without_variation (int): number of epochs to perform without
+      total variation consideration
+      epochs_with_variation(int): number of epochs to perform with
+      total variation consideration
+      steps_per_epoch(int): number of steps in each epoch
+      options (RenderOptions, optional): render settings of the batch, the
+      callbacks of each sample are in its request options
+
+    Returns:
+      Tuple[List[Image.Image], List[RenderReport]]: the rendered image and
+      render report of each request
+    """
+    options: RenderOptions = options or RenderOptions()
+    setup_start: float = time.perf_counter()
+    extractor: StyleContentModel = style_transfer.extractor_registry.get(
+        style_layers, content_layers,
+        style_transfer.resolve_precision(options.precision))
+
+    # load content images and per sample targets
+    loaded_contents: List[tf.Tensor] = [
+        style_transfer.load_img(request.content_image)
+        for request in requests]
+    style_targets: List[Dict[str, tf.Tensor]] = [
+        style_transfer.get_targets(extractor, 'style', request.style_image,
+                                   use_cache=options.use_target_cache)
+        for request in requests]
+    content_targets: List[Dict[str, tf.Tensor]] = [
+        style_transfer.get_targets(extractor, 'content',
+                                   request.content_image,
+                                   loaded_image=loaded,
+                                   use_cache=options.use_target_cache)
+        for request, loaded in zip(requests, loaded_contents)]
+
+    # stack samples on the batch axis
+    batch_style_targets: Dict[str, tf.Tensor] = {
+        name: tf.concat([targets[name] for targets in style_targets], 0)
+        for name in style_layers}
+    batch_content_targets: Dict[str, tf.Tensor] = {
+        name: tf.concat([targets[name] for targets in content_targets], 0)
+        for name in content_layers}
+    style_weights: tf.Tensor = tf.constant(
+        [request.style_weight for request in requests], tf.float32)
+    content_weights: tf.Tensor = tf.constant(
+        [request.content_weight for request in requests], tf.float32)
+    total_variation_weights: tf.Tensor = tf.constant(
+        [request.total_variation_weight for request in requests], tf.float32)
+
+    # adam updates each pixel independently, samples only keep their own
+    # moments
+    image: tf.Variable = tf.Variable(tf.concat(loaded_contents, 0))
+    opt: BatchAdam = BatchAdam(image)
+    step: Callable = get_batch_step(extractor, options.run_eagerly)
+
+    # callbacks of each sample
+    sample_options: List[RenderOptions] = [
+        request.options or RenderOptions() for request in requests]
+    reports: List[RenderReport] = [RenderReport() for _ in requests]
+    setup_seconds: float = time.perf_counter() - setup_start
+    for report in reports:
+        report.setup_seconds = setup_seconds
+
+    # schedule total variation weights are per sample, only use phase flag
+    schedule: List[RenderPhase] = render.render_schedule(
+        epochs_without_variation, epochs_with_variation, 0.0)
+    total_steps: int = sum(steps_per_epoch * phase.epochs
+                           for phase in schedule)
+    if options.max_steps is not None:
+        total_steps = min(total_steps, options.max_steps)
+    optimize_start: float = time.perf_counter()
+
+    for phase in schedule:
+        with_variation: bool = phase.total_variation_weight is not None
+        traces: List[PhaseTrace] = [PhaseTrace(phase.name)
+                                    for _ in requests]
+        # losses of different phases are not comparable
+        detectors: List[ConvergenceDetector] = [
+            ConvergenceDetector(options.convergence_window,
+                                options.convergence_tolerance)
+            for _ in requests]
+        running: List[bool] = [report.stop_reason is None
+                               for report in reports]
+        for report, trace, sample_running in zip(reports, traces, running):
+            if sample_running:
+                report.phases.append(trace)
+        phase_start: float = time.perf_counter()
+
+        stepped: List[bool] = list(running)
+        for phase_step in range(phase.epochs * steps_per_epoch):
+            epoch: int = phase_step // steps_per_epoch + 1
+            loss, grad = step(tf.convert_to_tensor(image),
+                              batch_style_targets, batch_content_targets,
+                              style_weights, content_weights,
+                              total_variation_weights, with_variation)
+            # samples that stopped keep their image
+            opt.apply(image, grad, running)
+
+            # reading losses waits for the step, once per step
+            losses: Optional[np.ndarray] = None
+            for i, (report, trace) in enumerate(zip(reports, traces)):
+                if not running[i]:
+                    continue
+                trace.steps += 1
+                callbacks: RenderOptions = sample_options[i]
+                if callbacks.preview_callback is not None and \
+                        report.steps % options.preview_every == 0:
+                    callbacks.preview_callback(
+                        report.steps,
+                        style_transfer.tensor_to_image(image[i:i+1]))
+
+                if options.max_steps is not None and \
+                        report.steps >= options.max_steps:
+                    report.stop_reason = STEP_BUDGET
+                elif report.steps % options.progress_every == 0:
+                    if losses is None:
+                        losses = loss.numpy()
+                    if callbacks.progress_callback is not None:
+                        callbacks.progress_callback(RenderProgress(
+                            phase.name, epoch, report.steps, total_steps,
+                            float(losses[i])))
+
+                    report.stop_reason = render.stop_reason(
+                        callbacks.should_stop, options.max_seconds,
+                        optimize_start)
+                    if report.stop_reason is None and \
+                            options.convergence_window > 0 and \
+                            detectors[i].update(trace.steps,
+                                                float(losses[i])):
+                        trace.stop_reason = CONVERGED
+
+                if report.stop_reason is not None:
+                    trace.stop_reason = report.stop_reason
+                if trace.stop_reason is not None:
+                    running[i] = False
+                    trace.seconds = time.perf_counter() - phase_start
+
+            # read epoch loss of samples that ran in epoch
+            if (phase_step + 1) % steps_per_epoch == 0 or not any(running):
+                epoch_losses: np.ndarray = loss.numpy()
+                for i, trace in enumerate(traces):
+                    if stepped[i]:
+                        trace.losses.append(float(epoch_losses[i]))
+                stepped = list(running)
+            if not any(running):
+                break
+
+        phase_seconds: float = time.perf_counter() - phase_start
+        for trace, sample_running in zip(traces, running):
+            if sample_running:
+                trace.seconds = phase_seconds
+
+    if options.use_session_store:
+        # next render of these images with other weights can warm start
+        for i, request in enumerate(requests):
+            style_transfer.session_store.put('output', (
+                image_hash(request.content_image),
+                image_hash(request.style_image),
+                str(engines.model_max_dim), extractor.precision),
+                tf.convert_to_tensor(image[i:i+1]))
+
+    return [style_transfer.tensor_to_image(image[i:i+1])
+            for i in range(len(requests))], reports
+
+
+def render_batch(requests: List[RenderRequest], content_layers: List[str], # pylint: disable=R0913
+                 style_layers: List[str], epochs_without_variation: int,
+                 epochs_with_variation: int, steps_per_epoch: int,
+                 options: RenderOptions = None) -> List[Image.Image]:
+    """
+    Method to render requests of the same resolution in one batch
+
+    Args:
+      requests (List[RenderRequest]): the requests
+      content_layers (List[str]): the conten intermediate layers
+      style_layers (List[str]): the style intermediate layers
+      epochs_without_variation (int): number of epochs to perform without
+      total variation consideration
+      epochs_with_variation(int): number of epochs to perform with
+      total variation consideration
+      steps_per_epoch(int): number of steps in each epoch
+      options (RenderOptions, optional): optional render settings
+
+    Returns:
+      List[Image.Image]: the rendered image of each request
+    """
+    images, _ = render_batch_with_reports(
+        requests, content_layers, style_layers, epochs_without_variation,
+        epochs_with_variation, steps_per_epoch, options)
+    return images
+
+
+def render_batched(requests: List[RenderRequest], content_layers: List[str], # pylint: disable=R0913
+                   style_layers: List[str], epochs_without_variation: int,
+                   epochs_with_variation: int, steps_per_epoch: int,
+                   max_batch_size: int = 4,
+                   options: RenderOptions = None) -> List[Image.Image]:
+    """
+    Method to render queued requests, batching requests of the same
+    resolution
+
+    Args:
+      requests (List[RenderRequest]): the requests
+      content_layers (List[str]): the conten intermediate layers
+      style_layers (List[str]): the style intermediate layers
+      epochs_without_variation (int): number of epochs to perform without
+      total variation consideration
+      epochs_with_variation(int): number of epochs to perform with
+      total variation consideration
+      steps_per_epoch(int): number of steps in each epoch
+      max_batch_size (int): maximum number of requests in batch
+      options (RenderOptions, optional): optional render settings
+
+    Returns:
+      List[Image.Image]: the rendered image of each request, in order
+    """
+    results: List[Image.Image] = [None] * len(requests)
+    for group in group_requests(requests, max_batch_size):
+        images: List[Image.Image] = render_batch(
+            [requests[i] for i in group], content_layers, style_layers,
+            epochs_without_variation, epochs_with_variation,
+            steps_per_epoch, options)
+        for i, image in zip(group, images):
+            results[i] = image
+    return results
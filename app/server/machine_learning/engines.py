@@ -0,0 +1,91 @@
+"""
+Render engine names and settings shared by the api and the render engines.
+this module does not import tensorflow, so the api validates requests and
+serves results without loading the engines, which load in the render
+workers.
+"""
+
+
+import os
+import hashlib
+import numpy as np
+from typing import Tuple
+
+
+# engine name of per image optimization renders
+OPTIMIZATION_ENGINE: str = 'optimization'
+
+# engine name of fast style renders
+FAST_ENGINE: str = 'fast'
+
+# engine name of AdaIN renders
+ADAIN_ENGINE: str = 'adain'
+
+# stop reasons of a render
+STOPPED: str = 'stopped'
+CONVERGED: str = 'converged'
+STEP_BUDGET: str = 'step_budget'
+TIME_BUDGET: str = 'time_budget'
+
+# bytes of a file hashed at a time
+digest_chunk_bytes: int = 1024 * 1024
+
+# maximum dimension the base image is rendered at
+model_max_dim: int = 512
+
+# extractor compute precision of the deployment
+default_precision: str = os.environ.get('HSTYLE_PRECISION', 'float32')
+
+# path of the trained AdaIN decoder weights
+decoder_weights_path: str = os.environ.get(
+    'HSTYLE_ADAIN_WEIGHTS', os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), '..', 'data', 'adain',
+        'decoder'))
+
+
+def decoder_trained() -> bool:
+    """
+    Method to check if trained decoder weights exist
+
+    Returns:
+      bool: True if the AdaIN engine can render
+    """
+    return os.path.exists(decoder_weights_path + '.index')
+
+
+def render_shape(height: int, width: int,
+                 max_dim: int = model_max_dim) -> Tuple[int, int]:
+    """
+    Method to get the shape an image is rendered at, with the same float32
+    arithmetic as loading the image for a render
+
+    Args:
+      height (int): the image height
+      width (int): the image width
+      max_dim (int): maximum dimension the image is loaded with
+
+    Returns:
+      Tuple[int, int]: the rendered height and width
+    """
+    size: np.ndarray = np.array([height, width], np.float32)
+    scale: np.float32 = np.float32(max_dim) / size.max()
+    return tuple(int(dim) for dim in (size * scale).astype(np.int32))
+
+
+def file_digest(path: str) -> str:
+    """
+    Method to get the digest of an image file, the id of a style image. the
+    api hashes uploads the same way, so an uploaded style file has the id
+    of the file it was read from
+
+    Args:
+      path (str): the file path
+
+    Returns:
+      str: hex digest of the file
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(digest_chunk_bytes), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,52 @@
+"""
+Command line tool to export the style content extractor of the server
+layers, so render workers load it without building VGG19 or downloading its
+weights. run from the application folder on a machine with network access,
+e.g.:
+`python -m server.machine_learning.export_extractor --tflite --quantize`
+"""
+
+
+import os
+import shutil
+import argparse
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import style_transfer, frozen_extractor
+from server.machine_learning.engines import default_precision
+
+
+def main() -> None:
+    """
+    Export the extractor as a SavedModel to the extractor artifact path
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--output',
+                        default=frozen_extractor.extractor_artifact_path,
+                        help='SavedModel folder, replaced if it exists')
+    parser.add_argument('--precision', default=default_precision,
+                        choices=list(style_transfer.PRECISION_POLICIES))
+    parser.add_argument('--tflite', action='store_true',
+                        help='also convert to a TFLite model (forward passes '
+                        'only) next to the SavedModel')
+    parser.add_argument('--quantize', action='store_true',
+                        help='quantize the TFLite model weights to int8')
+    args: argparse.Namespace = parser.parse_args()
+
+    # built from VGG19, not loaded from a previous export
+    extractor: style_transfer.StyleContentModel = \
+        style_transfer.StyleContentModel(style_layers, content_layer,
+                                         args.precision)
+    output: str = os.path.normpath(args.output)
+    if os.path.exists(output):
+        shutil.rmtree(output)
+    frozen_extractor.export_saved_model(extractor, output)
+    print(f'saved {output}')
+    if args.tflite:
+        size: int = frozen_extractor.export_tflite(output, output + '.tflite',
+                                                   args.quantize)
+        print(f'saved {output}.tflite ({size / 2 ** 20:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main()
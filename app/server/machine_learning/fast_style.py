@@ -0,0 +1,365 @@
+"""
+Feed forward (fast) style transfer. a small transformer network is trained
+offline per style with the style transfer losses, and renders a content
+image in a single forward pass.
+"""
+
+
+import os
+import json
+import math
+import time
+import threading
+import numpy as np
+import tensorflow as tf
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from PIL import Image
+from server.machine_learning import style_transfer
+from server.machine_learning.engines import FAST_ENGINE
+from server.machine_learning.layers import ConvLayer, load_training_image
+
+
+class ResidualBlock(tf.keras.layers.Layer):
+    """
+    Class of a residual block of two convolution layers
+    """
+    def __init__(self, filters: int, **kwargs):
+        """
+        Initialization Method
+
+        Args:
+          filters (int): number of channels
+        """
+        super(ResidualBlock, self).__init__(**kwargs)
+        self.conv1: ConvLayer = ConvLayer(filters, 3)
+        self.conv2: ConvLayer = ConvLayer(filters, 3, relu=False)
+
+    def call(self, inputs: tf.Tensor) -> tf.Tensor: # pylint: disable=W0221
+        """
+        Method to apply the block
+
+        Args:
+          inputs (tf.Tensor): the inputs
+
+        Returns:
+          tf.Tensor: the outputs
+        """
+        return inputs + self.conv2(self.conv1(inputs))
+
+
+class TransformerNet(tf.keras.models.Model):
+    """
+    Class of the feed forward style transfer network, downsamples the
+    content image, applies residual blocks and upsamples back to the
+    content image size
+    """
+    def __init__(self, residual_blocks: int = 5):
+        """
+        Initialization Method
+
+        Args:
+          residual_blocks (int): number of residual blocks
+        """
+        super(TransformerNet, self).__init__()
+        self.down: List[ConvLayer] = [ConvLayer(32, 9), ConvLayer(64, 3, 2),
+                                      ConvLayer(128, 3, 2)]
+        self.residual: List[ResidualBlock] = [
+            ResidualBlock(128) for _ in range(residual_blocks)]
+        self.upsample: List[ConvLayer] = [ConvLayer(64, 3), ConvLayer(32, 3)]
+        self.output_conv: tf.keras.layers.Conv2D = tf.keras.layers.Conv2D(
+            3, 9, padding='same')
+
+    def call(self, inputs: tf.Tensor) -> tf.Tensor: # pylint: disable=W0221
+        """
+        Method to render content images
+
+        Args:
+          inputs (tf.Tensor): content images, float input in [0,1]
+
+        Returns:
+          tf.Tensor: rendered images in [0,1], same size as inputs
+        """
+        outputs: tf.Tensor = inputs
+        for layer in self.down:
+            outputs = layer(outputs)
+        for block in self.residual:
+            outputs = block(outputs)
+        for layer in self.upsample:
+            # nearest upsampling then convolution avoids checkerboard
+            # artifacts of transposed convolutions
+            outputs = layer(tf.image.resize(
+                outputs, tf.shape(outputs)[1:3] * 2, 'nearest'))
+        outputs = tf.sigmoid(self.output_conv(outputs))
+        # odd input sizes lose a row or column when downsampled
+        return tf.image.resize(outputs, tf.shape(inputs)[1:3])
+
+
+def build_transformer() -> TransformerNet:
+    """
+    Method to create a transformer network with created weights
+
+    Returns:
+      TransformerNet: the network
+    """
+    model: TransformerNet = TransformerNet()
+    model(tf.zeros((1, 64, 64, 3), tf.float32))
+    return model
+
+
+def train_transformer(style_image: np.ndarray, # pylint: disable=R0913,R0914
+                      content_images: List[np.ndarray],
+                      content_layers: List[str], style_layers: List[str],
+                      style_weight: float, content_weight: float,
+                      total_variation_weight: float, epochs: int = 2,
+                      batch_size: int = 4, image_size: int = 256,
+                      learning_rate: float = 1e-3,
+                      progress_callback: Optional[
+                          Callable[[int, float], None]] = None
+                      ) -> TransformerNet:
+    """
+    Method to train a transformer network to render a style, with the style
+    transfer losses of the rendered content images
+
+    Args:
+      style_image (np.ndarray): the style image
+      content_images (List[np.ndarray]): the training content images
+      content_layers (List[str]): the conten intermediate layers
+      style_layers (List[str]): the style intermediate layers
+      style_weight (float): the style weight
+      content_weight (float): the content weight
+      total_variation_weight (float): the total variation weight
+      epochs (int): number of passes over the content images
+      batch_size (int): number of content images in each step
+      image_size (int): size training images are resized to
+      learning_rate (float): the optimizer learning rate
+      progress_callback (Callable[[int, float], None], optional): called
+      with step and loss after every step
+
+    Returns:
+      TransformerNet: the trained network
+    """
+    extractor: style_transfer.StyleContentModel = \
+        style_transfer.extractor_registry.get(style_layers, content_layers)
+    style_targets: Dict[str, tf.Tensor] = style_transfer.get_targets(
+        extractor, 'style', style_image, image_size)
+    images: tf.Tensor = tf.stack([load_training_image(img, image_size)
+                                  for img in content_images])
+
+    model: TransformerNet = build_transformer()
+    opt: tf.optimizers.Adam = tf.optimizers.Adam(learning_rate=learning_rate)
+
+    @tf.function
+    def train_step(batch: tf.Tensor) -> tf.Tensor:
+        content_targets: Dict[str, tf.Tensor] = extractor(batch)['content']
+        with tf.GradientTape() as tape:
+            rendered: tf.Tensor = model(batch, training=True)
+            # style gram matrices broadcast over the batch
+            loss: tf.Tensor = style_transfer.style_content_loss(
+                extractor(rendered), style_targets, content_targets,
+                len(style_layers), len(content_layers), style_weight,
+                content_weight)
+            loss += total_variation_weight * tf.reduce_mean(
+                tf.image.total_variation(rendered))
+        grad: List[tf.Tensor] = tape.gradient(loss,
+                                              model.trainable_variables)
+        opt.apply_gradients(zip(grad, model.trainable_variables))
+        return loss
+
+    step: int = 0
+    for _ in range(epochs):
+        dataset: tf.data.Dataset = tf.data.Dataset.from_tensor_slices(
+            images).shuffle(len(content_images)).batch(batch_size)
+        for batch in dataset:
+            loss: tf.Tensor = train_step(batch)
+            step += 1
+            if progress_callback is not None:
+                progress_callback(step, float(loss))
+    return model
+
+
+def render_fast(content_image: np.ndarray, model: TransformerNet,
+                max_dim: int = 512) -> Image:
+    """
+    Method to render a content image with a trained transformer network
+
+    Args:
+      content_image (np.ndarray): the content image
+      model (TransformerNet): the style transformer network
+      max_dim (int): maximum dimension of the rendered image
+
+    Returns:
+      Image: the rendered image
+    """
+    return style_transfer.tensor_to_image(
+        model(style_transfer.load_img(content_image, max_dim)))
+
+
+def render_fast_with_report(content_image: np.ndarray, model: TransformerNet,
+                            max_dim: int = 512
+                            ) -> Tuple[Image, style_transfer.RenderReport]:
+    """
+    Method to render a content image with a trained transformer network,
+    and report the render time
+
+    Args:
+      content_image (np.ndarray): the content image
+      model (TransformerNet): the style transformer network
+      max_dim (int): maximum dimension of the rendered image
+
+    Returns:
+      Tuple[Image, style_transfer.RenderReport]: the rendered image and
+      render report
+    """
+    start: float = time.perf_counter()
+    result: Image = render_fast(content_image, model, max_dim)
+    report: style_transfer.RenderReport = style_transfer.RenderReport(
+        engine=FAST_ENGINE)
+    report.phases.append(style_transfer.PhaseTrace(
+        'forward_pass', seconds=time.perf_counter() - start,
+        max_dim=max_dim))
+    return result, report
+
+
+class FastStyleRegistry:
+    """
+    Class of the trained fast style models in a folder, by the id of their
+    style image, the digest of the style image file (decoded pixels differ
+    with the decode size of an upload). models are loaded once per worker
+    on first use.
+    """
+    def __init__(self, models_dir: str):
+        """
+        Initialization Method
+
+        Args:
+          models_dir (str): folder of the trained models, a sub folder with
+          weights and meta.json per style
+        """
+        self.models_dir: str = models_dir
+        self._models: Dict[str, TransformerNet] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def _weights_path(self, style_id: str) -> str:
+        """
+        Method to get the weights path of a style
+
+        Args:
+          style_id (str): the style id
+
+        Returns:
+          str: the weights checkpoint prefix
+        """
+        return os.path.join(self.models_dir, style_id, 'weights')
+
+    def has(self, style_id: str) -> bool:
+        """
+        Method to check if a model is trained for a style
+
+        Args:
+          style_id (str): the style id
+
+        Returns:
+          bool: True if a trained model exists
+        """
+        return style_id in self._models or os.path.exists(
+            self._weights_path(style_id) + '.index')
+
+    def trained_with(self, style_id: Optional[str], style_weight: float,
+                     content_weight: float,
+                     total_variation_weight: float) -> bool:
+        """
+        Method to check if a model is trained for a style with the loss
+        weights of a request, a model renders the weights it was trained
+        with only
+
+        Args:
+          style_id (str, optional): the style id, None if not known
+          style_weight (float): the style weight
+          content_weight (float): the content weight
+          total_variation_weight (float): the total variation weight
+
+        Returns:
+          bool: True if a trained model exists and was trained with the
+          loss weights, False if its training settings are missing
+        """
+        if style_id is None or not self.has(style_id):
+            return False
+        meta_path: str = os.path.join(self.models_dir, style_id, 'meta.json')
+        if not os.path.exists(meta_path):
+            # weights without their training settings can not be matched
+            return False
+        with open(meta_path, encoding='utf-8') as meta_file:
+            settings: Dict[str, Any] = json.load(meta_file)['settings']
+        return all(math.isclose(settings.get(name, math.nan), weight)
+                   for name, weight in (
+                       ('style_weight', style_weight),
+                       ('content_weight', content_weight),
+                       ('total_variation_weight', total_variation_weight)))
+
+    def get(self, style_id: str) -> Optional[TransformerNet]:
+        """
+        Method to get the trained model of a style
+
+        Args:
+          style_id (str): the style id
+
+        Returns:
+          Optional[TransformerNet]: the model, None if not trained
+        """
+        with self._lock:
+            model: Optional[TransformerNet] = self._models.get(style_id)
+            if model is None and os.path.exists(
+                    self._weights_path(style_id) + '.index'):
+                model = build_transformer()
+                model.load_weights(
+                    self._weights_path(style_id)).expect_partial()
+                self._models[style_id] = model
+        return model
+
+    def save(self, model: TransformerNet, style_id: str, name: str,
+             settings: Dict[str, Any]) -> str:
+        """
+        Method to save a trained model of a style
+
+        Args:
+          model (TransformerNet): the trained model
+          style_id (str): the style id
+          name (str): the style name
+          settings (Dict[str, Any]): the training settings
+
+        Returns:
+          str: the model folder
+        """
+        os.makedirs(os.path.join(self.models_dir, style_id), exist_ok=True)
+        model.save_weights(self._weights_path(style_id))
+        with open(os.path.join(self.models_dir, style_id, 'meta.json'),
+                  'w', encoding='utf-8') as meta_file:
+            json.dump({'name': name, 'key': style_id, 'created': time.time(),
+                       'settings': settings}, meta_file, indent=2)
+        with self._lock:
+            self._models[style_id] = model
+        return os.path.join(self.models_dir, style_id)
+
+    def styles(self) -> List[Dict[str, Any]]:
+        """
+        Method to list the trained styles
+
+        Returns:
+          List[Dict[str, Any]]: meta data of each trained style
+        """
+        if not os.path.isdir(self.models_dir):
+            return []
+        styles: List[Dict[str, Any]] = []
+        for key in sorted(os.listdir(self.models_dir)):
+            meta_path: str = os.path.join(self.models_dir, key, 'meta.json')
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding='utf-8') as meta_file:
+                    styles.append(json.load(meta_file))
+        return styles
+
+
+# trained fast style models, shipped with the server data by default
+fast_style_registry: FastStyleRegistry = FastStyleRegistry(
+    os.environ.get('HSTYLE_FAST_STYLE_DIR', os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), '..', 'data',
+        'fast_styles')))
@@ -0,0 +1,220 @@
+"""
+Exported style content extractors. the extractor (vgg preprocessing, VGG19
+up to the deepest layer and gram matrices) is saved as a SavedModel with
+its weights, so render nodes without network access load it instead of
+building VGG19 and downloading its weights. the SavedModel keeps the
+gradient of the forward pass for the optimization steps, a TFLite export
+of it runs forward passes only (targets and inference workers).
+"""
+
+
+import os
+import json
+import numpy as np
+import tensorflow as tf
+from typing import Any, Dict, List, Optional
+
+
+# saved extractor of the render workers, loaded instead of building VGG19
+# when it was exported with the requested layers and precision
+extractor_artifact_path: str = os.environ.get(
+    'HSTYLE_EXTRACTOR_ARTIFACT', os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), '..', 'data',
+        'extractor'))
+
+# file of the layers and precision of an exported extractor
+metadata_file: str = 'extractor.json'
+
+
+def output_name(kind: str, layer: str) -> str:
+    """
+    Method to get the name of an output of the exported extractor
+
+    Args:
+      kind (str): 'style' or 'content'
+      layer (str): the layer name
+
+    Returns:
+      str: the output name
+    """
+    return f'{kind}_{layer}'
+
+
+def export_saved_model(extractor: Any, path: str) -> None:
+    """
+    Method to save an extractor as a SavedModel with its weights
+
+    Args:
+      extractor (StyleContentModel): the extractor
+      path (str): the SavedModel folder
+    """
+    @tf.function(input_signature=[tf.TensorSpec([None, None, None, 3],
+                                                tf.float32, name='image')])
+    def extract(image: tf.Tensor) -> Dict[str, tf.Tensor]:
+        outputs: Dict[str, Dict[str, tf.Tensor]] = extractor(image)
+        return {output_name(kind, layer): value
+                for kind in ('style', 'content')
+                for layer, value in outputs[kind].items()}
+
+    module: tf.Module = tf.Module()
+    module.extractor = extractor
+    module.extract = extract
+    tf.saved_model.save(module, path,
+                        signatures={'serving_default': extract})
+    with open(os.path.join(path, metadata_file), 'w',
+              encoding='utf-8') as meta_file:
+        json.dump({'style_layers': extractor.style_layers,
+                   'content_layers': extractor.content_layers,
+                   'precision': extractor.precision,
+                   'tensorflow': tf.__version__}, meta_file)
+
+
+def read_metadata(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Method to read the layers and precision of an exported extractor
+
+    Args:
+      path (str): the SavedModel folder
+
+    Returns:
+      Optional[Dict[str, Any]]: the metadata, None if no extractor was
+      exported to path
+    """
+    try:
+        with open(os.path.join(path, metadata_file),
+                  encoding='utf-8') as meta_file:
+            return json.load(meta_file)
+    except FileNotFoundError:
+        return None
+
+
+def artifact_matches(path: str, style_layers: List[str],
+                     content_layers: List[str], precision: str) -> bool:
+    """
+    Method to check if an extractor exported to path has the requested
+    layers and precision
+
+    Args:
+      path (str): the SavedModel folder
+      style_layers (List[str]): the style intermidate layers
+      content_layers (List[str]): the content intermidate layers
+      precision (str): the extractor compute precision
+
+    Returns:
+      bool: True if the exported extractor can be loaded for the request
+    """
+    metadata: Optional[Dict[str, Any]] = read_metadata(path)
+    return metadata is not None and \
+        metadata['style_layers'] == list(style_layers) and \
+        metadata['content_layers'] == list(content_layers) and \
+        metadata['precision'] == precision
+
+
+class FrozenStyleContentModel: # pylint: disable=R0903
+    """
+    Class of an extractor loaded from a SavedModel, called like
+    StyleContentModel
+    """
+    def __init__(self, path: str):
+        """
+        Initialization Method
+
+        Args:
+          path (str): the SavedModel folder
+        """
+        metadata: Dict[str, Any] = read_metadata(path)
+        self.style_layers: List[str] = metadata['style_layers']
+        self.content_layers: List[str] = metadata['content_layers']
+        self.num_style_layers: int = len(self.style_layers)
+        self.precision: str = metadata['precision']
+        self._module: Any = tf.saved_model.load(path)
+
+    def __call__(self, inputs: tf.Tensor) -> Dict[str, Dict[str, tf.Tensor]]:
+        """
+        Method to get the gram matrices of the style layers and the outputs
+        of the content layers of an image
+
+        Args:
+          inputs (tf.Tensor): the image, float input in [0,1]
+
+        Returns:
+          Dict[str, Dict[str, tf.Tensor]]: style and content outputs by
+          layer name
+        """
+        outputs: Dict[str, tf.Tensor] = self._module.extract(
+            tf.cast(inputs, tf.float32))
+        return {'content': {layer: outputs[output_name('content', layer)]
+                            for layer in self.content_layers},
+                'style': {layer: outputs[output_name('style', layer)]
+                          for layer in self.style_layers}}
+
+
+def export_tflite(saved_model_path: str, path: str,
+                  quantize: bool = False) -> int:
+    """
+    Method to convert an exported extractor to a TFLite model
+
+    Args:
+      saved_model_path (str): the SavedModel folder
+      path (str): the TFLite model file
+      quantize (bool): quantize the weights to int8 (dynamic range)
+
+    Returns:
+      int: size of the TFLite model in bytes
+    """
+    converter: tf.lite.TFLiteConverter = \
+        tf.lite.TFLiteConverter.from_saved_model(saved_model_path)
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    model: bytes = converter.convert()
+    with open(path, 'wb') as model_file:
+        model_file.write(model)
+    return len(model)
+
+
+class TFLiteStyleContentModel: # pylint: disable=R0903
+    """
+    Class of an extractor loaded from a TFLite model, forward passes only
+    (TFLite has no gradients). the interpreter runs on the XNNPACK cpu
+    delegate.
+    """
+    def __init__(self, path: str, saved_model_path: str,
+                 num_threads: Optional[int] = None):
+        """
+        Initialization Method
+
+        Args:
+          path (str): the TFLite model file
+          saved_model_path (str): the SavedModel folder it was converted
+          from, for its layers
+          num_threads (int, optional): interpreter threads, the tensorflow
+          default if not given
+        """
+        metadata: Dict[str, Any] = read_metadata(saved_model_path)
+        self.style_layers: List[str] = metadata['style_layers']
+        self.content_layers: List[str] = metadata['content_layers']
+        self.num_style_layers: int = len(self.style_layers)
+        self.precision: str = metadata['precision']
+        self._interpreter: tf.lite.Interpreter = tf.lite.Interpreter(
+            model_path=path, num_threads=num_threads)
+        # the signature runner resizes the interpreter to each input shape
+        self._runner: Any = self._interpreter.get_signature_runner()
+
+    def __call__(self, inputs: tf.Tensor) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Method to get the gram matrices of the style layers and the outputs
+        of the content layers of an image
+
+        Args:
+          inputs (tf.Tensor): the image, float input in [0,1]
+
+        Returns:
+          Dict[str, Dict[str, np.ndarray]]: style and content outputs by
+          layer name
+        """
+        image: np.ndarray = np.asarray(inputs, np.float32)
+        outputs: Dict[str, np.ndarray] = self._runner(image=image)
+        return {'content': {layer: outputs[output_name('content', layer)]
+                            for layer in self.content_layers},
+                'style': {layer: outputs[output_name('style', layer)]
+                          for layer in self.style_layers}}
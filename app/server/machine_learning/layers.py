@@ -0,0 +1,115 @@
+"""
+Layers and image loading shared by the single pass engines (the fast style
+transformer and the AdaIN decoder)
+"""
+
+
+import numpy as np
+import tensorflow as tf
+from typing import Optional
+
+
+class InstanceNormalization(tf.keras.layers.Layer):
+    """
+    Class of an instance normalization layer, normalizes each channel of
+    each image over its locations
+    """
+    def __init__(self, epsilon: float = 1e-3, **kwargs):
+        """
+        Initialization Method
+
+        Args:
+          epsilon (float): small value added to variance
+        """
+        super(InstanceNormalization, self).__init__(**kwargs)
+        self.epsilon: float = epsilon
+        # created by build once the number of channels is known
+        self.scale: Optional[tf.Variable] = None
+        self.offset: Optional[tf.Variable] = None
+
+    def build(self, input_shape: tf.TensorShape) -> None:
+        """
+        Method to create the layer scale and offset
+
+        Args:
+          input_shape (tf.TensorShape): the input shape
+        """
+        channels: int = input_shape[-1]
+        self.scale = self.add_weight(
+            name='scale', shape=(channels,), initializer='ones')
+        self.offset = self.add_weight(
+            name='offset', shape=(channels,), initializer='zeros')
+
+    def call(self, inputs: tf.Tensor) -> tf.Tensor: # pylint: disable=W0221
+        """
+        Method to normalize the inputs
+
+        Args:
+          inputs (tf.Tensor): the inputs [batch, height, width, channels]
+
+        Returns:
+          tf.Tensor: the normalized inputs
+        """
+        mean, variance = tf.nn.moments(inputs, axes=[1, 2], keepdims=True)
+        return (self.scale * (inputs - mean) /
+                tf.sqrt(variance + self.epsilon) + self.offset)
+
+
+class ConvLayer(tf.keras.layers.Layer):
+    """
+    Class of a reflection padded convolution followed by an optional
+    instance normalization and an optional relu
+    """
+    def __init__(self, filters: int, kernel_size: int, strides: int = 1, # pylint: disable=R0913
+                 relu: bool = True, normalize: bool = True, **kwargs):
+        """
+        Initialization Method
+
+        Args:
+          filters (int): number of output channels
+          kernel_size (int): convolution kernel size
+          strides (int): convolution strides
+          relu (bool): apply relu activation
+          normalize (bool): apply instance normalization
+        """
+        super(ConvLayer, self).__init__(**kwargs)
+        self.padding: int = kernel_size // 2
+        self.conv: tf.keras.layers.Conv2D = tf.keras.layers.Conv2D(
+            filters, kernel_size, strides)
+        self.norm: Optional[InstanceNormalization] = \
+            InstanceNormalization() if normalize else None
+        self.relu: bool = relu
+
+    def call(self, inputs: tf.Tensor) -> tf.Tensor: # pylint: disable=W0221
+        """
+        Method to apply the layer
+
+        Args:
+          inputs (tf.Tensor): the inputs
+
+        Returns:
+          tf.Tensor: the outputs
+        """
+        # reflection padding avoids dark borders
+        padded: tf.Tensor = tf.pad(
+            inputs, [[0, 0], [self.padding, self.padding],
+                     [self.padding, self.padding], [0, 0]], 'REFLECT')
+        outputs: tf.Tensor = self.conv(padded)
+        if self.norm is not None:
+            outputs = self.norm(outputs)
+        return tf.nn.relu(outputs) if self.relu else outputs
+
+
+def load_training_image(img: np.ndarray, image_size: int) -> tf.Tensor:
+    """
+    Method to load a training content image as a square image
+
+    Args:
+      img (np.ndarray): the rgb image
+      image_size (int): the training image size
+
+    Returns:
+      tf.Tensor: the image in [0,1] [image_size, image_size, 3]
+    """
+    img: tf.Tensor = tf.convert_to_tensor(img[..., :3], dtype=tf.float32)
+    return tf.image.resize(img / 255, (image_size, image_size))
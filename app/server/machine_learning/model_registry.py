@@ -0,0 +1,129 @@
+"""
+Registry of style transfer extractors. each distinct set of style and content
+layers is built once per worker and shared by all renders.
+"""
+
+
+import time
+import threading
+import tensorflow as tf
+from typing import Callable, Dict, List, Tuple
+from server.services import metrics
+
+
+# key of an extractor in registry (style layers, content layers, precision)
+ExtractorKey = Tuple[Tuple[str, ...], Tuple[str, ...], str]
+
+# time to build an extractor (cold start)
+model_build_seconds: metrics.Histogram = metrics.Histogram(
+    'hstyle_model_build_seconds',
+    'Time to build a style content extractor (cold start)')
+
+# extractor lookups that found a built extractor
+model_cache_hits: metrics.Counter = metrics.Counter(
+    'hstyle_model_cache_hits_total',
+    'Extractor lookups served from the model registry')
+
+# extractor lookups that had to build the extractor
+model_cache_misses: metrics.Counter = metrics.Counter(
+    'hstyle_model_cache_misses_total',
+    'Extractor lookups that built a new extractor')
+
+# number of extractors in registry
+models_loaded: metrics.Gauge = metrics.Gauge(
+    'hstyle_models_loaded', 'Number of extractors in the model registry')
+
+
+class ModelRegistry:
+    """
+    Class to build and hold style content extractors, one per distinct set
+    of style and content layers and compute precision
+    """
+    def __init__(self, factory: Callable[[List[str], List[str], str],
+                                         tf.keras.Model]):
+        """
+        Initialization Method
+
+        Args:
+          factory (Callable[[List[str], List[str], str], tf.keras.Model]):
+          builds an extractor from style layers, content layers and compute
+          precision
+        """
+        self._factory: Callable[[List[str], List[str], str],
+                                tf.keras.Model] = factory
+        self._models: Dict[ExtractorKey, tf.keras.Model] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._build_locks: Dict[ExtractorKey, threading.Lock] = {}
+
+    def get(self, style_layers: List[str], content_layers: List[str],
+            precision: str = 'float32') -> tf.keras.Model:
+        """
+        Method to get the extractor of a set of layers, building it on
+        first use. concurrent callers of a missing extractor wait for a
+        single build.
+
+        Args:
+          style_layers (List[str]): the style intermidate layers
+          content_layers (List[str]): the content intermidate layers
+          precision (str): the extractor compute precision
+
+        Returns:
+          tf.keras.Model: the shared extractor
+        """
+        key: ExtractorKey = (tuple(style_layers), tuple(content_layers),
+                             precision)
+
+        # fast path, extractor already built
+        model: tf.keras.Model = self._models.get(key)
+        if model is not None:
+            model_cache_hits.inc()
+            return model
+
+        # build each key once, without blocking lookups of other keys
+        with self._lock:
+            build_lock: threading.Lock = self._build_locks.setdefault(
+                key, threading.Lock())
+        with build_lock:
+            model = self._models.get(key)
+            if model is not None:
+                model_cache_hits.inc()
+                return model
+
+            model_cache_misses.inc()
+            start: float = time.perf_counter()
+            model = self._factory(list(style_layers), list(content_layers),
+                                  precision)
+            model_build_seconds.observe(time.perf_counter() - start)
+
+            with self._lock:
+                self._models[key] = model
+                models_loaded.set(len(self._models))
+        return model
+
+    def warm(self, style_layers: List[str], content_layers: List[str],
+             precision: str = 'float32') -> tf.keras.Model:
+        """
+        Method to build an extractor and run a first forward pass so
+        the first render does not pay for it
+
+        Args:
+          style_layers (List[str]): the style intermidate layers
+          content_layers (List[str]): the content intermidate layers
+          precision (str): the extractor compute precision
+
+        Returns:
+          tf.keras.Model: the warm extractor
+        """
+        model: tf.keras.Model = self.get(style_layers, content_layers,
+                                         precision)
+        model(tf.zeros((1, 64, 64, 3), tf.float32))
+        return model
+
+    def clear(self) -> None:
+        """
+        Method to remove all extractors from registry
+        """
+        with self._lock:
+            self._models.clear()
+            self._build_locks.clear()
+            models_loaded.set(0)
@@ -0,0 +1,219 @@
+"""
+Profiling of renders. a render profiler records opt in timing spans of the
+render phases and of the parts of every optimization step (gradients,
+optimizer update and clipping), logs the loss periodically and captures
+tensorflow profiler traces of a sampled share of render jobs, where the
+step graph is split by op (vgg forward, gram matrices, loss and gradient).
+"""
+
+
+import os
+import time
+import random
+import logging
+import tempfile
+import threading
+import contextlib
+import dataclasses
+import tensorflow as tf
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+
+
+# logger of render profiles
+logger: logging.Logger = logging.getLogger(__name__)
+
+# record timing spans of every render
+profile_renders: bool = os.environ.get('HSTYLE_PROFILE_RENDERS', '0') == '1'
+
+# number of steps between loss log lines of a render, 0 for no logging
+loss_log_every: int = int(os.environ.get('HSTYLE_RENDER_LOG_EVERY', '0'))
+
+# share of render jobs traced with the tensorflow profiler
+trace_sample_rate: float = float(os.environ.get('HSTYLE_PROFILE_SAMPLE_RATE',
+                                                '0'))
+
+# folder of tensorflow profiler traces, a folder per traced job
+trace_dir: str = os.environ.get('HSTYLE_PROFILE_DIR', os.path.join(
+    tempfile.gettempdir(), 'hstyle-profiles'))
+
+# the tensorflow profiler traces one render of a process at a time
+_trace_lock: threading.Lock = threading.Lock()
+
+
+@dataclass
+class SpanStats:
+    """
+    Class of the timing of a span over a render
+
+    Attributes:
+      count (int): number of times the span ran
+      seconds (float): total wall time of the span
+      max_seconds (float): longest wall time of the span
+    """
+    count: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class RenderProfiler:
+    """
+    Class of the profiler of a render, spans may be recorded from the
+    threads of parallel tiles
+    """
+    def __init__(self, log_every: int = 0,
+                 trace_logdir: Optional[str] = None):
+        """
+        Initialization Method
+
+        Args:
+          log_every (int): number of steps between loss log lines, 0 for no
+          logging
+          trace_logdir (str, optional): folder to write a tensorflow profiler
+          trace of the render to, None to not trace
+        """
+        self.log_every: int = log_every
+        self.trace_logdir: Optional[str] = trace_logdir
+        self.traced: bool = False
+        self.spans: Dict[str, SpanStats] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Method to record the wall time of a span
+
+        Args:
+          name (str): the span name
+          seconds (float): the span wall time
+        """
+        with self._lock:
+            stats: SpanStats = self.spans.setdefault(name, SpanStats())
+            stats.count += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """
+        Method to time a block, also named in tensorflow profiler traces
+
+        Args:
+          name (str): the span name
+
+        Returns:
+          Iterator[None]: context of the block
+        """
+        start: float = time.perf_counter()
+        with tf.profiler.experimental.Trace(name):
+            yield
+        self.record(name, time.perf_counter() - start)
+
+    def log_loss(self, phase: str, step: int, loss: tf.Tensor) -> None:
+        """
+        Method to log the loss every log_every steps
+
+        Args:
+          phase (str): name of the running phase
+          step (int): steps executed in render
+          loss (tf.Tensor): loss of the step
+        """
+        if self.log_every and step % self.log_every == 0:
+            # reading loss waits for the step
+            logger.info('Render step %d (%s) loss %.6g', step, phase,
+                        float(loss))
+
+    @contextlib.contextmanager
+    def trace(self) -> Iterator[bool]:
+        """
+        Method to capture a tensorflow profiler trace of a block in
+        trace_logdir, skipped when another render of the process is traced
+
+        Returns:
+          Iterator[bool]: context of the block, True if traced
+        """
+        if self.trace_logdir is None or \
+                not _trace_lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            tf.profiler.experimental.start(self.trace_logdir)
+        except tf.errors.OpError:
+            _trace_lock.release()
+            logger.warning('Unable to start profiler trace in %s',
+                           self.trace_logdir)
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            tf.profiler.experimental.stop()
+            _trace_lock.release()
+            self.traced = True
+            logger.info('Render profiler trace written to %s',
+                        self.trace_logdir)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Method to get the timing of every span
+
+        Returns:
+          Dict[str, Dict[str, float]]: count, total and longest seconds of
+          each span
+        """
+        with self._lock:
+            return {name: dataclasses.asdict(stats)
+                    for name, stats in self.spans.items()}
+
+
+def span(profiler: Optional[RenderProfiler],
+         name: str) -> contextlib.AbstractContextManager:
+    """
+    Method to time a block when profiling
+
+    Args:
+      profiler (RenderProfiler, optional): the render profiler, None to not
+      profile
+      name (str): the span name
+
+    Returns:
+      contextlib.AbstractContextManager: context of the block
+    """
+    return contextlib.nullcontext() if profiler is None \
+        else profiler.span(name)
+
+
+def trace(profiler: Optional[RenderProfiler]
+          ) -> contextlib.AbstractContextManager:
+    """
+    Method to capture a tensorflow profiler trace of a block when the
+    profiler traces
+
+    Args:
+      profiler (RenderProfiler, optional): the render profiler, None to not
+      trace
+
+    Returns:
+      contextlib.AbstractContextManager: context of the block
+    """
+    return contextlib.nullcontext(False) if profiler is None \
+        else profiler.trace()
+
+
+def job_profiler(job_id: str) -> Optional[RenderProfiler]:
+    """
+    Method to get the profiler of a render job by the deployment settings,
+    the job is traced with the tensorflow profiler if sampled
+
+    Args:
+      job_id (str): the render job id
+
+    Returns:
+      Optional[RenderProfiler]: the profiler, None if the job is not
+      profiled
+    """
+    traced: bool = trace_sample_rate > 0 and \
+        random.random() < trace_sample_rate
+    if not (profile_renders or loss_log_every or traced):
+        return None
+    return RenderProfiler(loss_log_every,
+                          os.path.join(trace_dir, job_id) if traced else None)
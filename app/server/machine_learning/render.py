@@ -0,0 +1,562 @@
+"""
+Render orchestration. optimization renders run the phases of the render
+schedule at each level of a coarse to fine pyramid, every level continues
+from the upsampled image of the previous level, or from the previous render
+of the same images when warm started. single pass engines render in one
+forward pass.
+"""
+
+
+import time
+import functools
+import numpy as np
+import tensorflow as tf
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Callable, Optional
+from PIL import Image
+from server.machine_learning import style_transfer, fast_style, adain
+from server.machine_learning.engines import (OPTIMIZATION_ENGINE, STOPPED,
+                                             CONVERGED, STEP_BUDGET,
+                                             TIME_BUDGET)
+from server.machine_learning.profiling import RenderProfiler, span
+from server.machine_learning.style_transfer import (StyleContentModel,
+                                                    RenderOptions,
+                                                    RenderProgress,
+                                                    PyramidLevel,
+                                                    PhaseTrace,
+                                                    RenderReport)
+from server.machine_learning.target_cache import image_hash
+
+
+@dataclass
+class RenderPhase:
+    """
+    Class of a phase in the optimization schedule of a render
+
+    Attributes:
+      name (str): the phase name
+      epochs (int): number of epochs in phase
+      total_variation_weight (float, optional): the total variation weight,
+      None to optimize without total variation consideration
+    """
+    name: str
+    epochs: int
+    total_variation_weight: Optional[float] = None
+
+
+class ConvergenceDetector: # pylint: disable=R0903
+    """
+    Class to detect that the loss stopped improving, by the relative
+    improvement of the loss over a window of steps
+    """
+    def __init__(self, window: int, tolerance: float):
+        """
+        Initialization Method
+
+        Args:
+          window (int): number of steps to measure improvement over
+          tolerance (float): minimal relative improvement over window
+        """
+        self.window: int = window
+        self.tolerance: float = tolerance
+        self._samples: deque = deque()
+
+    def update(self, step: int, loss: float) -> bool:
+        """
+        Method to add a loss sample
+
+        Args:
+          step (int): the step of the sample
+          loss (float): the loss of the step
+
+        Returns:
+          bool: True if loss improved less than tolerance over the window
+        """
+        self._samples.append((step, loss))
+        # keep the latest sample at least window steps old
+        while len(self._samples) > 1 and \
+                step - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+        old_step, old_loss = self._samples[0]
+        if step - old_step < self.window or old_loss <= 0:
+            return False
+        return (old_loss - loss) / old_loss < self.tolerance
+
+
+def render_schedule(epochs_without_variation: int,
+                    epochs_with_variation: int,
+                    total_variation_weight: float) -> List[RenderPhase]:
+    """
+    Method to create the optimization schedule of a render. each phase
+    continues from the image of the previous phase.
+
+    Args:
+      epochs_without_variation (int): number of epochs to perform without
+      total variation consideration
+      epochs_with_variation(int): number of epochs to perform with
+      total variation consideration
+      total_variation_weight (float): the total variation weight
+
+    Returns:
+      List[RenderPhase]: the phases to execute, in order
+    """
+    phases: List[RenderPhase] = [
+        RenderPhase('without_variation', epochs_without_variation),
+        RenderPhase('with_variation', epochs_with_variation,
+                    total_variation_weight)]
+    # skip empty phases
+    return [phase for phase in phases if phase.epochs > 0]
+
+
+def pyramid_levels(dims: Tuple[int, ...] = (128, 256, 512)
+                   ) -> List[PyramidLevel]:
+    """
+    Method to create the levels of a coarse to fine render, each level runs
+    half the steps of the previous (coarser) level
+
+    Args:
+      dims (Tuple[int, ...]): maximum dimension of each level, coarse to
+      fine, the last is the output resolution
+
+    Returns:
+      List[PyramidLevel]: the levels to render, in order
+    """
+    weights: List[float] = [2.0 ** -i for i in range(len(dims))]
+    return [PyramidLevel(dim, weight / sum(weights))
+            for dim, weight in zip(dims, weights)]
+
+
+def upsample_image(image: tf.Tensor, shape: tf.TensorShape) -> tf.Tensor:
+    """
+    Method to resize a rendered image to the image shape of another level
+
+    Args:
+      image (tf.Tensor): the rendered image
+      shape (tf.TensorShape): the shape of the next level image
+
+    Returns:
+      tf.Tensor: the resized image
+    """
+    return style_transfer.clip_0_1(tf.image.resize(image, shape[1:3]))
+
+
+def load_level_image(image: np.ndarray, max_dim: int,
+                     digest: Optional[str] = None,
+                     use_session_store: bool = True) -> tf.Tensor:
+    """
+    Method to load an image at the resolution of a level, from the session
+    store when possible
+
+    Args:
+      image (np.ndarray): the rgb image
+      max_dim (int): maximum dimension of the level
+      digest (str, optional): the already computed image hash
+      use_session_store (bool): reuse the resized image of the session
+
+    Returns:
+      tf.Tensor: the loaded image
+    """
+    if not use_session_store:
+        return style_transfer.load_img(image, max_dim)
+    return style_transfer.session_store.get_or_compute(
+        'image', (digest, max_dim),
+        functools.partial(style_transfer.load_img, image, max_dim))
+
+
+def train_step(image: tf.Variable, extractor: StyleContentModel, # pylint: disable=R0913
+               opt: tf.optimizers.Adam, style_targets: Dict[str, tf.Tensor],
+               content_targets: Dict[str, tf.Tensor], style_weight: float,
+               content_weight: float, phase: RenderPhase,
+               run_eagerly: bool = False,
+               profiler: Optional[RenderProfiler] = None) -> tf.Tensor:
+    """
+    Method to apply a training step of a phase
+
+    Args:
+      image (tf.Variable): the rendered image
+      extractor (StyleContentModel): the intermidate layer extractor
+      opt (tf.optimizers.Adam): the optimizer
+      style_targets (Dict[str, tf.Tensor]): the style intermidate outputs
+      content_targets (Dict[str, tf.Tensor]): the content intermidate outputs
+      style_weight (float): the style weight
+      content_weight (float): the content weight
+      phase (RenderPhase): the running phase
+      run_eagerly (bool): run the step eagerly instead of traced
+      profiler (RenderProfiler, optional): the render profiler
+
+    Returns:
+      tf.Tensor: the step loss
+    """
+    num_style_layers: int = len(extractor.style_layers)
+    num_content_layers: int = len(extractor.content_layers)
+    if phase.total_variation_weight is None:
+        # perform optimization without total variation
+        return style_transfer.train_step_without_variation_loss(
+            image, extractor, opt, style_targets, content_targets,
+            num_style_layers, num_content_layers, style_weight,
+            content_weight, run_eagerly, profiler)
+    # perform optimization with total variation
+    return style_transfer.train_step_with_variation_loss(
+        image, extractor, opt, style_targets, content_targets,
+        num_style_layers, num_content_layers, style_weight, content_weight,
+        phase.total_variation_weight, run_eagerly, profiler)
+
+
+def stop_reason(should_stop: Optional[Callable[[], bool]],
+                max_seconds: Optional[float],
+                optimize_start: float) -> Optional[str]:
+    """
+    Method to check if a render should stop before the end of its schedule,
+    checked every progress_every steps
+
+    Args:
+      should_stop (Callable[[], bool], optional): returns True when the
+      render is asked to stop
+      max_seconds (float, optional): maximum optimization wall time
+      optimize_start (float): perf counter of the first optimization step
+
+    Returns:
+      Optional[str]: STOPPED if asked to stop, TIME_BUDGET if out of time,
+      None to go on
+    """
+    if should_stop is not None and should_stop():
+        # stop early with current image if asked to
+        return STOPPED
+    if max_seconds is not None and \
+            time.perf_counter() - optimize_start >= max_seconds:
+        return TIME_BUDGET
+    return None
+
+
+class OptimizationRender:
+    """
+    Class of the optimization of a render, runs the phases of the render
+    schedule on the image of each level and reports the steps, losses,
+    progress and previews of the render
+    """
+    def __init__(self, extractor: StyleContentModel, style_weight: float,
+                 content_weight: float, options: RenderOptions,
+                 report: RenderReport, total_steps: int):
+        """
+        Initialization Method
+
+        Args:
+          extractor (StyleContentModel): the intermidate layer extractor
+          style_weight (float): the style weight
+          content_weight (float): the content weight
+          options (RenderOptions): the render settings
+          report (RenderReport): the report of the render
+          total_steps (int): steps in render schedule
+        """
+        self.extractor: StyleContentModel = extractor
+        self.style_weight: float = style_weight
+        self.content_weight: float = content_weight
+        self.options: RenderOptions = options
+        self.report: RenderReport = report
+        self.total_steps: int = total_steps
+        self.optimize_start: Optional[float] = None
+
+    def run_level(self, image: tf.Variable, # pylint: disable=R0913
+                  style_targets: Dict[str, tf.Tensor],
+                  content_targets: Dict[str, tf.Tensor],
+                  schedule: List[RenderPhase], steps_per_epoch: int,
+                  max_dim: int) -> None:
+        """
+        Method to run the schedule on the image of a level, until its end or
+        the render stops
+
+        Args:
+          image (tf.Variable): the rendered image of the level
+          style_targets (Dict[str, tf.Tensor]): the style intermidate outputs
+          content_targets (Dict[str, tf.Tensor]): the content intermidate
+          outputs
+          schedule (List[RenderPhase]): the phases to execute
+          steps_per_epoch (int): number of steps in each epoch of the level
+          max_dim (int): maximum dimension of the level
+        """
+        # create optimizer for gradient decent
+        opt: tf.optimizers.Adam = tf.optimizers.Adam(learning_rate=0.02,
+                                                     beta_1=0.99,
+                                                     epsilon=1e-1)
+        if self.optimize_start is None:
+            self.optimize_start = time.perf_counter()
+
+        for phase in schedule:
+            trace: PhaseTrace = PhaseTrace(phase.name, max_dim=max_dim)
+            self.report.phases.append(trace)
+            phase_start: float = time.perf_counter()
+            # losses of different phases are not comparable
+            detector: ConvergenceDetector = ConvergenceDetector(
+                self.options.convergence_window,
+                self.options.convergence_tolerance)
+
+            for epoch in range(1, phase.epochs + 1):
+                for _ in range(steps_per_epoch):
+                    with span(self.options.profiler, 'step'):
+                        loss: tf.Tensor = train_step(
+                            image, self.extractor, opt, style_targets,
+                            content_targets, self.style_weight,
+                            self.content_weight, phase,
+                            self.options.run_eagerly, self.options.profiler)
+                    trace.steps += 1
+                    trace.stop_reason = self.after_step(
+                        image, loss, phase, epoch, trace, detector)
+                    if trace.stop_reason is not None:
+                        break
+
+                # read epoch loss (waits for the epoch steps to finish)
+                if trace.steps > 0:
+                    trace.losses.append(float(loss))
+                if trace.stop_reason is not None:
+                    break
+
+            trace.seconds = time.perf_counter() - phase_start
+            if self.options.profiler is not None:
+                self.options.profiler.record(f'phase/{phase.name}',
+                                             trace.seconds)
+            if self.report.stop_reason is not None:
+                break
+
+    def after_step(self, image: tf.Variable, loss: tf.Tensor, # pylint: disable=R0913
+                   phase: RenderPhase, epoch: int, trace: PhaseTrace,
+                   detector: ConvergenceDetector) -> Optional[str]:
+        """
+        Method to log, preview and report the progress of a step, and check
+        if its phase should stop
+
+        Args:
+          image (tf.Variable): the rendered image
+          loss (tf.Tensor): the step loss
+          phase (RenderPhase): the running phase
+          epoch (int): epoch in phase (starting from 1)
+          trace (PhaseTrace): the trace of the running phase
+          detector (ConvergenceDetector): the phase convergence detector
+
+        Returns:
+          Optional[str]: why the phase stops, the render stop reason or
+          CONVERGED, None to go on
+        """
+        options: RenderOptions = self.options
+        report: RenderReport = self.report
+        if options.profiler is not None:
+            options.profiler.log_loss(phase.name, report.steps, loss)
+
+        # snapshot rendered image
+        if options.preview_callback is not None and \
+                report.steps % options.preview_every == 0:
+            options.preview_callback(report.steps,
+                                     style_transfer.tensor_to_image(image))
+
+        if options.max_steps is not None and \
+                report.steps >= options.max_steps:
+            report.stop_reason = STEP_BUDGET
+        elif report.steps % options.progress_every == 0:
+            # reading loss waits for the step
+            step_loss: float = float(loss)
+            if options.progress_callback is not None:
+                options.progress_callback(RenderProgress(
+                    phase.name, epoch, report.steps, self.total_steps,
+                    step_loss))
+
+            report.stop_reason = stop_reason(options.should_stop,
+                                             options.max_seconds,
+                                             self.optimize_start)
+            if report.stop_reason is None and \
+                    options.convergence_window > 0 and \
+                    detector.update(trace.steps, step_loss):
+                # move on to next phase
+                return CONVERGED
+        return report.stop_reason
+
+
+def render_single_pass(content_image: np.ndarray, style_image: np.ndarray,
+                       engine: str, style_id: Optional[str] = None
+                       ) -> Tuple[Image, RenderReport]:
+    """
+    Method to render with a single forward pass engine
+
+    Args:
+      content_image (np.ndarray): the content image
+      style_image (np.ndarray): the style image
+      engine (str): 'fast' or 'adain'
+      style_id (str, optional): id of the style image, for the fast engine
+
+    Raises:
+      ValueError: if engine is unknown or style has no fast style model
+
+    Returns:
+      Tuple[Image, RenderReport]: the rendered image and render report
+    """
+    if engine == fast_style.FAST_ENGINE:
+        model: Optional[fast_style.TransformerNet] = \
+            fast_style.fast_style_registry.get(style_id) \
+            if style_id is not None else None
+        if model is None:
+            raise ValueError('No fast style model trained for style')
+        return fast_style.render_fast_with_report(content_image, model)
+    if engine == adain.ADAIN_ENGINE:
+        return adain.render_adain_with_report(content_image, style_image)
+    raise ValueError(f'Unknown render engine {engine}')
+
+
+def render_image(content_image: np.ndarray, style_image: np.ndarray, # pylint: disable=R0913
+                 content_layers: List[str], style_layers: List[str],
+                 style_weight: float, content_weight: float,
+                 total_variation_weight: float, epochs_without_variation: int,
+                 epochs_with_variation: int, steps_per_epoch: int,
+                 options: RenderOptions = None) -> Image:
+    """
+    Method to render neural style transfer from style and content
+
+    Args:
+      content_image (np.ndarray): the content image
+      style_image (np.ndarray): the style image
+      content_layers (List[str]): the conten intermediate layers
+      style_layers (List[str]): the style intermediate layers
+      style_weight (float): the style weight
+      content_weight (float): the content weight
+      total_variation_weight (float): the total variation weight
+      epochs_without_variation (int): number of epochs to perform without
+      total variation consideration
+      epochs_with_variation(int): number of epochs to perform with
+      total variation consideration
+      steps_per_epoch(int): number of steps in each epoch
+      options (RenderOptions, optional): optional render settings
+
+    Returns:
+      Image: the rendered image
+    """
+    image, _ = render_image_with_report(
+        content_image, style_image, content_layers, style_layers,
+        style_weight, content_weight, total_variation_weight,
+        epochs_without_variation, epochs_with_variation, steps_per_epoch,
+        options)
+    return image
+
+
+def render_image_with_report(content_image: np.ndarray, # pylint: disable=R0913,R0914
+                             style_image: np.ndarray,
+                             content_layers: List[str],
+                             style_layers: List[str],
+                             style_weight: float, content_weight: float,
+                             total_variation_weight: float,
+                             epochs_without_variation: int,
+                             epochs_with_variation: int,
+                             steps_per_epoch: int,
+                             options: RenderOptions = None
+                             ) -> Tuple[Image, RenderReport]:
+    """
+    Method to render neural style transfer from style and content, and
+    report the time and loss of each phase
+
+    Args:
+      content_image (np.ndarray): the content image
+      style_image (np.ndarray): the style image
+      content_layers (List[str]): the conten intermediate layers
+      style_layers (List[str]): the style intermediate layers
+      style_weight (float): the style weight
+      content_weight (float): the content weight
+      total_variation_weight (float): the total variation weight
+      epochs_without_variation (int): number of epochs to perform without
+      total variation consideration
+      epochs_with_variation(int): number of epochs to perform with
+      total variation consideration
+      steps_per_epoch(int): number of steps in each epoch
+      options (RenderOptions, optional): optional render settings
+
+    Returns:
+      Tuple[Image, RenderReport]: the rendered image and render report
+    """
+    # use default options if none given
+    options: RenderOptions = options or RenderOptions()
+    if options.engine != OPTIMIZATION_ENGINE:
+        return render_single_pass(content_image, style_image, options.engine,
+                                  options.style_id)
+    report: RenderReport = RenderReport()
+    setup_start: float = time.perf_counter()
+
+    # get shared extractor
+    extractor: StyleContentModel = style_transfer.extractor_registry.get(
+        style_layers, content_layers,
+        style_transfer.resolve_precision(options.precision))
+
+    # render at full resolution unless a pyramid is given
+    levels: List[PyramidLevel] = options.pyramid or [PyramidLevel(512, 1.0)]
+
+    # images are hashed once, keys of session entries and targets
+    content_digest: Optional[str] = None
+    style_digest: Optional[str] = None
+    if options.use_session_store or options.use_target_cache:
+        content_digest = image_hash(content_image)
+        style_digest = image_hash(style_image)
+    output_key: Tuple[str, ...] = (content_digest, style_digest,
+                                   str(levels[-1].max_dim),
+                                   extractor.precision)
+    image: Optional[tf.Variable] = \
+        style_transfer.session_store.get('output', output_key) \
+        if options.warm_start and options.use_session_store else None
+    if image is not None:
+        # the previous render is already stylized, refine at full resolution
+        levels = levels[-1:]
+        report.warm_started = True
+
+    schedule: List[RenderPhase] = render_schedule(epochs_without_variation,
+                                                  epochs_with_variation,
+                                                  total_variation_weight)
+    level_steps: List[int] = [int(round(steps_per_epoch * level.step_share))
+                              for level in levels]
+    total_steps: int = sum(steps * phase.epochs for steps in level_steps
+                           for phase in schedule)
+    if options.max_steps is not None:
+        total_steps = min(total_steps, options.max_steps)
+    optimization: OptimizationRender = OptimizationRender(
+        extractor, style_weight, content_weight, options, report, total_steps)
+    image_dim: int = levels[-1].max_dim
+
+    for level, level_steps_per_epoch in zip(levels, level_steps):
+        # load content image, style image is only loaded if its targets are
+        # not cached
+        loaded_content: tf.Tensor = load_level_image(
+            content_image, level.max_dim, content_digest,
+            options.use_session_store)
+
+        # get style content outputs
+        style_targets: Dict[str, tf.Tensor] = style_transfer.get_targets(
+            extractor, 'style', style_image, level.max_dim,
+            use_cache=options.use_target_cache, digest=style_digest)
+        content_targets: Dict[str, tf.Tensor] = style_transfer.get_targets(
+            extractor, 'content', content_image, level.max_dim,
+            loaded_image=loaded_content, use_cache=options.use_target_cache,
+            digest=content_digest)
+
+        # define a tf.Variable to contain the image to optimize, every level
+        # continues from the upsampled image of the previous level (or
+        # previous render when warm started)
+        image = tf.Variable(loaded_content if image is None else
+                            upsample_image(image, loaded_content.shape))
+        image_dim = level.max_dim
+        level_setup_seconds: float = time.perf_counter() - setup_start
+        report.setup_seconds += level_setup_seconds
+        if options.profiler is not None:
+            options.profiler.record('setup', level_setup_seconds)
+
+        optimization.run_level(image, style_targets, content_targets,
+                               schedule, level_steps_per_epoch, level.max_dim)
+        if report.stop_reason is not None:
+            break
+        setup_start = time.perf_counter()
+
+    # a render stopped at a coarse level still has the output resolution
+    if image_dim != levels[-1].max_dim:
+        image = upsample_image(image, style_transfer.load_img(
+            content_image, levels[-1].max_dim).shape)
+    elif options.use_session_store:
+        # next render of these images with other weights can warm start
+        style_transfer.session_store.put('output', output_key,
+                                         tf.convert_to_tensor(image))
+
+    if options.profiler is not None:
+        report.spans = options.profiler.summary()
+    return style_transfer.tensor_to_image(image), report
@@ -1,40 +1,233 @@
-
 """
 Style transfer model
 """
 
 
+import os
+import logging
+import weakref
+import functools
+import threading
+import h5py
 import numpy as np
 import tensorflow as tf
-from typing import List, Dict, Tuple
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Callable, Optional
 from PIL import Image
+from server.machine_learning.engines import (OPTIMIZATION_ENGINE,
+                                             default_precision)
+from server.machine_learning import frozen_extractor
+from server.machine_learning.model_registry import ModelRegistry
+from server.machine_learning.profiling import RenderProfiler, span
+from server.machine_learning.target_cache import TargetCache, target_key
+from server.services.session_store import SessionStore
+
+
+# logger of style transfer
+logger: logging.Logger = logging.getLogger(__name__)
+
+# extractor compute precisions, by keras mixed precision policy. weights,
+# gram matrices and losses stay float32 in every precision
+PRECISION_POLICIES: Dict[str, str] = {'float32': 'float32',
+                                      'bfloat16': 'mixed_bfloat16',
+                                      'float16': 'mixed_float16'}
+
+# keras policy is global, build layers of one precision at a time
+_policy_lock: threading.Lock = threading.Lock()
+
+# convolution filters of each VGG19 block, every block ends with pooling
+vgg19_blocks: List[Tuple[int, int]] = [(64, 2), (128, 2), (256, 4), (512, 4),
+                                       (512, 4)]
+
+# imagenet weights of the VGG19 convolutional stack, shared with the keras
+# applications cache
+vgg19_weights_url: str = ('https://storage.googleapis.com/tensorflow/'
+                          'keras-applications/vgg19/'
+                          'vgg19_weights_tf_dim_ordering_tf_kernels_notop.h5')
+vgg19_weights_hash: str = '253f8cb515780f3b799900260a226db6'
 
+# build vgg only up to the deepest requested layer
+truncate_vgg: bool = os.environ.get('HSTYLE_TRUNCATE_VGG', '1') == '1'
 
-def load_img(img: np.ndarray) -> tf.Tensor:
+
+@dataclass
+class RenderProgress:
+    """
+    Class of the progress of a render
+
+    Attributes:
+      phase (str): name of the running phase
+      epoch (int): epoch in phase (starting from 1)
+      step (int): steps executed in render
+      total_steps (int): steps in render schedule
+      loss (float): loss of the last step
     """
-    Function to load an image and limit its maximum dimension to 512 pixels
+    phase: str
+    epoch: int
+    step: int
+    total_steps: int
+    loss: float
+
+
+@dataclass
+class RenderOptions:
+    """
+    Class to hold optional settings of a render
+
+    Attributes:
+      run_eagerly (bool): run the training steps eagerly instead of as
+      traced graphs (for debugging)
+      use_target_cache (bool): reuse style and content targets of images
+      that were already rendered
+      progress_callback (Callable[[RenderProgress], None], optional): called
+      with the render progress every progress_every steps
+      progress_every (int): number of steps between progress reports (and
+      should_stop checks)
+      preview_callback (Callable[[int, Image], None], optional): called
+      with the step and a snapshot of the rendered image every
+      preview_every steps
+      preview_every (int): number of steps between previews
+      should_stop (Callable[[], bool], optional): checked every
+      progress_every steps, render stops with the current image when it
+      returns True
+      convergence_window (int): number of steps the loss must improve over
+      for a phase to continue, 0 to run every phase to its end
+      convergence_tolerance (float): minimal relative loss improvement over
+      convergence_window steps
+      max_steps (int, optional): maximum number of steps in render
+      max_seconds (float, optional): maximum optimization wall time
+      pyramid (List[PyramidLevel], optional): resolution levels to render
+      from coarse to fine, None to render at full resolution only
+      precision (str, optional): extractor compute precision ('float32',
+      'bfloat16' or 'float16'), the deployment default if not given
+      use_session_store (bool): reuse resized images of images that were
+      rendered in the session
+      warm_start (bool): start from the previous render of the same content
+      and style images in the session instead of the content image
+      engine (str): 'optimization' to optimize the image, 'fast' for the
+      trained fast style model of the style or 'adain' for a single pass
+      of the AdaIN model (single pass engines ignore the loss weights and
+      schedule)
+      style_id (str, optional): id of the style image, the digest of its
+      file, the fast engine renders the model trained for it
+      profiler (RenderProfiler, optional): records timing spans of the
+      phases and steps and logs the loss, None to not profile
+    """
+    run_eagerly: bool = False
+    use_target_cache: bool = True
+    progress_callback: Optional[Callable[[RenderProgress], None]] = None
+    progress_every: int = 10
+    preview_callback: Optional[Callable[[int, Image.Image], None]] = None
+    preview_every: int = 100
+    should_stop: Optional[Callable[[], bool]] = None
+    convergence_window: int = 0
+    convergence_tolerance: float = 1e-3
+    max_steps: Optional[int] = None
+    max_seconds: Optional[float] = None
+    pyramid: Optional[List['PyramidLevel']] = None
+    precision: Optional[str] = None
+    use_session_store: bool = True
+    warm_start: bool = False
+    engine: str = OPTIMIZATION_ENGINE
+    style_id: Optional[str] = None
+    profiler: Optional[RenderProfiler] = None
+
+
+@dataclass
+class PyramidLevel:
+    """
+    Class of a resolution level of a coarse to fine render
+
+    Attributes:
+      max_dim (int): maximum dimension of the image at this level
+      step_share (float): share of the steps of each epoch run at this level
+    """
+    max_dim: int
+    step_share: float
+
+
+@dataclass
+class PhaseTrace:
+    """
+    Class of the timing and loss trace of an executed render phase
+
+    Attributes:
+      name (str): the phase name
+      steps (int): number of steps executed
+      seconds (float): wall time of the phase
+      losses (List[float]): loss at the end of each epoch
+      stop_reason (str, optional): why the phase stopped before its last
+      epoch, None if it ran all steps
+      max_dim (int): maximum dimension of the image in phase
+    """
+    name: str
+    steps: int = 0
+    seconds: float = 0.0
+    losses: List[float] = field(default_factory=list)
+    stop_reason: Optional[str] = None
+    max_dim: int = 512
+
+
+@dataclass
+class RenderReport:
+    """
+    Class of the report of a render
+
+    Attributes:
+      setup_seconds (float): time to load images and compute targets
+      phases (List[PhaseTrace]): trace of every executed phase
+      stop_reason (str, optional): why the render stopped before the end
+      of its schedule (stopped, step_budget or time_budget), None if it ran
+      every phase until its end or convergence
+      engine (str): the engine that rendered the image
+      warm_started (bool): the render started from a previous render
+      spans (Dict[str, Dict[str, float]]): count, total and longest seconds
+      of each timing span, empty if the render was not profiled
+    """
+    setup_seconds: float = 0.0
+    phases: List[PhaseTrace] = field(default_factory=list)
+    stop_reason: Optional[str] = None
+    engine: str = OPTIMIZATION_ENGINE
+    warm_started: bool = False
+    spans: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @property
+    def steps(self) -> int:
+        """
+        Total number of executed steps
+
+        Returns:
+          int: number of steps
+        """
+        return sum(phase.steps for phase in self.phases)
+
+
+def load_img(img: np.ndarray, max_dim: int = 512) -> tf.Tensor:
+    """
+    Function to load an image and limit its maximum dimension to max_dim
+    pixels
 
     Args:
       img (np.ndarray): an rgb image
+      max_dim (int): maximum dimension of the loaded image
 
     Returns:
       tf.Tensor: a tensor that represents an image
     """
-    # set max dimensions
-    max_dim: int = 512
-    # convert to float, each val between [0,1]
-    img: tf.Tensor = tf.convert_to_tensor(img, dtype=tf.float32)
-    img /= 255
+    # uint8 images are resized before converting to float, so the full size
+    # image is never copied as float
+    img: tf.Tensor = tf.convert_to_tensor(img)
     # get image width and height
     shape: tf.Tensor = tf.cast(tf.shape(img)[:-1], tf.float32)
     # get max height or width
     long_dim: tf.Tensor = max(shape)
-    # get the ratio scale to 512
+    # get the ratio scale to max dimension
     scale: tf.Tensor = max_dim / long_dim
     # get the new image shape by scale ratio
     new_shape: tf.Tensor = tf.cast(shape * scale, tf.int32)
-    # resize image
-    img: tf.Tensor = tf.image.resize(img, new_shape)
+    # resize image and convert to float, each val between [0,1]
+    img: tf.Tensor = tf.cast(tf.image.resize(img, new_shape),
+                             tf.float32) / 255
     # expand dimension to image array
     img: tf.Tensor = img[tf.newaxis, :]
     return img
@@ -62,29 +255,162 @@ def tensor_to_image(tensor: tf.Tensor) -> Image:
     return Image.fromarray(tensor)
 
 
-def vgg_layers(layer_names: List[str]) -> tf.keras.Model:
+@functools.lru_cache(maxsize=1)
+def supported_precisions() -> List[str]:
+    """
+    Method to get the compute precisions the hardware runs natively
+
+    Returns:
+      List[str]: the precisions, float32 is always supported
+    """
+    precisions: List[str] = ['float32']
+    flags: List[str] = []
+    try:
+        with open('/proc/cpuinfo', encoding='utf-8') as cpuinfo:
+            flags = next((line.split(':', 1)[1].split() for line in cpuinfo
+                          if line.startswith('flags')), [])
+    except OSError:
+        pass
+    if 'avx512_bf16' in flags or 'amx_bf16' in flags:
+        precisions.append('bfloat16')
+    # cpus emulate float16, only gpus run it faster than float32
+    if tf.config.list_physical_devices('GPU'):
+        precisions.append('float16')
+    return precisions
+
+
+def resolve_precision(precision: Optional[str] = None) -> str:
+    """
+    Method to get the precision to compute with, falling back to float32
+    when the hardware does not support the requested precision
+
+    Args:
+      precision (str, optional): the requested precision, the deployment
+      default if not given
+
+    Raises:
+      ValueError: if precision is unknown
+
+    Returns:
+      str: the precision
+    """
+    precision: str = precision or default_precision
+    if precision not in PRECISION_POLICIES:
+        raise ValueError(f'Unknown precision {precision}')
+    if precision not in supported_precisions():
+        logger.warning('%s is not supported by this machine, using float32',
+                       precision)
+        return 'float32'
+    return precision
+
+
+def vgg19_layer_names() -> List[str]:
+    """
+    Method to get the names of the VGG19 convolutional stack layers in order
+
+    Returns:
+      List[str]: the layer names, without the input layer
+    """
+    return [name for block, (_, convs) in enumerate(vgg19_blocks, 1)
+            for name in [f'block{block}_conv{conv}'
+                         for conv in range(1, convs + 1)] +
+            [f'block{block}_pool']]
+
+
+def truncated_vgg19(deepest_layer: str) -> tf.keras.Model:
+    """
+    Method to create the VGG19 convolutional stack up to a layer, loading
+    only the imagenet weights of the created layers
+
+    Args:
+      deepest_layer (str): the last layer to create
+
+    Raises:
+      ValueError: if deepest_layer is not a VGG19 layer
+
+    Returns:
+      tf.keras.Model: the truncated vgg with VGG19 layer names
+    """
+    names: List[str] = vgg19_layer_names()
+    if deepest_layer not in names:
+        raise ValueError(f'Unknown VGG19 layer {deepest_layer}')
+    names = names[:names.index(deepest_layer) + 1]
+
+    inputs: tf.Tensor = tf.keras.Input(shape=(None, None, 3))
+    outputs: tf.Tensor = inputs
+    filters: Dict[str, int] = {
+        f'block{block}_conv{conv}': block_filters
+        for block, (block_filters, convs) in enumerate(vgg19_blocks, 1)
+        for conv in range(1, convs + 1)}
+    for name in names:
+        if name.endswith('pool'):
+            outputs = tf.keras.layers.MaxPooling2D(
+                (2, 2), strides=(2, 2), name=name)(outputs)
+        else:
+            outputs = tf.keras.layers.Conv2D(
+                filters[name], (3, 3), activation='relu', padding='same',
+                name=name)(outputs)
+    vgg: tf.keras.Model = tf.keras.Model(inputs, outputs, name='vgg19')
+
+    # read the weights of the created layers only, h5 datasets are read
+    # when indexed so the deeper layers are never loaded
+    with h5py.File(tf.keras.utils.get_file(
+            'vgg19_weights_tf_dim_ordering_tf_kernels_notop.h5',
+            vgg19_weights_url, cache_subdir='models',
+            file_hash=vgg19_weights_hash), 'r') as weights_file:
+        for name in names:
+            if name.endswith('pool'):
+                continue
+            group: h5py.Group = weights_file[name]
+            vgg.get_layer(name).set_weights([
+                np.asarray(group[weight_name])
+                for weight_name in group.attrs['weight_names']])
+    return vgg
+
+
+def vgg_layers(layer_names: List[str], precision: str = 'float32',
+               truncate: Optional[bool] = None) -> tf.keras.Model:
     """
     Method to Creates a vgg model that returns a list of intermediate output
     values.
 
     Args:
       layer_names (list[str]): intermediate layer names for output
+      precision (str): compute precision of the layers, weights are kept
+      in float32
+      truncate (bool, optional): create vgg only up to the deepest layer
+      of layer_names instead of the whole convolutional stack, the
+      deployment default if not given
 
     Returns:
        tf.keras.Model: a vgg model that returns a list of intermediate
        output values
     """
-    # Load pretrained VGG, trained on imagenet data
-    vgg: tf.keras.Model = tf.keras.applications.VGG19(include_top=False,
-                                                      weights='imagenet')
-    # set layers to not be trained
-    vgg.trainable = False
-
-    # get the outputs of each intermediate layer
-    outputs = [vgg.get_layer(name).output for name in layer_names]
-
-    # return functional API
-    return tf.keras.Model([vgg.input], outputs)
+    truncate: bool = truncate_vgg if truncate is None else truncate
+    with _policy_lock:
+        previous_policy: tf.keras.mixed_precision.Policy = \
+            tf.keras.mixed_precision.global_policy()
+        tf.keras.mixed_precision.set_global_policy(
+            PRECISION_POLICIES[precision])
+        try:
+            # Load pretrained VGG, trained on imagenet data
+            vgg: tf.keras.Model
+            if truncate:
+                order: List[str] = vgg19_layer_names()
+                vgg = truncated_vgg19(max(layer_names, key=order.index))
+            else:
+                vgg = tf.keras.applications.VGG19(include_top=False,
+                                                  weights='imagenet')
+            # set layers to not be trained
+            vgg.trainable = False
+
+            # get the outputs of each intermediate layer
+            outputs = [vgg.get_layer(name).output for name in layer_names]
+
+            # return functional API
+            return tf.keras.Model([vgg.input], outputs)
+        finally:
+            tf.keras.mixed_precision.set_global_policy(previous_policy)
 
 
 def gram_matrix(input_tensor: tf.Tensor) -> tf.Tensor:
@@ -117,17 +443,22 @@ class StyleContentModel(tf.keras.models.Model): # pylint: disable=W0223
     """
     Class to get the content and style from model
     """
-    def __init__(self, style_layers: List[str], content_layers: List[str]):
+    def __init__(self, style_layers: List[str], content_layers: List[str],
+                 precision: str = 'float32'):
         """
         Initialization Method
 
         Args:
           style_layers (List[str]): the style intermidate layers
           content_layers (List[str]): the content intermidate layers
+          precision (str): compute precision of the vgg forward and
+          backward pass
         """
 
         super(StyleContentModel, self).__init__()
-        self.vgg: tf.keras.Model = vgg_layers(style_layers + content_layers)
+        self.precision: str = precision
+        self.vgg: tf.keras.Model = vgg_layers(style_layers + content_layers,
+                                              precision)
         self.vgg.trainable = False
         self.style_layers: List[str] = style_layers
         self.num_style_layers: int = len(style_layers)
@@ -153,16 +484,19 @@ class StyleContentModel(tf.keras.models.Model): # pylint: disable=W0223
         preprocessed_input: tf.Tensor = tf.keras.applications.\
             vgg19.preprocess_input(inputs)
 
-        # forward pass content and style images
-        outputs: List[tf.Tensor] = self.vgg(preprocessed_input)
+        # forward pass content and style images, gram matrices and losses
+        # accumulate in float32 whatever the vgg precision
+        outputs: List[tf.Tensor] = [tf.cast(output, tf.float32)
+                                    for output in self.vgg(preprocessed_input)]
 
         # get the outputs of content and style from the forward pass
         style_outputs, content_outputs = (outputs[:self.num_style_layers],
                                           outputs[self.num_style_layers:])
 
         # calculate gram matrix for style outputs
-        style_outputs: List[tf.Tensor] = [gram_matrix(style_output)
-                                          for style_output in style_outputs]
+        with tf.name_scope('gram_matrix'):
+            style_outputs: List[tf.Tensor] = [
+                gram_matrix(style_output) for style_output in style_outputs]
 
         # create dict where key is layer name and value is output
         content_dict = {content_name: value
@@ -177,6 +511,82 @@ class StyleContentModel(tf.keras.models.Model): # pylint: disable=W0223
         return {'content': content_dict, 'style': style_dict}
 
 
+def build_extractor(style_layers: List[str], content_layers: List[str],
+                    precision: str = 'float32') -> StyleContentModel:
+    """
+    Method to create an extractor, loaded from the exported extractor when
+    it was exported with the same layers and precision
+
+    Args:
+      style_layers (List[str]): the style intermidate layers
+      content_layers (List[str]): the content intermidate layers
+      precision (str): compute precision of the vgg forward and backward
+      pass
+
+    Returns:
+      StyleContentModel: the extractor, or the loaded
+      FrozenStyleContentModel called like it
+    """
+    path: str = frozen_extractor.extractor_artifact_path
+    if frozen_extractor.artifact_matches(path, style_layers, content_layers,
+                                         precision):
+        logger.info('Loading exported extractor %s', path)
+        return frozen_extractor.FrozenStyleContentModel(path)
+    return StyleContentModel(style_layers, content_layers, precision)
+
+
+# extractors shared by all renders of the worker
+extractor_registry: ModelRegistry = ModelRegistry(build_extractor)
+
+# targets shared by all renders of the worker, persisted to
+# HSTYLE_TARGET_CACHE_DIR when set
+target_cache: TargetCache = TargetCache(
+    persist_dir=os.environ.get('HSTYLE_TARGET_CACHE_DIR'))
+
+# resized images and last renders of the worker session, by image hash
+session_store: SessionStore = SessionStore(
+    int(os.environ.get('HSTYLE_SESSION_ENTRIES', '16')),
+    float(os.environ.get('HSTYLE_SESSION_TTL_SECONDS', '900')))
+
+
+def get_targets(extractor: StyleContentModel, kind: str,
+                image: np.ndarray, max_dim: int = 512,
+                loaded_image: tf.Tensor = None, use_cache: bool = True,
+                digest: Optional[str] = None) -> Dict[str, tf.Tensor]:
+    """
+    Method to get the style or content targets of an image, from the target
+    cache when possible
+
+    Args:
+      extractor (StyleContentModel): the intermidate layer extractor
+      kind (str): 'style' for gram matrices of style layers, 'content' for
+      outputs of content layers
+      image (np.ndarray): the rgb image
+      max_dim (int): maximum dimension the image is loaded with
+      loaded_image (tf.Tensor, optional): the already loaded image
+      use_cache (bool): use the target cache
+      digest (str, optional): the already computed image hash
+
+    Returns:
+      Dict[str, tf.Tensor]: the targets by layer name
+    """
+    def compute() -> Dict[str, np.ndarray]:
+        loaded: tf.Tensor = loaded_image if loaded_image is not None \
+            else load_img(image, max_dim)
+        return {name: value.numpy()
+                for name, value in extractor(loaded)[kind].items()}
+
+    if use_cache:
+        layers: List[str] = extractor.style_layers if kind == 'style' \
+            else extractor.content_layers
+        targets: Dict[str, np.ndarray] = target_cache.get_or_compute(
+            kind, target_key(kind, image, max_dim, layers,
+                             extractor.precision, digest), compute)
+    else:
+        targets = compute()
+    return {name: tf.constant(value) for name, value in targets.items()}
+
+
 def style_content_loss(outputs: Dict[str, tf.Tensor], style_targets: tf.Tensor,
                        content_targets: tf.Tensor, num_style_layers: int,
                        num_content_layers: int, style_weight: float,
@@ -231,7 +641,202 @@ def clip_0_1(image: tf.Tensor) -> tf.Tensor:
     return tf.clip_by_value(image, clip_value_min=0.0, clip_value_max=1.0)
 
 
-def train_step_without_variation_loss(image: tf.Variable,
+def gradients_without_variation_loss(image: tf.Tensor,
+                                     extractor: StyleContentModel,
+                                     style_targets: Dict[str, tf.Tensor],
+                                     content_targets: Dict[str, tf.Tensor],
+                                     num_style_layers: int,
+                                     num_content_layers: int,
+                                     style_weight: tf.Tensor,
+                                     content_weight: tf.Tensor
+                                     ) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Method to calculate the loss and gradient of a training step without
+    total variation consideration
+
+    Args:
+      image (tf.Tensor): the rendered image
+      extractor (StyleContentModel): the intermidate layer extractor
+      style_targets (Dict[str, tf.Tensor]): the style intermidate outputs
+      content_targets (Dict[str, tf.Tensor]): the content intermidate outputs
+      num_style_layers: number of style layers
+      num_content_layers(int): number of content layers
+      style_weight (tf.Tensor): the style weight
+      content_weight (tf.Tensor): the content weight
+
+    Returns:
+      Tuple[tf.Tensor, tf.Tensor]: the loss and its gradient by the image
+    """
+    with tf.GradientTape() as tape:
+        # watch rendered image (not a variable inside the traced graph)
+        tape.watch(image)
+
+        # forward pass rendered image, ops are grouped by name scope in
+        # profiler traces
+        with tf.name_scope('vgg_forward'):
+            outputs: Dict[str, tf.Tensor] = extractor(image)
+
+        # calculate style content loss
+        with tf.name_scope('style_content_loss'):
+            loss: tf.Tensor = style_content_loss(
+                outputs, style_targets, content_targets, num_style_layers,
+                num_content_layers, style_weight, content_weight)
+
+    # calculate gradient descent
+    with tf.name_scope('gradient'):
+        return loss, tape.gradient(loss, image)
+
+
+def gradients_with_variation_loss(image: tf.Tensor,
+                                  extractor: StyleContentModel,
+                                  style_targets: Dict[str, tf.Tensor],
+                                  content_targets: Dict[str, tf.Tensor],
+                                  num_style_layers: int,
+                                  num_content_layers: int,
+                                  style_weight: tf.Tensor,
+                                  content_weight: tf.Tensor,
+                                  total_variation_weight: tf.Tensor
+                                  ) -> Tuple[tf.Tensor, tf.Tensor]:
+    """
+    Method to calculate the loss and gradient of a training step with total
+    variation consideration
+
+    Args:
+      image (tf.Tensor): the rendered image
+      extractor (StyleContentModel): the intermidate layer extractor
+      style_targets (Dict[str, tf.Tensor]): the style intermidate outputs
+      content_targets (Dict[str, tf.Tensor]): the content intermidate outputs
+      num_style_layers: number of style layers
+      num_content_layers(int): number of content layers
+      style_weight (tf.Tensor): the style weight
+      content_weight (tf.Tensor): the content weight
+      total_variation_weight (tf.Tensor): the total variation weight
+
+    Returns:
+      Tuple[tf.Tensor, tf.Tensor]: the loss and its gradient by the image
+    """
+    with tf.GradientTape() as tape:
+        # watch rendered image (not a variable inside the traced graph)
+        tape.watch(image)
+
+        # forward pass rendered image, ops are grouped by name scope in
+        # profiler traces
+        with tf.name_scope('vgg_forward'):
+            outputs: Dict[str, tf.Tensor] = extractor(image)
+
+        # calculate style content loss
+        with tf.name_scope('style_content_loss'):
+            loss: tf.Tensor = style_content_loss(
+                outputs, style_targets, content_targets, num_style_layers,
+                num_content_layers, style_weight, content_weight)
+
+        # add total variation loss
+        with tf.name_scope('total_variation_loss'):
+            loss += total_variation_weight*tf.image.total_variation(image)
+
+    # calculate gradient descent
+    with tf.name_scope('gradient'):
+        return loss, tape.gradient(loss, image)
+
+
+class StepEngine: # pylint: disable=R0903
+    """
+    Class to calculate training step gradients of an extractor as traced
+    graphs. a graph is traced once per input shape and reused by all
+    following steps and renders with that shape.
+    """
+    def __init__(self, extractor: StyleContentModel,
+                 run_eagerly: bool = False):
+        """
+        Initialization Method
+
+        Args:
+          extractor (StyleContentModel): the intermidate layer extractor
+          run_eagerly (bool): run the steps eagerly instead of traced
+        """
+        # weak reference so the engine does not keep the extractor alive
+        self._extractor: weakref.ref = weakref.ref(extractor)
+        self.run_eagerly: bool = run_eagerly
+
+        # trace step methods unless running eagerly
+        wrap: Callable = (lambda func: func) if run_eagerly else tf.function
+        self.without_variation: Callable = wrap(self._without_variation)
+        self.with_variation: Callable = wrap(self._with_variation)
+
+    def _without_variation(self, image: tf.Tensor,
+                           *args) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Method to calculate loss and gradient without total variation
+
+        Args:
+          image (tf.Tensor): the rendered image
+          *args: rest of gradients_without_variation_loss arguments
+
+        Returns:
+          Tuple[tf.Tensor, tf.Tensor]: the loss and its gradient by the image
+        """
+        return gradients_without_variation_loss(image, self._extractor(),
+                                                *args)
+
+    def _with_variation(self, image: tf.Tensor,
+                        *args) -> Tuple[tf.Tensor, tf.Tensor]:
+        """
+        Method to calculate loss and gradient with total variation
+
+        Args:
+          image (tf.Tensor): the rendered image
+          *args: rest of gradients_with_variation_loss arguments
+
+        Returns:
+          Tuple[tf.Tensor, tf.Tensor]: the loss and its gradient by the image
+        """
+        return gradients_with_variation_loss(image, self._extractor(), *args)
+
+
+# step engines of every live extractor, by run eagerly flag
+_step_engines: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_step_engine(extractor: StyleContentModel,
+                    run_eagerly: bool = False) -> StepEngine:
+    """
+    Method to get the step engine of an extractor, creating it on first use
+
+    Args:
+      extractor (StyleContentModel): the intermidate layer extractor
+      run_eagerly (bool): run the steps eagerly instead of traced
+
+    Returns:
+      StepEngine: the step engine of the extractor
+    """
+    engines: Dict[bool, StepEngine] = _step_engines.setdefault(extractor, {})
+    if run_eagerly not in engines:
+        engines[run_eagerly] = StepEngine(extractor, run_eagerly)
+    return engines[run_eagerly]
+
+
+def apply_gradient(image: tf.Variable, opt: tf.optimizers.Adam,
+                   grad: tf.Tensor,
+                   profiler: Optional[RenderProfiler] = None) -> None:
+    """
+    Method to apply a gradient descent step on the rendered image
+
+    Args:
+      image (tf.Variable): the rendered image
+      opt (tf.optimizers.Adam): the optimizer
+      grad (tf.Tensor): the loss gradient by the image
+      profiler (RenderProfiler, optional): the render profiler
+    """
+    # apply gradient descent
+    with span(profiler, 'apply_gradients'):
+        opt.apply_gradients([(grad, image)])
+
+    # update image and clip to [0,1]
+    with span(profiler, 'clip'):
+        image.assign(clip_0_1(image))
+
+
+def train_step_without_variation_loss(image: tf.Variable, # pylint: disable=R0913
                                       extractor: StyleContentModel,
                                       opt: tf.optimizers.Adam,
                                       style_targets: tf.Tensor,
@@ -239,9 +844,12 @@ def train_step_without_variation_loss(image: tf.Variable,
                                       num_style_layers: int,
                                       num_content_layers: int,
                                       style_weight: float,
-                                      content_weight: float) -> None:
+                                      content_weight: float,
+                                      run_eagerly: bool = False,
+                                      profiler: Optional[RenderProfiler] = None
+                                      ) -> tf.Tensor:
     """
-    Method to apply a training step with total variation consideration
+    Method to apply a training step without total variation consideration
 
     Args:
       image (tf.Variable): the rendered image
@@ -253,26 +861,25 @@ def train_step_without_variation_loss(image: tf.Variable,
       num_content_layers(int): number of content layers
       style_weight (float): the style weight
       content_weight (float): the content weight
-      total_variation_weight (float): the total variation weight
-    """
-    with tf.GradientTape() as tape:
-        # forward pass rendered image
-        outputs: Dict[str, tf.Tensor] = extractor(image)
-
-        # calculate style content loss
-        loss: tf.Tensor = style_content_loss(outputs, style_targets,
-                                             content_targets, num_style_layers,
-                                             num_content_layers, style_weight,
-                                             content_weight)
+      run_eagerly (bool): run the step eagerly instead of traced
+      profiler (RenderProfiler, optional): the render profiler, the
+      gradients span only covers dispatch of the step unless run eagerly
 
-    # calculate gradient descent
-    grad = tape.gradient(loss, image)
+    Returns:
+      tf.Tensor: the step loss
+    """
+    engine: StepEngine = get_step_engine(extractor, run_eagerly)
 
-    # apply gradient descent
-    opt.apply_gradients([(grad, image)])
+    # weights are passed as tensors so new values do not retrace
+    with span(profiler, 'gradients'):
+        loss, grad = engine.without_variation(
+            tf.convert_to_tensor(image), style_targets, content_targets,
+            num_style_layers, num_content_layers,
+            tf.constant(style_weight, tf.float32),
+            tf.constant(content_weight, tf.float32))
 
-    # update image and clip to [0,1]
-    image.assign(clip_0_1(image))
+    apply_gradient(image, opt, grad, profiler)
+    return loss
 
 
 def high_pass_x_y(image: tf.Variable) -> Tuple[tf.Tensor, tf.Tensor]:
@@ -305,7 +912,7 @@ def total_variation_loss(image: tf.Variable) -> tf.Tensor:
     return tf.reduce_sum(tf.abs(x_deltas)) + tf.reduce_sum(tf.abs(y_deltas))
 
 
-def train_step_with_variation_loss(image: tf.Variable,
+def train_step_with_variation_loss(image: tf.Variable, # pylint: disable=R0913
                                    extractor: StyleContentModel,
                                    opt: tf.optimizers.Adam,
                                    style_targets: tf.Tensor,
@@ -314,7 +921,10 @@ def train_step_with_variation_loss(image: tf.Variable,
                                    num_content_layers: int,
                                    style_weight: float,
                                    content_weight: float,
-                                   total_variation_weight: float) -> None:
+                                   total_variation_weight: float,
+                                   run_eagerly: bool = False,
+                                   profiler: Optional[RenderProfiler] = None
+                                   ) -> tf.Tensor:
     """
     Method to apply a training step with total variation consideration
 
@@ -329,100 +939,23 @@ def train_step_with_variation_loss(image: tf.Variable,
       style_weight (float): the style weight
       content_weight (float): the content weight
       total_variation_weight (float): the total variation weight
-    """
-    with tf.GradientTape() as tape:
-        # forward pass rendered image
-        outputs: Dict[str, tf.Tensor] = extractor(image)
-
-        # calculate style content loss
-        loss: tf.Tensor = style_content_loss(outputs, style_targets,
-                                             content_targets, num_style_layers,
-                                             num_content_layers, style_weight,
-                                             content_weight)
-
-        # add total variation loss
-        loss += total_variation_weight*tf.image.total_variation(image)
-
-    # calculate gradient descent
-    grad = tape.gradient(loss, image)
-
-    # apply gradient descent
-    opt.apply_gradients([(grad, image)])
-
-    # update image and clip to [0,1]
-    image.assign(clip_0_1(image))
-
-
-def render_image(content_image: np.ndarray, style_image: np.ndarray,
-                 content_layers: List[str], style_layers: List[str],
-                 style_weight: float, content_weight: float,
-                 total_variation_weight: float, epochs_without_variation: int,
-                 epochs_with_variation: int, steps_per_epoch: int) -> Image:
-    """
-    Method to render neural style transfer from style and content
-
-    Args:
-      content_image (np.ndarray): the content image
-      style_image (np.ndarray): the style image
-      content_layers (List[str]): the conten intermediate layers
-      style_layers (List[str]): the style intermediate layers
-      style_weight (float): the style weight
-      content_weight (float): the content weight
-      total_variation_weight (float): the total variation weight
-      epochs_without_variation (int): number of epochs to perform without
-      total variation consideration
-      epochs_with_variation(int): number of epochs to perform with
-      total variation consideration
-      steps_per_epoch(int): number of steps in each epoch
+      run_eagerly (bool): run the step eagerly instead of traced
+      profiler (RenderProfiler, optional): the render profiler, the
+      gradients span only covers dispatch of the step unless run eagerly
 
     Returns:
-      Image: the rendered image
-    """
-    # calculate number of content and style layers
-    num_content_layers: int = len(content_layers)
-    num_style_layers: int = len(style_layers)
-
-    # load content and style images
-    content_image: tf.Tensor = load_img(content_image)
-    style_image: tf.Tensor = load_img(style_image)
-
-    # create extractor
-    extractor: StyleContentModel = StyleContentModel(style_layers,
-                                                     content_layers)
-    # get style content outputs
-    style_targets: tf.Tensor = extractor(style_image)['style']
-    content_targets: tf.Tensor = extractor(content_image)['content']
-
-    # create optimizer for gradient decent
-    opt: tf.optimizers.Adam = tf.optimizers.Adam(learning_rate=0.02,
-                                                 beta_1=0.99, epsilon=1e-1)
-
-    # define a tf.Variable to contain the image to optimize
-    image: tf.Variable = tf.Variable(content_image)
-
-    # perform optimization without total variation
-    step: int = 0
-    for _ in range(epochs_without_variation):
-        for _ in range(steps_per_epoch):
-            step += 1
-            train_step_without_variation_loss(image, extractor, opt,
-                                              style_targets, content_targets,
-                                              num_style_layers,
-                                              num_content_layers, style_weight,
-                                              content_weight)
-
-    # define a tf.Variable to contain the image to optimize
-    image: tf.Variable = tf.Variable(content_image)
-
-    # perform optimization with total variation
-    step: int = 0
-    for _ in range(epochs_with_variation):
-        for _ in range(steps_per_epoch):
-            step += 1
-            train_step_with_variation_loss(image, extractor, opt,
-                                           style_targets, content_targets,
-                                           num_style_layers,
-                                           num_content_layers, style_weight,
-                                           content_weight,
-                                           total_variation_weight)
-    return tensor_to_image(image)
+      tf.Tensor: the step loss
+    """
+    engine: StepEngine = get_step_engine(extractor, run_eagerly)
+
+    # weights are passed as tensors so new values do not retrace
+    with span(profiler, 'gradients'):
+        loss, grad = engine.with_variation(
+            tf.convert_to_tensor(image), style_targets, content_targets,
+            num_style_layers, num_content_layers,
+            tf.constant(style_weight, tf.float32),
+            tf.constant(content_weight, tf.float32),
+            tf.constant(total_variation_weight, tf.float32))
+
+    apply_gradient(image, opt, grad, profiler)
+    return loss
@@ -0,0 +1,205 @@
+"""
+Cache of style transfer targets (style gram matrices and content outputs)
+keyed by image content, resize dimension and layers.
+"""
+
+
+import os
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from server.services import metrics
+
+
+# targets of a layer set, by layer name
+Targets = Dict[str, np.ndarray]
+
+# target lookups served from cache
+target_cache_hits: metrics.Counter = metrics.Counter(
+    'hstyle_target_cache_hits_total',
+    'Style and content target lookups served from cache')
+
+# target lookups that computed the targets
+target_cache_misses: metrics.Counter = metrics.Counter(
+    'hstyle_target_cache_misses_total',
+    'Style and content target lookups that computed the targets')
+
+
+def image_hash(image: np.ndarray) -> str:
+    """
+    Method to hash the content of an image
+
+    Args:
+        image (np.ndarray): the image
+
+    Returns:
+        str: hex digest of image shape, type and pixels
+    """
+    digest = hashlib.sha256()
+    digest.update(f'{image.shape}{image.dtype}'.encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+def target_key(kind: str, image: np.ndarray, max_dim: int, # pylint: disable=R0913
+               layers: List[str], precision: str = 'float32',
+               digest: Optional[str] = None) -> str:
+    """
+    Method to create the cache key of image targets
+
+    Args:
+        kind (str): target kind ('style' or 'content')
+        image (np.ndarray): the image the targets are computed from
+        max_dim (int): maximum dimension the image is resized to
+        layers (List[str]): the layers of the targets
+        precision (str): compute precision of the extractor
+        digest (str, optional): the already computed image hash
+
+    Returns:
+        str: the cache key
+    """
+    key = hashlib.sha256()
+    key.update(f'{kind}|{max_dim}|{",".join(layers)}|'.encode())
+    # float32 keys are unchanged so persisted targets stay valid
+    if precision != 'float32':
+        key.update(f'{precision}|'.encode())
+    key.update((digest or image_hash(image)).encode())
+    return key.hexdigest()
+
+
+class TargetCache:
+    """
+    Class of a bounded LRU cache of targets, optionaly persisted to disk as
+    npz files so a restarted worker stays warm
+    """
+    def __init__(self, max_entries: int = 32,
+                 persist_dir: Optional[str] = None):
+        """
+        Initialization Method
+
+        Args:
+            max_entries (int): maximum number of targets held in memory
+            persist_dir (str, optional): folder to persist targets in, None
+            to keep targets only in memory
+        """
+        self.max_entries: int = max_entries
+        self.persist_dir: Optional[str] = persist_dir
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: 'OrderedDict[str, Targets]' = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+        if persist_dir is not None:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        """
+        Method to get the persisted file path of a key
+
+        Args:
+            key (str): the cache key
+
+        Returns:
+            str: the npz file path
+        """
+        return os.path.join(self.persist_dir, key + '.npz')
+
+    def _put_memory(self, key: str, targets: Targets) -> None:
+        """
+        Method to add targets to memory, evicting the least recently used
+
+        Args:
+            key (str): the cache key
+            targets (Targets): the targets
+        """
+        with self._lock:
+            self._entries[key] = targets
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Targets]:
+        """
+        Method to get targets from memory or disk
+
+        Args:
+            key (str): the cache key
+
+        Returns:
+            Optional[Targets]: the targets, None if not cached
+        """
+        with self._lock:
+            targets: Optional[Targets] = self._entries.get(key)
+            if targets is not None:
+                self._entries.move_to_end(key)
+                return targets
+
+        if self.persist_dir is not None and os.path.exists(self._path(key)):
+            try:
+                with np.load(self._path(key)) as persisted:
+                    targets = {name: persisted[name]
+                               for name in persisted.files}
+            except (OSError, ValueError):
+                # unreadable file, recompute targets
+                return None
+            self._put_memory(key, targets)
+            return targets
+        return None
+
+    def put(self, key: str, targets: Targets) -> None:
+        """
+        Method to add targets to cache
+
+        Args:
+            key (str): the cache key
+            targets (Targets): the targets
+        """
+        self._put_memory(key, targets)
+        if self.persist_dir is not None:
+            # write to temporary file first so readers never see partial file
+            tmp_path: str = self._path(key) + '.tmp.npz'
+            np.savez(tmp_path, **targets)
+            os.replace(tmp_path, self._path(key))
+
+    def get_or_compute(self, kind: str, key: str,
+                       compute: Callable[[], Targets]) -> Targets:
+        """
+        Method to get targets from cache, computing and caching them on miss
+
+        Args:
+            kind (str): target kind, for metrics
+            key (str): the cache key
+            compute (Callable[[], Targets]): computes the targets
+
+        Returns:
+            Targets: the targets
+        """
+        targets: Optional[Targets] = self.get(key)
+        if targets is not None:
+            self.hits += 1
+            target_cache_hits.inc(kind=kind)
+            return targets
+
+        self.misses += 1
+        target_cache_misses.inc(kind=kind)
+        targets = compute()
+        self.put(key, targets)
+        return targets
+
+    def clear(self) -> None:
+        """
+        Method to remove all targets from memory (persisted files are kept)
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Method to get cache statistics
+
+        Returns:
+            Dict[str, int]: number of entries, hits and misses
+        """
+        return {'entries': len(self._entries), 'hits': self.hits,
+                'misses': self.misses}
@@ -0,0 +1,365 @@
+"""
+Tiled high resolution style transfer. a base render at the model resolution
+is upsampled to the output resolution and refined in overlapping tiles that
+share the global style targets, so the VGG activations and gradients of
+the optimization are bounded by the tile size instead of the output size.
+the content image, the upsampled base render and the blended output are
+still held at the output size (about 40 bytes per output pixel).
+"""
+
+
+import time
+import threading
+import numpy as np
+import tensorflow as tf
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+from PIL import Image
+from server.machine_learning import render, style_transfer
+from server.machine_learning.engines import STEP_BUDGET, model_max_dim
+from server.machine_learning.profiling import span
+from server.machine_learning.render import RenderPhase, ConvergenceDetector
+from server.machine_learning.style_transfer import (StyleContentModel,
+                                                    RenderOptions,
+                                                    RenderReport,
+                                                    PhaseTrace)
+
+
+# position of a tile in the output image (top, left, height, width)
+TileBox = Tuple[int, int, int, int]
+
+
+@dataclass
+class TileOptions:
+    """
+    Class of the tiled render settings
+
+    Attributes:
+      output_max_dim (int): maximum dimension of the rendered image
+      tile_size (int): maximum dimension of each tile
+      overlap (int): pixels shared by neighbouring tiles, blended to hide
+      seams, at most half the tile size
+      refine_step_share (float): share of the steps of each epoch run on
+      each tile
+      parallel_tiles (int): number of tiles optimized at the same time,
+      peak memory grows with it
+    """
+    output_max_dim: int = 2048
+    tile_size: int = 512
+    overlap: int = 64
+    refine_step_share: float = 0.25
+    parallel_tiles: int = 1
+
+
+def tile_starts(length: int, tile_size: int, overlap: int) -> List[int]:
+    """
+    Method to get the start of tiles covering a length
+
+    Args:
+      length (int): the length to cover
+      tile_size (int): the tile length
+      overlap (int): length shared by neighbouring tiles
+
+    Raises:
+      ValueError: if overlap is negative or more than half of tile_size
+
+    Returns:
+      List[int]: the tile starts, the last tile ends at length
+    """
+    # wider overlaps would blend more than two tiles at a pixel
+    if not 0 <= overlap <= tile_size // 2:
+        raise ValueError(f'Tile overlap {overlap} must be between 0 and half '
+                         f'the tile size {tile_size}')
+    if length <= tile_size:
+        return [0]
+    stride: int = tile_size - overlap
+    starts: List[int] = list(range(0, length - tile_size, stride))
+    return starts + [length - tile_size]
+
+
+def tile_boxes(height: int, width: int, tile_size: int,
+               overlap: int) -> List[TileBox]:
+    """
+    Method to split an image into overlapping tiles
+
+    Args:
+      height (int): the image height
+      width (int): the image width
+      tile_size (int): maximum dimension of each tile
+      overlap (int): pixels shared by neighbouring tiles
+
+    Returns:
+      List[TileBox]: the tiles, row by row
+    """
+    return [(top, left, min(tile_size, height), min(tile_size, width))
+            for top in tile_starts(height, tile_size, overlap)
+            for left in tile_starts(width, tile_size, overlap)]
+
+
+def blend_mask(box: TileBox, height: int, width: int,
+               overlap: int) -> np.ndarray:
+    """
+    Method to create the blending weights of a tile, ramping linearly over
+    the overlap on sides that have a neighbouring tile. the weights of
+    neighbouring tiles sum to 1
+
+    Args:
+      box (TileBox): the tile
+      height (int): the image height
+      width (int): the image width
+      overlap (int): pixels shared by neighbouring tiles
+
+    Returns:
+      np.ndarray: the weights [tile height, tile width, 1]
+    """
+    top, left, tile_height, tile_width = box
+
+    def ramp(length: int, start: int, end: int, total: int) -> np.ndarray:
+        weights: np.ndarray = np.ones(length, np.float32)
+        size: int = min(overlap, length // 2)
+        edge: np.ndarray = (np.arange(size, dtype=np.float32) + 1) / \
+            (size + 1)
+        if start > 0:
+            # ramp up where the previous tile ramps down, the last tile
+            # starts closer to the previous tile than the stride
+            offset: int = (start - 1) // (length - overlap) * \
+                (length - overlap) + length - start - size
+            weights[:offset] = 0
+            weights[offset:offset + size] = edge
+        if end < total and size > 0:
+            weights[-size:] = edge[::-1]
+        return weights
+
+    return (ramp(tile_height, top, top + tile_height, height)[:, None] *
+            ramp(tile_width, left, left + tile_width, width)[None, :]
+            )[..., None]
+
+
+class TileBudget: # pylint: disable=R0903
+    """
+    Class of the steps and time the tiles of a render are charged against,
+    the budget of the whole render, shared by tiles optimized in parallel
+    """
+    def __init__(self, options: RenderOptions, steps: int,
+                 optimize_start: float):
+        """
+        Initialization Method
+
+        Args:
+          options (RenderOptions): the render settings
+          steps (int): steps already executed in render
+          optimize_start (float): perf counter the render optimization
+          started at
+        """
+        self.options: RenderOptions = options
+        self.steps: int = steps
+        self.optimize_start: float = optimize_start
+        self.stop_reason: Optional[str] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def step(self) -> Optional[str]:
+        """
+        Method to charge a tile step, should_stop and the time budget are
+        checked every progress_every steps of the render
+
+        Returns:
+          Optional[str]: why the tiles stop, None to go on
+        """
+        with self._lock:
+            self.steps += 1
+            if self.stop_reason is not None:
+                return self.stop_reason
+            if self.options.max_steps is not None and \
+                    self.steps >= self.options.max_steps:
+                self.stop_reason = STEP_BUDGET
+            elif self.steps % self.options.progress_every == 0:
+                self.stop_reason = render.stop_reason(
+                    self.options.should_stop, self.options.max_seconds,
+                    self.optimize_start)
+            return self.stop_reason
+
+
+def optimize_tile(content: tf.Tensor, init: tf.Tensor, # pylint: disable=R0913
+                  extractor: StyleContentModel,
+                  style_targets: Dict[str, tf.Tensor],
+                  schedule: List[RenderPhase], steps_per_epoch: int,
+                  style_weight: float, content_weight: float,
+                  options: RenderOptions, budget: TileBudget
+                  ) -> Tuple[tf.Tensor, Optional[float], int]:
+    """
+    Method to optimize a tile against its content and the global style
+    targets, until the end of the schedule or the render budget. each phase
+    stops early once the tile converges
+
+    Args:
+      content (tf.Tensor): the tile of the content image
+      init (tf.Tensor): the tile of the upsampled base render
+      extractor (StyleContentModel): the intermidate layer extractor
+      style_targets (Dict[str, tf.Tensor]): the global style targets
+      schedule (List[RenderPhase]): the phases to execute
+      steps_per_epoch (int): number of steps in each epoch
+      style_weight (float): the style weight
+      content_weight (float): the content weight
+      options (RenderOptions): the render settings
+      budget (TileBudget): the render budget the steps are charged against
+
+    Returns:
+      Tuple[tf.Tensor, Optional[float], int]: the optimized tile, its last
+      loss (None if no step ran) and the number of steps run
+    """
+    content_targets: Dict[str, tf.Tensor] = extractor(content)['content']
+    opt: tf.optimizers.Adam = tf.optimizers.Adam(learning_rate=0.02,
+                                                 beta_1=0.99, epsilon=1e-1)
+    image: tf.Variable = tf.Variable(init)
+    loss: Optional[tf.Tensor] = None
+    steps: int = 0
+    for phase in schedule:
+        # losses of different phases are not comparable
+        detector: ConvergenceDetector = ConvergenceDetector(
+            options.convergence_window, options.convergence_tolerance)
+        for phase_step in range(1, phase.epochs * steps_per_epoch + 1):
+            with span(options.profiler, 'tile_step'):
+                loss = render.train_step(image, extractor, opt, style_targets,
+                                         content_targets, style_weight,
+                                         content_weight, phase,
+                                         options.run_eagerly,
+                                         options.profiler)
+            steps += 1
+            if budget.step() is not None:
+                return tf.convert_to_tensor(image), float(loss), steps
+            if options.convergence_window > 0 and \
+                    phase_step % options.progress_every == 0 and \
+                    detector.update(phase_step, float(loss)):
+                # move on to next phase
+                break
+    return (tf.convert_to_tensor(image),
+            None if loss is None else float(loss), steps)
+
+
+def render_tiled(content_image: np.ndarray, style_image: np.ndarray, # pylint: disable=R0913,R0914
+                 content_layers: List[str], style_layers: List[str],
+                 style_weight: float, content_weight: float,
+                 total_variation_weight: float, epochs_without_variation: int,
+                 epochs_with_variation: int, steps_per_epoch: int,
+                 options: RenderOptions = None,
+                 tile_options: TileOptions = None
+                 ) -> Tuple[Image, RenderReport]:
+    """
+    Method to render neural style transfer above the model resolution. the
+    image is rendered at model_max_dim with options (any engine), upsampled
+    to the output resolution and every tile is refined by optimization with
+    the style targets of the whole style image
+
+    Args:
+      content_image (np.ndarray): the content image
+      style_image (np.ndarray): the style image
+      content_layers (List[str]): the conten intermediate layers
+      style_layers (List[str]): the style intermediate layers
+      style_weight (float): the style weight
+      content_weight (float): the content weight
+      total_variation_weight (float): the total variation weight
+      epochs_without_variation (int): number of epochs to perform without
+      total variation consideration
+      epochs_with_variation(int): number of epochs to perform with
+      total variation consideration
+      steps_per_epoch(int): number of steps in each epoch
+      options (RenderOptions, optional): optional settings of the base
+      render, the tiles are charged against its step and time budget and
+      also stop on should_stop or convergence
+      tile_options (TileOptions, optional): optional tiled render settings
+
+    Returns:
+      Tuple[Image, RenderReport]: the rendered image and render report
+    """
+    options: RenderOptions = options or RenderOptions()
+    tile_options: TileOptions = tile_options or TileOptions()
+
+    base, report = render.render_image_with_report(
+        content_image, style_image, content_layers, style_layers,
+        style_weight, content_weight, total_variation_weight,
+        epochs_without_variation, epochs_with_variation, steps_per_epoch,
+        options)
+    if report.stop_reason is not None or \
+            tile_options.output_max_dim <= model_max_dim:
+        return base, report
+
+    start: float = time.perf_counter()
+    content: tf.Tensor = style_transfer.load_img(content_image,
+                                                 tile_options.output_max_dim)
+    _, height, width, _ = content.shape
+    init: tf.Tensor = render.upsample_image(
+        style_transfer.load_img(np.asarray(base)), content.shape)
+
+    # style targets of the whole style image at model resolution, gram
+    # matrices are averaged over locations so they hold for any tile size
+    extractor: StyleContentModel = style_transfer.extractor_registry.get(
+        style_layers, content_layers,
+        style_transfer.resolve_precision(options.precision))
+    style_targets: Dict[str, tf.Tensor] = style_transfer.get_targets(
+        extractor, 'style', style_image, use_cache=options.use_target_cache)
+    schedule: List[RenderPhase] = render.render_schedule(
+        epochs_without_variation, epochs_with_variation,
+        total_variation_weight)
+    tile_steps_per_epoch: int = int(round(
+        steps_per_epoch * tile_options.refine_step_share))
+    steps_per_tile: int = tile_steps_per_epoch * sum(phase.epochs
+                                                     for phase in schedule)
+
+    # blended output, tiles are added as they finish
+    output: np.ndarray = np.zeros((height, width, 3), np.float32)
+    weights: np.ndarray = np.zeros((height, width, 1), np.float32)
+    boxes: List[TileBox] = tile_boxes(height, width, tile_options.tile_size,
+                                      tile_options.overlap)
+    trace: PhaseTrace = PhaseTrace('tiles',
+                                   max_dim=tile_options.output_max_dim)
+    # tiles continue the optimization time of the base render
+    budget: TileBudget = TileBudget(
+        options, report.steps, time.perf_counter() -
+        sum(phase.seconds for phase in report.phases))
+    report.phases.append(trace)
+
+    def refine(box: TileBox) -> Tuple[np.ndarray, Optional[float], int]:
+        top, left, tile_height, tile_width = box
+        if budget.stop_reason is not None:
+            # stopped, keep the upsampled base render
+            return (init[0, top:top + tile_height,
+                         left:left + tile_width].numpy(), None, 0)
+        tile, loss, steps = optimize_tile(
+            content[:, top:top + tile_height, left:left + tile_width],
+            init[:, top:top + tile_height, left:left + tile_width],
+            extractor, style_targets, schedule, tile_steps_per_epoch,
+            style_weight, content_weight, options, budget)
+        return tile[0].numpy(), loss, steps
+
+    with ThreadPoolExecutor(max(1, tile_options.parallel_tiles)) as executor:
+        # stream tiles one at a time unless asked to optimize in parallel
+        tiles: Iterator[Tuple[np.ndarray, Optional[float], int]] = \
+            executor.map(refine, boxes) \
+            if tile_options.parallel_tiles > 1 else map(refine, boxes)
+
+        for i, (box, (tile, loss, steps)) in enumerate(zip(boxes, tiles), 1):
+            top, left, tile_height, tile_width = box
+            mask: np.ndarray = blend_mask(box, height, width,
+                                          tile_options.overlap)
+            output[top:top + tile_height,
+                   left:left + tile_width] += tile * mask
+            weights[top:top + tile_height, left:left + tile_width] += mask
+            if loss is None:
+                continue
+            trace.steps += steps
+            trace.losses.append(loss)
+            if options.progress_callback is not None:
+                options.progress_callback(style_transfer.RenderProgress(
+                    trace.name, i, report.steps,
+                    report.steps + (len(boxes) - i) * steps_per_tile, loss))
+
+    report.stop_reason = budget.stop_reason
+    trace.stop_reason = budget.stop_reason
+
+    trace.seconds = time.perf_counter() - start
+    if options.profiler is not None:
+        options.profiler.record(f'phase/{trace.name}', trace.seconds)
+        report.spans = options.profiler.summary()
+    return (style_transfer.tensor_to_image(output[np.newaxis] / weights),
+            report)
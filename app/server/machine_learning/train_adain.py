@@ -0,0 +1,51 @@
+"""
+Command line tool to train the AdaIN decoder. run from the application
+folder, e.g.:
+`python -m server.machine_learning.train_adain
+--content ../partial_data_set/modern_hebrew --style ../examples`
+"""
+
+
+import argparse
+from typing import List
+from server.machine_learning import adain
+from server.machine_learning.train_fast_style import (find_images,
+                                                      read_rgb_image)
+
+
+def main() -> None:
+    """
+    Train the AdaIN decoder and save it as the engine decoder weights
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--content', nargs='+', required=True,
+                        help='folders of training content images')
+    parser.add_argument('--style', nargs='+', required=True,
+                        help='folders of training style images')
+    parser.add_argument('--epochs', type=int, default=40)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--image-size', type=int, default=256)
+    parser.add_argument('--learning-rate', type=float, default=1e-4)
+    parser.add_argument('--style-weight', type=float, default=10.0)
+    parser.add_argument('--output', default=adain.decoder_weights_path)
+    args: argparse.Namespace = parser.parse_args()
+
+    content_paths: List[str] = find_images(args.content)
+    style_paths: List[str] = find_images(args.style)
+    if not content_paths or not style_paths:
+        parser.error('No content or style images found')
+
+    model: adain.AdaINModel = adain.train_decoder(
+        [read_rgb_image(path) for path in content_paths],
+        [read_rgb_image(path) for path in style_paths], args.epochs,
+        args.batch_size, args.image_size, args.learning_rate,
+        args.style_weight,
+        progress_callback=lambda step, loss: print(f'step {step}'
+                                                   f' loss {loss:.2f}'))
+    adain.save_decoder(model, args.output)
+    print(f'saved {args.output}')
+
+
+if __name__ == '__main__':
+    main()
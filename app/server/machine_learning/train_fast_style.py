@@ -0,0 +1,105 @@
+"""
+Command line tool to train a fast style model. run from the application
+folder, e.g.:
+`python -m server.machine_learning.train_fast_style
+--style server/data/historical.png --content ../examples --name historical`
+"""
+
+
+import os
+import glob
+import argparse
+import numpy as np
+from typing import Any, Dict, List
+from PIL import Image
+from server.controllers.style_transfer import content_layer, style_layers
+from server.machine_learning import engines, fast_style
+
+
+# extensions of training content images
+image_extensions: List[str] = ['png', 'jpg', 'jpeg']
+
+
+def read_rgb_image(path: str) -> np.ndarray:
+    """
+    Method to read an image file the same way the server reads its default
+    images
+
+    Args:
+        path (str): the image path
+
+    Returns:
+        np.ndarray: RGB image as numpy array
+    """
+    return np.asarray(Image.open(path).convert('RGB'))
+
+
+def find_images(folders: List[str]) -> List[str]:
+    """
+    Method to find the images in folders and their sub folders
+
+    Args:
+        folders (List[str]): the folders
+
+    Returns:
+        List[str]: the image paths
+    """
+    return sorted(path for folder in folders
+                  for extension in image_extensions
+                  for path in glob.glob(os.path.join(folder, '**',
+                                                     f'*.{extension}'),
+                                        recursive=True))
+
+
+def main() -> None:
+    """
+    Train a fast style model and save it to the fast style models folder
+    """
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description=__doc__)
+    parser.add_argument('--style', required=True,
+                        help='path of the style image')
+    parser.add_argument('--content', nargs='+', required=True,
+                        help='folders of training content images')
+    parser.add_argument('--name', required=True, help='the style name')
+    parser.add_argument('--epochs', type=int, default=40)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--image-size', type=int, default=256)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    parser.add_argument('--style-weight', type=float, default=0.01)
+    parser.add_argument('--content-weight', type=float, default=10000.0)
+    parser.add_argument('--total-variation-weight', type=float,
+                        default=30.0)
+    parser.add_argument('--models-dir',
+                        default=fast_style.fast_style_registry.models_dir)
+    args: argparse.Namespace = parser.parse_args()
+
+    paths: List[str] = find_images(args.content)
+    if not paths:
+        parser.error('No content images found')
+    settings: Dict[str, Any] = {
+        'content_images': len(paths), 'epochs': args.epochs,
+        'batch_size': args.batch_size, 'image_size': args.image_size,
+        'learning_rate': args.learning_rate,
+        'style_weight': args.style_weight,
+        'content_weight': args.content_weight,
+        'total_variation_weight': args.total_variation_weight}
+
+    style_image: np.ndarray = read_rgb_image(args.style)
+    model: fast_style.TransformerNet = fast_style.train_transformer(
+        style_image, [read_rgb_image(path) for path in paths],
+        content_layer, style_layers, args.style_weight,
+        args.content_weight, args.total_variation_weight, args.epochs,
+        args.batch_size, args.image_size, args.learning_rate,
+        progress_callback=lambda step, loss: print(f'step {step}'
+                                                   f' loss {loss:.2f}'))
+
+    registry: fast_style.FastStyleRegistry = fast_style.FastStyleRegistry(
+        args.models_dir)
+    # models are found by the digest of the style file, as uploads are
+    style_id: str = engines.file_digest(args.style)
+    print(f'saved {registry.save(model, style_id, args.name, settings)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Job store service responsable for tracking render jobs status, progress and
+results. results are kept in a size bounded store and jobs expire after a
+time to live.
+"""
+
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+
+# job statuses
+QUEUED: str = 'queued'
+RUNNING: str = 'running'
+DONE: str = 'done'
+FAILED: str = 'failed'
+
+
+@dataclass
+class JobRecord:
+    """
+    Class of a render job record
+
+    Attributes:
+        job_id (str): the job id
+        status (str): queued, running, done or failed
+        created (float): creation time
+        updated (float): last update time
+        progress (Dict[str, Any]): last reported progress
+        error (str, optional): failure reason of a failed job
+        result (bytes, optional): the rendered image of a done job, None
+        if evicted
+        preview (bytes, optional): latest preview of a running job
+        preview_step (int): render step of latest preview
+        report (Dict[str, Any]): render report of a done job (steps run and
+        stop reason)
+    """
+    job_id: str
+    status: str
+    created: float
+    updated: float
+    progress: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    result: Optional[bytes] = None
+    preview: Optional[bytes] = None
+    preview_step: int = 0
+    report: Dict[str, Any] = field(default_factory=dict)
+
+
+class JobStore:
+    """
+    Class of an in memory store of render jobs. the oldest results are
+    evicted when the results exceed the size limit, and jobs are removed
+    after their time to live.
+    """
+    def __init__(self, max_result_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialization Method
+
+        Args:
+            max_result_bytes (int): maximum total size of stored results
+            ttl_seconds (float): seconds a job is kept after its last update
+            clock (Callable[[], float]): time source
+        """
+        self.max_result_bytes: int = max_result_bytes
+        self.ttl_seconds: float = ttl_seconds
+        self._clock: Callable[[], float] = clock
+        self._jobs: 'OrderedDict[str, JobRecord]' = OrderedDict()
+        self._result_bytes: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def result_bytes(self) -> int:
+        """
+        Total size of stored results
+
+        Returns:
+            int: size in bytes
+        """
+        return self._result_bytes
+
+    def _evict(self) -> None:
+        """
+        Method to remove expired jobs and the oldest results over the size
+        limit, must be called with lock held
+        """
+        now: float = self._clock()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if now - job.updated > self.ttl_seconds]:
+            self._drop_result(self._jobs.pop(job_id))
+
+        # jobs are ordered by creation, drop oldest results first
+        for job in self._jobs.values():
+            if self._result_bytes <= self.max_result_bytes:
+                break
+            self._drop_result(job)
+
+    def _drop_result(self, job: JobRecord) -> None:
+        """
+        Method to remove the result of a job, must be called with lock held
+
+        Args:
+            job (JobRecord): the job
+        """
+        if job.result is not None:
+            self._result_bytes -= len(job.result)
+            job.result = None
+
+    def create(self) -> str:
+        """
+        Method to create a queued job
+
+        Returns:
+            str: the job id
+        """
+        job_id: str = uuid.uuid4().hex
+        now: float = self._clock()
+        with self._lock:
+            self._evict()
+            self._jobs[job_id] = JobRecord(job_id, QUEUED, now, now)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        """
+        Method to get a job
+
+        Args:
+            job_id (str): the job id
+
+        Returns:
+            Optional[JobRecord]: the job, None if unknown or expired
+        """
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def _update(self, job_id: str, **changes: Any) -> None:
+        """
+        Method to update a job
+
+        Args:
+            job_id (str): the job id
+            **changes (Any): the changed job fields
+        """
+        with self._lock:
+            job: Optional[JobRecord] = self._jobs.get(job_id)
+            if job is None:
+                return
+            for name, value in changes.items():
+                setattr(job, name, value)
+            job.updated = self._clock()
+
+    def update_progress(self, job_id: str, progress: Dict[str, Any]) -> None:
+        """
+        Method to set the progress of a job, marking it as running
+
+        Args:
+            job_id (str): the job id
+            progress (Dict[str, Any]): the progress
+        """
+        self._update(job_id, status=RUNNING, progress=progress)
+
+    def set_preview(self, job_id: str, preview: bytes, step: int) -> None:
+        """
+        Method to set the latest preview of a job
+
+        Args:
+            job_id (str): the job id
+            preview (bytes): the preview image
+            step (int): render step of preview
+        """
+        self._update(job_id, preview=preview, preview_step=step)
+
+    def set_failed(self, job_id: str, error: str) -> None:
+        """
+        Method to mark a job as failed
+
+        Args:
+            job_id (str): the job id
+            error (str): the failure reason
+        """
+        self._update(job_id, status=FAILED, error=error)
+
+    def set_result(self, job_id: str, result: bytes,
+                   report: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Method to mark a job as done and store its result
+
+        Args:
+            job_id (str): the job id
+            result (bytes): the rendered image
+            report (Dict[str, Any], optional): the render report
+        """
+        with self._lock:
+            job: Optional[JobRecord] = self._jobs.get(job_id)
+            if job is None:
+                return
+            self._drop_result(job)
+            job.status = DONE
+            job.result = result
+            job.preview = None
+            job.report = report or {}
+            job.updated = self._clock()
+            self._result_bytes += len(result)
+            self._evict()
@@ -1,42 +1,113 @@
 """
 Email service responsable for all email services through the application.
+emails of renders are delivered by an outbox, queued off the render workers
+and sent in batches over pooled SMTP connections with exponential backoff
+retries.
 """
 
 
-import smtplib
+import os
 import io
+import time
+import heapq
+import logging
+import smtplib
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
 from pydantic import EmailStr
 from PIL import Image
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
+from server.services import metrics
 
 
-def send_image_by_email(img: Image, email_text: str, email: EmailStr
-                        ) -> None:
+# logger of email delivery
+logger: logging.Logger = logging.getLogger(__name__)
+
+# smtp server of outgoing emails
+smtp_host: str = os.environ.get('HSTYLE_SMTP_HOST', 'smtp.gmail.com')
+smtp_port: int = int(os.environ.get('HSTYLE_SMTP_PORT', '587'))
+
+# smtp login, no login when user is empty
+smtp_user: str = os.environ.get('HSTYLE_SMTP_USER',
+                                'hstyle.service@gmail.com')
+smtp_password: str = os.environ.get('HSTYLE_SMTP_PASSWORD', 'HStyle1234')
+
+# upgrade smtp connections to tls
+smtp_starttls: bool = os.environ.get('HSTYLE_SMTP_STARTTLS', '1') == '1'
+
+# sender of outgoing emails
+sender: str = 'HStyle Service' # pylint: disable=C0103
+
+# emails sent
+mails_sent: metrics.Counter = metrics.Counter(
+    'hstyle_mails_sent_total', 'Emails delivered to the smtp server')
+
+# emails dropped after a permanent error or their last retry
+mails_failed: metrics.Counter = metrics.Counter(
+    'hstyle_mails_failed_total', 'Emails that could not be delivered')
+
+# email delivery retries
+mails_retried: metrics.Counter = metrics.Counter(
+    'hstyle_mails_retried_total', 'Email deliveries scheduled for retry')
+
+# emails waiting in outbox
+outbox_depth: metrics.Gauge = metrics.Gauge(
+    'hstyle_mail_outbox_depth', 'Emails waiting in the outbox')
+
+# smtp connections opened
+smtp_connections_opened: metrics.Counter = metrics.Counter(
+    'hstyle_smtp_connections_opened_total', 'SMTP connections opened')
+
+
+def connect(host: str = None, port: int = None, user: str = None,
+            password: str = None, starttls: bool = None) -> smtplib.SMTP:
     """
-    Method to send image with text by email
+    Method to open a logged in smtp connection, with the service settings
+    unless given
 
     Args:
-        img (Image): the image to send
+        host (str, optional): the smtp server host
+        port (int, optional): the smtp server port
+        user (str, optional): the login user, empty for no login
+        password (str, optional): the login password
+        starttls (bool, optional): upgrade the connection to tls
+
+    Returns:
+        smtplib.SMTP: the connection
+    """
+    server: smtplib.SMTP = smtplib.SMTP(host or smtp_host, port or smtp_port)
+    starttls: bool = smtp_starttls if starttls is None else starttls
+    if starttls:
+        server.starttls()
+    user: str = smtp_user if user is None else user
+    if user:
+        server.login(user, smtp_password if password is None else password)
+    smtp_connections_opened.inc()
+    return server
+
+
+def build_image_message(img_data: bytes, email_text: str,
+                        email: EmailStr) -> MIMEMultipart:
+    """
+    Method to create an email with an image and text
+
+    Args:
+        img_data (bytes): the png image to send
         email_text (str): the text to send
         email (EmailStr): receiver email address
-    """
-    # sertup email client
-    server: smtplib.SMTP = smtplib.SMTP('smtp.gmail.com', 587)
-    server.starttls()
-    server.login('hstyle.service@gmail.com', 'HStyle1234')
 
+    Returns:
+        MIMEMultipart: the email
+    """
     # Create the container (outer) email message.
     msg: MIMEMultipart = MIMEMultipart()
     msg['Subject'] = 'Historical Style Generator'
     msg['To'] = email
-    msg['From'] = 'HStyle Service'
-
-    # convert Image to np array
-    img_data: io.BytesIO = io.BytesIO()
-    img.save(img_data, format='PNG')
-    img_data: bytes = img_data.getvalue()
+    msg['From'] = sender
 
     # attach image to email
     img: MIMEImage = MIMEImage(img_data, _subtype='.PNG', name='render.png')
@@ -45,7 +116,409 @@ def send_image_by_email(img: Image, email_text: str, email: EmailStr
     # attach text to email
     body: MIMEText = MIMEText(email_text)
     msg.attach(body)
+    return msg
+
+
+def send_image_by_email(img: Image, email_text: str, email: EmailStr
+                        ) -> None:
+    """
+    Method to send image with text by email, over a new connection
+
+    Args:
+        img (Image): the image to send
+        email_text (str): the text to send
+        email (EmailStr): receiver email address
+    """
+    # sertup email client
+    server: smtplib.SMTP = connect()
+
+    # convert Image to np array
+    img_data: io.BytesIO = io.BytesIO()
+    img.save(img_data, format='PNG')
+    msg: MIMEMultipart = build_image_message(img_data.getvalue(),
+                                             email_text, email)
 
     # Send the email and close server
     server.sendmail(msg['From'], msg['To'], msg.as_string())
     server.quit()
+
+
+class SmtpConnectionPool:
+    """
+    Class of a pool of logged in smtp connections, idle connections are
+    reused until they expire or the server closes them
+    """
+    def __init__(self, size: int = 2, idle_seconds: float = 60.0,
+                 factory: Callable[[], smtplib.SMTP] = connect,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialization Method
+
+        Args:
+            size (int): maximum number of idle connections kept
+            idle_seconds (float): seconds an idle connection is reused
+            within, servers close idle connections
+            factory (Callable[[], smtplib.SMTP]): opens a connection
+            clock (Callable[[], float]): time source
+        """
+        self.size: int = size
+        self.idle_seconds: float = idle_seconds
+        self._factory: Callable[[], smtplib.SMTP] = factory
+        self._clock: Callable[[], float] = clock
+        self._idle: List[Tuple[float, smtplib.SMTP]] = []
+        self._lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def _close(connection: smtplib.SMTP) -> None:
+        """
+        Method to close a connection, ignoring errors of dead connections
+
+        Args:
+            connection (smtplib.SMTP): the connection
+        """
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def acquire(self) -> smtplib.SMTP:
+        """
+        Method to get a live connection, opening one if none is idle
+
+        Returns:
+            smtplib.SMTP: the connection
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                released, connection = self._idle.pop()
+            if self._clock() - released > self.idle_seconds:
+                self._close(connection)
+                continue
+            try:
+                # the server may have closed the connection
+                if connection.noop()[0] == 250:
+                    return connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            connection.close()
+        return self._factory()
+
+    def release(self, connection: smtplib.SMTP) -> None:
+        """
+        Method to return a connection to the pool
+
+        Args:
+            connection (smtplib.SMTP): the connection
+        """
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((self._clock(), connection))
+                return
+        self._close(connection)
+
+    def discard(self, connection: smtplib.SMTP) -> None:
+        """
+        Method to close a broken connection instead of returning it
+
+        Args:
+            connection (smtplib.SMTP): the connection
+        """
+        connection.close()
+
+    def close(self) -> None:
+        """
+        Method to close all idle connections
+        """
+        with self._lock:
+            idle: List[Tuple[float, smtplib.SMTP]] = self._idle
+            self._idle = []
+        for _, connection in idle:
+            self._close(connection)
+
+
+@dataclass(order=True)
+class OutboxMessage:
+    """
+    Class of an email waiting in the outbox
+
+    Attributes:
+        ready (float): time the email can be sent at
+        sequence (int): enqueue order of emails ready at the same time
+        recipient (str): receiver email address
+        message (str): the email
+        attempts (int): failed delivery attempts
+    """
+    ready: float
+    sequence: int
+    recipient: str = field(compare=False)
+    message: str = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class MailOutbox: # pylint: disable=R0902
+    """
+    Class of an outbox delivering emails in background threads. ready
+    emails are sent in batches over one pooled connection, failed
+    deliveries are retried with exponential backoff and emails refused by
+    the server are dropped.
+    """
+    def __init__(self, pool: SmtpConnectionPool = None, workers: int = 1, # pylint: disable=R0913,R0917
+                 batch_size: int = 20, max_attempts: int = 5,
+                 backoff_seconds: float = 1.0,
+                 max_backoff_seconds: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialization Method
+
+        Args:
+            pool (SmtpConnectionPool, optional): the connections, a pool of
+            the service smtp server if not given
+            workers (int): number of delivery threads
+            batch_size (int): maximum number of emails sent over a
+            connection at once
+            max_attempts (int): delivery attempts before an email is dropped
+            backoff_seconds (float): delay of the first retry, doubled for
+            every retry
+            max_backoff_seconds (float): maximum delay of a retry
+            clock (Callable[[], float]): time source
+        """
+        self.pool: SmtpConnectionPool = pool or SmtpConnectionPool()
+        self.workers: int = workers
+        self.batch_size: int = batch_size
+        self.max_attempts: int = max_attempts
+        self.backoff_seconds: float = backoff_seconds
+        self.max_backoff_seconds: float = max_backoff_seconds
+        self.sent: int = 0
+        self.failed: int = 0
+        self._clock: Callable[[], float] = clock
+        self._heap: List[OutboxMessage] = []
+        self._sequence: itertools.count = itertools.count()
+        self._sending: int = 0
+        self._condition: threading.Condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._closing: bool = False
+
+    def start(self) -> None:
+        """
+        Method to start the delivery threads, called on first enqueue
+        """
+        with self._condition:
+            if self._threads or self._closing:
+                return
+            self._threads = [
+                threading.Thread(target=self._work, daemon=True,
+                                 name=f'mail-outbox-{i}')
+                for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def enqueue(self, recipient: str, message: str) -> bool:
+        """
+        Method to add an email to the outbox
+
+        Args:
+            recipient (str): receiver email address
+            message (str): the email
+
+        Returns:
+            bool: False if the outbox is closed and the email is not sent
+        """
+        self.start()
+        with self._condition:
+            if self._closing:
+                logger.warning('Outbox closed, email to %s not sent',
+                               recipient)
+                return False
+            heapq.heappush(self._heap, OutboxMessage(
+                self._clock(), next(self._sequence), recipient, message))
+            outbox_depth.set(len(self._heap))
+            self._condition.notify()
+            return True
+
+    def send_image(self, img_data: bytes, email_text: str,
+                   email: EmailStr) -> bool:
+        """
+        Method to add an email with an image and text to the outbox
+
+        Args:
+            img_data (bytes): the png image to send
+            email_text (str): the text to send
+            email (EmailStr): receiver email address
+
+        Returns:
+            bool: False if the outbox is closed and the email is not sent
+        """
+        return self.enqueue(email, build_image_message(
+            img_data, email_text, email).as_string())
+
+    def pending(self) -> int:
+        """
+        Method to get the number of emails not delivered yet
+
+        Returns:
+            int: emails waiting or being sent
+        """
+        with self._condition:
+            return len(self._heap) + self._sending
+
+    def _take_batch(self) -> Optional[List[OutboxMessage]]:
+        """
+        Method to wait for ready emails and take up to batch_size of them
+
+        Returns:
+            Optional[List[OutboxMessage]]: the emails, None when closed and
+            no email is left
+        """
+        with self._condition:
+            while True:
+                now: float = self._clock()
+                if self._heap and self._heap[0].ready <= now:
+                    break
+                if self._closing and not self._heap:
+                    return None
+                self._condition.wait(
+                    self._heap[0].ready - now if self._heap else None)
+            batch: List[OutboxMessage] = []
+            while self._heap and self._heap[0].ready <= now and \
+                    len(batch) < self.batch_size:
+                batch.append(heapq.heappop(self._heap))
+            self._sending += len(batch)
+            outbox_depth.set(len(self._heap))
+            return batch
+
+    def _retry(self, item: OutboxMessage) -> None:
+        """
+        Method to schedule the retry of a failed delivery, or drop the email
+        after its last attempt
+
+        Args:
+            item (OutboxMessage): the email
+        """
+        item.attempts += 1
+        if item.attempts >= self.max_attempts:
+            self._drop(item)
+            return
+        mails_retried.inc()
+        delay: float = min(self.max_backoff_seconds,
+                           self.backoff_seconds * 2 ** (item.attempts - 1))
+        with self._condition:
+            item.ready = self._clock() + delay
+            heapq.heappush(self._heap, item)
+            outbox_depth.set(len(self._heap))
+            self._condition.notify()
+
+    def _drop(self, item: OutboxMessage) -> None:
+        """
+        Method to give up on an email
+
+        Args:
+            item (OutboxMessage): the email
+        """
+        self.failed += 1
+        mails_failed.inc()
+        logger.warning('Dropped email to %s after %d attempts',
+                       item.recipient,
+                       item.attempts)
+
+    def _send_batch(self, batch: List[OutboxMessage]) -> None:
+        """
+        Method to send emails over one connection
+
+        Args:
+            batch (List[OutboxMessage]): the emails
+        """
+        try:
+            connection: smtplib.SMTP = self.pool.acquire()
+        except (smtplib.SMTPException, OSError):
+            logger.exception('Unable to connect to smtp server')
+            for item in batch:
+                self._retry(item)
+            return
+
+        for i, item in enumerate(batch):
+            try:
+                connection.sendmail(sender, item.recipient, item.message)
+                self.sent += 1
+                mails_sent.inc()
+            except (smtplib.SMTPRecipientsRefused,
+                    smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as err:
+                # refused by the server, retrying will not help unless the
+                # error is temporary
+                code: int = min(
+                    code for code, _ in err.recipients.values()) \
+                    if isinstance(err, smtplib.SMTPRecipientsRefused) \
+                    else err.smtp_code
+                if 400 <= code < 500:
+                    self._retry(item)
+                else:
+                    item.attempts += 1
+                    self._drop(item)
+            except (smtplib.SMTPException, OSError):
+                # connection broke, retry the rest on a new connection
+                self.pool.discard(connection)
+                for failed in batch[i:]:
+                    self._retry(failed)
+                return
+        self.pool.release(connection)
+
+    def _work(self) -> None:
+        """
+        Delivery thread loop
+        """
+        while True:
+            batch: Optional[List[OutboxMessage]] = self._take_batch()
+            if batch is None:
+                return
+            try:
+                self._send_batch(batch)
+            finally:
+                with self._condition:
+                    self._sending -= len(batch)
+                    self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Method to wait until the outbox is empty
+
+        Args:
+            timeout (float, optional): maximum seconds to wait
+
+        Returns:
+            bool: True if every email was delivered or dropped
+        """
+        deadline: Optional[float] = None if timeout is None \
+            else time.monotonic() + timeout
+        with self._condition:
+            while self._heap or self._sending:
+                remaining: Optional[float] = None if deadline is None \
+                    else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Method to deliver the ready emails and stop the delivery threads,
+        emails enqueued after are not sent
+
+        Args:
+            timeout (float, optional): maximum seconds to wait for delivery
+            by all threads
+        """
+        deadline: Optional[float] = None if timeout is None \
+            else time.monotonic() + timeout
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(None if deadline is None
+                        else max(0.0, deadline - time.monotonic()))
+        self.pool.close()
+
+
+# outbox of the emails of the application
+outbox: MailOutbox = MailOutbox(
+    workers=int(os.environ.get('HSTYLE_MAIL_WORKERS', '1')))
@@ -0,0 +1,419 @@
+"""
+Metrics service responsable for collecting application metrics and exposing
+them in the prometheus text format. metrics recorded in render worker
+processes are collected as changes and merged into the api process metrics.
+"""
+
+
+import abc
+import math
+import threading
+from typing import Any, Dict, List, Tuple
+
+
+# label values of a metric sample, sorted by label name
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# default histogram buckets (seconds)
+default_buckets: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                                      0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                                      120.0, 300.0, 600.0)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    """
+    Method to create a hashable key from metric labels
+
+    Args:
+        labels (Dict[str, str]): the labels
+
+    Returns:
+        LabelKey: labels sorted by name
+    """
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_sample(name: str, key: LabelKey, value: float) -> str:
+    """
+    Method to format a metric sample as a prometheus text line
+
+    Args:
+        name (str): sample name
+        key (LabelKey): sample labels
+        value (float): sample value
+
+    Returns:
+        str: prometheus text line
+    """
+    labels: str = ','.join(f'{label}="{label_value}"'
+                           for label, label_value in key)
+    labels = '{' + labels + '}' if labels else ''
+    value_text: str = '+Inf' if value == math.inf else repr(float(value))
+    return f'{name}{labels} {value_text}'
+
+
+class Metric(abc.ABC):
+    """
+    Base class of a metric
+    """
+    metric_type: str = 'untyped'
+
+    def __init__(self, name: str, documentation: str,
+                 registry: 'MetricsRegistry' = None):
+        """
+        Initialization Method
+
+        Args:
+            name (str): metric name
+            documentation (str): metric help text
+            registry (MetricsRegistry, optional): registry to add the metric
+            to, the default registry if not given
+        """
+        self.name: str = name
+        self.documentation: str = documentation
+        self._lock: threading.Lock = threading.Lock()
+        self._changes: Dict[LabelKey, Any] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """
+        Method to get the metric samples as prometheus text lines
+
+        Returns:
+            List[str]: the samples
+        """
+
+    def collect(self) -> Dict[LabelKey, Any]:
+        """
+        Method to take the changes of the metric since it was last collected
+
+        Returns:
+            Dict[LabelKey, Any]: the changes of each sample
+        """
+        with self._lock:
+            changes: Dict[LabelKey, Any] = self._changes
+            self._changes = {}
+        return changes
+
+    @abc.abstractmethod
+    def merge(self, changes: Dict[LabelKey, Any]) -> None:
+        """
+        Method to apply the changes collected from the same metric of
+        another process
+
+        Args:
+            changes (Dict[LabelKey, Any]): the changes of each sample
+        """
+
+    @abc.abstractmethod
+    def state(self) -> Dict[LabelKey, Any]:
+        """
+        Method to get the samples of the metric as changes, merging them
+        into a new metric copies the metric
+
+        Returns:
+            Dict[LabelKey, Any]: the samples
+        """
+
+    def render(self) -> str:
+        """
+        Method to render the metric in the prometheus text format
+
+        Returns:
+            str: the rendered metric
+        """
+        lines: List[str] = [f'# HELP {self.name} {self.documentation}',
+                            f'# TYPE {self.name} {self.metric_type}']
+        return '\n'.join(lines + self.samples())
+
+
+class Counter(Metric):
+    """
+    Class of a metric that only goes up
+    """
+    metric_type: str = 'counter'
+
+    def __init__(self, name: str, documentation: str,
+                 registry: 'MetricsRegistry' = None):
+        # samples are set before registering, registering may merge samples
+        self._values: Dict[LabelKey, float] = {}
+        super(Counter, self).__init__(name, documentation, registry)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """
+        Method to increment the counter
+
+        Args:
+            amount (float): amount to increment by
+            **labels (str): sample labels
+        """
+        key: LabelKey = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+            self._changes[key] = self._changes.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """
+        Method to get the counter value
+
+        Args:
+            **labels (str): sample labels
+
+        Returns:
+            float: the counter value
+        """
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [_format_sample(self.name, key, value)
+                    for key, value in self._values.items()]
+
+    def merge(self, changes: Dict[LabelKey, float]) -> None:
+        with self._lock:
+            for key, amount in changes.items():
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+    def state(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(Counter):
+    """
+    Class of a metric that can go up and down
+    """
+    metric_type: str = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        """
+        Method to set the gauge value
+
+        Args:
+            value (float): the new value
+            **labels (str): sample labels
+        """
+        key: LabelKey = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+            self._changes[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key: LabelKey = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+            # gauges are merged by their latest value
+            self._changes[key] = self._values[key]
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        """
+        Method to decrement the gauge
+
+        Args:
+            amount (float): amount to decrement by
+            **labels (str): sample labels
+        """
+        self.inc(-amount, **labels)
+
+    def merge(self, changes: Dict[LabelKey, float]) -> None:
+        with self._lock:
+            self._values.update(changes)
+
+
+class Histogram(Metric):
+    """
+    Class of a metric that counts observations in buckets
+    """
+    metric_type: str = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 registry: 'MetricsRegistry' = None,
+                 buckets: Tuple[float, ...] = default_buckets):
+        """
+        Initialization Method
+
+        Args:
+            name (str): metric name
+            documentation (str): metric help text
+            registry (MetricsRegistry, optional): registry to add the metric
+            to, the default registry if not given
+            buckets (Tuple[float, ...]): bucket upper bounds
+        """
+        # samples are set before registering, registering may merge samples
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+        super(Histogram, self).__init__(name, documentation, registry)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """
+        Method to add an observation
+
+        Args:
+            value (float): the observed value
+            **labels (str): sample labels
+        """
+        key: LabelKey = _label_key(labels)
+        with self._lock:
+            counts: List[int] = self._counts.setdefault(
+                key, [0] * len(self.buckets))
+            changes: Tuple[List[int], float] = self._changes.get(
+                key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    changes[0][i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+            self._changes[key] = (changes[0], changes[1] + value)
+
+    def count(self, **labels: str) -> int:
+        """
+        Method to get the number of observations
+
+        Args:
+            **labels (str): sample labels
+
+        Returns:
+            int: number of observations
+        """
+        counts: List[int] = self._counts.get(_label_key(labels))
+        return counts[-1] if counts else 0
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                for bound, count in zip(self.buckets, counts):
+                    bound_text: str = '+Inf' if bound == math.inf \
+                        else str(bound)
+                    lines.append(_format_sample(
+                        f'{self.name}_bucket', key + (('le', bound_text),),
+                        count))
+                lines.append(_format_sample(f'{self.name}_sum', key,
+                                            self._sums[key]))
+                lines.append(_format_sample(f'{self.name}_count', key,
+                                            counts[-1]))
+        return lines
+
+    def merge(self, changes: Dict[LabelKey, Tuple[List[int], float]]
+              ) -> None:
+        with self._lock:
+            for key, (count_changes, sum_change) in changes.items():
+                counts: List[int] = self._counts.setdefault(
+                    key, [0] * len(self.buckets))
+                for i, count in enumerate(count_changes):
+                    counts[i] += count
+                self._sums[key] = self._sums.get(key, 0.0) + sum_change
+
+    def state(self) -> Dict[LabelKey, Tuple[List[int], float]]:
+        with self._lock:
+            return {key: (list(counts), self._sums[key])
+                    for key, counts in self._counts.items()}
+
+
+class MetricsRegistry:
+    """
+    Class of a collection of metrics
+    """
+    def __init__(self):
+        """
+        Initialization Method
+        """
+        self._metrics: Dict[str, Metric] = {}
+        # names of metrics added by merging changes of another process
+        self._merged: set = set()
+        self._lock: threading.RLock = threading.RLock()
+
+    def register(self, metric: Metric) -> None:
+        """
+        Method to add a metric to registry, a metric added by merging
+        changes of another process is replaced, keeping its samples
+
+        Args:
+            metric (Metric): the metric
+
+        Raises:
+            ValueError: if a metric with same name already registered
+        """
+        with self._lock:
+            existing: Metric = self._metrics.get(metric.name)
+            if existing is not None:
+                if metric.name not in self._merged or \
+                        existing.metric_type != metric.metric_type:
+                    raise ValueError(
+                        f'Metric {metric.name} already registered')
+                self._merged.discard(metric.name)
+                metric.merge(existing.state())
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """
+        Method to render all metrics in the prometheus text format
+
+        Returns:
+            str: the rendered metrics
+        """
+        return '\n'.join(metric.render()
+                         for metric in list(self._metrics.values())) + '\n'
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Method to take the changes of all metrics since they were last
+        collected, to merge them into the registry of another process
+
+        Returns:
+            Dict[str, Dict[str, Any]]: type, help text, buckets and sample
+            changes of each changed metric, by name
+        """
+        collected: Dict[str, Dict[str, Any]] = {}
+        for metric in list(self._metrics.values()):
+            changes: Dict[LabelKey, Any] = metric.collect()
+            if changes:
+                collected[metric.name] = {
+                    'type': metric.metric_type,
+                    'documentation': metric.documentation,
+                    'buckets': getattr(metric, 'buckets', None),
+                    'changes': changes}
+        return collected
+
+    def _create(self, name: str, metric_changes: Dict[str, Any]) -> Metric:
+        """
+        Method to add a metric of collected changes to registry
+
+        Args:
+            name (str): metric name
+            metric_changes (Dict[str, Any]): type, help text and buckets of
+            the metric
+
+        Returns:
+            Metric: the metric
+        """
+        if metric_changes['type'] == Histogram.metric_type:
+            return Histogram(name, metric_changes['documentation'], self,
+                             metric_changes['buckets'][:-1])
+        if metric_changes['type'] == Gauge.metric_type:
+            return Gauge(name, metric_changes['documentation'], self)
+        return Counter(name, metric_changes['documentation'], self)
+
+    def merge(self, collected: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Method to apply metric changes collected in another process, metrics
+        only recorded in the other process are added to registry
+
+        Args:
+            collected (Dict[str, Dict[str, Any]]): the collected changes
+        """
+        for name, metric_changes in collected.items():
+            with self._lock:
+                metric: Metric = self._metrics.get(name)
+                if metric is None:
+                    # metric not recorded in this process (e.g. extractor
+                    # builds, only the render workers load tensorflow)
+                    metric = self._create(name, metric_changes)
+                    self._merged.add(name)
+                metric.merge(metric_changes['changes'])
+
+
+# default registry of the application
+REGISTRY: MetricsRegistry = MetricsRegistry()
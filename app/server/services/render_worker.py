@@ -0,0 +1,693 @@
+"""
+Render worker service responsable for running render jobs outside of the api
+request handling, with a bounded job queue and a limited number of workers.
+"""
+
+
+import abc
+import logging
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from server.services import metrics
+
+
+# logger of render workers
+logger: logging.Logger = logging.getLogger(__name__)
+
+# execution backends of render jobs
+THREAD_BACKEND: str = 'thread'
+PROCESS_BACKEND: str = 'process'
+
+# jobs waiting in queue
+queue_depth: metrics.Gauge = metrics.Gauge(
+    'hstyle_render_queue_depth', 'Render jobs waiting in queue')
+
+# jobs being rendered
+jobs_in_flight: metrics.Gauge = metrics.Gauge(
+    'hstyle_render_jobs_in_flight', 'Render jobs being rendered')
+
+# jobs rejected because queue was full
+jobs_rejected: metrics.Counter = metrics.Counter(
+    'hstyle_render_jobs_rejected_total',
+    'Render jobs rejected because the queue was full')
+
+# number of jobs run together by a worker
+batch_sizes: metrics.Histogram = metrics.Histogram(
+    'hstyle_render_batch_size', 'Render jobs run together by a worker',
+    buckets=(1, 2, 4, 8, 16))
+
+# progress queue and stop requests of the current process, set in worker
+# processes and in the api process when rendering in threads
+_progress_queue: Optional[Any] = None
+_stop_requests: Optional[Any] = None
+
+
+def _init_worker(progress_queue: Any, stop_requests: Any,
+                 initializer: Optional[Callable[[], None]],
+                 worker_setup: Optional[Callable[[int], None]] = None,
+                 slots: Optional[Any] = None) -> None:
+    """
+    Method to initialize a worker process
+
+    Args:
+        progress_queue (Any): queue to report progress to the api process
+        stop_requests (Any): shared dict of keys jobs were asked to stop by
+        initializer (Callable[[], None], optional): pool initializer
+        worker_setup (Callable[[int], None], optional): called with the
+        index of the worker process before the initializer
+        slots (Any, optional): shared counter of started worker processes,
+        the index of the next one
+    """
+    global _progress_queue, _stop_requests # pylint: disable=W0603
+    _progress_queue = progress_queue
+    _stop_requests = stop_requests
+    if worker_setup is not None and slots is not None:
+        with slots.get_lock():
+            slot: int = slots.value
+            slots.value += 1
+        worker_setup(slot)
+    if initializer is not None:
+        initializer()
+
+
+def _run_in_worker(func: Callable, args: Tuple,
+                   kwargs: Dict[str, Any]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Method to run a job function in a worker process, returning the metrics
+    recorded by the process since its previous job with the result
+
+    Args:
+        func (Callable): function to run
+        args (Tuple): function positional arguments
+        kwargs (Dict[str, Any]): function keyword arguments
+
+    Returns:
+        Tuple[Any, Dict[str, Any]]: the function result and the metric
+        changes of the process
+    """
+    # changes of a failed job are sent with the next job
+    result: Any = func(*args, **kwargs)
+    return result, metrics.REGISTRY.collect()
+
+
+def _merge_worker_metrics(future: Future) -> None:
+    """
+    Method to merge the metrics returned by a job run in a worker process
+
+    Args:
+        future (Future): future of _run_in_worker
+    """
+    if not future.cancelled() and future.exception() is None:
+        metrics.REGISTRY.merge(future.result()[1])
+
+
+def stop_requested(key: str) -> bool:
+    """
+    Method for a running job to check if it was asked to stop
+
+    Args:
+        key (str): the job key given to RenderWorkerPool.request_stop
+
+    Returns:
+        bool: True if job should stop
+    """
+    return _stop_requests is not None and key in _stop_requests
+
+
+def report_progress(job_id: str, progress: Dict[str, Any]) -> None:
+    """
+    Method to report the progress of a job from a worker to the pool
+    progress handler
+
+    Args:
+        job_id (str): the job id
+        progress (Dict[str, Any]): the progress, must be picklable
+    """
+    if _progress_queue is not None:
+        _progress_queue.put((job_id, progress))
+
+
+class QueueFullError(Exception):
+    """
+    Error raised when a job is submitted to a full queue
+    """
+
+
+class PoolClosedError(Exception):
+    """
+    Error raised when a job is submitted to a pool that is shutting down,
+    or set on queued jobs the worker processes were shut down before
+    """
+
+
+@dataclass
+class Job:
+    """
+    Class of a queued job
+
+    Attributes:
+        func (Callable): function to run
+        args (Tuple): function positional arguments
+        kwargs (Dict[str, Any]): function keyword arguments
+        future (Future): future of the job result
+        batch_key (Hashable, optional): jobs of the same key may run
+        together, None to always run alone
+        batch_func (Callable, optional): function running the positional
+        arguments of a list of jobs, returning the result of each
+    """
+    func: Callable
+    args: Tuple = ()
+    kwargs: Dict[str, Any] = field(default_factory=dict)
+    future: Future = field(default_factory=Future)
+    batch_key: Optional[Hashable] = None
+    batch_func: Optional[Callable] = None
+
+
+class JobQueue(abc.ABC):
+    """
+    Base class of a job queue
+    """
+    @abc.abstractmethod
+    def put(self, job: Job) -> None:
+        """
+        Method to add a job to queue
+
+        Args:
+            job (Job): the job
+
+        Raises:
+            QueueFullError: if queue is full
+        """
+
+    @abc.abstractmethod
+    def get(self, timeout: float) -> Optional[Job]:
+        """
+        Method to take the next job from queue
+
+        Args:
+            timeout (float): seconds to wait for a job
+
+        Returns:
+            Optional[Job]: the job, None if no job arrived in time
+        """
+
+    @abc.abstractmethod
+    def qsize(self) -> int:
+        """
+        Method to get the number of waiting jobs
+
+        Returns:
+            int: number of waiting jobs
+        """
+
+    @abc.abstractmethod
+    def take(self, batch_key: Hashable, limit: int) -> List[Job]:
+        """
+        Method to take waiting jobs of a batch key, in queue order
+
+        Args:
+            batch_key (Hashable): the batch key
+            limit (int): maximum number of jobs to take
+
+        Returns:
+            List[Job]: the jobs, removed from queue
+        """
+
+
+class InMemoryJobQueue(JobQueue):
+    """
+    Class of a bounded job queue in process memory
+    """
+    def __init__(self, max_size: int):
+        """
+        Initialization Method
+
+        Args:
+            max_size (int): maximum number of waiting jobs
+        """
+        self._queue: queue.Queue = queue.Queue(max_size)
+
+    def put(self, job: Job) -> None:
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full as err:
+            raise QueueFullError('Render queue is full') from err
+
+    def get(self, timeout: float) -> Optional[Job]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def take(self, batch_key: Hashable, limit: int) -> List[Job]:
+        taken: List[Job] = []
+        with self._queue.mutex:
+            remaining: List[Job] = []
+            for job in self._queue.queue:
+                if len(taken) < limit and job.batch_key == batch_key:
+                    taken.append(job)
+                else:
+                    remaining.append(job)
+            if taken:
+                self._queue.queue.clear()
+                self._queue.queue.extend(remaining)
+                self._queue.not_full.notify(len(taken))
+        return taken
+
+
+class RenderWorkerPool: # pylint: disable=R0902
+    """
+    Class of a pool of render workers consuming a job queue. with the
+    process backend each worker renders in its own process, with the thread
+    backend workers render in threads of the api process.
+    """
+    def __init__(self, workers: int = 1, max_queue_size: int = 8,
+                 backend: str = PROCESS_BACKEND,
+                 initializer: Optional[Callable[[], None]] = None,
+                 job_queue: Optional[JobQueue] = None,
+                 progress_handler: Optional[
+                     Callable[[str, Dict[str, Any]], None]] = None,
+                 worker_setup: Optional[Callable[[int], None]] = None,
+                 max_batch_size: int = 1):
+        """
+        Initialization Method
+
+        Args:
+            workers (int): number of jobs rendered at the same time
+            max_queue_size (int): maximum number of waiting jobs
+            backend (str): 'process' or 'thread'
+            initializer (Callable[[], None], optional): called in each
+            worker before its first job (e.g. to warm models)
+            job_queue (JobQueue, optional): the job queue, a bounded in
+            memory queue if not given
+            progress_handler (Callable[[str, Dict[str, Any]], None],
+            optional): called in the api process with job id and progress
+            of every report_progress call of the jobs
+            worker_setup (Callable[[int], None], optional): called in each
+            worker process with its index before the initializer (e.g. to
+            pin it to cpus), must be picklable. thread workers share the api
+            process and are not set up
+            max_batch_size (int): maximum number of queued jobs of the same
+            batch key a worker runs together, 1 to run every job alone
+
+        Raises:
+            ValueError: if backend is unknown
+        """
+        if backend not in (THREAD_BACKEND, PROCESS_BACKEND):
+            raise ValueError(f'Unknown render backend {backend}')
+        self.workers: int = workers
+        self.backend: str = backend
+        self.max_batch_size: int = max_batch_size
+        self._initializer: Optional[Callable[[], None]] = initializer
+        self._worker_setup: Optional[Callable[[int], None]] = worker_setup
+        self._queue: JobQueue = job_queue or InMemoryJobQueue(max_queue_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._threads: List[threading.Thread] = []
+        self._lock: threading.Lock = threading.Lock()
+        self._stopping: threading.Event = threading.Event()
+        self._in_flight: int = 0
+        self._progress_handler: Optional[
+            Callable[[str, Dict[str, Any]], None]] = progress_handler
+        self._progress_queue: Optional[Any] = None
+        self._manager: Optional[Any] = None
+        self._stop_requests: Optional[Any] = None
+        self._listener: Optional[threading.Thread] = None
+        self._listener_stopping: threading.Event = threading.Event()
+        self._warm_futures: List[Future] = []
+        self._warmed: int = 0
+
+    @property
+    def started(self) -> bool:
+        """
+        Whether the workers are running
+
+        Returns:
+            bool: True if workers are running
+        """
+        return bool(self._threads)
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether every worker ran its initializer, so renders start warm
+
+        Returns:
+            bool: True if workers are running and initialized
+        """
+        if not self.started:
+            return False
+        if self.backend == PROCESS_BACKEND:
+            return all(future.done() and future.exception() is None
+                       for future in self._warm_futures)
+        return self._warmed >= self.workers
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of jobs waiting in queue
+
+        Returns:
+            int: number of waiting jobs
+        """
+        return self._queue.qsize()
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Number of jobs being rendered
+
+        Returns:
+            int: number of running jobs
+        """
+        return self._in_flight
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        """
+        Method to create the worker processes executor
+
+        Returns:
+            ProcessPoolExecutor: the executor
+        """
+        # spawn, forking a process that already loaded tensorflow is unsafe
+        context: Any = multiprocessing.get_context('spawn')
+        # processes of a new executor take the worker indexes from 0
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._progress_queue, self._stop_requests,
+                      self._initializer, self._worker_setup,
+                      context.Value('i', 0)))
+
+    def _warm_processes(self) -> None:
+        """
+        Method to start the worker processes, which initialize before
+        running their first job, the caller holds the lock
+        """
+        self._warm_futures = [self._executor.submit(_run_in_worker, int, (),
+                                                    {})
+                              for _ in range(self.workers)]
+        for future in self._warm_futures:
+            # metrics of the initializer (e.g. extractor builds)
+            future.add_done_callback(_merge_worker_metrics)
+
+    def start(self) -> None:
+        """
+        Method to start the workers
+        """
+        with self._lock:
+            if self.started:
+                return
+            self._stopping.clear()
+            self._listener_stopping.clear()
+            if self.backend == PROCESS_BACKEND:
+                context: Any = multiprocessing.get_context('spawn')
+                self._progress_queue = context.Queue()
+                self._manager = context.Manager()
+                self._stop_requests = self._manager.dict()
+                self._executor = self._create_executor()
+                self._warm_processes()
+            else:
+                self._progress_queue = queue.Queue()
+                self._stop_requests = {}
+                _init_worker(self._progress_queue, self._stop_requests, None)
+            self._listener = threading.Thread(target=self._listen,
+                                              daemon=True,
+                                              name='render-progress')
+            self._listener.start()
+            self._threads = [
+                threading.Thread(target=self._work, daemon=True,
+                                 name=f'render-worker-{i}')
+                for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        Method to queue a job, starting the workers if needed
+
+        Args:
+            func (Callable): function to run, must be picklable with the
+            process backend
+            *args: function positional arguments
+            **kwargs: function keyword arguments
+
+        Raises:
+            PoolClosedError: if pool is shutting down
+            QueueFullError: if queue is full
+
+        Returns:
+            Future: future of the job result
+        """
+        return self._put(Job(func, args, kwargs))
+
+    def submit_batchable(self, batch_key: Hashable, batch_func: Callable,
+                         func: Callable, *args) -> Future:
+        """
+        Method to queue a job that a worker may run together with other
+        queued jobs of the same batch key, starting the workers if needed
+
+        Args:
+            batch_key (Hashable): key of the jobs that can run together
+            batch_func (Callable): function called with the positional
+            arguments of each job of a batch, returning the result of each,
+            must be picklable with the process backend
+            func (Callable): function to run the job alone, must be
+            picklable with the process backend
+            *args: function positional arguments
+
+        Raises:
+            PoolClosedError: if pool is shutting down
+            QueueFullError: if queue is full
+
+        Returns:
+            Future: future of the job result
+        """
+        return self._put(Job(func, args, batch_key=batch_key,
+                             batch_func=batch_func))
+
+    def _put(self, job: Job) -> Future:
+        """
+        Method to queue a job, starting the workers if needed
+
+        Args:
+            job (Job): the job
+
+        Raises:
+            PoolClosedError: if pool is shutting down
+            QueueFullError: if queue is full
+
+        Returns:
+            Future: future of the job result
+        """
+        if self._stopping.is_set():
+            raise PoolClosedError('Render workers are shutting down')
+        self.start()
+        try:
+            self._queue.put(job)
+        except QueueFullError:
+            jobs_rejected.inc()
+            raise
+        queue_depth.set(self.queue_depth)
+        return job.future
+
+    def _run(self, func: Callable, args: Tuple,
+             kwargs: Dict[str, Any]) -> Any:
+        """
+        Method to run a job function on the backend
+
+        Args:
+            func (Callable): function to run
+            args (Tuple): function positional arguments
+            kwargs (Dict[str, Any]): function keyword arguments
+
+        Raises:
+            PoolClosedError: if the worker processes were shut down
+
+        Returns:
+            Any: the function result
+        """
+        if self.backend == THREAD_BACKEND:
+            return func(*args, **kwargs)
+        with self._lock:
+            executor: Optional[ProcessPoolExecutor] = self._executor
+            if executor is None:
+                # never render in the api process
+                raise PoolClosedError('Render workers were shut down')
+            future: Future = executor.submit(_run_in_worker, func, args,
+                                             kwargs)
+        try:
+            result, changes = future.result()
+        except BrokenProcessPool:
+            # a worker process died (e.g. out of memory), replace the pool
+            # so following jobs can run, unless another job replaced it or
+            # the pool was shut down
+            logger.error('Render worker process died, restarting workers')
+            with self._lock:
+                if self._executor is executor:
+                    executor.shutdown(wait=False)
+                    self._executor = self._create_executor()
+                    self._warm_processes()
+            raise
+        # metrics of worker processes are exposed by the api process
+        metrics.REGISTRY.merge(changes)
+        return result
+
+    def request_stop(self, key: str) -> None:
+        """
+        Method to ask a job to stop, the job checks it with stop_requested
+
+        Args:
+            key (str): the job key
+        """
+        if self._stop_requests is not None:
+            self._stop_requests[key] = True
+
+    def clear_stop(self, key: str) -> None:
+        """
+        Method to forget a stop request of a finished job
+
+        Args:
+            key (str): the job key
+        """
+        if self._stop_requests is not None:
+            self._stop_requests.pop(key, None)
+
+    def _listen(self) -> None:
+        """
+        Method of the progress listener thread, passes reported progress to
+        progress handler until pool is stopped
+        """
+        while True:
+            try:
+                job_id, progress = self._progress_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._listener_stopping.is_set():
+                    return
+                continue
+            if self._progress_handler is not None:
+                try:
+                    self._progress_handler(job_id, progress)
+                except Exception: # pylint: disable=W0703
+                    logger.exception('Render progress handler failed')
+
+    def _work(self) -> None:
+        """
+        Method of a worker thread, runs jobs until pool is shutting down and
+        queue is empty
+        """
+        if self.backend == THREAD_BACKEND:
+            try:
+                if self._initializer is not None:
+                    self._initializer()
+                with self._lock:
+                    self._warmed += 1
+            except Exception: # pylint: disable=W0703
+                # renders still run, but cold and the pool is never ready
+                logger.exception('Render worker initializer failed')
+
+        while True:
+            job: Optional[Job] = self._queue.get(timeout=0.1)
+            if job is None:
+                if self._stopping.is_set():
+                    return
+                continue
+            # queued jobs of the same batch key run with the job
+            batch: List[Job] = [job]
+            if job.batch_key is not None and self.max_batch_size > 1:
+                batch += self._queue.take(job.batch_key,
+                                          self.max_batch_size - 1)
+            queue_depth.set(self.queue_depth)
+
+            batch = [batch_job for batch_job in batch
+                     if batch_job.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            with self._lock:
+                self._in_flight += len(batch)
+                jobs_in_flight.set(self._in_flight)
+            try:
+                self._run_batch(batch)
+            finally:
+                with self._lock:
+                    self._in_flight -= len(batch)
+                    jobs_in_flight.set(self._in_flight)
+
+    def _run_batch(self, batch: List[Job]) -> None:
+        """
+        Method to run a job, or jobs of a batch key in one batch call, and
+        set their results
+
+        Args:
+            batch (List[Job]): the running jobs
+        """
+        batch_sizes.observe(len(batch))
+        try:
+            if len(batch) == 1:
+                batch[0].future.set_result(self._run(
+                    batch[0].func, batch[0].args, batch[0].kwargs))
+                return
+            results: List[Any] = self._run(
+                batch[0].batch_func, ([job.args for job in batch],), {})
+            for job, result in zip(batch, results):
+                job.future.set_result(result)
+        except Exception as err: # pylint: disable=W0703
+            logger.exception('Render job failed')
+            for job in batch:
+                job.future.set_exception(err)
+
+    def _fail_queued(self) -> None:
+        """
+        Method to fail the jobs left in queue once the worker processes are
+        shut down
+        """
+        while True:
+            job: Optional[Job] = self._queue.get(timeout=0)
+            if job is None:
+                break
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(PoolClosedError(
+                    'Render workers were shut down before the job ran'))
+        queue_depth.set(self.queue_depth)
+
+    def shutdown(self, wait: bool = True,
+                 timeout: Optional[float] = None) -> None:
+        """
+        Method to stop accepting jobs and stop the workers once queued and
+        in flight jobs are done. worker processes are shut down after the
+        wait, jobs still queued then fail with PoolClosedError
+
+        Args:
+            wait (bool): wait for workers to finish
+            timeout (float, optional): maximum seconds to wait for each
+            worker
+        """
+        self._stopping.set()
+        if wait:
+            for thread in self._threads:
+                thread.join(timeout)
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+            self._threads = []
+            self._warm_futures = []
+            self._warmed = 0
+        if self.backend == PROCESS_BACKEND:
+            # no worker process is left to run the queued jobs
+            self._fail_queued()
+        # stop listener once workers can not report progress anymore
+        self._listener_stopping.set()
+        if wait and self._listener is not None:
+            self._listener.join(timeout)
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+            self._stop_requests = None
@@ -0,0 +1,374 @@
+"""
+Result cache service responsable for answering identical render requests
+from earlier renders. results are keyed by the hash of the render inputs and
+parameters, bounded in size with LRU eviction in memory and optionaly on
+disk, and duplicates of a render in progress wait on that render instead of
+rendering again.
+"""
+
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from server.services import metrics
+
+
+# lookup outcomes
+HIT: str = 'hit'
+JOINED: str = 'joined'
+MISS: str = 'miss'
+
+# result lookups by outcome (hit, joined a render in progress or miss)
+result_cache_lookups: metrics.Counter = metrics.Counter(
+    'hstyle_result_cache_lookups_total', 'Render result lookups by outcome')
+
+# size of results held in memory
+result_cache_bytes: metrics.Gauge = metrics.Gauge(
+    'hstyle_result_cache_bytes', 'Size of render results held in memory')
+
+
+@dataclass
+class CachedResult:
+    """
+    Class of a cached render result
+
+    Attributes:
+        result (bytes): the rendered image
+        report (Dict[str, Any]): the render report
+    """
+    result: bytes
+    report: Dict[str, Any] = field(default_factory=dict)
+
+
+def request_key(*parts: Any) -> str:
+    """
+    Method to create the cache key of a render request
+
+    Args:
+        *parts (Any): hashes of the input images and the render parameters
+
+    Returns:
+        str: the cache key
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(parts, default=str).encode())
+    return digest.hexdigest()
+
+
+class ResultCache: # pylint: disable=R0902
+    """
+    Class of a size bounded LRU cache of render results with in flight
+    coalescing. the job that misses renders (the leader), identical
+    requests arriving before it is done join it and get its result. a
+    stopped job leaves the render, which is stopped once no job waits on it.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024,
+                 persist_dir: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        """
+        Initialization Method
+
+        Args:
+            max_bytes (int): maximum total size of results held in memory
+            persist_dir (str, optional): folder to persist results in, None
+            to keep results only in memory
+            max_disk_bytes (int): maximum total size of persisted results
+        """
+        self.max_bytes: int = max_bytes
+        self.persist_dir: Optional[str] = persist_dir
+        self.max_disk_bytes: int = max_disk_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: 'OrderedDict[str, CachedResult]' = OrderedDict()
+        self._bytes: int = 0
+        self._inflight: Dict[str, List[str]] = {}
+        self._leader_keys: Dict[str, str] = {}
+        self._left: Set[str] = set()
+        self._lock: threading.Lock = threading.Lock()
+        if persist_dir is not None:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Share of lookups answered without rendering
+
+        Returns:
+            float: hits (including joined) over lookups, 0 before lookups
+        """
+        lookups: int = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _path(self, key: str) -> str:
+        """
+        Method to get the persisted file path of a key, without extension
+
+        Args:
+            key (str): the cache key
+
+        Returns:
+            str: the file path
+        """
+        return os.path.join(self.persist_dir, key)
+
+    def _put_memory(self, key: str, entry: CachedResult) -> None:
+        """
+        Method to add a result to memory, evicting the least recently used,
+        must be called with lock held
+
+        Args:
+            key (str): the cache key
+            entry (CachedResult): the result
+        """
+        previous: Optional[CachedResult] = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous.result)
+        self._entries[key] = entry
+        self._bytes += len(entry.result)
+        while self._bytes > self.max_bytes and self._entries:
+            self._bytes -= len(self._entries.popitem(last=False)[1].result)
+        result_cache_bytes.set(self._bytes)
+
+    def _read_disk(self, key: str) -> Optional[CachedResult]:
+        """
+        Method to read a persisted result
+
+        Args:
+            key (str): the cache key
+
+        Returns:
+            Optional[CachedResult]: the result, None if not persisted
+        """
+        if self.persist_dir is None or \
+                not os.path.exists(self._path(key) + '.json'):
+            return None
+        try:
+            with open(self._path(key) + '.bin', 'rb') as result_file:
+                result: bytes = result_file.read()
+            with open(self._path(key) + '.json',
+                      encoding='utf-8') as report_file:
+                report: Dict[str, Any] = json.load(report_file)
+            # mark as recently used for disk eviction
+            os.utime(self._path(key) + '.json')
+        except (OSError, ValueError):
+            # unreadable files, render again
+            return None
+        return CachedResult(result, report)
+
+    def _write_disk(self, key: str, entry: CachedResult) -> None:
+        """
+        Method to persist a result, evicting the least recently used
+        persisted results over the disk limit
+
+        Args:
+            key (str): the cache key
+            entry (CachedResult): the result
+        """
+        # the report is written last, a result is persisted once it exists
+        with open(self._path(key) + '.bin', 'wb') as result_file:
+            result_file.write(entry.result)
+        tmp_path: str = self._path(key) + '.json.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as report_file:
+            json.dump(entry.report, report_file, default=str)
+        os.replace(tmp_path, self._path(key) + '.json')
+
+        persisted: List[Tuple[float, int, str]] = []
+        for name in os.listdir(self.persist_dir):
+            if name.endswith('.json'):
+                path: str = os.path.join(self.persist_dir, name[:-5])
+                try:
+                    persisted.append((os.path.getmtime(path + '.json'),
+                                      os.path.getsize(path + '.bin'), path))
+                except OSError:
+                    continue
+        disk_bytes: int = sum(size for _, size, _ in persisted)
+        for _, size, path in sorted(persisted):
+            if disk_bytes <= self.max_disk_bytes:
+                break
+            for extension in ('.json', '.bin'):
+                try:
+                    os.remove(path + extension)
+                except OSError:
+                    pass
+            disk_bytes -= size
+
+    def lookup(self, key: str,
+               job_id: str) -> Tuple[str, Optional[CachedResult]]:
+        """
+        Method to look up the result of a request, joining the render of an
+        identical request in progress or making the job its leader on miss
+
+        Args:
+            key (str): the cache key
+            job_id (str): the job of the request
+
+        Returns:
+            Tuple[str, Optional[CachedResult]]: the outcome (hit, joined or
+            miss) and the result of a hit
+        """
+        with self._lock:
+            entry: Optional[CachedResult] = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            elif key in self._inflight:
+                self._inflight[key].append(job_id)
+                self.hits += 1
+                result_cache_lookups.inc(outcome=JOINED)
+                return JOINED, None
+
+        if entry is None:
+            entry = self._read_disk(key)
+            if entry is not None:
+                with self._lock:
+                    self._put_memory(key, entry)
+
+        with self._lock:
+            if entry is not None:
+                self.hits += 1
+                result_cache_lookups.inc(outcome=HIT)
+                return HIT, entry
+            if key in self._inflight:
+                # an identical request missed while reading disk
+                self._inflight[key].append(job_id)
+                self.hits += 1
+                result_cache_lookups.inc(outcome=JOINED)
+                return JOINED, None
+            self._inflight[key] = [job_id]
+            self._leader_keys[job_id] = key
+            self.misses += 1
+            result_cache_lookups.inc(outcome=MISS)
+            return MISS, None
+
+    def jobs(self, job_id: str) -> List[str]:
+        """
+        Method to get the jobs waiting on the render of a job
+
+        Args:
+            job_id (str): the rendering job
+
+        Returns:
+            List[str]: the jobs waiting on the render, the job (unless it
+            left the render) and the jobs that joined it
+        """
+        with self._lock:
+            key: Optional[str] = self._leader_keys.get(job_id)
+            if key is None:
+                return [] if job_id in self._left else [job_id]
+            return list(self._inflight[key])
+
+    def complete(self, job_id: str, result: bytes,
+                 report: Optional[Dict[str, Any]] = None) -> List[str]:
+        """
+        Method to cache the result of a render
+
+        Args:
+            job_id (str): the rendering job
+            result (bytes): the rendered image
+            report (Dict[str, Any], optional): the render report
+
+        Returns:
+            List[str]: the jobs waiting on the render, the job (unless it
+            left the render) and the jobs that joined it
+        """
+        entry: CachedResult = CachedResult(result, report or {})
+        with self._lock:
+            key: Optional[str] = self._leader_keys.pop(job_id, None)
+            if key is None:
+                return self._end_left(job_id)
+            self._put_memory(key, entry)
+            waiting: List[str] = self._inflight.pop(key)
+        if self.persist_dir is not None:
+            try:
+                self._write_disk(key, entry)
+            except OSError:
+                # memory result still answers identical requests
+                pass
+        return waiting
+
+    def release(self, job_id: str) -> List[str]:
+        """
+        Method to end the render of a job without caching a result (failed,
+        rejected or stopped), the next identical request renders again
+
+        Args:
+            job_id (str): the rendering job
+
+        Returns:
+            List[str]: the jobs waiting on the render, the job (unless it
+            left the render) and the jobs that joined it
+        """
+        with self._lock:
+            key: Optional[str] = self._leader_keys.pop(job_id, None)
+            if key is None:
+                return self._end_left(job_id)
+            return self._inflight.pop(key)
+
+    def _end_left(self, job_id: str) -> List[str]:
+        """
+        Method to end a render that is not coalesced, must be called with
+        lock held
+
+        Args:
+            job_id (str): the rendering job
+
+        Returns:
+            List[str]: the job, none if it left its render before it was
+            stopped
+        """
+        if job_id in self._left:
+            self._left.discard(job_id)
+            return []
+        return [job_id]
+
+    def detach(self, job_id: str) -> Optional[str]:
+        """
+        Method to stop a job from waiting on a render. the render goes on
+        while other jobs wait on it, otherwise it is no longer joined and
+        should be stopped
+
+        Args:
+            job_id (str): the stopped job
+
+        Returns:
+            Optional[str]: the job of the render to stop, job_id itself if
+            the job renders alone (it keeps its render as result), None if
+            other jobs wait on the render
+        """
+        with self._lock:
+            key: Optional[str] = self._leader_keys.get(job_id)
+            if key is None:
+                key = next((inflight_key for inflight_key, waiting
+                            in self._inflight.items() if job_id in waiting),
+                           None)
+                if key is None:
+                    return job_id
+            waiting: List[str] = self._inflight[key]
+            waiting.remove(job_id)
+            if waiting:
+                return None
+            # nobody waits on the render, identical requests render again
+            del self._inflight[key]
+            leader: str = next(leader for leader, leader_key
+                               in self._leader_keys.items()
+                               if leader_key == key)
+            del self._leader_keys[leader]
+            if leader != job_id:
+                self._left.add(leader)
+            return leader
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Method to get cache statistics
+
+        Returns:
+            Dict[str, Any]: number of entries, size, hits, misses, hit rate
+            and renders in progress
+        """
+        return {'entries': len(self._entries), 'bytes': self._bytes,
+                'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate,
+                'in_flight': len(self._inflight)}
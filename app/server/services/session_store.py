@@ -0,0 +1,143 @@
+"""
+Session store service responsable for keeping prepared render inputs (decoded
+uploads, resized images, previous renders) keyed by image hash, so users
+re-rendering the same images with other loss weights skip the preparation.
+entries are bounded in number and expire after a time to live.
+"""
+
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from server.services import metrics
+
+
+# session lookups served from store
+session_store_hits: metrics.Counter = metrics.Counter(
+    'hstyle_session_store_hits_total',
+    'Prepared render input lookups served from the session store')
+
+# session lookups that prepared the input
+session_store_misses: metrics.Counter = metrics.Counter(
+    'hstyle_session_store_misses_total',
+    'Prepared render input lookups that prepared the input')
+
+
+class SessionStore:
+    """
+    Class of an in memory LRU store of prepared render inputs. the least
+    recently used entries are evicted above the entries limit, and entries
+    expire after their time to live.
+    """
+    def __init__(self, max_entries: int = 64, ttl_seconds: float = 900.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialization Method
+
+        Args:
+            max_entries (int): maximum number of entries held
+            ttl_seconds (float): seconds an entry is kept after its last use
+            clock (Callable[[], float]): time source
+        """
+        self.max_entries: int = max_entries
+        self.ttl_seconds: float = ttl_seconds
+        self.hits: int = 0
+        self.misses: int = 0
+        self._clock: Callable[[], float] = clock
+        self._entries: 'OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]' \
+            = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        """
+        Method to remove expired entries, the caller holds the lock
+
+        Args:
+            now (float): the current time
+        """
+        while self._entries:
+            key, (used, _) = next(iter(self._entries.items()))
+            if now - used <= self.ttl_seconds:
+                break
+            del self._entries[key]
+
+    def get(self, kind: str, key: Hashable) -> Optional[Any]:
+        """
+        Method to get an entry, marking it as used
+
+        Args:
+            kind (str): entry kind, e.g. 'upload' or 'image'
+            key (Hashable): the entry key
+
+        Returns:
+            Optional[Any]: the entry value, None if missing or expired
+        """
+        now: float = self._clock()
+        with self._lock:
+            self._expire(now)
+            entry: Optional[Tuple[float, Any]] = self._entries.get((kind, key))
+            if entry is None:
+                return None
+            self._entries[(kind, key)] = (now, entry[1])
+            self._entries.move_to_end((kind, key))
+            return entry[1]
+
+    def put(self, kind: str, key: Hashable, value: Any) -> None:
+        """
+        Method to add an entry, evicting the least recently used
+
+        Args:
+            kind (str): entry kind
+            key (Hashable): the entry key
+            value (Any): the entry value
+        """
+        now: float = self._clock()
+        with self._lock:
+            self._expire(now)
+            self._entries[(kind, key)] = (now, value)
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, kind: str, key: Hashable,
+                       compute: Callable[[], Any]) -> Any:
+        """
+        Method to get an entry, computing and storing it on miss
+
+        Args:
+            kind (str): entry kind, for metrics
+            key (Hashable): the entry key
+            compute (Callable[[], Any]): computes the entry value
+
+        Returns:
+            Any: the entry value
+        """
+        value: Optional[Any] = self.get(kind, key)
+        if value is not None:
+            self.hits += 1
+            session_store_hits.inc(kind=kind)
+            return value
+
+        self.misses += 1
+        session_store_misses.inc(kind=kind)
+        value = compute()
+        self.put(kind, key, value)
+        return value
+
+    def clear(self) -> None:
+        """
+        Method to remove all entries
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Method to get store statistics
+
+        Returns:
+            Dict[str, int]: number of entries, hits and misses
+        """
+        return {'entries': len(self._entries), 'hits': self.hits,
+                'misses': self.misses}
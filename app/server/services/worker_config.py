@@ -0,0 +1,138 @@
+"""
+Render worker configuration service responsable for splitting the cpus of
+the host between render worker processes. each worker is pinned to its own
+cpu set and its tensorflow runtime uses as many intra op threads as the set
+has cpus, so concurrent renders do not compete for the same cores.
+"""
+
+
+import os
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+# logger of render worker configuration
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WorkerConfig:
+    """
+    Class of the cpu configuration of a render worker process
+
+    Attributes:
+        intra_op_threads (int): threads running a single op (convolutions),
+        0 for the tensorflow default (every cpu of the host)
+        inter_op_threads (int): threads running independent ops, 0 for the
+        tensorflow default
+        cpus (List[int], optional): cpus the worker is pinned to, None to
+        not pin it
+    """
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    cpus: Optional[List[int]] = None
+
+
+def available_cpus() -> List[int]:
+    """
+    Method to get the cpus the current process may run on
+
+    Returns:
+        List[int]: the cpu ids
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cpu_list(cpu_list: str) -> List[int]:
+    """
+    Method to parse a cpu list in the linux format (e.g. '0-3,6')
+
+    Args:
+        cpu_list (str): the cpu list, empty for none
+
+    Raises:
+        ValueError: if cpu list is malformed
+
+    Returns:
+        List[int]: the sorted cpu ids
+    """
+    cpus: set = set()
+    for part in cpu_list.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return sorted(cpus)
+
+
+def plan_workers(workers: int, cpus: Optional[List[int]] = None,
+                 intra_op_threads: int = 0, inter_op_threads: int = 0,
+                 pin: bool = True) -> List[WorkerConfig]:
+    """
+    Method to split cpus between render workers, each worker gets a
+    contiguous cpu set (workers share cpus when there are more workers than
+    cpus)
+
+    Args:
+        workers (int): number of render workers
+        cpus (List[int], optional): cpus to split, the cpus of the current
+        process if not given
+        intra_op_threads (int): intra op threads of each worker, 0 for the
+        number of cpus of the worker
+        inter_op_threads (int): inter op threads of each worker, 0 for up to
+        2 (a render step is a chain of dependent ops)
+        pin (bool): pin each worker to its cpu set
+
+    Returns:
+        List[WorkerConfig]: the configuration of each worker
+    """
+    cpus: List[int] = cpus or available_cpus()
+    configs: List[WorkerConfig] = []
+    for i in range(workers):
+        # worker i takes cpus [i * n / workers, (i + 1) * n / workers), or
+        # a single cpu in turn when there are fewer cpus than workers
+        worker_cpus: List[int] = \
+            cpus[i * len(cpus) // workers:(i + 1) * len(cpus) // workers] \
+            if workers <= len(cpus) else [cpus[i % len(cpus)]]
+        configs.append(WorkerConfig(
+            intra_op_threads or len(worker_cpus),
+            inter_op_threads or min(2, len(worker_cpus)),
+            worker_cpus if pin else None))
+    return configs
+
+
+def apply_worker_config(configs: List[WorkerConfig], slot: int) -> None:
+    """
+    Method to configure the current render worker process, must run before
+    tensorflow executes its first op
+
+    Args:
+        configs (List[WorkerConfig]): the configuration of each worker
+        slot (int): index of the worker
+    """
+    config: WorkerConfig = configs[slot % len(configs)]
+    if config.cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, config.cpus)
+    if config.intra_op_threads:
+        # openmp pools of the mkl kernels are sized when first used
+        os.environ['OMP_NUM_THREADS'] = str(config.intra_op_threads)
+
+    import tensorflow as tf # pylint: disable=C0415
+    try:
+        if config.intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(
+                config.intra_op_threads)
+        if config.inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(
+                config.inter_op_threads)
+    except RuntimeError:
+        # tensorflow runtime already started with its default thread pools
+        logger.warning('Render worker %d thread counts not applied, '
+                       'tensorflow already initialized', slot)
+    logger.info('Render worker %d on cpus %s with %d intra op and %d inter '
+                'op threads', slot, config.cpus or 'all',
+                config.intra_op_threads, config.inter_op_threads)
@@ -2,9 +2,16 @@
 Tests for main controller
 """
 
+import os
+import sys
+import subprocess
 from requests import Response
+from unittest import mock
+from unittest.mock import patch, PropertyMock
 from fastapi.testclient import TestClient
 from server.controllers.main import app
+from server.machine_learning import target_cache
+from server.services import render_worker
 
 
 # create a client for testing
@@ -21,3 +28,110 @@ def test_main_api_end_point() -> None:
     # Assert
     assert response.status_code == 200
     assert response.url == 'http://testserver/docs'
+
+
+def test_metrics_end_point() -> None:
+    """
+    Test method of main controller metrics end point
+    """
+    # Act
+    response: Response = client.get("/metrics")
+
+    # Assert
+    assert response.status_code == 200
+    assert 'hstyle_render_queue_depth' in response.text
+
+
+def count_target_cache_hit() -> int:
+    """
+    Render worker method to record a target cache hit
+
+    Returns:
+        int: the worker process id
+    """
+    target_cache.target_cache_hits.inc(kind='worker_test')
+    return os.getpid()
+
+
+def test_metrics_of_render_worker_processes() -> None:
+    """
+    Test method of main controller metrics end point exposing metrics
+    recorded in render worker processes
+    """
+    # Arrange
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        workers=1, backend=render_worker.PROCESS_BACKEND)
+
+    # Act
+    worker_pid: int = pool.submit(count_target_cache_hit).result(timeout=120)
+    response: Response = client.get("/metrics")
+    pool.shutdown()
+
+    # Assert
+    assert worker_pid != os.getpid()
+    assert 'hstyle_target_cache_hits_total{kind="worker_test"} 1.0' in \
+        response.text
+
+
+@patch('server.controllers.style_transfer.stop_workers')
+@patch('server.controllers.style_transfer.start_workers')
+def test_startup_and_shutdown_manage_workers(
+    mock_start_workers: mock.MagicMock,
+    mock_stop_workers: mock.MagicMock) -> None:
+    """
+    Test method of main controller startup and shutdown events managing the
+    render workers
+
+    Args:
+        mock_start_workers (mock.MagicMock): mock
+        mock_stop_workers (mock.MagicMock): mock
+    """
+    # Act
+    with TestClient(app):
+        mock_stop_workers.assert_not_called()
+
+    # Assert
+    mock_start_workers.assert_called_once()
+    mock_stop_workers.assert_called_once()
+
+
+@patch.object(render_worker.RenderWorkerPool, 'ready',
+              new_callable=PropertyMock)
+def test_ready_end_point(mock_ready: mock.MagicMock) -> None:
+    """
+    Test method of main controller readiness end point
+
+    Args:
+        mock_ready (mock.MagicMock): mock
+    """
+    # Arrange
+    mock_ready.side_effect = [False, True]
+
+    # Act
+    warming: Response = client.get("/ready")
+    ready: Response = client.get("/ready")
+
+    # Assert
+    assert warming.status_code == 503
+    assert warming.json()['ready'] is False
+    assert ready.status_code == 200
+    assert ready.json()['ready'] is True
+
+
+def test_import_does_not_load_tensorflow() -> None:
+    """
+    Test method of main controller starting without loading tensorflow
+    """
+    # Arrange
+    # folder of the server package, so it imports from any working folder
+    app_dir: str = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), '..', '..', '..')
+
+    # Act
+    process: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, '-c', 'import sys; import server.controllers.main; '
+         'print("tensorflow" in sys.modules)'],
+        cwd=app_dir, capture_output=True, text=True, check=True)
+
+    # Assert
+    assert process.stdout.strip() == 'False'
@@ -3,11 +3,18 @@ Tests for style transfer controller
 """
 
 
+import io
 import os
+import pytest
 import numpy as np
-from typing import Dict
+from concurrent.futures import Future
+from typing import Any, Dict
+from PIL import Image
 from fastapi.testclient import TestClient
+from server.controllers import style_transfer, uploads
 from server.controllers.main import app
+from server.machine_learning.style_transfer import RenderReport
+from server.services import render_worker, job_store, result_cache
 from unittest import mock
 from unittest.mock import patch
 from requests import Response
@@ -20,14 +27,27 @@ dir_path: str = os.path.dirname(os.path.realpath(__file__))
 client = TestClient(app)
 
 
-@patch('server.controllers.style_transfer.render_image_background')
+@pytest.fixture(autouse=True)
+def empty_result_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Fixture to render every request of a test, identical requests of other
+    tests never finish their mocked renders
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    monkeypatch.setattr(style_transfer, 'results',
+                        result_cache.ResultCache())
+
+
+@patch('server.controllers.style_transfer.render_pool.submit')
 def test_render_image_without_images(
-    mock_render_image_background: mock.MagicMock) -> None:
+    mock_submit: mock.MagicMock) -> None:
     """
     Test method of style transfer controller api end point with images
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
 
     # Arrange
@@ -42,31 +62,22 @@ def test_render_image_without_images(
                                      data=data)
 
     # Assert
-    mock_render_image_background.assert_called()
-    assert mock_render_image_background.call_args[0][:4] == ('test@test.com',
-                                                             150.0, 0.01, 30.0)
+    mock_submit.assert_called()
+    assert mock_submit.call_args[0][2:5] == (150.0, 0.01, 30.0)
     assert response.status_code == 200
 
 
-@patch('server.controllers.style_transfer.render_image_background')
+@patch('server.controllers.style_transfer.render_pool.submit')
 def test_render_image_with_images(
-    mock_render_image_background: mock.MagicMock) -> None:
+    mock_submit: mock.MagicMock) -> None:
     """
     Test method of style transfer controller api end point without images
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
 
     # Arrange
-    files: Dict[str, tuple] = {
-            "content_image": ("test_content_image",
-                               open(dir_path + '/../../data/modern.png', "rb"),
-                               "image/png"),
-            "style_image": ("test_style_image",
-                             open(dir_path + '/../../data/historical.png', "rb"),
-                             "image/png")}
-
     data: Dict[str, str] = {"email": "test@test.com",
             "content_loss": "150",
             "style_loss": "0.01",
@@ -74,23 +85,27 @@ def test_render_image_with_images(
             "apply_dilation": "true"}
 
     # Act
-    response: Response = client.post("/api/styleTransfer/renderImage/",
-                                     data=data, files=files)
+    with open(dir_path + '/../../data/modern.png', "rb") as content, \
+            open(dir_path + '/../../data/historical.png', "rb") as style:
+        files: Dict[str, tuple] = {
+            "content_image": ("test_content_image", content, "image/png"),
+            "style_image": ("test_style_image", style, "image/png")}
+        response: Response = client.post("/api/styleTransfer/renderImage/",
+                                         data=data, files=files)
 
     # Assert
-    assert mock_render_image_background.call_args[0][:4] == ('test@test.com',
-                                                             150.0, 0.01, 30.0)
+    assert mock_submit.call_args[0][2:5] == (150.0, 0.01, 30.0)
     assert response.status_code == 200
 
 
-@patch('server.controllers.style_transfer.render_image_background')
+@patch('server.controllers.style_transfer.render_pool.submit')
 def test_render_image_with_wrong_images(
-    mock_render_image_background: mock.MagicMock) -> None:
+    mock_submit: mock.MagicMock) -> None:
     """
     Test method of style transfer controller api end point with wrong images
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
     # Arrange
     files: Dict[str, tuple] = {"content_image": ("test_content_image",
@@ -111,20 +126,71 @@ def test_render_image_with_wrong_images(
                                      data=data, files=files)
 
     # Assert
-    mock_render_image_background.assert_not_called()
+    mock_submit.assert_not_called()
     assert response.status_code == 422
     assert response.json()['detail'] == ('Unable to process image file')
 
 
-@patch('server.controllers.style_transfer.render_image_background')
+@patch('server.controllers.uploads.form_fields_bytes', 4 * 1024 * 1024)
+@patch('server.controllers.uploads.max_upload_bytes', 1024)
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_upload_too_large(
+    mock_submit: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller api end point with an image
+    file bigger than allowed
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+    """
+    # Arrange
+    data: Dict[str, str] = {"email": "test@test.com",
+            "content_loss": "150",
+            "style_loss": "0.01",
+            "total_variation_loss": "30",
+            "apply_dilation": "false"}
+
+    # Act
+    with open(dir_path + '/../../data/modern.png', "rb") as content:
+        response: Response = client.post(
+            "/api/styleTransfer/renderImage/", data=data,
+            files={"content_image": ("test_content_image", content,
+                                     "image/png")})
+
+    # Assert
+    mock_submit.assert_not_called()
+    assert response.status_code == 413
+    assert response.json()['detail'] == 'Image file is too large'
+
+
+def test_decode_image_reduced_jpeg() -> None:
+    """
+    Test method of style transfer controller decoding a large jpeg at a
+    reduced scale keeping the rendered size
+    """
+    # Arrange
+    jpeg: io.BytesIO = io.BytesIO()
+    Image.new('RGB', (2000, 1000), (255, 0, 0)).save(jpeg, format='JPEG')
+    jpeg.seek(0)
+
+    # Act
+    img: np.ndarray = uploads.decode_image(jpeg, 512)
+
+    # Assert
+    assert img.shape == (500, 1000, 3)
+    assert not img.flags.writeable
+    assert img[0, 0, 0] > 200
+
+
+@patch('server.controllers.style_transfer.render_pool.submit')
 def test_render_image_wrong_max_content_loss(
-    mock_render_image_background: mock.MagicMock) -> None:
+    mock_submit: mock.MagicMock) -> None:
     """
     Test method of style transfer controller api end point with content
     loss larger than allowed
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
     # Arrange
     data: Dict[str, str] = {"email": "test@test.com",
@@ -138,22 +204,22 @@ def test_render_image_wrong_max_content_loss(
                                      data=data)
 
     # Assert
-    mock_render_image_background.assert_not_called()
+    mock_submit.assert_not_called()
     assert response.status_code == 422
     assert response.json()['detail'][0]['msg'] == ('ensure this value is'
                                                    ' less than or equal to'
                                                    ' 100000.0')
 
 
-@patch('server.controllers.style_transfer.render_image_background')
+@patch('server.controllers.style_transfer.render_pool.submit')
 def test_render_image_wrong_min_content_loss(
-    mock_render_image_background: mock.MagicMock) -> None:
+    mock_submit: mock.MagicMock) -> None:
     """
     Test method of style transfer controller api end point with content
     loss smaller than allowed
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
     # Arrange
     data: Dict[str, str] = {"email": "test@test.com",
@@ -167,22 +233,22 @@ def test_render_image_wrong_min_content_loss(
                                      data=data)
 
     # Assert
-    mock_render_image_background.assert_not_called()
+    mock_submit.assert_not_called()
     assert response.status_code == 422
     assert response.json()['detail'][0]['msg'] == ('ensure this value is'
                                                    ' greater than or equal to'
                                                    ' 10.0')
 
 
-@patch('server.controllers.style_transfer.render_image_background')
+@patch('server.controllers.style_transfer.render_pool.submit')
 def test_render_image_wrong_max_style_loss(
-    mock_render_image_background: mock.MagicMock) -> None:
+    mock_submit: mock.MagicMock) -> None:
     """
     Test method of style transfer controller api end point with style
     loss larger than allowed
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
     # Arrange
     data: Dict[str, str] = {"email": "test@test.com",
@@ -196,22 +262,22 @@ def test_render_image_wrong_max_style_loss(
                                      data=data)
 
     # Assert
-    mock_render_image_background.assert_not_called()
+    mock_submit.assert_not_called()
     assert response.status_code == 422
     assert response.json()['detail'][0]['msg'] == ('ensure this value is'
                                                    ' less than or equal to'
                                                    ' 0.01')
 
 
-@patch('server.controllers.style_transfer.render_image_background')
+@patch('server.controllers.style_transfer.render_pool.submit')
 def test_render_image_wrong_min_style_loss(
-    mock_render_image_background: mock.MagicMock) -> None:
+    mock_submit: mock.MagicMock) -> None:
     """
     Test method of style transfer controller api end point with style
     loss smaller than allowed
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
     # Arrange
     data: Dict[str, str] = {"email": "test@test.com",
@@ -225,22 +291,22 @@ def test_render_image_wrong_min_style_loss(
                                      data=data)
 
     # Assert
-    mock_render_image_background.assert_not_called()
+    mock_submit.assert_not_called()
     assert response.status_code == 422
     assert response.json()['detail'][0]['msg'] == ('ensure this value is'
                                                    ' greater than or equal to'
                                                    ' 0.01')
 
 
-@patch('server.controllers.style_transfer.render_image_background')
+@patch('server.controllers.style_transfer.render_pool.submit')
 def test_render_image_wrong_max_total_variation_loss(
-    mock_render_image_background: mock.MagicMock) -> None:
+    mock_submit: mock.MagicMock) -> None:
     """
     Test method of style transfer controller api end point with total
     variation loss larger than allowed
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
 
     # Arrange
@@ -255,22 +321,22 @@ def test_render_image_wrong_max_total_variation_loss(
                                      data=data)
 
     # Assert
-    mock_render_image_background.assert_not_called()
+    mock_submit.assert_not_called()
     assert response.status_code == 422
     assert response.json()['detail'][0]['msg'] == ('ensure this value is'
                                                    ' less than or equal to'
                                                    ' 30.0')
 
 
-@patch('server.controllers.style_transfer.render_image_background')
+@patch('server.controllers.style_transfer.render_pool.submit')
 def test_render_image_wrong_min_total_variation_loss(
-    mock_render_image_background: mock.MagicMock) -> None:
+    mock_submit: mock.MagicMock) -> None:
     """
     Test method of style transfer controller api end point with total
     variation loss smaller than allowed
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
     # Arrange
     data: Dict[str, str] = {"email": "test@test.com",
@@ -284,26 +350,106 @@ def test_render_image_wrong_min_total_variation_loss(
                                      data=data)
 
     # Assert
-    mock_render_image_background.assert_not_called()
+    mock_submit.assert_not_called()
     assert response.status_code == 422
     assert response.json()['detail'][0]['msg'] == ('ensure this value is'
                                                    ' greater than or equal to'
                                                    ' 30.0')
 
 
-@patch('server.services.mail_service.send_image_by_email')
-@patch('server.machine_learning.style_transfer.render_image')
-def test_render_render_image_background(
-    mock_render_image: mock.MagicMock,
-    mock_send_image_by_email: mock.MagicMock) -> None:
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_wrong_quality(mock_submit: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller api end point with unknown
+    quality tier
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+    """
+    # Arrange
+    data: Dict[str, str] = {"email": "test@test.com",
+            "content_loss": "150",
+            "style_loss": "0.01",
+            "total_variation_loss": "30",
+            "apply_dilation": "true",
+            "quality": "best"}
+
+    # Act
+    response: Response = client.post("/api/styleTransfer/renderImage/",
+                                     data=data)
+
+    # Assert
+    mock_submit.assert_not_called()
+    assert response.status_code == 422
+
+
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_with_quality(mock_submit: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller api end point with a quality
+    tier
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+    """
+    # Arrange
+    data: Dict[str, str] = {"email": "test@test.com",
+            "content_loss": "150",
+            "style_loss": "0.01",
+            "total_variation_loss": "30",
+            "apply_dilation": "false",
+            "quality": "draft"}
+
+    # Act
+    response: Response = client.post("/api/styleTransfer/renderImage/",
+                                     data=data)
+
+    # Assert
+    assert response.status_code == 200
+    assert mock_submit.call_args[0][-5:-1] == ('draft', 'auto', 512, False)
+
+
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_wrong_max_output_size(
+    mock_submit: mock.MagicMock) -> None:
     """
-    Test method of style transfer controller to test render image background
-    method
+    Test method of style transfer controller api end point with output size
+    bigger than allowed
 
     Args:
-        mock_render_image_background (mock.MagicMock): mock
+        mock_submit (mock.MagicMock): mock
     """
     # Arrange
+    data: Dict[str, str] = {"email": "test@test.com",
+            "content_loss": "150",
+            "style_loss": "0.01",
+            "total_variation_loss": "30",
+            "apply_dilation": "false",
+            "output_size": "8192"}
+
+    # Act
+    response: Response = client.post("/api/styleTransfer/renderImage/",
+                                     data=data)
+
+    # Assert
+    mock_submit.assert_not_called()
+    assert response.status_code == 422
+    assert response.json()['detail'][0]['msg'] == ('ensure this value is'
+                                                   ' less than or equal to'
+                                                   ' 4096')
+
+
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_queue_full(mock_submit: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller api end point when render
+    queue is full
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+    """
+    # Arrange
+    mock_submit.side_effect = render_worker.QueueFullError()
     data: Dict[str, str] = {"email": "test@test.com",
             "content_loss": "150",
             "style_loss": "0.01",
@@ -315,6 +461,466 @@ def test_render_render_image_background(
                                      data=data)
 
     # Assert
-    mock_render_image.assert_called()
-    mock_send_image_by_email.assert_called()
+    assert response.status_code == 429
+
+
+@patch('server.machine_learning.render.render_image_with_report')
+def test_render_image_job(mock_render_image: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller render worker method
+
+    Args:
+        mock_render_image (mock.MagicMock): mock
+    """
+    # Arrange
+    img: np.ndarray = np.zeros((3, 3, 3), np.uint8)
+    mock_render_image.return_value = (
+        Image.new('RGB', (3, 3)),
+        RenderReport(stop_reason='converged'))
+
+    # Act
+    result: Dict[str, Any] = style_transfer.render_image_job(
+        'job', 150.0, 0.01, 30.0, img, img, 'draft')
+
+    # Assert
+    options = mock_render_image.call_args[0][10]
+    assert options.max_steps == style_transfer.quality_tiers['draft'][
+        'max_steps']
+    assert Image.open(io.BytesIO(result['image'])).format == 'PNG'
+    assert result['report']['stop_reason'] == 'converged'
+
+
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_same_upload_decoded_once(
+    mock_submit: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller api end point decoding a
+    re-submitted image once
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+    """
+    # Arrange
+    uploads.upload_store.clear()
+    data: Dict[str, str] = {"email": "test@test.com",
+            "content_loss": "150",
+            "style_loss": "0.01",
+            "total_variation_loss": "30",
+            "apply_dilation": "false",
+            "warm_start": "true"}
+
+    # Act
+    for content_loss in ("150", "300"):
+        with open(dir_path + '/../../data/modern.png', "rb") as content:
+            response: Response = client.post(
+                "/api/styleTransfer/renderImage/",
+                data={**data, "content_loss": content_loss},
+                files={"content_image": ("test_content_image", content,
+                                         "image/png")})
+
+    # Assert
     assert response.status_code == 200
+    assert mock_submit.call_args[0][-2] is True
+    first_img: np.ndarray = mock_submit.call_args_list[0][0][5]
+    assert mock_submit.call_args[0][5] is first_img
+    assert uploads.upload_store.stats()['entries'] == 1
+
+
+@patch('server.machine_learning.render.render_image_with_report')
+def test_render_image_job_warm_start(
+    mock_render_image: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller render worker method asking
+    to warm start from the previous render
+
+    Args:
+        mock_render_image (mock.MagicMock): mock
+    """
+    # Arrange
+    img: np.ndarray = np.zeros((3, 3, 3), np.uint8)
+    mock_render_image.return_value = (
+        Image.new('RGB', (3, 3)),
+        RenderReport(warm_started=True))
+
+    # Act
+    result: Dict[str, Any] = style_transfer.render_image_job(
+        'job', 150.0, 0.01, 30.0, img, img, warm_start=True)
+
+    # Assert
+    assert mock_render_image.call_args[0][10].warm_start
+    assert result['report']['warm_started']
+
+
+@patch('server.machine_learning.render.render_image_with_report')
+@patch('server.machine_learning.fast_style.fast_style_registry.trained_with')
+def test_render_image_job_fast_style(
+    mock_trained_with: mock.MagicMock,
+    mock_render_image: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller render worker method routing a
+    style with a fast style model trained with the request loss weights to
+    the fast engine, and other weights to optimization
+
+    Args:
+        mock_trained_with (mock.MagicMock): mock
+        mock_render_image (mock.MagicMock): mock
+    """
+    # Arrange
+    img: np.ndarray = np.zeros((3, 3, 3), np.uint8)
+    mock_trained_with.side_effect = [True, False]
+    mock_render_image.return_value = (
+        Image.new('RGB', (3, 3)),
+        RenderReport(engine='fast'))
+
+    # Act
+    result: Dict[str, Any] = style_transfer.render_image_job(
+        'job', 150.0, 0.01, 30.0, img, img, style_id='style')
+    fast_options = mock_render_image.call_args[0][10]
+    style_transfer.render_image_job('job', 300.0, 0.01, 30.0, img, img,
+                                    style_id='style')
+
+    # Assert
+    mock_trained_with.assert_any_call('style', 0.01, 150.0, 30.0)
+    assert fast_options.engine == 'fast'
+    assert fast_options.style_id == 'style'
+    assert mock_render_image.call_args[0][10].engine == 'optimization'
+    assert result['report']['engine'] == 'fast'
+
+
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_adain_not_available(
+    mock_submit: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller api end point with AdaIN
+    engine and no trained decoder
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+    """
+    # Arrange
+    data: Dict[str, str] = {"email": "test@test.com",
+            "content_loss": "150",
+            "style_loss": "0.01",
+            "total_variation_loss": "30",
+            "apply_dilation": "false",
+            "engine": "adain"}
+
+    # Act
+    with patch('server.machine_learning.engines.decoder_trained',
+               return_value=False):
+        response: Response = client.post("/api/styleTransfer/renderImage/",
+                                         data=data)
+
+    # Assert
+    mock_submit.assert_not_called()
+    assert response.status_code == 422
+
+
+@patch('server.machine_learning.tiled_render.render_tiled')
+def test_render_image_job_high_resolution(
+    mock_render_tiled: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller render worker method with an
+    output size above the model resolution
+
+    Args:
+        mock_render_tiled (mock.MagicMock): mock
+    """
+    # Arrange
+    img: np.ndarray = np.zeros((3, 3, 3), np.uint8)
+    mock_render_tiled.return_value = (
+        Image.new('RGB', (3, 3)),
+        RenderReport())
+
+    # Act
+    style_transfer.render_image_job('job', 150.0, 0.01, 30.0, img, img,
+                                    output_size=2048)
+
+    # Assert
+    assert mock_render_tiled.call_args[0][11].output_max_dim == 2048
+
+
+def test_record_render_report() -> None:
+    """
+    Test method of style transfer controller recording render metrics
+    """
+    # Arrange
+    report: Dict[str, Any] = {
+        'setup_seconds': 0.5, 'stop_reason': None, 'engine': 'optimization',
+        'phases': [{'name': 'with_variation', 'steps': 300, 'seconds': 2.0,
+                    'losses': [1.0], 'stop_reason': 'converged'}]}
+    completed: float = style_transfer.render_stop_reasons.value(
+        reason='completed')
+
+    # Act
+    summary: Dict[str, Any] = style_transfer.record_render_report(report)
+
+    # Assert
+    assert summary['steps'] == 300
+    assert summary['stop_reason'] == 'completed'
+    assert summary['phases'][0]['stop_reason'] == 'converged'
+    assert style_transfer.render_stop_reasons.value(
+        reason='completed') == completed + 1
+    assert summary['seconds'] == 2.5
+    assert 'spans' not in summary
+
+
+def test_record_render_report_spans() -> None:
+    """
+    Test method of style transfer controller recording the profiled spans
+    of a render
+    """
+    # Arrange
+    report: Dict[str, Any] = {
+        'setup_seconds': 0.5, 'stop_reason': None, 'engine': 'optimization',
+        'phases': [{'name': 'with_variation', 'steps': 300, 'seconds': 2.0,
+                    'losses': [1.0], 'stop_reason': None}],
+        'spans': {'step': {'count': 300, 'seconds': 1.5,
+                           'max_seconds': 0.5}}}
+    observed: int = style_transfer.render_span_seconds.count(span='step')
+    rendered: int = style_transfer.render_seconds.count(engine='optimization')
+
+    # Act
+    summary: Dict[str, Any] = style_transfer.record_render_report(report)
+
+    # Assert
+    assert summary['spans']['step']['count'] == 300
+    assert style_transfer.render_span_seconds.count(
+        span='step') == observed + 1
+    assert style_transfer.render_seconds.count(
+        engine='optimization') == rendered + 1
+
+
+@patch('server.controllers.style_transfer.send_result_by_email')
+def test_on_render_done(mock_send_result: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller storing a finished render and
+    sending it by email
+
+    Args:
+        mock_send_result (mock.MagicMock): mock
+    """
+    # Arrange
+    job_id: str = style_transfer.jobs.create()
+    future: Future = Future()
+    future.set_result({'image': b'result', 'report': {
+        'setup_seconds': 0.5, 'stop_reason': 'step_budget',
+        'engine': 'optimization',
+        'phases': [{'name': 'with_variation', 'steps': 300, 'seconds': 2.0,
+                    'losses': [1.0], 'stop_reason': 'step_budget'}]}})
+
+    # Act
+    style_transfer.on_render_done(job_id, 'test@test.com', future)
+
+    # Assert
+    assert style_transfer.jobs.get(job_id).status == job_store.DONE
+    assert style_transfer.jobs.get(job_id).result == b'result'
+    assert style_transfer.jobs.get(job_id).report['steps'] == 300
+    assert style_transfer.jobs.get(job_id).report['stop_reason'] == \
+        'step_budget'
+    assert mock_send_result.call_args[0] == ('test@test.com', b'result')
+
+
+def test_on_render_done_failed() -> None:
+    """
+    Test method of style transfer controller marking a failed render
+    """
+    # Arrange
+    job_id: str = style_transfer.jobs.create()
+    future: Future = Future()
+    future.set_exception(ValueError('bad image'))
+
+    # Act
+    style_transfer.on_render_done(job_id, 'test@test.com', future)
+
+    # Assert
+    assert style_transfer.jobs.get(job_id).status == job_store.FAILED
+    assert style_transfer.jobs.get(job_id).error == 'bad image'
+
+
+@patch('server.services.mail_service.outbox.send_image')
+def test_send_result_by_email(mock_send_image: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller sending a result by email
+
+    Args:
+        mock_send_image (mock.MagicMock): mock
+    """
+    # Arrange
+    result: bytes = style_transfer.encode_image(Image.new('RGB', (3, 3)),
+                                                'png')
+
+    # Act
+    style_transfer.send_result_by_email('test@test.com', result)
+
+    # Assert
+    assert mock_send_image.call_args[0][0] == result
+    assert mock_send_image.call_args[0][2] == 'test@test.com'
+
+
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_returns_job_id(mock_submit: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller api end point returning a
+    queued job
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+    """
+    # Arrange
+    data: Dict[str, str] = {"email": "test@test.com",
+            "content_loss": "150",
+            "style_loss": "0.01",
+            "total_variation_loss": "30",
+            "apply_dilation": "false"}
+
+    # Act
+    response: Response = client.post("/api/styleTransfer/renderImage/",
+                                     data=data)
+    job_id: str = response.json()['job_id']
+    status_response: Response = client.get(
+        f"/api/styleTransfer/jobs/{job_id}")
+
+    # Assert
+    assert mock_submit.call_args[0][1] == job_id
+    assert status_response.status_code == 200
+    assert status_response.json()['status'] == job_store.QUEUED
+
+
+def test_job_progress() -> None:
+    """
+    Test method of style transfer controller job progress end point
+    """
+    # Arrange
+    job_id: str = style_transfer.jobs.create()
+    progress: Dict[str, Any] = {'phase': 'with_variation', 'epoch': 1,
+                                'step': 10, 'total_steps': 100,
+                                'loss': 1.5}
+    style_transfer.jobs.update_progress(job_id, progress)
+
+    # Act
+    response: Response = client.get(
+        f"/api/styleTransfer/jobs/{job_id}/progress")
+
+    # Assert
+    assert response.status_code == 200
+    assert response.json() == progress
+    assert style_transfer.jobs.get(job_id).status == job_store.RUNNING
+
+
+def test_job_not_found() -> None:
+    """
+    Test method of style transfer controller job end points with unknown job
+    """
+    # Act
+    response: Response = client.get("/api/styleTransfer/jobs/unknown")
+
+    # Assert
+    assert response.status_code == 404
+
+
+def test_job_result_download() -> None:
+    """
+    Test method of style transfer controller result end point in png and
+    jpeg formats
+    """
+    # Arrange
+    job_id: str = style_transfer.jobs.create()
+    style_transfer.jobs.set_result(job_id, style_transfer.encode_image(
+        Image.new('RGB', (3, 3)), 'png'))
+
+    # Act
+    png_response: Response = client.get(
+        f"/api/styleTransfer/jobs/{job_id}/result")
+    jpeg_response: Response = client.get(
+        f"/api/styleTransfer/jobs/{job_id}/result?image_format=jpeg")
+
+    # Assert
+    assert png_response.headers['content-type'] == 'image/png'
+    assert jpeg_response.headers['content-type'] == 'image/jpeg'
+    assert Image.open(io.BytesIO(jpeg_response.content)).format == 'JPEG'
+
+
+def test_job_result_not_done() -> None:
+    """
+    Test method of style transfer controller result end point before the
+    render is done
+    """
+    # Arrange
+    job_id: str = style_transfer.jobs.create()
+
+    # Act
+    response: Response = client.get(
+        f"/api/styleTransfer/jobs/{job_id}/result")
+
+    # Assert
+    assert response.status_code == 409
+
+
+def test_on_render_progress_preview() -> None:
+    """
+    Test method of style transfer controller storing reported progress and
+    previews
+    """
+    # Arrange
+    job_id: str = style_transfer.jobs.create()
+
+    # Act
+    style_transfer.on_render_progress(job_id, {'step': 10})
+    style_transfer.on_render_progress(job_id, {'preview': b'preview',
+                                               'step': 100})
+
+    # Assert
+    assert style_transfer.jobs.get(job_id).progress == {'step': 10}
+    assert style_transfer.jobs.get(job_id).preview == b'preview'
+
+
+def test_encode_preview_downscaled() -> None:
+    """
+    Test method of style transfer controller encoding a downscaled preview
+    """
+    # Act
+    preview: bytes = style_transfer.encode_preview(
+        Image.new('RGB', (1024, 512)))
+
+    # Assert
+    assert Image.open(io.BytesIO(preview)).size == (256, 128)
+
+
+def test_job_preview() -> None:
+    """
+    Test method of style transfer controller preview end point
+    """
+    # Arrange
+    job_id: str = style_transfer.jobs.create()
+    no_preview_response: Response = client.get(
+        f"/api/styleTransfer/jobs/{job_id}/preview")
+    style_transfer.jobs.set_preview(job_id, b'preview', 100)
+
+    # Act
+    response: Response = client.get(
+        f"/api/styleTransfer/jobs/{job_id}/preview")
+
+    # Assert
+    assert no_preview_response.status_code == 404
+    assert response.content == b'preview'
+    assert response.headers['x-render-step'] == '100'
+
+
+def test_job_previews_stream() -> None:
+    """
+    Test method of style transfer controller preview event stream end point
+    """
+    # Arrange
+    job_id: str = style_transfer.jobs.create()
+    style_transfer.jobs.set_preview(job_id, b'preview', 100)
+    style_transfer.jobs.set_failed(job_id, 'error')
+
+    # Act
+    response: Response = client.get(
+        f"/api/styleTransfer/jobs/{job_id}/previews")
+
+    # Assert
+    assert response.headers['content-type'].startswith('text/event-stream')
+    assert 'event: preview\nid: 100\ndata: cHJldmlldw==' in response.text
+    assert 'event: failed' in response.text
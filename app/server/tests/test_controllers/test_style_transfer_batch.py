@@ -0,0 +1,130 @@
+"""
+Tests for style transfer controller batched renders
+"""
+
+
+import io
+import pytest
+import numpy as np
+from typing import Any, Dict, List
+from fastapi.testclient import TestClient
+from PIL import Image
+from server.controllers.main import app
+from server.controllers import style_transfer
+from server.machine_learning.style_transfer import RenderReport
+from server.services import result_cache
+from unittest import mock
+from unittest.mock import patch
+from requests import Response
+
+
+# create a client for testing
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Fixture to render every request of a test, identical requests of other
+    tests never finish their mocked renders
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    monkeypatch.setattr(style_transfer, 'results',
+                        result_cache.ResultCache())
+
+
+@patch('server.controllers.style_transfer.render_pool.submit_batchable')
+def test_render_image_batchable(mock_submit_batchable: mock.MagicMock,
+                                monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test method of style transfer controller api end point queueing a
+    render that can be batched with renders of the same size and quality
+
+    Args:
+        mock_submit_batchable (mock.MagicMock): mock
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    # Arrange
+    monkeypatch.setattr(style_transfer, 'render_batch_size', 2)
+    data: Dict[str, str] = {
+        "email": "test@test.com", "content_loss": "150", "style_loss": "0.01",
+        "total_variation_loss": "30", "apply_dilation": "true",
+        "quality": "high"}
+
+    # Act
+    response: Response = client.post("/api/styleTransfer/renderImage/",
+                                     data=data)
+
+    # Assert
+    batch_key, batch_func, func = mock_submit_batchable.call_args[0][:3]
+    assert response.status_code == 200
+    assert batch_key[2] == 'high' and max(batch_key[:2]) == 512
+    assert batch_func is style_transfer.render_image_batch_job
+    assert func is style_transfer.render_image_job
+    assert mock_submit_batchable.call_args[0][4:7] == (150.0, 0.01, 30.0)
+
+
+def test_render_batch_key() -> None:
+    """
+    Test method of style transfer controller batching only renders at the
+    model resolution without warm start
+    """
+    # Arrange
+    img: np.ndarray = np.zeros((300, 400, 3), np.uint8)
+
+    # Act
+    with patch.object(style_transfer, 'render_batch_size', 4):
+        key = style_transfer.render_batch_key(img, 'high', 'auto', 512,
+                                              False)
+        tiled = style_transfer.render_batch_key(img, 'high', 'auto', 1024,
+                                                False)
+        warm = style_transfer.render_batch_key(img, 'high', 'auto', 512,
+                                               True)
+        adain = style_transfer.render_batch_key(img, 'high', 'adain', 512,
+                                                False)
+    single = style_transfer.render_batch_key(img, 'high', 'auto', 512, False)
+
+    # Assert
+    assert key == (384, 512, 'high')
+    assert tiled is None and warm is None and adain is None
+    assert single is None
+
+
+@patch('server.machine_learning.batch_render.render_batch_with_reports')
+@patch('server.machine_learning.fast_style.fast_style_registry.trained_with')
+def test_render_image_batch_job(
+    mock_trained_with: mock.MagicMock,
+    mock_render_batch: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller render worker method rendering
+    the jobs of a batch in one batched render
+
+    Args:
+        mock_trained_with (mock.MagicMock): mock
+        mock_render_batch (mock.MagicMock): mock
+    """
+    # Arrange
+    img: np.ndarray = np.zeros((3, 3, 3), np.uint8)
+    mock_trained_with.return_value = False
+    mock_render_batch.return_value = (
+        [Image.new('RGB', (3, 3)), Image.new('RGB', (3, 3))],
+        [RenderReport(stop_reason='converged'), RenderReport()])
+
+    # Act
+    results: List[Dict[str, Any]] = style_transfer.render_image_batch_job(
+        [('first', 150.0, 0.01, 30.0, img, img, 'draft', 'auto', 512, False,
+          'style'),
+         ('second', 300.0, 0.01, 30.0, img, img, 'draft', 'auto', 512,
+          False, 'style')])
+
+    # Assert
+    mock_render_batch.assert_called_once()
+    requests = mock_render_batch.call_args[0][0]
+    assert [request.content_weight for request in requests] == [150.0, 300.0]
+    assert mock_render_batch.call_args[0][6].max_steps == \
+        style_transfer.quality_tiers['draft']['max_steps']
+    assert [result['report']['stop_reason'] for result in results] == \
+        ['converged', None]
+    assert Image.open(io.BytesIO(results[1]['image'])).format == 'PNG'
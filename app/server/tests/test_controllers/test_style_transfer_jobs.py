@@ -0,0 +1,257 @@
+"""
+Tests for style transfer controller render jobs of identical requests
+"""
+
+
+import pytest
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+from fastapi.testclient import TestClient
+from server.controllers.main import app
+from server.controllers import style_transfer
+from server.services import job_store, result_cache
+from unittest import mock
+from unittest.mock import patch
+
+
+# create a client for testing
+client = TestClient(app)
+
+# render request of the default images
+request_data: Dict[str, str] = {
+    "email": "test@test.com", "content_loss": "150", "style_loss": "0.01",
+    "total_variation_loss": "30", "apply_dilation": "false"}
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Fixture to render every request of a test, identical requests of other
+    tests never finish their mocked renders
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    monkeypatch.setattr(style_transfer, 'results',
+                        result_cache.ResultCache())
+
+
+def finish_render(future: Future, stop_reason: Optional[str] = None) -> None:
+    """
+    Method to finish a mocked render
+
+    Args:
+        future (Future): the render future
+        stop_reason (str, optional): stop reason of the render
+    """
+    future.set_result({'image': b'result', 'report': {
+        'setup_seconds': 0.5, 'stop_reason': stop_reason,
+        'engine': 'optimization',
+        'phases': [{'name': 'with_variation', 'steps': 300, 'seconds': 2.0,
+                    'losses': [1.0], 'stop_reason': stop_reason}]}})
+
+
+def post_render(**data: str) -> str:
+    """
+    Method to request a render of the default images
+
+    Args:
+        **data (str): request fields other than the defaults
+
+    Returns:
+        str: the render job id
+    """
+    return client.post("/api/styleTransfer/renderImage/",
+                       data={**request_data, **data}).json()['job_id']
+
+
+def stop(job_id: str) -> Dict[str, Any]:
+    """
+    Method to stop a render job
+
+    Args:
+        job_id (str): the render job id
+
+    Returns:
+        Dict[str, Any]: the response
+    """
+    return client.post(f"/api/styleTransfer/jobs/{job_id}/stop").json()
+
+
+@patch('server.controllers.style_transfer.send_result_by_email')
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_identical_requests(
+    mock_submit: mock.MagicMock,
+    mock_send_result: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller api end point rendering
+    identical requests once and answering later ones from the result cache
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+        mock_send_result (mock.MagicMock): mock
+    """
+    # Arrange
+    future: Future = Future()
+    mock_submit.return_value = future
+
+    # Act
+    leader: str = post_render()
+    follower: str = post_render(email="other@test.com")
+    finish_render(future)
+    later: str = post_render()
+
+    # Assert
+    assert mock_submit.call_count == 1
+    for job_id in (leader, follower, later):
+        assert style_transfer.jobs.get(job_id).status == job_store.DONE
+        assert style_transfer.jobs.get(job_id).result == b'result'
+    assert [call[0][0] for call in
+            mock_send_result.call_args_list] == [
+                'test@test.com', 'other@test.com', 'test@test.com']
+
+
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_render_image_warm_start_renders(mock_submit: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller api end point rendering every
+    warm started request, its result depends on the worker
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+    """
+    # Arrange
+    futures: List[Future] = [Future(), Future()]
+    mock_submit.side_effect = futures
+
+    # Act
+    first: str = post_render(warm_start="true")
+    finish_render(futures[0])
+    second: str = post_render(warm_start="true")
+
+    # Assert
+    assert mock_submit.call_count == 2
+    assert style_transfer.jobs.get(first).status == job_store.DONE
+    assert style_transfer.jobs.get(second).status == job_store.QUEUED
+    assert style_transfer.results.stats()['entries'] == 0
+
+
+@patch('server.controllers.style_transfer.render_pool.request_stop')
+def test_stop_job(mock_request_stop: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller stop end point
+
+    Args:
+        mock_request_stop (mock.MagicMock): mock
+    """
+    # Arrange
+    job_id: str = style_transfer.jobs.create()
+
+    # Act
+    response: Dict[str, Any] = stop(job_id)
+
+    # Assert
+    assert response == {'job_id': job_id, 'status': job_store.QUEUED}
+    mock_request_stop.assert_called_once_with(job_id)
+
+
+@patch('server.controllers.style_transfer.send_result_by_email')
+@patch('server.controllers.style_transfer.render_pool.request_stop')
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_stop_joined_job(
+    mock_submit: mock.MagicMock,
+    mock_request_stop: mock.MagicMock,
+    mock_send_result: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller stop end point detaching a
+    job waiting on an identical render, the render goes on for its job
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+        mock_request_stop (mock.MagicMock): mock
+        mock_send_result (mock.MagicMock): mock
+    """
+    # Arrange
+    future: Future = Future()
+    mock_submit.return_value = future
+    leader: str = post_render()
+    follower: str = post_render(email="other@test.com")
+
+    # Act
+    response: Dict[str, Any] = stop(follower)
+    finish_render(future)
+
+    # Assert
+    mock_request_stop.assert_not_called()
+    assert response['status'] == job_store.FAILED
+    assert style_transfer.jobs.get(follower).status == job_store.FAILED
+    assert style_transfer.jobs.get(leader).result == b'result'
+    assert [call[0][0] for call in mock_send_result.call_args_list] == \
+        ['test@test.com']
+
+
+@patch('server.controllers.style_transfer.render_pool.request_stop')
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_stop_leader_of_joined_jobs(
+    mock_submit: mock.MagicMock,
+    mock_request_stop: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller stop end point stopping the
+    render of identical requests once no job waits on it, the stopped
+    render is neither cached nor given to the jobs
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+        mock_request_stop (mock.MagicMock): mock
+    """
+    # Arrange
+    future: Future = Future()
+    mock_submit.side_effect = [future, Future()]
+    leader: str = post_render()
+    follower: str = post_render()
+
+    # Act
+    stop(leader)
+    stopped_leader: bool = mock_request_stop.called
+    stop(follower)
+    finish_render(future, 'stopped')
+    post_render()
+
+    # Assert
+    assert not stopped_leader
+    mock_request_stop.assert_called_once_with(leader)
+    for job_id in (leader, follower):
+        assert style_transfer.jobs.get(job_id).status == job_store.FAILED
+    assert mock_submit.call_count == 2
+
+
+@patch('server.controllers.style_transfer.render_pool.request_stop')
+@patch('server.controllers.style_transfer.render_pool.submit')
+def test_stop_leader_alone(
+    mock_submit: mock.MagicMock,
+    mock_request_stop: mock.MagicMock) -> None:
+    """
+    Test method of style transfer controller stop end point stopping a
+    render no other job waits on, the job keeps its partial render which
+    is not cached
+
+    Args:
+        mock_submit (mock.MagicMock): mock
+        mock_request_stop (mock.MagicMock): mock
+    """
+    # Arrange
+    future: Future = Future()
+    mock_submit.side_effect = [future, Future()]
+    leader: str = post_render()
+
+    # Act
+    stop(leader)
+    finish_render(future, 'stopped')
+    later: str = post_render()
+
+    # Assert
+    mock_request_stop.assert_called_once_with(leader)
+    assert style_transfer.jobs.get(leader).status == job_store.DONE
+    assert style_transfer.jobs.get(leader).report['stop_reason'] == 'stopped'
+    assert style_transfer.jobs.get(later).status == job_store.QUEUED
+    assert mock_submit.call_count == 2
@@ -0,0 +1,110 @@
+"""
+Tests for style transfer api upload handling
+"""
+
+
+import os
+import json
+import asyncio
+from typing import Any, Dict, Iterator, List
+from unittest import mock
+from unittest.mock import patch
+from requests import Response
+from fastapi.testclient import TestClient
+from server.controllers import uploads
+from server.controllers.main import app
+
+
+# create a client for testing
+client = TestClient(app)
+
+# path of the default style image
+style_path: str = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                               '..', '..', 'data', 'historical.png')
+
+
+@patch('server.controllers.uploads.max_upload_bytes', 1024)
+@patch('server.controllers.uploads.read_image_from_api')
+def test_request_too_large(mock_read_image: mock.MagicMock) -> None:
+    """
+    Test method of upload limit rejecting a request by its Content-Length
+    before the body is read
+
+    Args:
+        mock_read_image (mock.MagicMock): mock
+    """
+    # Arrange
+    data: Dict[str, str] = {"email": "test@test.com", "content_loss": "150",
+                            "style_loss": "0.01",
+                            "total_variation_loss": "30",
+                            "apply_dilation": "false"}
+
+    # Act
+    with open(style_path, "rb") as style:
+        response: Response = client.post(
+            "/api/styleTransfer/renderImage/", data=data,
+            files={"style_image": ("test_style_image", style,
+                                   "image/png")})
+
+    # Assert
+    mock_read_image.assert_not_called()
+    assert response.status_code == 413
+    assert response.json()['detail'] == 'Request body is too large'
+
+
+def test_request_invalid_content_length() -> None:
+    """
+    Test method of upload limit answering a malformed Content-Length as a
+    bad request without calling the app
+    """
+    # Arrange
+    inner: mock.AsyncMock = mock.AsyncMock()
+    messages: List[Dict[str, Any]] = []
+    scope: Dict[str, Any] = {'type': 'http', 'method': 'POST',
+                             'headers': [(b'content-length', b'abc')]}
+
+    async def receive() -> Dict[str, Any]:
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message: Dict[str, Any]) -> None:
+        messages.append(message)
+
+    # Act
+    asyncio.run(uploads.UploadLimitMiddleware(inner)(scope, receive, send))
+
+    # Assert
+    inner.assert_not_called()
+    assert messages[0]['status'] == 400
+    assert json.loads(messages[1]['body'])['detail'] == \
+        'Invalid Content-Length header'
+
+
+@patch('server.controllers.uploads.form_fields_bytes', 1024)
+@patch('server.controllers.uploads.max_upload_bytes', 1024)
+@patch('server.controllers.uploads.read_image_from_api')
+def test_chunked_request_too_large(mock_read_image: mock.MagicMock) -> None:
+    """
+    Test method of upload limit aborting a chunked request without
+    Content-Length once it received more bytes than allowed
+
+    Args:
+        mock_read_image (mock.MagicMock): mock
+    """
+    # Arrange
+    def body() -> Iterator[bytes]:
+        yield (b'--upload\r\nContent-Disposition: form-data; '
+               b'name="style_image"; filename="style.png"\r\n'
+               b'Content-Type: image/png\r\n\r\n')
+        for _ in range(8):
+            yield b'0' * 1024
+
+    # Act
+    response: Response = client.post(
+        "/api/styleTransfer/renderImage/", data=body(),
+        headers={'content-type': 'multipart/form-data; boundary=upload'})
+
+    # Assert
+    mock_read_image.assert_not_called()
+    assert 'content-length' not in response.request.headers
+    assert response.status_code == 413
+    assert response.json()['detail'] == 'Request body is too large'
@@ -0,0 +1,40 @@
+"""
+Tests for batched style transfer renders
+"""
+
+
+import numpy as np
+import tensorflow as tf
+from server.machine_learning import batch_render
+
+
+def test_batch_adam_matches_solo_render() -> None:
+    """
+    Test method of batch optimizer updating a sample like the optimizer of
+    a render of it alone, a stopped sample keeps its image and moments
+    """
+    # Arrange
+    grads: np.ndarray = np.random.default_rng(0).normal(
+        size=(3, 2, 4, 4, 3)).astype(np.float32) * 0.1
+    solo: tf.Variable = tf.Variable(tf.fill((1, 4, 4, 3), 0.5))
+    solo_opt: tf.optimizers.Adam = tf.optimizers.Adam(
+        learning_rate=0.02, beta_1=0.99, epsilon=1e-1)
+    batch: tf.Variable = tf.Variable(tf.fill((2, 4, 4, 3), 0.5))
+    batch_opt: batch_render.BatchAdam = batch_render.BatchAdam(batch)
+
+    # Act
+    batch_opt.apply(batch, grads[0], [True, True])
+    stopped_image: np.ndarray = batch[1].numpy()
+    stopped_momentums: np.ndarray = batch_opt.momentums[1].numpy()
+    for grad in grads:
+        solo_opt.apply_gradients([(grad[:1], solo)])
+        solo.assign(tf.clip_by_value(solo, 0.0, 1.0))
+    for grad in grads[1:]:
+        batch_opt.apply(batch, grad, [True, False])
+
+    # Assert
+    np.testing.assert_allclose(batch[:1].numpy(), solo.numpy(), atol=1e-6)
+    np.testing.assert_array_equal(batch[1].numpy(), stopped_image)
+    np.testing.assert_array_equal(batch_opt.momentums[1].numpy(),
+                                  stopped_momentums)
+    assert batch_opt.steps.numpy().ravel().tolist() == [3.0, 1.0]
@@ -0,0 +1,36 @@
+"""
+Tests for fast style transfer
+"""
+
+
+import json
+import pathlib
+from server.machine_learning import fast_style
+
+
+def test_trained_with_missing_meta(tmp_path: pathlib.Path) -> None:
+    """
+    Test method of a style model without its training settings not
+    matching any loss weights, and matching the weights it was trained with
+    once they are known
+
+    Args:
+        tmp_path (pathlib.Path): temporary folder
+    """
+    # Arrange
+    registry: fast_style.FastStyleRegistry = fast_style.FastStyleRegistry(
+        str(tmp_path))
+    (tmp_path / 'style').mkdir()
+    (tmp_path / 'style' / 'weights.index').write_bytes(b'')
+
+    # Act
+    without_meta: bool = registry.trained_with('style', 0.01, 150.0, 30.0)
+    (tmp_path / 'style' / 'meta.json').write_text(json.dumps({
+        'settings': {'style_weight': 0.01, 'content_weight': 150.0,
+                     'total_variation_weight': 30.0}}), encoding='utf-8')
+    with_meta: bool = registry.trained_with('style', 0.01, 150.0, 30.0)
+
+    # Assert
+    assert registry.has('style')
+    assert not without_meta
+    assert with_meta
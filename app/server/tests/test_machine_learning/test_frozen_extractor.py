@@ -0,0 +1,97 @@
+"""
+Tests for exported style content extractors
+"""
+
+
+import pathlib
+import numpy as np
+import tensorflow as tf
+from typing import Dict, List
+from server.machine_learning import frozen_extractor, style_transfer
+
+
+class ScaleExtractor(tf.Module): # pylint: disable=W0223
+    """
+    Class of an extractor without vgg with a weight, the scaled image is
+    its content and the gram matrix of the scaled image its style
+    """
+    style_layers: List[str] = ['block1_conv1']
+    content_layers: List[str] = ['block2_conv1']
+    precision: str = 'float32'
+
+    def __init__(self):
+        """
+        Initialization Method
+        """
+        super().__init__()
+        self.scale: tf.Variable = tf.Variable(2.0)
+
+    def __call__(self, image: tf.Tensor) -> Dict[str, Dict[str, tf.Tensor]]:
+        features: tf.Tensor = image * self.scale
+        return {'style': {'block1_conv1': style_transfer.gram_matrix(
+                    features)},
+                'content': {'block2_conv1': features}}
+
+
+def test_artifact_matches(tmp_path: pathlib.Path) -> None:
+    """
+    Test method of loading an exported extractor only for the layers and
+    precision it was exported with
+
+    Args:
+        tmp_path (pathlib.Path): temporary folder
+    """
+    # Arrange
+    path: str = str(tmp_path / 'extractor')
+
+    # Act
+    missing: bool = frozen_extractor.artifact_matches(
+        path, ['block1_conv1'], ['block2_conv1'], 'float32')
+    frozen_extractor.export_saved_model(ScaleExtractor(), path)
+
+    # Assert
+    assert not missing
+    assert frozen_extractor.artifact_matches(
+        path, ('block1_conv1',), ('block2_conv1',), 'float32')
+    assert not frozen_extractor.artifact_matches(
+        path, ['block1_conv1'], ['block2_conv1'], 'bfloat16')
+    assert not frozen_extractor.artifact_matches(
+        path, ['block1_conv1', 'block2_conv1'], ['block2_conv1'], 'float32')
+    assert not frozen_extractor.artifact_matches(
+        path, ['block1_conv1'], ['block4_conv2'], 'float32')
+
+
+def test_frozen_extractor_matches_exported(tmp_path: pathlib.Path) -> None:
+    """
+    Test method of a loaded extractor returning the outputs of the exported
+    extractor by layer name, with the gradient of the forward pass
+
+    Args:
+        tmp_path (pathlib.Path): temporary folder
+    """
+    # Arrange
+    path: str = str(tmp_path / 'extractor')
+    extractor: ScaleExtractor = ScaleExtractor()
+    frozen_extractor.export_saved_model(extractor, path)
+    image: tf.Tensor = tf.random.stateless_uniform((1, 8, 6, 3), (0, 1))
+
+    # Act
+    frozen: frozen_extractor.FrozenStyleContentModel = \
+        frozen_extractor.FrozenStyleContentModel(path)
+    with tf.GradientTape() as tape:
+        tape.watch(image)
+        outputs: Dict[str, Dict[str, tf.Tensor]] = frozen(image)
+        loss: tf.Tensor = tf.reduce_sum(outputs['content']['block2_conv1'])
+    gradient: tf.Tensor = tape.gradient(loss, image)
+
+    # Assert
+    assert frozen.style_layers == ['block1_conv1']
+    assert frozen.content_layers == ['block2_conv1']
+    assert frozen.num_style_layers == 1
+    assert frozen.precision == 'float32'
+    expected: Dict[str, Dict[str, tf.Tensor]] = extractor(image)
+    np.testing.assert_allclose(outputs['style']['block1_conv1'],
+                               expected['style']['block1_conv1'], rtol=1e-6)
+    np.testing.assert_allclose(outputs['content']['block2_conv1'],
+                               expected['content']['block2_conv1'])
+    np.testing.assert_allclose(gradient, np.full((1, 8, 6, 3), 2.0))
@@ -0,0 +1,59 @@
+"""
+Tests for model registry
+"""
+
+
+from typing import List, Tuple
+from server.machine_learning import model_registry
+
+
+def test_get_reuses_and_rebuilds() -> None:
+    """
+    Test method of building an extractor once per layer set and precision
+    """
+    # Arrange
+    builds: List[Tuple[List[str], List[str], str]] = []
+
+    def factory(style_layers: List[str], content_layers: List[str],
+                precision: str) -> object:
+        builds.append((style_layers, content_layers, precision))
+        return object()
+
+    registry: model_registry.ModelRegistry = \
+        model_registry.ModelRegistry(factory)
+    hits: float = model_registry.model_cache_hits.value()
+
+    # Act
+    first = registry.get(['block1_conv1'], ['block5_conv2'])
+    second = registry.get(['block1_conv1'], ['block5_conv2'])
+    other_layers = registry.get(['block2_conv1'], ['block5_conv2'])
+    other_precision = registry.get(['block1_conv1'], ['block5_conv2'],
+                                   'mixed_float16')
+
+    # Assert
+    assert first is second
+    assert other_layers is not first
+    assert other_precision is not first
+    assert builds == [(['block1_conv1'], ['block5_conv2'], 'float32'),
+                      (['block2_conv1'], ['block5_conv2'], 'float32'),
+                      (['block1_conv1'], ['block5_conv2'], 'mixed_float16')]
+    assert model_registry.model_cache_hits.value() == hits + 1
+    assert model_registry.models_loaded.value() == 3
+
+
+def test_clear_rebuilds() -> None:
+    """
+    Test method of rebuilding extractors after clearing the registry
+    """
+    # Arrange
+    registry: model_registry.ModelRegistry = \
+        model_registry.ModelRegistry(lambda *args: object())
+    first = registry.get(['block1_conv1'], ['block5_conv2'])
+
+    # Act
+    registry.clear()
+    second = registry.get(['block1_conv1'], ['block5_conv2'])
+
+    # Assert
+    assert second is not first
+    assert model_registry.models_loaded.value() == 1
@@ -0,0 +1,168 @@
+"""
+Tests for render orchestration
+"""
+
+
+import numpy as np
+import tensorflow as tf
+from typing import Dict, List
+from unittest import mock
+from unittest.mock import patch
+from PIL import Image
+from server.machine_learning import render, style_transfer
+
+
+class FakeExtractor: # pylint: disable=R0903
+    """
+    Class of an extractor without vgg, the image is its own content and
+    its gram matrix the style
+    """
+    style_layers: List[str] = ['style']
+    content_layers: List[str] = ['content']
+    precision: str = 'float32'
+
+    def __call__(self, image: tf.Tensor) -> Dict[str, Dict[str, tf.Tensor]]:
+        return {'style': {'style': style_transfer.gram_matrix(image)},
+                'content': {'content': image}}
+
+
+def test_convergence_after_window() -> None:
+    """
+    Test method of detecting convergence only after a window of steps
+    """
+    # Arrange
+    detector: render.ConvergenceDetector = render.ConvergenceDetector(
+        window=3, tolerance=0.01)
+    losses: List[float] = [100.0, 100.0, 100.0, 100.0, 100.0]
+
+    # Act
+    converged: List[bool] = [detector.update(step, loss)
+                             for step, loss in enumerate(losses)]
+
+    # Assert
+    assert converged == [False, False, False, True, True]
+
+
+def test_no_convergence_while_improving() -> None:
+    """
+    Test method of not stopping while the loss improves over the window
+    """
+    # Arrange
+    detector: render.ConvergenceDetector = render.ConvergenceDetector(
+        window=3, tolerance=0.01)
+    losses: List[float] = [100.0, 90.0, 80.0, 70.0, 60.0, 60.0, 60.0, 60.0]
+
+    # Act
+    converged: List[bool] = [detector.update(step, loss)
+                             for step, loss in enumerate(losses)]
+
+    # Assert
+    assert converged == [False] * 7 + [True]
+
+
+def test_render_schedule_skips_empty_phases() -> None:
+    """
+    Test method of skipping phases without epochs
+    """
+    # Act
+    phases: List[render.RenderPhase] = render.render_schedule(0, 5, 30.0)
+
+    # Assert
+    assert [(phase.name, phase.epochs) for phase in phases] == \
+        [('with_variation', 5)]
+
+
+def test_pyramid_levels_halve_steps() -> None:
+    """
+    Test method of pyramid levels running half the steps of the previous
+    (coarser) level, the shares of all levels sum to 1
+    """
+    # Act
+    levels: List[style_transfer.PyramidLevel] = render.pyramid_levels(
+        (128, 256, 512))
+
+    # Assert
+    assert [level.max_dim for level in levels] == [128, 256, 512]
+    np.testing.assert_allclose([level.step_share for level in levels],
+                               [4 / 7, 2 / 7, 1 / 7])
+
+
+def test_upsample_image_to_level_shape() -> None:
+    """
+    Test method of upsampling a rendered image to the image shape of the
+    next level, keeping the pixel values between 0 and 1
+    """
+    # Arrange
+    image: tf.Tensor = tf.concat([tf.fill((1, 4, 3, 3), -0.5),
+                                  tf.fill((1, 4, 3, 3), 1.5)], axis=2)
+
+    # Act
+    upsampled: tf.Tensor = render.upsample_image(image,
+                                                 tf.TensorShape((1, 8, 12, 3)))
+
+    # Assert
+    assert upsampled.shape == (1, 8, 12, 3)
+    assert float(tf.reduce_min(upsampled)) == 0.0
+    assert float(tf.reduce_max(upsampled)) == 1.0
+
+
+@patch('server.machine_learning.style_transfer.extractor_registry.get')
+def test_render_pyramid_levels(mock_get: mock.MagicMock) -> None:
+    """
+    Test method of rendering every pyramid level with its share of the
+    steps, the output has the resolution of the last level
+
+    Args:
+        mock_get (mock.MagicMock): mock
+    """
+    # Arrange
+    mock_get.return_value = FakeExtractor()
+    content: np.ndarray = np.random.default_rng(0).integers(
+        0, 255, (32, 64, 3), np.uint8)
+    options: style_transfer.RenderOptions = style_transfer.RenderOptions(
+        run_eagerly=True, use_target_cache=False, use_session_store=False,
+        pyramid=render.pyramid_levels((16, 32)))
+
+    # Act
+    image, report = render.render_image_with_report(
+        content, content, ['content'], ['style'], 1.0, 1.0, 1.0, 1, 1, 6,
+        options)
+
+    # Assert
+    assert isinstance(image, Image.Image)
+    assert image.size == (32, 16)
+    assert [(phase.name, phase.max_dim, phase.steps)
+            for phase in report.phases] == [
+                ('without_variation', 16, 4), ('with_variation', 16, 4),
+                ('without_variation', 32, 2), ('with_variation', 32, 2)]
+    assert report.stop_reason is None
+
+
+@patch('server.machine_learning.style_transfer.extractor_registry.get')
+def test_render_stopped_at_coarse_level(mock_get: mock.MagicMock) -> None:
+    """
+    Test method of a render out of steps at a coarse level, the image is
+    upsampled to the output resolution
+
+    Args:
+        mock_get (mock.MagicMock): mock
+    """
+    # Arrange
+    mock_get.return_value = FakeExtractor()
+    content: np.ndarray = np.random.default_rng(0).integers(
+        0, 255, (32, 64, 3), np.uint8)
+    options: style_transfer.RenderOptions = style_transfer.RenderOptions(
+        run_eagerly=True, use_target_cache=False, use_session_store=False,
+        pyramid=render.pyramid_levels((16, 32)), max_steps=3)
+
+    # Act
+    image, report = render.render_image_with_report(
+        content, content, ['content'], ['style'], 1.0, 1.0, 1.0, 1, 1, 6,
+        options)
+
+    # Assert
+    assert image.size == (32, 16)
+    assert report.steps == 3
+    assert report.stop_reason == 'step_budget'
+    assert report.phases[-1].stop_reason == 'step_budget'
+    assert report.phases[-1].max_dim == 16
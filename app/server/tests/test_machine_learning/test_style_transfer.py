@@ -0,0 +1,230 @@
+"""
+Tests for style transfer renders
+"""
+
+
+import gc
+import weakref
+import h5py
+import pytest
+import numpy as np
+import tensorflow as tf
+from typing import Any, Dict, List, Tuple
+from unittest import mock
+from unittest.mock import patch
+from server.machine_learning import style_transfer
+
+
+def test_report_steps() -> None:
+    """
+    Test method of counting the steps of every phase of a render
+    """
+    # Arrange
+    report: style_transfer.RenderReport = style_transfer.RenderReport(
+        phases=[style_transfer.PhaseTrace('without_variation', steps=4),
+                style_transfer.PhaseTrace('with_variation', steps=6)])
+
+    # Assert
+    assert report.steps == 10
+
+
+def test_truncated_vgg19_reads_created_layers(
+        tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test method of truncated vgg reading the weights of its layers only,
+    a weights file without the deeper layers loads
+
+    Args:
+        tmp_path (pathlib.Path): temporary folder
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    # Arrange
+    path: str = str(tmp_path / 'vgg19.h5')
+    kernels: List[np.ndarray] = [np.full((3, 3, 3, 64), 0.1, np.float32),
+                                 np.full((3, 3, 64, 64), 0.2, np.float32)]
+    with h5py.File(path, 'w') as weights_file:
+        for i, kernel in enumerate(kernels, 1):
+            group: h5py.Group = weights_file.create_group(f'block1_conv{i}')
+            group['kernel'] = kernel
+            group['bias'] = np.full(64, i, np.float32)
+            group.attrs['weight_names'] = [b'kernel', b'bias']
+    monkeypatch.setattr(tf.keras.utils, 'get_file', lambda *_, **__: path)
+
+    # Act
+    vgg: tf.keras.Model = style_transfer.truncated_vgg19('block1_conv2')
+
+    # Assert
+    assert [layer.name for layer in vgg.layers[1:]] == \
+        ['block1_conv1', 'block1_conv2']
+    assert np.array_equal(vgg.get_layer('block1_conv2').kernel, kernels[1])
+    assert np.array_equal(vgg.get_layer('block1_conv1').bias,
+                          np.ones(64, np.float32))
+
+
+class FakeExtractor: # pylint: disable=R0903
+    """
+    Class of an extractor without vgg, the image is its own content and
+    its gram matrix the style
+    """
+    style_layers: List[str] = ['style']
+    content_layers: List[str] = ['content']
+
+    def __call__(self, image: tf.Tensor) -> Dict[str, Dict[str, tf.Tensor]]:
+        return {'style': {'style': style_transfer.gram_matrix(image)},
+                'content': {'content': image}}
+
+
+def step_arguments(size: int) -> Tuple[Any, ...]:
+    """
+    Method to create the arguments of a step without variation
+
+    Args:
+        size (int): the image size
+
+    Returns:
+        Tuple[Any, ...]: the image and the rest of the step arguments
+    """
+    image: tf.Tensor = tf.fill((1, size, size, 3), 0.5)
+    return (image, {'style': tf.zeros((1, 3, 3))}, {'content': image * 0},
+            1, 1, tf.constant(1.0), tf.constant(1.0))
+
+
+def test_step_engine_traces_once_per_shape() -> None:
+    """
+    Test method of step engine reusing the traced step of an input shape
+    for every step and render of the extractor
+    """
+    # Arrange
+    extractor: FakeExtractor = FakeExtractor()
+    engine: style_transfer.StepEngine = style_transfer.get_step_engine(
+        extractor)
+
+    # Act
+    engine.without_variation(*step_arguments(8))
+    engine.without_variation(*step_arguments(8))
+    same_shape: int = engine.without_variation.experimental_get_tracing_count()
+    engine.without_variation(*step_arguments(16))
+
+    # Assert
+    assert style_transfer.get_step_engine(extractor) is engine
+    assert style_transfer.get_step_engine(extractor, True) is not engine
+    assert same_shape == 1
+    assert engine.without_variation.experimental_get_tracing_count() == 2
+
+
+def test_step_engine_released_with_extractor() -> None:
+    """
+    Test method of step engines not keeping their extractor alive, the
+    engine is dropped with the extractor
+    """
+    # Arrange
+    extractor: FakeExtractor = FakeExtractor()
+    style_transfer.get_step_engine(extractor).without_variation(
+        *step_arguments(8))
+    extractor_ref: weakref.ref = weakref.ref(extractor)
+    engines: int = len(style_transfer._step_engines) # pylint: disable=W0212
+
+    # Act
+    del extractor
+    gc.collect()
+
+    # Assert
+    assert extractor_ref() is None
+    assert len(style_transfer._step_engines) == engines - 1 # pylint: disable=W0212
+
+
+@patch('tensorflow.config.list_physical_devices', return_value=[])
+def test_supported_precisions_by_cpu_flags(
+        mock_devices: mock.MagicMock) -> None:
+    """
+    Test method of detecting bfloat16 support by the cpu flags, float16 is
+    only supported with a gpu
+
+    Args:
+        mock_devices (mock.MagicMock): mock
+    """
+    # Arrange
+    cpuinfo: str = 'processor\t: 0\nflags\t\t: fpu sse avx512_bf16\n'
+
+    # Act
+    with patch('builtins.open', mock.mock_open(read_data=cpuinfo)):
+        precisions: List[str] = \
+            style_transfer.supported_precisions.__wrapped__()
+
+    # Assert
+    mock_devices.assert_called_once_with('GPU')
+    assert precisions == ['float32', 'bfloat16']
+
+
+@patch('server.machine_learning.style_transfer.supported_precisions',
+       return_value=['float32', 'bfloat16'])
+def test_resolve_precision(mock_supported: mock.MagicMock,
+                           monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test method of resolving the requested or deployment default precision,
+    falling back to float32 when the machine does not support it
+
+    Args:
+        mock_supported (mock.MagicMock): mock
+        monkeypatch (pytest.MonkeyPatch): monkeypatch
+    """
+    # Arrange
+    monkeypatch.setattr(style_transfer, 'default_precision', 'bfloat16')
+
+    # Act
+    requested: str = style_transfer.resolve_precision('bfloat16')
+    default: str = style_transfer.resolve_precision()
+    unsupported: str = style_transfer.resolve_precision('float16')
+
+    # Assert
+    assert mock_supported.called
+    assert requested == 'bfloat16'
+    assert default == 'bfloat16'
+    assert unsupported == 'float32'
+    with pytest.raises(ValueError):
+        style_transfer.resolve_precision('float64')
+
+
+def small_vgg(deepest_layer: str) -> tf.keras.Model:
+    """
+    Method to create a one layer stand in of the truncated vgg, in the
+    global policy it is created in
+
+    Args:
+        deepest_layer (str): name of the layer
+
+    Returns:
+        tf.keras.Model: the model
+    """
+    inputs: tf.Tensor = tf.keras.Input(shape=(None, None, 3))
+    return tf.keras.Model(inputs, tf.keras.layers.Conv2D(
+        4, 3, padding='same', name=deepest_layer)(inputs))
+
+
+@patch('server.machine_learning.style_transfer.truncated_vgg19',
+       side_effect=small_vgg)
+def test_vgg_layers_precision_policy(mock_vgg: mock.MagicMock) -> None:
+    """
+    Test method of creating the vgg layers in the compute precision of the
+    extractor and restoring the global policy, also when creation fails
+
+    Args:
+        mock_vgg (mock.MagicMock): mock
+    """
+    # Arrange
+    policy: str = tf.keras.mixed_precision.global_policy().name
+
+    # Act
+    model: tf.keras.Model = style_transfer.vgg_layers(
+        ['block1_conv1'], 'bfloat16', truncate=True)
+    after_build: str = tf.keras.mixed_precision.global_policy().name
+    mock_vgg.side_effect = ValueError
+    with pytest.raises(ValueError):
+        style_transfer.vgg_layers(['block1_conv1'], 'float16', truncate=True)
+
+    # Assert
+    assert model.get_layer('block1_conv1').compute_dtype == 'bfloat16'
+    assert model.get_layer('block1_conv1').dtype == 'float32'
+    assert not model.get_layer('block1_conv1').trainable
+    assert after_build == policy
+    assert tf.keras.mixed_precision.global_policy().name == policy
@@ -0,0 +1,101 @@
+"""
+Tests for target cache
+"""
+
+
+import numpy as np
+from typing import Dict, List
+from server.machine_learning import target_cache
+
+
+def targets(value: float) -> Dict[str, np.ndarray]:
+    """
+    Method to create targets of a single layer
+
+    Args:
+        value (float): the target value
+
+    Returns:
+        Dict[str, np.ndarray]: the targets
+    """
+    return {'block1_conv1': np.full((1, 4), value, np.float32)}
+
+
+def test_evicts_least_recently_used() -> None:
+    """
+    Test method of evicting the least recently used targets at capacity
+    """
+    # Arrange
+    cache: target_cache.TargetCache = target_cache.TargetCache(max_entries=2)
+    cache.put('first', targets(1))
+    cache.put('second', targets(2))
+
+    # Act
+    cache.get('first')
+    cache.put('third', targets(3))
+
+    # Assert
+    assert cache.get('second') is None
+    assert cache.get('first')['block1_conv1'][0, 0] == 1
+    assert cache.get('third')['block1_conv1'][0, 0] == 3
+    assert cache.stats()['entries'] == 2
+
+
+def test_get_or_compute_once() -> None:
+    """
+    Test method of computing targets on miss only
+    """
+    # Arrange
+    cache: target_cache.TargetCache = target_cache.TargetCache()
+    computed: List[int] = []
+
+    def compute() -> Dict[str, np.ndarray]:
+        computed.append(1)
+        return targets(1)
+
+    # Act
+    cache.get_or_compute('style', 'key', compute)
+    cache.get_or_compute('style', 'key', compute)
+
+    # Assert
+    assert len(computed) == 1
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+
+
+def test_persisted_targets(tmp_path) -> None:
+    """
+    Test method of loading persisted targets after clearing memory
+    """
+    # Arrange
+    cache: target_cache.TargetCache = target_cache.TargetCache(
+        persist_dir=str(tmp_path))
+    cache.put('key', targets(5))
+
+    # Act
+    cache.clear()
+    persisted = target_cache.TargetCache(persist_dir=str(tmp_path)).get('key')
+
+    # Assert
+    assert persisted['block1_conv1'][0, 0] == 5
+
+
+def test_target_key() -> None:
+    """
+    Test method of keying targets by image, size, layers and precision
+    """
+    # Arrange
+    image: np.ndarray = np.zeros((8, 8, 3), np.uint8)
+    other: np.ndarray = np.ones((8, 8, 3), np.uint8)
+    layers: List[str] = ['block1_conv1']
+
+    # Assert
+    assert target_cache.target_key('style', image, 512, layers) == \
+        target_cache.target_key('style', image.copy(), 512, layers)
+    assert target_cache.target_key('style', image, 512, layers) != \
+        target_cache.target_key('style', other, 512, layers)
+    assert target_cache.target_key('style', image, 512, layers) != \
+        target_cache.target_key('style', image, 256, layers)
+    assert target_cache.target_key('style', image, 512, layers) != \
+        target_cache.target_key('content', image, 512, layers)
+    assert target_cache.target_key('style', image, 512, layers) != \
+        target_cache.target_key('style', image, 512, layers, 'mixed_float16')
@@ -0,0 +1,219 @@
+"""
+Tests for tiled high resolution renders
+"""
+
+
+import time
+import pytest
+import numpy as np
+import tensorflow as tf
+from typing import Any, Dict, List
+from unittest import mock
+from unittest.mock import patch
+from server.machine_learning import render, tiled_render, style_transfer
+from server.tests.test_machine_learning.test_render import FakeExtractor
+
+
+def test_tile_starts_cover_length() -> None:
+    """
+    Test method of tiles covering the whole length with at least the
+    overlap between neighbours, the last tile ends at the length
+    """
+    for length in (100, 128, 129, 200, 226, 300, 1000):
+        # Act
+        starts: List[int] = tiled_render.tile_starts(length, 128, 32)
+
+        # Assert
+        assert starts[0] == 0
+        assert min(starts[-1] + 128, length) == length
+        assert all(start + 128 - next_start >= 32
+                   for start, next_start in zip(starts, starts[1:]))
+
+
+def test_tile_starts_invalid_overlap() -> None:
+    """
+    Test method of rejecting overlaps that are negative or wider than half
+    a tile
+    """
+    for overlap in (-1, 65, 128, 200):
+        # Act and Assert
+        with pytest.raises(ValueError):
+            tiled_render.tile_starts(1000, 128, overlap)
+
+
+def test_tile_boxes_cover_image() -> None:
+    """
+    Test method of tiles covering every pixel of the image, tiles of images
+    smaller than a tile are the image
+    """
+    # Arrange
+    covered: np.ndarray = np.zeros((300, 200), bool)
+
+    # Act
+    boxes: List[tiled_render.TileBox] = tiled_render.tile_boxes(300, 200,
+                                                                128, 32)
+    for top, left, height, width in boxes:
+        covered[top:top + height, left:left + width] = True
+
+    # Assert
+    assert covered.all()
+    assert all(top + height <= 300 and left + width <= 200
+               for top, left, height, width in boxes)
+    assert tiled_render.tile_boxes(50, 80, 128, 32) == [(0, 0, 50, 80)]
+
+
+def test_blend_mask_weights_sum_to_one() -> None:
+    """
+    Test method of the blending weights of all tiles summing to 1 at every
+    pixel, also where the last tile overlaps more than the overlap
+    """
+    for height, width, overlap in ((300, 200, 32), (226, 129, 64),
+                                   (1000, 90, 0)):
+        # Arrange
+        weights: np.ndarray = np.zeros((height, width, 1), np.float32)
+
+        # Act
+        for box in tiled_render.tile_boxes(height, width, 128, overlap):
+            top, left, tile_height, tile_width = box
+            weights[top:top + tile_height, left:left + tile_width] += \
+                tiled_render.blend_mask(box, height, width, overlap)
+
+        # Assert
+        np.testing.assert_allclose(weights, 1.0, atol=1e-6)
+
+
+def tile_arguments(options: style_transfer.RenderOptions,
+                   budget: tiled_render.TileBudget) -> Dict[str, Any]:
+    """
+    Method to create the arguments of a tile optimization of 2 phases of 10
+    steps
+
+    Args:
+        options (style_transfer.RenderOptions): the render settings
+        budget (tiled_render.TileBudget): the render budget
+
+    Returns:
+        Dict[str, Any]: the optimize_tile arguments
+    """
+    extractor: FakeExtractor = FakeExtractor()
+    content: tf.Tensor = tf.random.stateless_uniform((1, 16, 16, 3), (0, 1))
+    return {'content': content, 'init': tf.fill((1, 16, 16, 3), 0.5),
+            'extractor': extractor,
+            'style_targets': extractor(content)['style'],
+            'schedule': render.render_schedule(1, 1, 1.0),
+            'steps_per_epoch': 10, 'style_weight': 1.0,
+            'content_weight': 1.0, 'options': options, 'budget': budget}
+
+
+def test_optimize_tile_charged_against_render_budget() -> None:
+    """
+    Test method of tile steps counting against the render step budget,
+    the tile stops once the render is out of steps
+    """
+    # Arrange
+    options: style_transfer.RenderOptions = style_transfer.RenderOptions(
+        run_eagerly=True, max_steps=15)
+    budget: tiled_render.TileBudget = tiled_render.TileBudget(options, 8,
+                                                              0.0)
+
+    # Act
+    _, loss, steps = tiled_render.optimize_tile(
+        **tile_arguments(options, budget))
+
+    # Assert
+    assert steps == 7
+    assert loss is not None
+    assert budget.stop_reason == 'step_budget'
+
+
+def test_optimize_tile_time_budget() -> None:
+    """
+    Test method of tiles continuing the optimization time of the base
+    render, a render out of time stops its tile
+    """
+    # Arrange
+    options: style_transfer.RenderOptions = style_transfer.RenderOptions(
+        run_eagerly=True, progress_every=5, max_seconds=60.0)
+    budget: tiled_render.TileBudget = tiled_render.TileBudget(
+        options, 0, time.perf_counter() - 60.0)
+
+    # Act
+    _, _, steps = tiled_render.optimize_tile(
+        **tile_arguments(options, budget))
+
+    # Assert
+    assert steps == 5
+    assert budget.stop_reason == 'time_budget'
+
+
+def test_optimize_tile_checks_should_stop() -> None:
+    """
+    Test method of a tile checking should_stop every progress_every steps
+    of the render, not only between tiles
+    """
+    # Arrange
+    should_stop: mock.MagicMock = mock.MagicMock(side_effect=[False, True])
+    options: style_transfer.RenderOptions = style_transfer.RenderOptions(
+        run_eagerly=True, progress_every=4, should_stop=should_stop)
+    budget: tiled_render.TileBudget = tiled_render.TileBudget(options, 0,
+                                                              0.0)
+
+    # Act
+    _, _, steps = tiled_render.optimize_tile(
+        **tile_arguments(options, budget))
+
+    # Assert
+    assert steps == 8
+    assert budget.stop_reason == 'stopped'
+
+
+def test_optimize_tile_phase_converges() -> None:
+    """
+    Test method of a tile moving on to the next phase once its loss stops
+    improving
+    """
+    # Arrange
+    options: style_transfer.RenderOptions = style_transfer.RenderOptions(
+        run_eagerly=True, progress_every=1, convergence_window=2,
+        convergence_tolerance=1.0)
+    budget: tiled_render.TileBudget = tiled_render.TileBudget(options, 0,
+                                                              0.0)
+
+    # Act
+    _, _, steps = tiled_render.optimize_tile(
+        **tile_arguments(options, budget))
+
+    # Assert
+    assert steps == 6
+    assert budget.stop_reason is None
+
+
+@patch('server.machine_learning.style_transfer.extractor_registry.get')
+def test_render_tiled_step_budget(mock_get: mock.MagicMock) -> None:
+    """
+    Test method of a tiled render counting the steps its tiles ran, and
+    keeping the upsampled base render in tiles left when out of steps
+
+    Args:
+        mock_get (mock.MagicMock): mock
+    """
+    # Arrange
+    mock_get.return_value = FakeExtractor()
+    content: np.ndarray = np.random.default_rng(0).integers(
+        0, 255, (32, 64, 3), np.uint8)
+    options: style_transfer.RenderOptions = style_transfer.RenderOptions(
+        run_eagerly=True, use_target_cache=False, use_session_store=False,
+        pyramid=[style_transfer.PyramidLevel(32, 1.0)], max_steps=10)
+
+    # Act
+    image, report = tiled_render.render_tiled(
+        content, content, ['content'], ['style'], 1.0, 1.0, 1.0, 0, 1, 4,
+        options, tiled_render.TileOptions(output_max_dim=1024, tile_size=512,
+                                          overlap=64, refine_step_share=1.0))
+
+    # Assert
+    assert image.size == (1024, 512)
+    assert [(phase.name, phase.steps) for phase in report.phases] == \
+        [('with_variation', 4), ('tiles', 6)]
+    assert report.stop_reason == 'step_budget'
+    assert report.phases[-1].stop_reason == 'step_budget'
@@ -0,0 +1,140 @@
+"""
+Tests for job store service
+"""
+
+
+from typing import List
+from server.services import job_store
+
+
+class FakeClock:
+    """
+    Class of a clock that only moves when told
+    """
+    def __init__(self):
+        self.now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_create_job_queued() -> None:
+    """
+    Test method of creating a queued job
+    """
+    # Arrange
+    store: job_store.JobStore = job_store.JobStore()
+
+    # Act
+    job_id: str = store.create()
+
+    # Assert
+    assert store.get(job_id).status == job_store.QUEUED
+    assert store.get('unknown') is None
+
+
+def test_update_progress_running() -> None:
+    """
+    Test method of updating job progress
+    """
+    # Arrange
+    store: job_store.JobStore = job_store.JobStore()
+    job_id: str = store.create()
+
+    # Act
+    store.update_progress(job_id, {'step': 10})
+    store.update_progress('unknown', {'step': 10})
+
+    # Assert
+    assert store.get(job_id).status == job_store.RUNNING
+    assert store.get(job_id).progress == {'step': 10}
+
+
+def test_set_failed() -> None:
+    """
+    Test method of marking a job as failed
+    """
+    # Arrange
+    store: job_store.JobStore = job_store.JobStore()
+    job_id: str = store.create()
+
+    # Act
+    store.set_failed(job_id, 'error')
+
+    # Assert
+    assert store.get(job_id).status == job_store.FAILED
+    assert store.get(job_id).error == 'error'
+
+
+def test_result_size_eviction() -> None:
+    """
+    Test method of evicting oldest results over the size limit
+    """
+    # Arrange
+    store: job_store.JobStore = job_store.JobStore(max_result_bytes=10)
+    job_ids: List[str] = [store.create() for _ in range(3)]
+
+    # Act
+    for job_id in job_ids:
+        store.set_result(job_id, b'12345')
+    store.set_result('unknown', b'12345')
+
+    # Assert
+    assert store.get(job_ids[0]).result is None
+    assert store.get(job_ids[0]).status == job_store.DONE
+    assert store.get(job_ids[1]).result == b'12345'
+    assert store.get(job_ids[2]).result == b'12345'
+    assert store.result_bytes == 10
+
+
+def test_ttl_eviction() -> None:
+    """
+    Test method of removing jobs after their time to live
+    """
+    # Arrange
+    clock: FakeClock = FakeClock()
+    store: job_store.JobStore = job_store.JobStore(ttl_seconds=10,
+                                                   clock=clock)
+    old_job_id: str = store.create()
+    store.set_result(old_job_id, b'12345')
+    clock.now = 5
+    new_job_id: str = store.create()
+
+    # Act
+    clock.now = 11
+
+    # Assert
+    assert store.get(old_job_id) is None
+    assert store.get(new_job_id) is not None
+    assert store.result_bytes == 0
+
+
+def test_set_preview() -> None:
+    """
+    Test method of setting the latest preview of a job
+    """
+    # Arrange
+    store: job_store.JobStore = job_store.JobStore()
+    job_id: str = store.create()
+
+    # Act
+    store.set_preview(job_id, b'preview', 100)
+
+    # Assert
+    assert store.get(job_id).preview == b'preview'
+    assert store.get(job_id).preview_step == 100
+
+
+def test_set_result_report() -> None:
+    """
+    Test method of storing the render report with a result
+    """
+    # Arrange
+    store: job_store.JobStore = job_store.JobStore()
+    job_id: str = store.create()
+
+    # Act
+    store.set_result(job_id, b'12345', {'steps': 300})
+
+    # Assert
+    assert store.get(job_id).report == {'steps': 300}
@@ -3,10 +3,17 @@ Tests for mail service
 """
 
 
+import socket
+import smtplib
+import functools
+import pytest
 from PIL import Image
 from unittest import mock
-from server.services import mail_service
 from unittest.mock import patch
+from typing import Any, Callable, Iterator, List, Tuple
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import Envelope
+from server.services import mail_service
 
 
 @patch('smtplib.SMTP')
@@ -190,3 +197,304 @@ def test_send_image_by_email_mimetext_constructor(
 
     # Assert
     assert mock_mimetext.call_args is None
+
+
+class FakeClock: # pylint: disable=R0903
+    """
+    Class of a clock that only moves when told
+    """
+    def __init__(self):
+        self.now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RecordingHandler: # pylint: disable=R0903
+    """
+    Class of an smtp server handler keeping the received emails
+    """
+    def __init__(self):
+        self.envelopes: List[Envelope] = []
+
+    async def handle_DATA(self, _server: Any, _session: Any, # pylint: disable=C0103
+                          envelope: Envelope) -> str:
+        """
+        Method to receive an email
+
+        Args:
+            _server (Any): the smtp server
+            _session (Any): the smtp session
+            envelope (Envelope): the email
+
+        Returns:
+            str: the smtp reply
+        """
+        self.envelopes.append(envelope)
+        return '250 OK'
+
+
+@pytest.fixture(name='smtp_server')
+def fixture_smtp_server() -> Iterator[Tuple[RecordingHandler, Callable]]:
+    """
+    Fixture of a local smtp server
+
+    Yields:
+        Tuple[RecordingHandler, Callable]: the server handler and a factory
+        of connections to the server
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port: int = sock.getsockname()[1]
+    handler: RecordingHandler = RecordingHandler()
+    controller: Controller = Controller(handler, hostname='127.0.0.1',
+                                        port=port)
+    controller.start()
+    yield handler, functools.partial(mail_service.connect, '127.0.0.1',
+                                     port, '', '', False)
+    controller.stop()
+
+
+def test_outbox_delivers_to_smtp_server(
+    smtp_server: Tuple[RecordingHandler, Callable]) -> None:
+    """
+    Test method of mail service outbox delivering queued emails
+
+    Args:
+        smtp_server (Tuple[RecordingHandler, Callable]): fixture
+    """
+    # Arrange
+    handler, factory = smtp_server
+    outbox: mail_service.MailOutbox = mail_service.MailOutbox(
+        mail_service.SmtpConnectionPool(factory=factory))
+
+    # Act
+    outbox.send_image(b'image', 'test', 'test@test.com')
+    outbox.send_image(b'image', 'test', 'other@test.com')
+    delivered: bool = outbox.flush(timeout=10)
+    outbox.close(timeout=10)
+
+    # Assert
+    assert delivered
+    assert outbox.sent == 2
+    assert [envelope.rcpt_tos for envelope in handler.envelopes] == [
+        ['test@test.com'], ['other@test.com']]
+
+
+def test_outbox_batches_over_one_connection(
+    smtp_server: Tuple[RecordingHandler, Callable]) -> None:
+    """
+    Test method of mail service outbox sending a batch of emails over one
+    connection
+
+    Args:
+        smtp_server (Tuple[RecordingHandler, Callable]): fixture
+    """
+    # Arrange
+    handler, factory = smtp_server
+    factory = mock.Mock(wraps=factory)
+    outbox: mail_service.MailOutbox = mail_service.MailOutbox(
+        mail_service.SmtpConnectionPool(factory=factory), batch_size=10)
+
+    # Act
+    with outbox._condition: # pylint: disable=W0212
+        # emails queued before the delivery thread takes a batch
+        for i in range(10):
+            outbox.enqueue(f'user{i}@test.com', 'Subject: test\n\ntest')
+    outbox.flush(timeout=10)
+    outbox.close(timeout=10)
+
+    # Assert
+    assert len(handler.envelopes) == 10
+    assert factory.call_count == 1
+
+
+def test_outbox_retries_after_connection_failure(
+    smtp_server: Tuple[RecordingHandler, Callable]) -> None:
+    """
+    Test method of mail service outbox retrying emails on a new connection
+    after the connection fails
+
+    Args:
+        smtp_server (Tuple[RecordingHandler, Callable]): fixture
+    """
+    # Arrange
+    handler, factory = smtp_server
+    attempts: List[int] = []
+
+    def flaky_factory() -> smtplib.SMTP:
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise ConnectionRefusedError()
+        return factory()
+
+    outbox: mail_service.MailOutbox = mail_service.MailOutbox(
+        mail_service.SmtpConnectionPool(factory=flaky_factory),
+        backoff_seconds=0.01)
+
+    # Act
+    outbox.enqueue('test@test.com', 'Subject: test\n\ntest')
+    outbox.flush(timeout=10)
+    outbox.close(timeout=10)
+
+    # Assert
+    assert len(attempts) == 2
+    assert [envelope.rcpt_tos for envelope in handler.envelopes] == [
+        ['test@test.com']]
+
+
+def test_pool_reuses_live_connection() -> None:
+    """
+    Test method of mail service connection pool reusing a released
+    connection
+    """
+    # Arrange
+    connection: mock.MagicMock = mock.MagicMock()
+    connection.noop.return_value = (250, b'OK')
+    factory: mock.MagicMock = mock.MagicMock(return_value=connection)
+    pool: mail_service.SmtpConnectionPool = mail_service.SmtpConnectionPool(
+        factory=factory)
+
+    # Act
+    pool.release(pool.acquire())
+    reused: smtplib.SMTP = pool.acquire()
+
+    # Assert
+    assert reused is connection
+    assert factory.call_count == 1
+
+
+def test_pool_replaces_expired_connection() -> None:
+    """
+    Test method of mail service connection pool closing a connection idle
+    for too long
+    """
+    # Arrange
+    clock: FakeClock = FakeClock()
+    expired: mock.MagicMock = mock.MagicMock()
+    fresh: mock.MagicMock = mock.MagicMock()
+    factory: mock.MagicMock = mock.MagicMock(side_effect=[expired, fresh])
+    pool: mail_service.SmtpConnectionPool = mail_service.SmtpConnectionPool(
+        idle_seconds=60, factory=factory, clock=clock)
+    pool.release(pool.acquire())
+
+    # Act
+    clock.now = 61
+    connection: smtplib.SMTP = pool.acquire()
+
+    # Assert
+    assert connection is fresh
+    assert expired.quit.called
+
+
+def test_pool_replaces_closed_connection() -> None:
+    """
+    Test method of mail service connection pool replacing a connection
+    closed by the server
+    """
+    # Arrange
+    closed: mock.MagicMock = mock.MagicMock()
+    closed.noop.side_effect = smtplib.SMTPServerDisconnected()
+    fresh: mock.MagicMock = mock.MagicMock()
+    pool: mail_service.SmtpConnectionPool = mail_service.SmtpConnectionPool(
+        factory=mock.MagicMock(side_effect=[closed, fresh]))
+    pool.release(pool.acquire())
+
+    # Act
+    connection: smtplib.SMTP = pool.acquire()
+
+    # Assert
+    assert connection is fresh
+    assert closed.close.called
+
+
+def test_outbox_backoff() -> None:
+    """
+    Test method of mail service outbox doubling the retry delay up to the
+    maximum
+    """
+    # Arrange
+    clock: FakeClock = FakeClock()
+    outbox: mail_service.MailOutbox = mail_service.MailOutbox(
+        mock.MagicMock(), max_attempts=10, backoff_seconds=1,
+        max_backoff_seconds=5, clock=clock)
+    item: mail_service.OutboxMessage = mail_service.OutboxMessage(
+        0, 0, 'test@test.com', 'test')
+    delays: List[float] = []
+
+    # Act
+    for _ in range(5):
+        outbox._retry(item) # pylint: disable=W0212
+        delays.append(item.ready)
+
+    # Assert
+    assert delays == [1, 2, 4, 5, 5]
+
+
+def test_outbox_drops_refused_email() -> None:
+    """
+    Test method of mail service outbox dropping an email refused by the
+    server and retrying a temporarily refused one
+    """
+    # Arrange
+    connection: mock.MagicMock = mock.MagicMock()
+    connection.sendmail.side_effect = [
+        smtplib.SMTPRecipientsRefused({'bad@test.com': (550, b'unknown')}),
+        smtplib.SMTPDataError(451, b'try later')]
+    pool: mock.MagicMock = mock.MagicMock()
+    pool.acquire.return_value = connection
+    outbox: mail_service.MailOutbox = mail_service.MailOutbox(
+        pool, clock=FakeClock())
+    batch: List[mail_service.OutboxMessage] = [
+        mail_service.OutboxMessage(0, 0, 'bad@test.com', 'test'),
+        mail_service.OutboxMessage(0, 1, 'test@test.com', 'test')]
+
+    # Act
+    outbox._send_batch(batch) # pylint: disable=W0212
+
+    # Assert
+    assert outbox.failed == 1
+    assert outbox.pending() == 1
+    assert pool.release.call_args[0][0] is connection
+
+
+def test_outbox_stops_after_max_attempts() -> None:
+    """
+    Test method of mail service outbox dropping an email after its last
+    attempt
+    """
+    # Arrange
+    pool: mock.MagicMock = mock.MagicMock()
+    pool.acquire.side_effect = OSError()
+    outbox: mail_service.MailOutbox = mail_service.MailOutbox(
+        pool, max_attempts=2, clock=FakeClock())
+    item: mail_service.OutboxMessage = mail_service.OutboxMessage(
+        0, 0, 'test@test.com', 'test')
+    outbox._send_batch([item]) # pylint: disable=W0212
+    retried: int = outbox.pending()
+    outbox._heap.clear() # pylint: disable=W0212
+
+    # Act
+    outbox._send_batch([item]) # pylint: disable=W0212
+
+    # Assert
+    assert retried == 1
+    assert outbox.failed == 1
+    assert outbox.pending() == 0
+
+
+def test_outbox_refuses_email_after_close() -> None:
+    """
+    Test method of mail service outbox not queueing emails once closed
+    """
+    # Arrange
+    outbox: mail_service.MailOutbox = mail_service.MailOutbox(
+        mock.MagicMock(), clock=FakeClock())
+    outbox.close(timeout=10)
+
+    # Act
+    queued: bool = outbox.enqueue('test@test.com', 'Subject: test\n\ntest')
+
+    # Assert
+    assert not queued
+    assert outbox.pending() == 0
@@ -0,0 +1,152 @@
+"""
+Tests for metrics service
+"""
+
+
+import pytest
+from server.services import metrics
+
+
+def test_counter_inc() -> None:
+    """
+    Test method of counter increment with and without labels
+    """
+    # Arrange
+    registry: metrics.MetricsRegistry = metrics.MetricsRegistry()
+    counter: metrics.Counter = metrics.Counter('test_total', 'test',
+                                               registry)
+
+    # Act
+    counter.inc()
+    counter.inc(2)
+    counter.inc(kind='a')
+
+    # Assert
+    assert counter.value() == 3.0
+    assert counter.value(kind='a') == 1.0
+    assert counter.value(kind='b') == 0.0
+
+
+def test_gauge_set_and_dec() -> None:
+    """
+    Test method of gauge set and decrement
+    """
+    # Arrange
+    registry: metrics.MetricsRegistry = metrics.MetricsRegistry()
+    gauge: metrics.Gauge = metrics.Gauge('test_gauge', 'test', registry)
+
+    # Act
+    gauge.set(5)
+    gauge.dec(2)
+
+    # Assert
+    assert gauge.value() == 3.0
+
+
+def test_histogram_observe() -> None:
+    """
+    Test method of histogram observation buckets
+    """
+    # Arrange
+    registry: metrics.MetricsRegistry = metrics.MetricsRegistry()
+    histogram: metrics.Histogram = metrics.Histogram(
+        'test_seconds', 'test', registry, buckets=(1.0, 10.0))
+
+    # Act
+    histogram.observe(0.5)
+    histogram.observe(5)
+    histogram.observe(50)
+    text: str = registry.render()
+
+    # Assert
+    assert histogram.count() == 3
+    assert 'test_seconds_bucket{le="1.0"} 1' in text
+    assert 'test_seconds_bucket{le="10.0"} 2' in text
+    assert 'test_seconds_bucket{le="+Inf"} 3' in text
+    assert 'test_seconds_sum 55.5' in text
+    assert 'test_seconds_count 3' in text
+
+
+def test_registry_render() -> None:
+    """
+    Test method of rendering metrics in the prometheus text format
+    """
+    # Arrange
+    registry: metrics.MetricsRegistry = metrics.MetricsRegistry()
+    counter: metrics.Counter = metrics.Counter('test_total', 'test help',
+                                               registry)
+    counter.inc(kind='a')
+
+    # Act
+    text: str = registry.render()
+
+    # Assert
+    assert '# HELP test_total test help' in text
+    assert '# TYPE test_total counter' in text
+    assert 'test_total{kind="a"} 1.0' in text
+
+
+def test_registry_duplicate_name() -> None:
+    """
+    Test method of registering two metrics with the same name
+    """
+    # Arrange
+    registry: metrics.MetricsRegistry = metrics.MetricsRegistry()
+    metrics.Counter('test_total', 'test', registry)
+
+    # Act + Assert
+    with pytest.raises(ValueError):
+        metrics.Counter('test_total', 'test', registry)
+
+
+def test_registry_collect_and_merge() -> None:
+    """
+    Test method of merging the metric changes of another process
+    """
+    # Arrange
+    worker: metrics.MetricsRegistry = metrics.MetricsRegistry()
+    api: metrics.MetricsRegistry = metrics.MetricsRegistry()
+    worker_counter: metrics.Counter = metrics.Counter('test_total', 'test',
+                                                      worker)
+    api_counter: metrics.Counter = metrics.Counter('test_total', 'test',
+                                                   api)
+    metrics.Gauge('test_gauge', 'test', worker).set(3)
+    metrics.Histogram('test_seconds', 'test', worker,
+                      buckets=(1.0,)).observe(0.5)
+    api_counter.inc(kind='a')
+    worker_counter.inc(kind='a')
+
+    # Act
+    api.merge(worker.collect())
+    worker_counter.inc(kind='a')
+    api.merge(worker.collect())
+    text: str = api.render()
+
+    # Assert
+    assert api_counter.value(kind='a') == 3.0
+    assert 'test_gauge 3' in text
+    assert 'test_seconds_bucket{le="1.0"} 1' in text
+    assert 'test_seconds_count 1' in text
+    assert not worker.collect()
+
+
+def test_registry_register_merged_metric() -> None:
+    """
+    Test method of registering a metric first merged from another process,
+    keeping its samples
+    """
+    # Arrange
+    worker: metrics.MetricsRegistry = metrics.MetricsRegistry()
+    api: metrics.MetricsRegistry = metrics.MetricsRegistry()
+    metrics.Counter('test_total', 'test', worker).inc(2)
+    api.merge(worker.collect())
+
+    # Act
+    counter: metrics.Counter = metrics.Counter('test_total', 'test', api)
+    counter.inc()
+
+    # Assert
+    assert counter.value() == 3.0
+    assert 'test_total 3.0' in api.render()
+    with pytest.raises(ValueError):
+        metrics.Counter('test_total', 'test', api)
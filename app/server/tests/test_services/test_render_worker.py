@@ -0,0 +1,296 @@
+"""
+Tests for render worker service
+"""
+
+
+import os
+import time
+import threading
+import multiprocessing
+import pytest
+from concurrent.futures import Future
+from typing import Any, List
+from server.services import render_worker
+
+
+def test_in_memory_queue_full() -> None:
+    """
+    Test method of in memory queue rejecting jobs when full
+    """
+    # Arrange
+    job_queue: render_worker.InMemoryJobQueue = \
+        render_worker.InMemoryJobQueue(1)
+    job_queue.put(render_worker.Job(print))
+
+    # Act + Assert
+    with pytest.raises(render_worker.QueueFullError):
+        job_queue.put(render_worker.Job(print))
+    assert job_queue.qsize() == 1
+
+
+def test_in_memory_queue_get_empty() -> None:
+    """
+    Test method of in memory queue get timing out when empty
+    """
+    # Arrange
+    job_queue: render_worker.InMemoryJobQueue = \
+        render_worker.InMemoryJobQueue(1)
+
+    # Act + Assert
+    assert job_queue.get(timeout=0.01) is None
+
+
+def test_in_memory_queue_take() -> None:
+    """
+    Test method of in memory queue taking the waiting jobs of a batch key
+    """
+    # Arrange
+    job_queue: render_worker.InMemoryJobQueue = \
+        render_worker.InMemoryJobQueue(4)
+    jobs: List[render_worker.Job] = [
+        render_worker.Job(print, (i,), batch_key=key)
+        for i, key in enumerate(['a', 'b', 'a', 'a'])]
+    for job in jobs:
+        job_queue.put(job)
+
+    # Act
+    taken: List[render_worker.Job] = job_queue.take('a', 2)
+
+    # Assert
+    assert taken == [jobs[0], jobs[2]]
+    assert job_queue.qsize() == 2
+    assert job_queue.get(timeout=0.01) is jobs[1]
+    assert job_queue.get(timeout=0.01) is jobs[3]
+
+
+def test_pool_unknown_backend() -> None:
+    """
+    Test method of pool with unknown backend
+    """
+    # Act + Assert
+    with pytest.raises(ValueError):
+        render_worker.RenderWorkerPool(backend='unknown')
+
+
+def test_pool_runs_jobs() -> None:
+    """
+    Test method of thread pool running jobs and initializer
+    """
+    # Arrange
+    initialized: threading.Event = threading.Event()
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        workers=2, backend=render_worker.THREAD_BACKEND,
+        initializer=initialized.set)
+
+    # Act
+    future: Future = pool.submit(pow, 2, 3)
+
+    # Assert
+    assert future.result(timeout=5) == 8
+    assert initialized.is_set()
+    pool.shutdown()
+
+
+def test_pool_ready_after_initializer() -> None:
+    """
+    Test method of thread pool being ready once every worker ran its
+    initializer
+    """
+    # Arrange
+    release: threading.Event = threading.Event()
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        workers=2, backend=render_worker.THREAD_BACKEND,
+        initializer=lambda: release.wait(5))
+    not_started: bool = pool.ready
+
+    # Act
+    pool.start()
+    warming: bool = pool.ready
+    release.set()
+    deadline: float = time.monotonic() + 5
+    while not pool.ready and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # Assert
+    assert not not_started
+    assert not warming
+    assert pool.ready
+    pool.shutdown()
+    assert not pool.ready
+
+
+def test_init_worker_setup_slots() -> None:
+    """
+    Test method of worker processes set up with consecutive indexes before
+    the initializer
+    """
+    # Arrange
+    calls: List[Any] = []
+    slots: Any = multiprocessing.get_context('spawn').Value('i', 0)
+
+    # Act
+    for _ in range(2):
+        render_worker._init_worker( # pylint: disable=W0212
+            None, None, lambda: calls.append('initializer'), calls.append,
+            slots)
+
+    # Assert
+    assert calls == [0, 'initializer', 1, 'initializer']
+
+
+def test_pool_job_exception() -> None:
+    """
+    Test method of thread pool setting job exception on future
+    """
+    # Arrange
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        backend=render_worker.THREAD_BACKEND)
+
+    # Act
+    future: Future = pool.submit(int, 'not a number')
+
+    # Assert
+    with pytest.raises(ValueError):
+        future.result(timeout=5)
+    pool.shutdown()
+
+
+def test_pool_queue_full() -> None:
+    """
+    Test method of thread pool rejecting jobs when queue is full
+    """
+    # Arrange
+    release: threading.Event = threading.Event()
+    started: threading.Event = threading.Event()
+
+    def blocking_job() -> None:
+        started.set()
+        release.wait(5)
+
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        workers=1, max_queue_size=1, backend=render_worker.THREAD_BACKEND)
+    pool.submit(blocking_job)
+    started.wait(5)
+    pool.submit(blocking_job)
+
+    # Act + Assert
+    with pytest.raises(render_worker.QueueFullError):
+        pool.submit(blocking_job)
+    release.set()
+    pool.shutdown()
+
+
+def test_pool_batches_queued_jobs() -> None:
+    """
+    Test method of thread pool running queued jobs of a batch key in one
+    batch call
+    """
+    # Arrange
+    release: threading.Event = threading.Event()
+    batches: List[List[Any]] = []
+
+    def batch_pow(calls: List[Any]) -> List[int]:
+        batches.append(calls)
+        return [pow(*args) for args in calls]
+
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        workers=1, max_queue_size=4, backend=render_worker.THREAD_BACKEND,
+        max_batch_size=4)
+    pool.submit(release.wait, 5)
+    futures: List[Future] = [
+        pool.submit_batchable('512x512', batch_pow, pow, 2, 3),
+        pool.submit_batchable('512x384', batch_pow, pow, 3, 2),
+        pool.submit_batchable('512x512', batch_pow, pow, 2, 4)]
+
+    # Act
+    release.set()
+    pool.shutdown(wait=True)
+
+    # Assert
+    assert [future.result(timeout=0) for future in futures] == [8, 9, 16]
+    assert batches == [[(2, 3), (2, 4)]]
+
+
+def test_pool_shutdown_drains_queue() -> None:
+    """
+    Test method of thread pool shutdown running queued jobs before exit
+    """
+    # Arrange
+    release: threading.Event = threading.Event()
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        workers=1, max_queue_size=4, backend=render_worker.THREAD_BACKEND)
+    futures = [pool.submit(release.wait, 5)] + \
+        [pool.submit(pow, 2, i) for i in range(3)]
+
+    # Act
+    release.set()
+    pool.shutdown(wait=True)
+
+    # Assert
+    assert [future.result(timeout=0) for future in futures[1:]] == [1, 2, 4]
+    with pytest.raises(render_worker.PoolClosedError):
+        pool.submit(pow, 2, 2)
+
+
+def test_process_pool_shutdown_fails_queued_jobs() -> None:
+    """
+    Test method of process pool shutdown without waiting failing the queued
+    jobs instead of running them in the api process
+    """
+    # Arrange
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        workers=1, max_queue_size=4, backend=render_worker.PROCESS_BACKEND)
+    pool.submit(time.sleep, 0.5)
+    futures: List[Future] = [pool.submit(os.getpid) for _ in range(2)]
+
+    # Act
+    pool.shutdown(wait=False)
+
+    # Assert
+    for future in futures:
+        with pytest.raises(render_worker.PoolClosedError):
+            future.result(timeout=5)
+
+
+def test_pool_reports_progress() -> None:
+    """
+    Test method of thread pool passing job progress to progress handler
+    """
+    # Arrange
+    reported: threading.Event = threading.Event()
+    progress: list = []
+
+    def handler(job_id: str, job_progress: dict) -> None:
+        progress.append((job_id, job_progress))
+        reported.set()
+
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        backend=render_worker.THREAD_BACKEND, progress_handler=handler)
+
+    # Act
+    pool.submit(render_worker.report_progress, 'job', {'step': 1})
+    reported.wait(5)
+    pool.shutdown()
+
+    # Assert
+    assert progress == [('job', {'step': 1})]
+
+
+def test_pool_stop_request() -> None:
+    """
+    Test method of thread pool asking a job to stop
+    """
+    # Arrange
+    pool: render_worker.RenderWorkerPool = render_worker.RenderWorkerPool(
+        backend=render_worker.THREAD_BACKEND)
+    pool.start()
+
+    # Act
+    pool.request_stop('job')
+    requested: bool = render_worker.stop_requested('job')
+    pool.clear_stop('job')
+
+    # Assert
+    assert requested
+    assert not render_worker.stop_requested('job')
+    pool.shutdown()
@@ -0,0 +1,166 @@
+"""
+Tests for result cache service
+"""
+
+
+from typing import List
+from server.services import result_cache
+
+
+def test_lookup_miss_join_and_hit() -> None:
+    """
+    Test method of coalescing identical requests and caching the result
+    """
+    # Arrange
+    cache: result_cache.ResultCache = result_cache.ResultCache()
+    key: str = result_cache.request_key('content', 'style', 150.0)
+
+    # Act
+    first = cache.lookup(key, 'leader')
+    second = cache.lookup(key, 'follower')
+    waiting: List[str] = cache.complete('leader', b'result', {'steps': 10})
+    third = cache.lookup(key, 'later')
+
+    # Assert
+    assert first == (result_cache.MISS, None)
+    assert second == (result_cache.JOINED, None)
+    assert waiting == ['leader', 'follower']
+    assert third[0] == result_cache.HIT
+    assert third[1].result == b'result'
+    assert third[1].report == {'steps': 10}
+    assert cache.stats()['hit_rate'] == 2 / 3
+
+
+def test_request_key_parameters() -> None:
+    """
+    Test method of keying requests by every parameter
+    """
+    # Assert
+    assert result_cache.request_key('a', 'b', 150.0) == \
+        result_cache.request_key('a', 'b', 150.0)
+    assert result_cache.request_key('a', 'b', 150.0) != \
+        result_cache.request_key('a', 'b', 300.0)
+
+
+def test_jobs_of_render() -> None:
+    """
+    Test method of getting the jobs waiting on a render
+    """
+    # Arrange
+    cache: result_cache.ResultCache = result_cache.ResultCache()
+    cache.lookup('key', 'leader')
+    cache.lookup('key', 'follower')
+
+    # Assert
+    assert cache.jobs('leader') == ['leader', 'follower']
+    assert cache.jobs('other') == ['other']
+
+
+def test_release_not_cached() -> None:
+    """
+    Test method of releasing a render without caching its result
+    """
+    # Arrange
+    cache: result_cache.ResultCache = result_cache.ResultCache()
+    cache.lookup('key', 'leader')
+    cache.lookup('key', 'follower')
+
+    # Act
+    waiting: List[str] = cache.release('leader')
+
+    # Assert
+    assert waiting == ['leader', 'follower']
+    assert cache.lookup('key', 'retry') == (result_cache.MISS, None)
+
+
+def test_detach_waiting_jobs() -> None:
+    """
+    Test method of detaching stopped jobs from a render, the render is
+    stopped once no job waits on it
+    """
+    # Arrange
+    cache: result_cache.ResultCache = result_cache.ResultCache()
+    cache.lookup('key', 'leader')
+    cache.lookup('key', 'follower')
+    cache.lookup('key', 'other')
+
+    # Act
+    detached_follower = cache.detach('follower')
+    detached_leader = cache.detach('leader')
+    waiting: List[str] = cache.jobs('leader')
+    render_to_stop = cache.detach('other')
+    retry = cache.lookup('key', 'retry')
+
+    # Assert
+    assert detached_follower is None and detached_leader is None
+    assert waiting == ['other']
+    assert render_to_stop == 'leader'
+    assert retry == (result_cache.MISS, None)
+    assert cache.release('leader') == []
+    assert cache.jobs('retry') == ['retry']
+
+
+def test_detach_leader_alone() -> None:
+    """
+    Test method of detaching a job rendering alone, it keeps its render
+    """
+    # Arrange
+    cache: result_cache.ResultCache = result_cache.ResultCache()
+    cache.lookup('key', 'leader')
+
+    # Act
+    render_to_stop = cache.detach('leader')
+
+    # Assert
+    assert render_to_stop == 'leader'
+    assert cache.lookup('key', 'retry') == (result_cache.MISS, None)
+    assert cache.release('leader') == ['leader']
+    assert cache.detach('uncached') == 'uncached'
+
+
+def test_size_eviction() -> None:
+    """
+    Test method of evicting the least recently used results over the size
+    limit
+    """
+    # Arrange
+    cache: result_cache.ResultCache = result_cache.ResultCache(max_bytes=10)
+    for key in ('a', 'b'):
+        cache.lookup(key, key)
+        cache.complete(key, b'12345')
+    cache.lookup('a', 'reader')
+
+    # Act
+    cache.lookup('c', 'c')
+    cache.complete('c', b'12345')
+
+    # Assert
+    assert cache.lookup('a', 'reader')[0] == result_cache.HIT
+    assert cache.lookup('b', 'reader')[0] == result_cache.MISS
+    assert cache.stats()['bytes'] == 10
+
+
+def test_persisted_results(tmp_path) -> None:
+    """
+    Test method of answering from persisted results after a restart and
+    evicting over the disk limit
+
+    Args:
+        tmp_path: pytest temporary folder
+    """
+    # Arrange
+    cache: result_cache.ResultCache = result_cache.ResultCache(
+        persist_dir=str(tmp_path), max_disk_bytes=10)
+    for key in ('a', 'b', 'c'):
+        cache.lookup(key, key)
+        cache.complete(key, b'12345', {'key': key})
+
+    # Act
+    restarted: result_cache.ResultCache = result_cache.ResultCache(
+        persist_dir=str(tmp_path), max_disk_bytes=10)
+
+    # Assert
+    outcome, cached = restarted.lookup('c', 'reader')
+    assert outcome == result_cache.HIT
+    assert cached.report == {'key': 'c'}
+    assert len(list(tmp_path.glob('*.bin'))) == 2
@@ -0,0 +1,82 @@
+"""
+Tests for session store service
+"""
+
+
+from typing import List
+from server.services import session_store
+
+
+class FakeClock:
+    """
+    Class of a clock that only moves when told
+    """
+    def __init__(self):
+        self.now: float = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get_or_compute() -> None:
+    """
+    Test method of computing an entry once
+    """
+    # Arrange
+    store: session_store.SessionStore = session_store.SessionStore()
+    calls: List[str] = []
+
+    def compute() -> str:
+        calls.append('compute')
+        return 'decoded'
+
+    # Act
+    first: str = store.get_or_compute('upload', 'hash', compute)
+    second: str = store.get_or_compute('upload', 'hash', compute)
+
+    # Assert
+    assert first == second == 'decoded'
+    assert calls == ['compute']
+    assert store.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+    assert store.get('image', 'hash') is None
+
+
+def test_lru_eviction() -> None:
+    """
+    Test method of evicting the least recently used entry
+    """
+    # Arrange
+    store: session_store.SessionStore = session_store.SessionStore(
+        max_entries=2)
+    store.put('image', 'a', 1)
+    store.put('image', 'b', 2)
+
+    # Act
+    store.get('image', 'a')
+    store.put('image', 'c', 3)
+
+    # Assert
+    assert store.get('image', 'a') == 1
+    assert store.get('image', 'b') is None
+    assert store.get('image', 'c') == 3
+
+
+def test_ttl_expiry() -> None:
+    """
+    Test method of expiring entries unused for their time to live
+    """
+    # Arrange
+    clock: FakeClock = FakeClock()
+    store: session_store.SessionStore = session_store.SessionStore(
+        ttl_seconds=10, clock=clock)
+    store.put('output', 'a', 1)
+    store.put('output', 'b', 2)
+
+    # Act
+    clock.now = 8
+    store.get('output', 'a')
+    clock.now = 15
+
+    # Assert
+    assert store.get('output', 'a') == 1
+    assert store.get('output', 'b') is None
@@ -0,0 +1,106 @@
+"""
+Tests for worker config service
+"""
+
+
+from typing import List
+from unittest import mock
+from unittest.mock import patch
+from server.services import worker_config
+
+
+def test_parse_cpu_list() -> None:
+    """
+    Test method of parsing a cpu list with ranges
+    """
+    # Act
+    cpus: List[int] = worker_config.parse_cpu_list('4-6, 0,2,2')
+
+    # Assert
+    assert cpus == [0, 2, 4, 5, 6]
+    assert worker_config.parse_cpu_list('') == []
+
+
+def test_plan_workers_splits_cpus() -> None:
+    """
+    Test method of splitting cpus between workers
+    """
+    # Act
+    configs: List[worker_config.WorkerConfig] = worker_config.plan_workers(
+        3, list(range(8)))
+
+    # Assert
+    assert [config.cpus for config in configs] == [[0, 1], [2, 3, 4],
+                                                   [5, 6, 7]]
+    assert [config.intra_op_threads for config in configs] == [2, 3, 3]
+    assert [config.inter_op_threads for config in configs] == [2, 2, 2]
+
+
+def test_plan_workers_more_workers_than_cpus() -> None:
+    """
+    Test method of workers sharing cpus when there are more workers than cpus
+    """
+    # Act
+    configs: List[worker_config.WorkerConfig] = worker_config.plan_workers(
+        3, [0, 1], intra_op_threads=4, pin=False)
+
+    # Assert
+    assert [config.intra_op_threads for config in configs] == [4, 4, 4]
+    assert [config.inter_op_threads for config in configs] == [1, 1, 1]
+    assert all(config.cpus is None for config in configs)
+    assert [config.cpus for config in worker_config.plan_workers(
+        3, [0, 1])] == [[0], [1], [0]]
+
+
+@patch('tensorflow.config.threading.set_inter_op_parallelism_threads')
+@patch('tensorflow.config.threading.set_intra_op_parallelism_threads')
+@patch('os.sched_setaffinity', create=True)
+def test_apply_worker_config(mock_setaffinity: mock.MagicMock,
+                             mock_set_intra: mock.MagicMock,
+                             mock_set_inter: mock.MagicMock) -> None:
+    """
+    Test method of pinning a worker and setting its tensorflow threads
+
+    Args:
+        mock_setaffinity (mock.MagicMock): mock
+        mock_set_intra (mock.MagicMock): mock
+        mock_set_inter (mock.MagicMock): mock
+    """
+    # Arrange
+    configs: List[worker_config.WorkerConfig] = [
+        worker_config.WorkerConfig(2, 1, [0, 1]),
+        worker_config.WorkerConfig(2, 1, [2, 3])]
+
+    # Act
+    with patch.dict('os.environ'):
+        worker_config.apply_worker_config(configs, 1)
+
+    # Assert
+    mock_setaffinity.assert_called_once_with(0, [2, 3])
+    mock_set_intra.assert_called_once_with(2)
+    mock_set_inter.assert_called_once_with(1)
+
+
+@patch('tensorflow.config.threading.set_intra_op_parallelism_threads')
+@patch('os.sched_setaffinity', create=True)
+def test_apply_worker_config_after_tensorflow_started(
+    mock_setaffinity: mock.MagicMock,
+    mock_set_intra: mock.MagicMock) -> None:
+    """
+    Test method of a worker keeping the tensorflow threads when its runtime
+    already started
+
+    Args:
+        mock_setaffinity (mock.MagicMock): mock
+        mock_set_intra (mock.MagicMock): mock
+    """
+    # Arrange
+    mock_set_intra.side_effect = RuntimeError('already initialized')
+
+    # Act
+    with patch.dict('os.environ'):
+        worker_config.apply_worker_config(
+            [worker_config.WorkerConfig(2, 0, [0])], 0)
+
+    # Assert
+    mock_setaffinity.assert_called_once_with(0, [0])